@@ -0,0 +1,186 @@
+"""
+Aggregation pipelines for the admin user listing.
+
+Page mode runs one aggregation: the filter and sort go first so they are served by the
+users indexes, then a $facet returns the requested page (with per-user deal counts from
+a $lookup into pnl_deals) alongside the total. Keyset mode skips the total and seeks
+straight to the row after an opaque cursor, so deep pages cost the same as the first.
+"""
+import base64
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Decimal128, ObjectId, json_util
+
+from app.pagination import CursorError
+
+# Sortable fields; anything else falls back to created_at
+SORT_FIELDS = {"created_at", "last_login", "email", "full_name", "plan", "status"}
+
+SEARCH_MODES = {"contains", "prefix", "text"}
+
+# Fields returned to the admin UI (never password hashes or 2FA secrets)
+USER_FIELDS = ["id", "email", "full_name", "plan", "status", "role", "created_at", "last_login",
+               "stripe_customer_id"]
+
+
+# MongoDB's sort order across the BSON types a user field can hold, lowest first:
+# ($type aliases, Python types). Null (and missing) sorts below everything else.
+TYPE_ORDER: List[Tuple[List[str], tuple]] = [
+    (["null"], ()),
+    (["int", "long", "double", "decimal"], (int, float, Decimal128)),
+    (["string"], (str,)),
+    (["object"], (dict,)),
+    (["objectId"], (ObjectId,)),
+    (["bool"], (bool,)),
+    (["date"], (datetime,)),
+]
+
+
+def sort_spec(sort_by: str, sort_order: str) -> Tuple[str, int]:
+    field = sort_by if sort_by in SORT_FIELDS else "created_at"
+    return field, -1 if sort_order == "desc" else 1
+
+
+def build_user_query(search: Optional[str], search_mode: str = "contains",
+                     plan_filter: Optional[str] = None, status_filter: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Filter for the listing.
+    contains: case-insensitive substring on email / full_name / id (scans the collection)
+    prefix:   anchored match on email or id, served by their unique indexes
+    text:     $text search over email and full_name via the user_search_text index
+    """
+    query: Dict[str, Any] = {}
+
+    if search:
+        if search_mode == "text":
+            query["$text"] = {"$search": search}
+        elif search_mode == "prefix":
+            prefixes = {search, search.lower()}
+            query["$or"] = [
+                {field: {"$regex": f"^{re.escape(prefix)}"}}
+                for field in ("email", "id") for prefix in sorted(prefixes)
+            ]
+        else:
+            pattern = re.escape(search)
+            query["$or"] = [
+                {"email": {"$regex": pattern, "$options": "i"}},
+                {"full_name": {"$regex": pattern, "$options": "i"}},
+                {"id": {"$regex": pattern, "$options": "i"}}
+            ]
+
+    if plan_filter and plan_filter != "all":
+        query["plan"] = plan_filter
+
+    if status_filter and status_filter != "all":
+        query["status"] = status_filter
+
+    return query
+
+
+def encode_cursor(doc: Dict[str, Any], sort_field: str) -> str:
+    """Opaque cursor for the row after doc; keeps BSON types (dates vs strings) intact."""
+    raw = json_util.dumps([sort_field, doc.get(sort_field), doc.get("id")])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str) -> Tuple[Any, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        field, value, user_id = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise CursorError("Invalid cursor")
+    if field != sort_field:
+        raise CursorError("Cursor does not match sort_by")
+    return value, user_id
+
+
+def _type_rank(value: Any) -> int:
+    """Position of value's BSON type in MongoDB's cross-type sort order."""
+    if value is None:
+        return 0
+    for rank, (_, python_types) in enumerate(TYPE_ORDER):
+        # bool is an int subclass but sorts as its own type
+        if isinstance(value, bool) and bool not in python_types:
+            continue
+        if python_types and isinstance(value, python_types):
+            return rank
+    raise CursorError("Invalid cursor")
+
+
+def keyset_match(sort_field: str, direction: int, value: Any, user_id: str) -> Dict[str, Any]:
+    """
+    Rows strictly after (value, user_id) in (sort_field, id) order.
+
+    $lt/$gt only compare values of the same BSON type, so rows whose field is missing,
+    null or of another type (e.g. legacy string created_at next to dates) are matched by
+    their type instead: in descending order every type that sorts below the cursor's
+    comes after it, in ascending order every type above.
+    """
+    op = "$lt" if direction < 0 else "$gt"
+    rank = _type_rank(value)
+    if value is None:
+        branches = [{sort_field: None, "id": {op: user_id}}]
+    else:
+        branches = [
+            {sort_field: {op: value}},
+            {sort_field: value, "id": {op: user_id}}
+        ]
+
+    later = TYPE_ORDER[1:rank] if direction < 0 else TYPE_ORDER[rank + 1:]
+    aliases = [alias for type_aliases, _ in later for alias in type_aliases]
+    if aliases:
+        branches.append({sort_field: {"$type": aliases}})
+    if direction < 0 and rank > 0:
+        # Null matches missing fields too
+        branches.append({sort_field: None})
+    return {"$or": branches}
+
+
+def _page_stages(limit: int) -> List[Dict[str, Any]]:
+    """Limit, then count each page user's deals in one $lookup, then trim fields."""
+    return [
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "pnl_deals",
+            "let": {"user_id": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$user_id", "$$user_id"]}}},
+                {"$group": {"_id": None, "count": {"$sum": 1}}}
+            ],
+            "as": "deal_stats"
+        }},
+        {"$project": {
+            "_id": 0,
+            **{field: 1 for field in USER_FIELDS},
+            "deals_count": {"$ifNull": [{"$arrayElemAt": ["$deal_stats.count", 0]}, 0]}
+        }}
+    ]
+
+
+def build_page_pipeline(query: Dict[str, Any], sort_field: str, direction: int,
+                        skip: int, limit: int) -> List[Dict[str, Any]]:
+    """Offset pagination: one round trip for the page and the total."""
+    return [
+        {"$match": query},
+        {"$sort": {sort_field: direction, "id": direction}},
+        {"$facet": {
+            "users": [{"$skip": skip}, *_page_stages(limit)],
+            "total": [{"$count": "count"}]
+        }}
+    ]
+
+
+def build_keyset_pipeline(query: Dict[str, Any], sort_field: str, direction: int,
+                          after: Optional[Tuple[Any, str]], limit: int) -> List[Dict[str, Any]]:
+    """Keyset pagination: fetches limit + 1 rows so the caller knows whether there is a next page."""
+    match = dict(query)
+    if after is not None:
+        seek = keyset_match(sort_field, direction, *after)
+        match = {"$and": [query, seek]} if query else seek
+    return [
+        {"$match": match},
+        {"$sort": {sort_field: direction, "id": direction}},
+        *_page_stages(limit + 1)
+    ]
@@ -2,15 +2,9 @@ import time
 import hashlib
 import json
 from typing import Optional, Tuple
-from dataclasses import dataclass
 
-@dataclass
-class CacheItem:
-    body_hash: str
-    created_at: float
-    text: str
+from app.ai_cache import CacheItem, get_ai_cache
 
-_cache: dict[str, CacheItem] = {}
 _rate_limits: dict[str, list[float]] = {}
 
 def make_cache_key(user_id: str, body: dict, context: str = "general") -> str:
@@ -18,16 +12,12 @@ def make_cache_key(user_id: str, body: dict, context: str = "general") -> str:
     return f"ai:{user_id}:{context}:{h}"
 
 def get_cache(key: str, ttl: int) -> Optional[str]:
-    item = _cache.get(key)
-    if not item: 
-        return None
-    if time.time() - item.created_at > ttl:
-        _cache.pop(key, None)
-        return None
-    return item.text
+    """Process-local lookup in the bounded LRU tier of the AI response cache."""
+    item = get_ai_cache().memory_get(key, ttl)
+    return item.text if item else None
 
 def set_cache(key: str, text: str):
-    _cache[key] = CacheItem(body_hash=key, created_at=time.time(), text=text)
+    get_ai_cache().memory_set(key, CacheItem(text=text, created_at=time.time()))
 
 def check_rate_limit(user_id: str, max_per_minute: int) -> Tuple[bool, Optional[int]]:
     """Return (allowed, retry_after_seconds)"""
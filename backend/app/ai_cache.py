@@ -0,0 +1,247 @@
+"""
+Two-tier cache for AI coach responses with single-flight generation.
+
+A size- and TTL-bounded in-process LRU sits in front of the shared ai_response_cache
+collection (TTL index on expires_at), so every uvicorn worker sees responses generated by
+the others. Concurrent requests for the same key share one in-flight generation instead
+of each calling OpenAI.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "ai_response_cache"
+
+
+@dataclass
+class CacheItem:
+    text: str
+    created_at: float
+    llm_seconds: float = 0.0
+    ttl_seconds: Optional[float] = None  # None: the cache default
+
+
+class AIResponseCache:
+    """
+    Memory LRU (bounded by bytes and TTL) + MongoDB tier + single-flight.
+    Values are the JSON strings returned to the client.
+    """
+
+    def __init__(self, memory_bytes: Optional[int] = None, ttl_seconds: Optional[int] = None, db=None):
+        config = get_config()
+        self.memory_bytes = memory_bytes if memory_bytes is not None else config.AI_CACHE_MEMORY_MB * 1024 * 1024
+        self.ttl_seconds = ttl_seconds or config.AI_CACHE_TTL_SECONDS
+        self._db = db
+        self._memory: "OrderedDict[str, CacheItem]" = OrderedDict()
+        self._memory_used = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = {
+            "memory_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "llm_calls": 0,
+            "llm_errors": 0,
+            "llm_seconds": 0.0,
+            "saved_llm_seconds": 0.0,
+            "memory_evictions": 0,
+            "shared_errors": 0
+        }
+
+    @property
+    def collection(self):
+        if self._db is None:
+            from app.database import get_database
+            self._db = get_database()
+        return self._db[COLLECTION]
+
+    # Memory tier
+    def memory_get(self, key: str, ttl: Optional[int] = None) -> Optional[CacheItem]:
+        item = self._memory.get(key)
+        if item is None:
+            return None
+        if ttl is None:
+            ttl = item.ttl_seconds or self.ttl_seconds
+        if time.time() - item.created_at > ttl:
+            self._memory_drop(key)
+            return None
+        self._memory.move_to_end(key)
+        return item
+
+    def memory_set(self, key: str, item: CacheItem):
+        size = len(item.text)
+        if size > self.memory_bytes:
+            return
+        self._memory_drop(key)
+        self._memory[key] = item
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted.text)
+            self._stats["memory_evictions"] += 1
+
+    def _memory_drop(self, key: str):
+        item = self._memory.pop(key, None)
+        if item is not None:
+            self._memory_used -= len(item.text)
+
+    # Shared tier
+    async def _shared_get(self, key: str) -> Optional[CacheItem]:
+        try:
+            doc = await self.collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            self._stats["shared_errors"] += 1
+            logger.error(f"AI cache read error: {e}")
+            return None
+        if not doc:
+            return None
+        created_at, expires_at = doc["created_at"], doc["expires_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return CacheItem(text=doc["value"], created_at=created_at.timestamp(),
+                         llm_seconds=doc.get("llm_seconds", 0.0),
+                         ttl_seconds=(expires_at - created_at).total_seconds())
+
+    async def _shared_set(self, key: str, item: CacheItem):
+        created_at = datetime.fromtimestamp(item.created_at, tz=timezone.utc)
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "value": item.text,
+                    "llm_seconds": item.llm_seconds,
+                    "created_at": created_at,
+                    "expires_at": created_at + timedelta(seconds=item.ttl_seconds or self.ttl_seconds)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            self._stats["shared_errors"] += 1
+            logger.error(f"AI cache write error: {e}")
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        item = self.memory_get(key)
+        if item is not None:
+            self._record_hit("memory_hits", item)
+            return item.text
+
+        item = await self._shared_get(key)
+        if item is not None:
+            self._record_hit("shared_hits", item)
+            self.memory_set(key, item)
+            return item.text
+        return None
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up a response in memory, then in MongoDB (promoting shared hits)."""
+        text = await self._lookup(key)
+        if text is None:
+            self._stats["misses"] += 1
+        return text
+
+    async def set(self, key: str, text: str, llm_seconds: float = 0.0, ttl_seconds: Optional[float] = None):
+        item = CacheItem(text=text, created_at=time.time(), llm_seconds=llm_seconds, ttl_seconds=ttl_seconds)
+        self.memory_set(key, item)
+        await self._shared_set(key, item)
+
+    def _record_hit(self, tier: str, item: CacheItem):
+        self._stats[tier] += 1
+        self._stats["saved_llm_seconds"] += item.llm_seconds
+
+    def record_generation(self, llm_seconds: float):
+        """Count an LLM call made outside get_or_generate (the streaming path)."""
+        self._stats["llm_calls"] += 1
+        self._stats["llm_seconds"] += llm_seconds
+
+    async def join(self, key: str) -> Optional[str]:
+        """Wait for an in-flight generation of key and return its text; None if none is running."""
+        pending = self._inflight.get(key)
+        if pending is None:
+            return None
+        self._stats["coalesced"] += 1
+        text, llm_seconds = await asyncio.shield(pending)
+        self._stats["saved_llm_seconds"] += llm_seconds
+        return text
+
+    async def _generate(self, key: str, generate: Callable[[], Awaitable[str]],
+                        ttl_seconds: Optional[float]) -> Tuple[str, float]:
+        started = time.perf_counter()
+        try:
+            text = await generate()
+        except Exception:
+            self._stats["llm_calls"] += 1
+            self._stats["llm_errors"] += 1
+            raise
+        llm_seconds = time.perf_counter() - started
+        self.record_generation(llm_seconds)
+        await self.set(key, text, llm_seconds, ttl_seconds)
+        return text, llm_seconds
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Retrieve the exception so a failure nobody awaited is not logged as unhandled
+            task.exception()
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]],
+                              force: bool = False, ttl_seconds: Optional[float] = None) -> Tuple[str, bool]:
+        """
+        Return (text, was_cached). On a miss exactly one generate() runs; concurrent callers
+        with the same key wait for its result. Generation runs as its own task, so a caller
+        disconnecting does not cancel it for the others. A failed generation is not cached
+        and its exception is raised to every waiter. force skips the cache lookup; ttl_seconds
+        overrides the cache TTL for the stored result.
+        """
+        if not force:
+            text = await self._lookup(key)
+            if text is not None:
+                return text, True
+
+        text = await self.join(key)
+        if text is not None:
+            return text, True
+
+        self._stats["misses"] += 1
+        task = asyncio.create_task(self._generate(key, generate, ttl_seconds))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+        text, _ = await asyncio.shield(task)
+        return text, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and saved LLM time for health reporting."""
+        hits = self._stats["memory_hits"] + self._stats["shared_hits"] + self._stats["coalesced"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "llm_seconds": round(self._stats["llm_seconds"], 2),
+            "saved_llm_seconds": round(self._stats["saved_llm_seconds"], 2),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "inflight": len(self._inflight)
+        }
+
+
+# Global cache instance
+_ai_cache_instance: Optional[AIResponseCache] = None
+
+def get_ai_cache() -> AIResponseCache:
+    """Get or create global AI response cache instance."""
+    global _ai_cache_instance
+    if _ai_cache_instance is None:
+        _ai_cache_instance = AIResponseCache()
+    return _ai_cache_instance
@@ -0,0 +1,319 @@
+"""
+Audit log queries, NDJSON export and retention.
+
+Events are stored with a native BSON `timestamp` date and read newest first in
+(timestamp, _id) order, served by the (user_id, timestamp) and (action, timestamp)
+indexes. The admin console pages with an opaque keyset cursor, so deep pages cost the
+same as the first; counts are opt-in and can be estimated. Compliance pulls stream the
+matching range as NDJSON instead of building it in memory.
+
+Retention is not a TTL index because expired events are archived first: once a day one
+worker claims the run, writes events older than AUDIT_RETENTION_DAYS to storage as
+gzipped NDJSON (archive/audit_logs/YYYY/MM/DD/...) and only then deletes them.
+"""
+import asyncio
+import base64
+import gzip
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+from pymongo import UpdateOne
+
+from config import get_config
+from app.pagination import CursorError
+from app.scheduler_locks import claim_daily_lock
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "audit_logs"
+ARCHIVE_PREFIX = "archive/audit_logs"
+
+COUNT_MODES = {"none", "estimated", "exact"}
+# count=estimated stops counting here on filtered queries
+ESTIMATED_COUNT_CAP = 10000
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+NEWEST_FIRST = [("timestamp", -1), ("_id", -1)]
+OLDEST_FIRST = [("timestamp", 1), ("_id", 1)]
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """A stored timestamp (BSON date or legacy ISO string) as an aware UTC datetime."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def build_audit_query(action: Optional[str] = None, user_id: Optional[str] = None,
+                      user_email: Optional[str] = None, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> Dict[str, Any]:
+    """Filter on exact fields only, so every query can use an index; end is exclusive."""
+    query: Dict[str, Any] = {}
+    if action:
+        query["action"] = action
+    if user_id:
+        query["user_id"] = user_id
+    elif user_email:
+        query["user_email"] = user_email
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+    return query
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque cursor for the event after doc in newest-first order."""
+    # Rows still carrying a legacy string timestamp (before migrate_timestamps reaches them)
+    # get a date cursor too, so the next page doesn't fail to decode
+    raw = json_util.dumps([parse_timestamp(doc.get("timestamp")), doc["_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, object_id = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise CursorError("Invalid cursor")
+    if not isinstance(timestamp, datetime) or not isinstance(object_id, ObjectId):
+        raise CursorError("Invalid cursor")
+    return timestamp, object_id
+
+
+def keyset_match(timestamp: datetime, object_id: ObjectId) -> Dict[str, Any]:
+    """Events strictly older than (timestamp, _id)."""
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": object_id}}
+    ]}
+
+
+async def fetch_page(collection, query: Dict[str, Any], limit: int, cursor: Optional[str] = None,
+                     skip: int = 0) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of events, newest first, plus the cursor for the next page (None on the
+    last). With a cursor the page seeks past it; skip is only for legacy page numbers.
+    """
+    match = query
+    if cursor:
+        seek = keyset_match(*decode_cursor(cursor))
+        match = {"$and": [query, seek]} if query else seek
+        skip = 0
+
+    find = collection.find(match).sort(NEWEST_FIRST)
+    if skip:
+        find = find.skip(skip)
+    docs = await find.limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1]) if docs and has_more else None
+
+
+async def count_logs(collection, query: Dict[str, Any], mode: str) -> Tuple[Optional[int], bool]:
+    """
+    (total, is_estimate) for count=none|estimated|exact. Estimated uses collection
+    metadata when unfiltered and stops at ESTIMATED_COUNT_CAP otherwise.
+    """
+    if mode == "none":
+        return None, False
+    if mode == "exact":
+        return await collection.count_documents(query), False
+    if not query:
+        return await collection.estimated_document_count(), True
+    total = await collection.count_documents(query, limit=ESTIMATED_COUNT_CAP)
+    return total, total >= ESTIMATED_COUNT_CAP
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # Motor returns naive UTC datetimes; keep the offset so clients don't read local time
+        return parse_timestamp(value).isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+def serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """An event as JSON-safe values (ISO timestamps, string _id)."""
+    return json.loads(json.dumps(doc, default=_json_default))
+
+
+def ndjson_line(doc: Dict[str, Any]) -> bytes:
+    return json.dumps(doc, default=_json_default, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+async def stream_ndjson(collection, query: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """Matching events oldest first, one JSON object per line, in ~64KB chunks."""
+    chunk = bytearray()
+    async for doc in collection.find(query).sort(OLDEST_FIRST).batch_size(EXPORT_BATCH_SIZE):
+        chunk += ndjson_line(doc)
+        if len(chunk) >= EXPORT_CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+async def migrate_timestamps(collection, batch_size: int = 1000) -> int:
+    """
+    Convert legacy ISO-string timestamps to BSON dates so they sort and range-match
+    with new events. Idempotent; unparseable values fall back to the _id creation time.
+    """
+    migrated = 0
+    while True:
+        docs = await collection.find(
+            {"timestamp": {"$type": "string"}}, {"timestamp": 1}
+        ).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        updates = []
+        for doc in docs:
+            timestamp = parse_timestamp(doc["timestamp"])
+            if timestamp is None and isinstance(doc["_id"], ObjectId):
+                timestamp = doc["_id"].generation_time
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"timestamp": timestamp}}))
+        await collection.bulk_write(updates, ordered=False)
+        migrated += len(updates)
+    if migrated:
+        logger.info(f"Migrated {migrated} audit log timestamps to BSON dates")
+    return migrated
+
+
+def archive_key(first: Dict[str, Any]) -> str:
+    timestamp = parse_timestamp(first.get("timestamp")) or datetime.now(timezone.utc)
+    return f"{ARCHIVE_PREFIX}/{timestamp:%Y/%m/%d}/{timestamp:%Y%m%dT%H%M%S}-{first['_id']}.ndjson.gz"
+
+
+class AuditRetention:
+    """Daily archive-then-delete of audit events older than the retention window."""
+
+    def __init__(
+        self,
+        retention_days: Optional[int] = None,
+        archive: Optional[bool] = None,
+        batch_size: Optional[int] = None,
+        db=None,
+        storage=None
+    ):
+        config = get_config()
+        self.retention_days = config.AUDIT_RETENTION_DAYS if retention_days is None else retention_days
+        self.archive = config.AUDIT_ARCHIVE_ENABLED if archive is None else archive
+        self.batch_size = batch_size or config.AUDIT_RETENTION_BATCH_SIZE
+        self._db = db
+        self._storage = storage
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"runs": 0, "archived": 0, "deleted": 0, "archive_files": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    def _get_db(self):
+        if self._db is None:
+            from app.database import get_database
+            self._db = get_database()
+        return self._db
+
+    def _get_storage(self):
+        if self._storage is None:
+            from app.storage import get_storage
+            self._storage = get_storage()
+        return self._storage
+
+    async def expire_batch(self, cutoff: datetime) -> int:
+        """Archive (if enabled) and delete the oldest batch before cutoff. Returns the count."""
+        collection = self._get_db()[COLLECTION]
+        docs = await collection.find({"timestamp": {"$lt": cutoff}}).sort(OLDEST_FIRST) \
+            .limit(self.batch_size).to_list(length=self.batch_size)
+        if not docs:
+            return 0
+
+        if self.archive:
+            data = await asyncio.to_thread(gzip.compress, b"".join(ndjson_line(doc) for doc in docs))
+            # Raises on failure, so nothing is deleted that wasn't archived
+            await self._get_storage().put(archive_key(docs[0]), data, "application/gzip")
+            self._stats["archived"] += len(docs)
+            self._stats["archive_files"] += 1
+
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        self._stats["deleted"] += result.deleted_count
+        return len(docs)
+
+    async def run(self, now: Optional[datetime] = None) -> int:
+        """Expire everything past retention, once per UTC day. Returns the event count."""
+        now = now or datetime.now(timezone.utc)
+        if not self.enabled:
+            return 0
+        if not await claim_daily_lock(self._get_db(), f"audit_retention:{now.date().isoformat()}", now):
+            return 0
+
+        cutoff = now - timedelta(days=self.retention_days)
+        total = 0
+        while True:
+            expired = await self.expire_batch(cutoff)
+            total += expired
+            if expired < self.batch_size:
+                break
+        self._stats["runs"] += 1
+        logger.info(f"Audit retention: expired {total} events older than {cutoff.date().isoformat()}")
+        return total
+
+    async def _loop(self):
+        # Legacy string timestamps first, so retention and keyset pages see every event
+        try:
+            await migrate_timestamps(self._get_db()[COLLECTION])
+        except Exception as e:
+            logger.error(f"Audit timestamp migration failed: {e}")
+        if not self.enabled:
+            return
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Audit retention error: {e}")
+            await asyncio.sleep(timedelta(days=1).total_seconds())
+
+    def start(self):
+        """Migrate legacy timestamps, then run retention daily if a window is configured."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "retention_days": self.retention_days,
+            "archive": self.archive,
+            **self._stats
+        }
+
+
+# Global retention instance
+_retention_instance: Optional[AuditRetention] = None
+
+def get_audit_retention() -> AuditRetention:
+    """Get or create global audit retention instance."""
+    global _retention_instance
+    if _retention_instance is None:
+        _retention_instance = AuditRetention()
+    return _retention_instance
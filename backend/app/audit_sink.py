@@ -0,0 +1,177 @@
+"""
+Batched, in-process audit log writer.
+
+log_audit_event hands documents to the sink instead of awaiting an insert_one per event.
+A background task writes them with insert_many(ordered=False) whenever batch_size events
+are waiting or flush_interval has passed, and stop() drains what is left at shutdown.
+The queue is bounded; when it is full the overflow policy decides what gives:
+
+    drop_oldest  - discard the oldest queued event (default; the request never waits)
+    drop_newest  - discard the incoming event
+    block        - the request flushes a batch itself before queueing
+
+Every discarded event is counted in stats(). Security-critical events bypass the queue
+with write_now(), so they are on disk before the request returns.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class AuditSink:
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        overflow_policy: Optional[str] = None
+    ):
+        config = get_config()
+        self.max_queue = max_queue or config.AUDIT_QUEUE_MAX
+        self.batch_size = batch_size or config.AUDIT_BATCH_SIZE
+        self.flush_interval = flush_interval or config.AUDIT_FLUSH_SECONDS
+        self.overflow_policy = overflow_policy or config.AUDIT_OVERFLOW_POLICY
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {self.overflow_policy}")
+        self._collection = None
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "queued": 0, "written": 0, "written_sync": 0, "batches": 0,
+            "dropped": 0, "failed": 0, "write_errors": 0, "blocked": 0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, collection):
+        """Start the flush task writing to collection (db.audit_logs)."""
+        self._collection = collection
+        if not self.running:
+            self._stopping = False
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def submit(self, doc: Dict[str, Any]):
+        """Queue an event for the next batch, applying the overflow policy if the queue is full."""
+        if not self.running:
+            # Not started (scripts, tests) or already stopped: write it directly
+            await self.write_now(doc)
+            return
+
+        if len(self._queue) >= self.max_queue:
+            if self.overflow_policy == "drop_newest":
+                self._stats["dropped"] += 1
+                return
+            if self.overflow_policy == "drop_oldest":
+                self._queue.popleft()
+                self._stats["dropped"] += 1
+            else:
+                self._stats["blocked"] += 1
+                await self.flush_batch()
+                if len(self._queue) >= self.max_queue:
+                    self._queue.popleft()
+                    self._stats["dropped"] += 1
+
+        self._queue.append(doc)
+        self._stats["queued"] += 1
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    async def write_now(self, doc: Dict[str, Any]):
+        """Write one event immediately (security-critical events)."""
+        if self._collection is None:
+            raise RuntimeError("Audit sink has no collection; call start() first")
+        await self._collection.insert_one(doc)
+        self._stats["written_sync"] += 1
+
+    async def flush_batch(self) -> int:
+        """Write up to batch_size queued events. Returns how many were written."""
+        async with self._flush_lock:
+            if not self._queue or self._collection is None:
+                return 0
+            batch: List[Dict[str, Any]] = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            try:
+                await self._collection.insert_many(batch, ordered=False)
+                written = len(batch)
+            except asyncio.CancelledError:
+                # Don't lose a batch that was already taken off the queue
+                self._queue.extendleft(reversed(batch))
+                raise
+            except BulkWriteError as e:
+                # Unordered: everything except the reported documents made it in
+                failed = len(e.details.get("writeErrors", []))
+                written = e.details.get("nInserted", len(batch) - failed)
+                self._stats["failed"] += failed
+                self._stats["write_errors"] += 1
+                logger.error(f"Audit batch partially failed: {failed} of {len(batch)} events not written")
+            except Exception as e:
+                self._stats["write_errors"] += 1
+                logger.error(f"Audit batch write failed, will retry: {e}")
+                # Put the batch back in front (oldest first) as far as room allows
+                room = self.max_queue - len(self._queue)
+                requeue = batch[:max(0, room)]
+                self._stats["dropped"] += len(batch) - len(requeue)
+                self._queue.extendleft(reversed(requeue))
+                return 0
+            self._stats["written"] += written
+            self._stats["batches"] += 1
+            return written
+
+    async def flush(self):
+        """Write everything queued so far."""
+        while self._queue:
+            if not await self.flush_batch():
+                break
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Audit flush loop error: {e}")
+
+    async def stop(self):
+        """Stop the flush task and drain the queue."""
+        if self._task is not None:
+            # Let an in-flight insert_many finish rather than cancelling it mid-batch
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._queue:
+            logger.error(f"Audit sink stopped with {len(self._queue)} events unwritten")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "pending": len(self._queue), "policy": self.overflow_policy}
+
+
+# Global sink instance
+_audit_sink_instance: Optional[AuditSink] = None
+
+def get_audit_sink() -> AuditSink:
+    """Get or create global audit sink instance."""
+    global _audit_sink_instance
+    if _audit_sink_instance is None:
+        _audit_sink_instance = AuditSink()
+    return _audit_sink_instance
@@ -2,7 +2,7 @@ from fastapi import Depends, HTTPException, Request
 from typing import Optional
 import jwt
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from app.database import get_database
 
 # Simple user class for dependency injection
 class User:
@@ -32,8 +32,7 @@ async def get_current_user(request: Request) -> User:
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get user from database
-        client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-        db = client[os.environ.get('DB_NAME', 'test_database')]
+        db = get_database()
         
         user_data = await db.users.find_one({"id": user_id})
         if not user_data:
@@ -96,8 +95,7 @@ async def get_current_user_unified(request: Request) -> User:
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get user from database
-        client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-        db = client[os.environ.get('DB_NAME', 'test_database')]
+        db = get_database()
         
         user_data = await db.users.find_one({"id": user_id})
         if not user_data:
@@ -0,0 +1,202 @@
+"""
+Ready-to-embed brand images for branded PDFs.
+
+Entries are base64 payloads of each asset's PDF-embed derivative, keyed by storage key
+and ETag. A byte-bounded in-process LRU sits in front of the shared brand_asset_cache
+collection (TTL index on expires_at). Uploads populate both tiers eagerly, so a branded
+PDF needs no S3 round trip in steady state; deleting an asset invalidates its keys.
+"""
+import asyncio
+import base64
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "brand_asset_cache"
+
+
+@dataclass
+class EmbeddedAsset:
+    data: str  # base64
+    mime: str
+
+
+def embed_cache_key(storage_key: str, etag: Optional[str]) -> str:
+    return f"{storage_key}@{etag or ''}"
+
+
+class BrandAssetCache:
+    """Memory LRU (bounded by bytes) + MongoDB tier, with one load per key at a time."""
+
+    def __init__(self, memory_bytes: Optional[int] = None, ttl_days: Optional[int] = None, db=None):
+        config = get_config()
+        self.memory_bytes = (memory_bytes if memory_bytes is not None
+                             else config.BRAND_ASSET_CACHE_MEMORY_MB * 1024 * 1024)
+        self.ttl_days = ttl_days or config.BRAND_ASSET_CACHE_TTL_DAYS
+        self._db = db
+        self._memory: "OrderedDict[str, EmbeddedAsset]" = OrderedDict()
+        self._memory_used = 0
+        self._by_storage_key: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = {
+            "memory_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0,
+            "memory_evictions": 0,
+            "shared_errors": 0
+        }
+
+    @property
+    def collection(self):
+        if self._db is None:
+            from app.database import get_database
+            self._db = get_database()
+        return self._db[COLLECTION]
+
+    # Memory tier
+    def _memory_get(self, key: str) -> Optional[EmbeddedAsset]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key: str, storage_key: str, entry: EmbeddedAsset):
+        if len(entry.data) > self.memory_bytes:
+            return
+        self._memory_drop(key)
+        self._memory[key] = entry
+        self._memory_used += len(entry.data)
+        self._by_storage_key.setdefault(storage_key, set()).add(key)
+        while self._memory_used > self.memory_bytes and self._memory:
+            self._memory_drop(next(iter(self._memory)))
+            self._stats["memory_evictions"] += 1
+
+    def _memory_drop(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_used -= len(entry.data)
+            storage_key = key.rsplit("@", 1)[0]
+            keys = self._by_storage_key.get(storage_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_storage_key[storage_key]
+
+    # Shared tier
+    async def _shared_get(self, key: str) -> Optional[EmbeddedAsset]:
+        try:
+            doc = await self.collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            self._stats["shared_errors"] += 1
+            logger.error(f"Brand asset cache read error: {e}")
+            return None
+        if not doc:
+            return None
+        return EmbeddedAsset(data=doc["data"], mime=doc["mime"])
+
+    async def _shared_set(self, key: str, storage_key: str, etag: Optional[str], entry: EmbeddedAsset):
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "storage_key": storage_key,
+                    "etag": etag,
+                    "mime": entry.mime,
+                    "data": entry.data,
+                    "created_at": now,
+                    "expires_at": now + timedelta(days=self.ttl_days)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            self._stats["shared_errors"] += 1
+            logger.error(f"Brand asset cache write error: {e}")
+
+    async def get(self, storage_key: str, etag: Optional[str]) -> Optional[EmbeddedAsset]:
+        key = embed_cache_key(storage_key, etag)
+        entry = self._memory_get(key)
+        if entry is not None:
+            self._stats["memory_hits"] += 1
+            return entry
+
+        entry = await self._shared_get(key)
+        if entry is not None:
+            self._stats["shared_hits"] += 1
+            self._memory_put(key, storage_key, entry)
+            return entry
+        return None
+
+    async def set(self, storage_key: str, etag: Optional[str], data: bytes, mime: str) -> EmbeddedAsset:
+        """Store raw image bytes as a ready-to-embed base64 payload in both tiers."""
+        key = embed_cache_key(storage_key, etag)
+        entry = EmbeddedAsset(data=base64.b64encode(data).decode('utf-8'), mime=mime)
+        self._memory_put(key, storage_key, entry)
+        self._stats["stores"] += 1
+        await self._shared_set(key, storage_key, etag, entry)
+        return entry
+
+    async def get_or_load(
+        self,
+        storage_key: str,
+        etag: Optional[str],
+        load: Callable[[], Awaitable[Tuple[bytes, str]]]
+    ) -> EmbeddedAsset:
+        """Cached payload, or load() -> (image bytes, mime) once however many callers miss."""
+        entry = await self.get(storage_key, etag)
+        if entry is not None:
+            return entry
+
+        key = embed_cache_key(storage_key, etag)
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats["misses"] += 1
+
+            async def fill() -> EmbeddedAsset:
+                data, mime = await load()
+                return await self.set(storage_key, etag, data, mime)
+
+            task = self._inflight[key] = asyncio.create_task(fill())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def invalidate(self, *storage_keys: str):
+        """Drop every cached payload for these storage keys, whatever their ETag."""
+        for storage_key in storage_keys:
+            for key in list(self._by_storage_key.get(storage_key, ())):
+                self._memory_drop(key)
+        self._stats["invalidations"] += 1
+        try:
+            await self.collection.delete_many({"storage_key": {"$in": list(storage_keys)}})
+        except Exception as e:
+            self._stats["shared_errors"] += 1
+            logger.error(f"Brand asset cache invalidation error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used
+        }
+
+
+# Global cache instance
+_brand_asset_cache_instance: Optional[BrandAssetCache] = None
+
+def get_brand_asset_cache() -> BrandAssetCache:
+    """Get or create global brand asset cache instance."""
+    global _brand_asset_cache_instance
+    if _brand_asset_cache_instance is None:
+        _brand_asset_cache_instance = BrandAssetCache()
+    return _brand_asset_cache_instance
@@ -0,0 +1,133 @@
+"""
+Per-user cache of resolved brand bundles (/api/brand/resolve and report branding).
+
+A bundle is the plan-filtered, asset-embedded branding for one user and variant
+(context + embed flag), stored as the serialized JSON body. Entries carry a version
+derived from the brand profile's updatedAt, the user's plan and the user fields the
+bundle falls back to, so a profile edit or plan change on any worker produces a new
+version; local writes also invalidate explicitly. The version doubles as the ETag.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+def bundle_version(*parts: Any) -> str:
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+@dataclass
+class BundleEntry:
+    version: str
+    body: bytes
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+    def data(self) -> Dict[str, Any]:
+        """A fresh copy of the bundle (callers may mutate it)."""
+        return json.loads(self.body)
+
+
+class BrandBundleCache:
+    """Byte-bounded LRU of (user_id, variant) -> latest BundleEntry."""
+
+    def __init__(self, memory_bytes: Optional[int] = None):
+        config = get_config()
+        self.memory_bytes = (memory_bytes if memory_bytes is not None
+                             else config.BRAND_BUNDLE_CACHE_MEMORY_MB * 1024 * 1024)
+        self._entries: "OrderedDict[Tuple[str, str], BundleEntry]" = OrderedDict()
+        self._memory_used = 0
+        self._by_user: Dict[str, Set[str]] = {}
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Task] = {}
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "uncacheable": 0, "invalidations": 0, "evictions": 0}
+
+    def _put(self, user_id: str, variant: str, entry: BundleEntry):
+        self._drop(user_id, variant)
+        if len(entry.body) > self.memory_bytes:
+            return
+        self._entries[(user_id, variant)] = entry
+        self._memory_used += len(entry.body)
+        self._by_user.setdefault(user_id, set()).add(variant)
+        while self._memory_used > self.memory_bytes and self._entries:
+            self._drop(*next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _drop(self, user_id: str, variant: str):
+        entry = self._entries.pop((user_id, variant), None)
+        if entry is None:
+            return
+        self._memory_used -= len(entry.body)
+        variants = self._by_user.get(user_id)
+        if variants is not None:
+            variants.discard(variant)
+            if not variants:
+                del self._by_user[user_id]
+
+    async def get_or_build(
+        self,
+        user_id: str,
+        variant: str,
+        version: str,
+        build: Callable[[], Awaitable[Tuple[Dict[str, Any], bool]]]
+    ) -> BundleEntry:
+        """
+        The cached bundle when its version matches, otherwise build() -> (bundle, cacheable).
+        Concurrent requests for the same version share one build.
+        """
+        entry = self._entries.get((user_id, variant))
+        if entry is not None:
+            if entry.version == version:
+                self._entries.move_to_end((user_id, variant))
+                self._stats["hits"] += 1
+                return entry
+            self._stats["stale"] += 1
+
+        key = (user_id, variant, version)
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats["misses"] += 1
+
+            async def fill() -> BundleEntry:
+                bundle, cacheable = await build()
+                entry = BundleEntry(version=version, body=json.dumps(bundle).encode("utf-8"))
+                if cacheable:
+                    self._put(user_id, variant, entry)
+                else:
+                    # e.g. an asset failed to load and a placeholder was used
+                    self._stats["uncacheable"] += 1
+                return entry
+
+            task = self._inflight[key] = asyncio.create_task(fill())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def invalidate(self, user_id: str):
+        """Drop every cached variant for a user after a profile, asset or plan change."""
+        for variant in list(self._by_user.get(user_id, ())):
+            self._drop(user_id, variant)
+        self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._entries), "memory_bytes": self._memory_used}
+
+
+# Global cache instance
+_bundle_cache_instance: Optional[BrandBundleCache] = None
+
+def get_brand_bundle_cache() -> BrandBundleCache:
+    """Get or create global brand bundle cache instance."""
+    global _bundle_cache_instance
+    if _bundle_cache_instance is None:
+        _bundle_cache_instance = BrandBundleCache()
+    return _bundle_cache_instance
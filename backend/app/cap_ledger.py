@@ -0,0 +1,268 @@
+"""
+Incremental ledger for the Commission Cap Tracker.
+
+Each user's cap_configurations document carries a `ledger`: the deals inside the cap
+period ordered by closing date, each with the cap it paid and the running total paid so
+far (starting from the manual `current_cap_paid`). When a deal is added, edited or
+removed only the deals from its position onwards are recomputed, and their cap_amount /
+final_income are corrected in one bulk write. Cap progress is read straight from the
+ledger summary.
+
+The ledger owns cap_amount only for deals inside the configured cap period; deals from
+earlier periods are never touched.
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.pnl_rollups import apply_changes, deal_delta, deal_month
+
+logger = logging.getLogger(__name__)
+
+# Cap and income differences below this are float noise, not changes worth writing
+TOLERANCE = 0.005
+
+_DEAL_FIELDS = {"_id": 0, "id": 1, "user_id": 1, "month": 1, "closing_date": 1, "created_at": 1,
+                "amount_sold_for": 1, "commission_percent": 1, "split_percent": 1,
+                "team_brokerage_split_percent": 1, "pre_cap_income": 1, "cap_amount": 1,
+                "final_income": 1, "lead_source": 1}
+
+SortKey = Tuple[str, str, str]
+
+
+def sort_key(deal: Dict[str, Any]) -> SortKey:
+    """Ledger order: closing date, then creation time, then id to break ties."""
+    return ((deal.get("closing_date") or "")[:10], deal.get("created_at") or "", deal.get("id") or "")
+
+
+def in_period(deal: Optional[Dict[str, Any]], config: Dict[str, Any]) -> bool:
+    if not deal or not deal.get("closing_date"):
+        return False
+    closing = deal["closing_date"][:10]
+    return config["cap_period_start"][:10] <= closing <= config["reset_date"][:10]
+
+
+def agent_gross_commission(deal: Dict[str, Any]) -> float:
+    """Agent's commission after the brokerage split, before cap (pre_cap_income)."""
+    if deal.get("pre_cap_income"):
+        return float(deal["pre_cap_income"])
+    split = deal.get("split_percent") or 0
+    split_fraction = split / 100 if split > 0 else 1.0
+    return float(deal.get("amount_sold_for", 0)) * float(deal.get("commission_percent", 0)) / 100 * split_fraction
+
+
+def final_income(deal: Dict[str, Any], cap_amount: float) -> float:
+    team_split = float(deal.get("team_brokerage_split_percent") or 0) / 100
+    return (agent_gross_commission(deal) - cap_amount) * (1 - team_split)
+
+
+def cap_for(deal: Dict[str, Any], paid_before: float, config: Dict[str, Any]) -> float:
+    """Cap owed on a deal given what had been paid before it."""
+    remaining = max(0, config["annual_cap_amount"] - paid_before)
+    if remaining <= 0:
+        return 0
+    return min(agent_gross_commission(deal) * config["cap_percentage"] / 100, remaining)
+
+
+def run_ledger(deals: Iterable[Dict[str, Any]], config: Dict[str, Any], paid_before: float) -> List[Dict[str, Any]]:
+    """Ledger entries for deals (already in ledger order) starting from paid_before."""
+    entries = []
+    running = paid_before
+    for deal in deals:
+        cap = cap_for(deal, running, config)
+        running += cap
+        entries.append({
+            "deal_id": deal["id"],
+            "closing_date": (deal.get("closing_date") or "")[:10],
+            "created_at": deal.get("created_at") or "",
+            "cap_amount": cap,
+            "final_income": final_income(deal, cap),
+            "running_total": running
+        })
+    return entries
+
+
+def summarize(entries: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    base = config.get("current_cap_paid", 0) or 0
+    return {
+        "total_paid": entries[-1]["running_total"] if entries else base,
+        "deals_contributing": sum(1 for e in entries if e["cap_amount"] > 0),
+    }
+
+
+def _entry_key(entry: Dict[str, Any]) -> SortKey:
+    return (entry["closing_date"], entry["created_at"], entry["deal_id"])
+
+
+def _next_day(value: str) -> str:
+    return (date.fromisoformat(value[:10]) + timedelta(days=1)).isoformat()
+
+
+async def _period_deals(db, user_id: str, config: Dict[str, Any], from_date: str) -> List[Dict[str, Any]]:
+    cursor = db.pnl_deals.find({
+        "user_id": user_id,
+        "closing_date": {"$gte": from_date, "$lt": _next_day(config["reset_date"])}
+    }, _DEAL_FIELDS)
+    deals = [d async for d in cursor if in_period(d, config)]
+    deals.sort(key=sort_key)
+    return deals
+
+
+class _Corrections:
+    """Deal updates and matching rollup deltas, collected before one bulk write."""
+
+    def __init__(self):
+        self.operations: List[UpdateOne] = []
+        self.rollup_changes: List[Tuple[Optional[str], Dict[str, float]]] = []
+        self.changed: Dict[str, Dict[str, float]] = {}
+
+    def set(self, deal: Dict[str, Any], cap_amount: float, income: float):
+        if (abs(deal.get("cap_amount", 0) - cap_amount) <= TOLERANCE
+                and abs(deal.get("final_income", 0) - income) <= TOLERANCE):
+            return
+        values = {"cap_amount": cap_amount, "final_income": income}
+        self.operations.append(UpdateOne({"id": deal["id"], "user_id": deal["user_id"]}, {"$set": values}))
+        updated = {**deal, **values}
+        self.rollup_changes += [(deal_month(deal), deal_delta(deal, -1)), (deal_month(updated), deal_delta(updated, 1))]
+        self.changed[deal["id"]] = values
+
+    def add_ledger(self, deals: List[Dict[str, Any]], entries: List[Dict[str, Any]]):
+        for deal, entry in zip(deals, entries):
+            self.set(deal, entry["cap_amount"], entry["final_income"])
+
+    async def flush(self, db, user_id: str):
+        if self.operations:
+            await db.pnl_deals.bulk_write(self.operations, ordered=False)
+        if self.rollup_changes:
+            await apply_changes(db, user_id, self.rollup_changes)
+
+
+async def _write(db, user_id: str, config: Dict[str, Any], entries: List[Dict[str, Any]],
+                 corrections: _Corrections, force: bool = False) -> bool:
+    """Persist deal corrections and the ledger; False if another writer got there first."""
+    await corrections.flush(db, user_id)
+
+    version = (config.get("ledger") or {}).get("version", 0)
+    ledger = {
+        "entries": [{k: e[k] for k in ("deal_id", "closing_date", "created_at", "cap_amount", "running_total")}
+                    for e in entries],
+        **summarize(entries, config),
+        "version": version + 1,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    if force:
+        query = {"user_id": user_id}
+    elif version:
+        query = {"user_id": user_id, "ledger.version": version}
+    else:
+        query = {"user_id": user_id, "ledger": {"$exists": False}}
+    result = await db.cap_configurations.update_one(query, {"$set": {"ledger": ledger}})
+    if result.matched_count:
+        config["ledger"] = ledger
+        return True
+    return False
+
+
+async def _rebuild(db, user_id: str, config: Dict[str, Any]) -> _Corrections:
+    deals = await _period_deals(db, user_id, config, config["cap_period_start"][:10])
+    entries = run_ledger(deals, config, config.get("current_cap_paid", 0) or 0)
+    corrections = _Corrections()
+    corrections.add_ledger(deals, entries)
+    # A full recompute reflects the current deals, so it replaces whatever is stored
+    await _write(db, user_id, config, entries, corrections, force=True)
+    return corrections
+
+
+async def rebuild_ledger(db, user_id: str, config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Recompute the whole cap period from the deals and store it. Returns the ledger."""
+    config = config or await db.cap_configurations.find_one({"user_id": user_id})
+    if not config:
+        return None
+    await _rebuild(db, user_id, config)
+    return config.get("ledger")
+
+
+async def apply_deal_change(db, user_id: str, old: Optional[Dict[str, Any]] = None,
+                            new: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Update the ledger after a deal is inserted (old=None), edited, or deleted (new=None).
+    Only the deals from the earliest affected position onwards are recomputed.
+    Returns {deal_id: {"cap_amount", "final_income"}} for the deals that changed.
+    """
+    config = await db.cap_configurations.find_one({"user_id": user_id})
+    if not config:
+        return {}
+    if "ledger" not in config:
+        return (await _rebuild(db, user_id, config)).changed
+
+    corrections = _Corrections()
+
+    # A deal edited out of the period no longer pays cap
+    if in_period(old, config) and new is not None and not in_period(new, config):
+        corrections.set(new, 0, final_income(new, 0))
+
+    positions = [sort_key(d) for d in (old, new) if in_period(d, config)]
+    if not positions:
+        await corrections.flush(db, user_id)
+        return corrections.changed
+
+    start = min(positions)
+    entries = config["ledger"]["entries"]
+    prefix = [e for e in entries if _entry_key(e) < start]
+    paid_before = prefix[-1]["running_total"] if prefix else (config.get("current_cap_paid", 0) or 0)
+
+    suffix_deals = [d for d in await _period_deals(db, user_id, config, start[0]) if sort_key(d) >= start]
+    suffix = run_ledger(suffix_deals, config, paid_before)
+    corrections.add_ledger(suffix_deals, suffix)
+
+    if not await _write(db, user_id, config, prefix + suffix, corrections):
+        logger.warning(f"Cap ledger for user {user_id} changed concurrently; rebuilding")
+        config = await db.cap_configurations.find_one({"user_id": user_id})
+        if config:
+            corrections.changed.update((await _rebuild(db, user_id, config)).changed)
+    return corrections.changed
+
+
+async def get_ledger_summary(db, user_id: str) -> Optional[Dict[str, Any]]:
+    """Config plus ledger summary in one read (building the ledger on first use)."""
+    config = await db.cap_configurations.find_one({"user_id": user_id}, {"ledger.entries": 0})
+    if config and "ledger" not in config:
+        await rebuild_ledger(db, user_id)
+        config = await db.cap_configurations.find_one({"user_id": user_id}, {"ledger.entries": 0})
+    return config
+
+
+async def check_ledger(db, user_id: str) -> List[str]:
+    """
+    Recompute the ledger from scratch and compare with what is stored, without writing.
+    Returns human-readable problems; an empty list means the ledger is consistent.
+    """
+    config = await db.cap_configurations.find_one({"user_id": user_id})
+    if not config:
+        return []
+    if "ledger" not in config:
+        return ["ledger missing"]
+
+    deals = await _period_deals(db, user_id, config, config["cap_period_start"][:10])
+    expected = run_ledger(deals, config, config.get("current_cap_paid", 0) or 0)
+    stored = config["ledger"]["entries"]
+    problems = []
+
+    if [e["deal_id"] for e in expected] != [e["deal_id"] for e in stored]:
+        problems.append("ledger deal order differs from deals in the cap period")
+    for want, got in zip(expected, stored):
+        if want["deal_id"] != got["deal_id"]:
+            continue
+        if abs(want["cap_amount"] - got["cap_amount"]) > TOLERANCE:
+            problems.append(f"deal {want['deal_id']}: ledger cap {got['cap_amount']} != {want['cap_amount']}")
+        if abs(want["running_total"] - got["running_total"]) > TOLERANCE:
+            problems.append(f"deal {want['deal_id']}: running total {got['running_total']} != {want['running_total']}")
+    for deal, want in zip(deals, expected):
+        if abs(deal.get("cap_amount", 0) - want["cap_amount"]) > TOLERANCE:
+            problems.append(f"deal {deal['id']}: stored cap_amount {deal.get('cap_amount', 0)} != {want['cap_amount']}")
+    summary = summarize(expected, config)
+    if abs(config["ledger"].get("total_paid", 0) - summary["total_paid"]) > TOLERANCE:
+        problems.append(f"total_paid {config['ledger'].get('total_paid')} != {summary['total_paid']}")
+    return problems
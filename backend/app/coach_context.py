@@ -0,0 +1,301 @@
+"""
+Compact statistical context for the AI coach prompt.
+
+Instead of pasting raw activity logs, reflections and weekly metrics into the prompt,
+the coach gets a fixed-size summary: per-week activity rates and trends (NumPy over the
+raw logs), conversion ratios, pace against the GCI goal, top lead sources from the P&L
+rollups and a bounded number of redacted reflection snippets. Prompt size no longer
+grows with the user's history.
+"""
+import json
+import logging
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Weeks of activity history summarised
+ACTIVITY_WEEKS = 12
+
+# Known keys first so they always appear in the same order; others are appended as seen
+ACTIVITY_KEYS = ("conversations", "appointments", "offersWritten", "listingsTaken")
+HOURS_KEYS = ("prospecting", "appointments", "admin", "marketing")
+
+# (numerator, denominator) pairs reported as conversion ratios
+CONVERSIONS = (
+    ("appointments", "conversations"),
+    ("offersWritten", "appointments"),
+    ("listingsTaken", "appointments")
+)
+
+METRIC_KEYS = ("calls_made", "new_conversations", "appointments", "deals_created", "deals_closed", "gci_cents")
+
+TOP_LEAD_SOURCES = 3
+REFLECTION_SNIPPETS = 3
+REFLECTION_SNIPPET_CHARS = 160
+
+
+def redact_pii(text: str) -> str:
+    """Basic PII scrubbing for reflections"""
+    if not text:
+        return text
+
+    # Replace email patterns
+    text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]', text)
+    # Replace phone patterns
+    text = re.sub(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', '[PHONE]', text)
+    # Replace SSN patterns
+    text = re.sub(r'\b\d{3}-\d{2}-\d{4}\b', '[SSN]', text)
+
+    return text
+
+
+def _round(value, digits: int = 1) -> Optional[float]:
+    """Plain float for JSON; None for NaN/inf."""
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+
+def _log_date(log: Dict[str, Any]) -> Optional[date]:
+    logged_at = log.get("loggedAt")
+    if isinstance(logged_at, datetime):
+        return logged_at.date()
+    try:
+        return date.fromisoformat(str(logged_at)[:10])
+    except ValueError:
+        return None
+
+
+def _keys(logs: Sequence[Dict[str, Any]], field: str, known: Sequence[str]) -> List[str]:
+    keys = list(known)
+    for log in logs:
+        for key in (log.get(field) or {}):
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+
+def weekly_matrix(logs: Sequence[Dict[str, Any]], field: str, keys: Sequence[str],
+                  today: date, weeks: int = ACTIVITY_WEEKS) -> np.ndarray:
+    """
+    Sum log[field][key] into Monday-based weeks: shape (weeks, len(keys)), oldest first,
+    with the current (partial) week as the last row.
+    """
+    matrix = np.zeros((weeks, len(keys)))
+    columns = {key: i for i, key in enumerate(keys)}
+    this_monday = today - timedelta(days=today.weekday())
+    rows, cols, values = [], [], []
+    for log in logs:
+        logged = _log_date(log)
+        if logged is None:
+            continue
+        weeks_back = (this_monday - (logged - timedelta(days=logged.weekday()))).days // 7
+        if not 0 <= weeks_back < weeks:
+            continue
+        for key, value in (log.get(field) or {}).items():
+            if key in columns and isinstance(value, (int, float)):
+                rows.append(weeks - 1 - weeks_back)
+                cols.append(columns[key])
+                values.append(value)
+    np.add.at(matrix, (rows, cols), values)
+    return matrix
+
+
+def _series_stats(matrix: np.ndarray, keys: Sequence[str]) -> Dict[str, Any]:
+    """Per-week mean, last-4 vs previous-4 trend and linear slope for each column."""
+    weeks = matrix.shape[0]
+    per_week = matrix.mean(axis=0)
+    stats: Dict[str, Any] = {"per_week": dict(zip(keys, map(_round, per_week)))}
+
+    if weeks >= 8:
+        recent, previous = matrix[-4:].mean(axis=0), matrix[-8:-4].mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            trend = np.where(previous > 0, (recent - previous) / previous * 100, np.nan)
+        stats["last_4_weeks"] = dict(zip(keys, map(_round, recent)))
+        stats["trend_pct_vs_prior_4"] = {k: v for k, v in zip(keys, map(_round, trend)) if v is not None}
+    if weeks >= 3:
+        slope = np.polyfit(np.arange(weeks), matrix, 1)[0]
+        stats["weekly_slope"] = dict(zip(keys, (_round(s, 2) for s in slope)))
+    return stats
+
+
+def _drop_empty(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in values.items() if v not in (0, 0.0, None)}
+
+
+def activity_features(activity_logs: Sequence[Dict[str, Any]], today: date,
+                      weeks: int = ACTIVITY_WEEKS) -> Optional[Dict[str, Any]]:
+    """Weekly rates, trends and conversion ratios over completed weeks since the first log."""
+    activity_keys = _keys(activity_logs, "activities", ACTIVITY_KEYS)
+    hours_keys = _keys(activity_logs, "hours", HOURS_KEYS)
+    activities = weekly_matrix(activity_logs, "activities", activity_keys, today, weeks)
+    hours = weekly_matrix(activity_logs, "hours", hours_keys, today, weeks)
+
+    logged_weeks = np.flatnonzero(activities.any(axis=1) | hours.any(axis=1))
+    if logged_weeks.size == 0:
+        return None
+
+    # Completed weeks only, starting at the first week with a log, so a partial current
+    # week or weeks before the user started tracking don't drag the rates down
+    completed = slice(logged_weeks[0], weeks - 1)
+    completed_activities, completed_hours = activities[completed], hours[completed]
+
+    features: Dict[str, Any] = {"weeks_tracked": int(completed_activities.shape[0])}
+    if completed_activities.shape[0]:
+        features.update(_series_stats(completed_activities, activity_keys))
+        features["hours_per_week"] = _drop_empty(
+            dict(zip(hours_keys, map(_round, completed_hours.mean(axis=0))))
+        )
+    features["this_week"] = _drop_empty(dict(zip(activity_keys, map(_round, activities[-1]))))
+
+    totals = dict(zip(activity_keys, activities.sum(axis=0)))
+    features["conversion"] = {
+        f"{numerator}_per_{denominator}": _round(totals[numerator] / totals[denominator], 2)
+        for numerator, denominator in CONVERSIONS
+        if totals.get(denominator, 0) > 0
+    }
+    days_logged = {_log_date(log) for log in activity_logs} - {None}
+    features["days_logged"] = len(days_logged)
+    return features
+
+
+def metrics_features(weekly_metrics: Sequence[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Averages and trends over stored weekly metrics (oldest first)."""
+    if not weekly_metrics:
+        return None
+    matrix = np.array([[float(metric.get(key) or 0) for key in METRIC_KEYS] for metric in weekly_metrics])
+    matrix[:, METRIC_KEYS.index("gci_cents")] /= 100
+    keys = [key if key != "gci_cents" else "gci" for key in METRIC_KEYS]
+    return {"weeks": len(weekly_metrics), **_series_stats(matrix, keys)}
+
+
+def goal_pace(goal_settings: Dict[str, Any], rollups: Sequence[Dict[str, Any]], today: date) -> Dict[str, Any]:
+    """Earned GCI against a straight-line pace to the annual goal."""
+    annual_goal = float(goal_settings.get("annualGciGoal") or 0)
+    monthly_target = float(goal_settings.get("monthlyGciTarget") or 0) or annual_goal / 12
+    avg_per_closing = float(goal_settings.get("avgGciPerClosing") or 0)
+
+    this_year = [r for r in rollups if r["month"].startswith(f"{today.year}-")]
+    ytd_income = float(np.sum([r.get("income", 0) for r in this_year])) if this_year else 0.0
+    earned = ytd_income or float(goal_settings.get("earnedGciToDate") or 0)
+    month_income = sum(r.get("income", 0) for r in this_year if r["month"] == today.strftime("%Y-%m"))
+
+    days_in_year = (date(today.year + 1, 1, 1) - date(today.year, 1, 1)).days
+    year_fraction = today.timetuple().tm_yday / days_in_year
+    months_left = 12 - today.month + 1
+
+    pace: Dict[str, Any] = {
+        "annual_goal": _round(annual_goal, 0),
+        "monthly_target": _round(monthly_target, 0),
+        "earned_ytd": _round(earned, 0),
+        "earned_source": "pnl" if ytd_income else "goal_settings",
+        "this_month_income": _round(month_income, 0),
+        "closed_deals_ytd": int(sum(r.get("closed_deals_count", 0) for r in this_year))
+    }
+    if annual_goal > 0:
+        expected = annual_goal * year_fraction
+        remaining = max(annual_goal - earned, 0.0)
+        pace.update({
+            "expected_by_today": _round(expected, 0),
+            "pace_delta": _round(earned - expected, 0),
+            "pace_pct": _round(earned / expected * 100 if expected else 0),
+            "projected_annual": _round(earned / year_fraction, 0),
+            "needed_per_remaining_month": _round(remaining / months_left, 0)
+        })
+        if avg_per_closing > 0:
+            pace["closings_needed"] = int(np.ceil(remaining / avg_per_closing))
+    return pace
+
+
+def lead_source_features(rollups: Sequence[Dict[str, Any]], limit: int = TOP_LEAD_SOURCES) -> List[Dict[str, Any]]:
+    totals: Dict[str, Dict[str, float]] = {}
+    for rollup in rollups:
+        for source, values in (rollup.get("lead_sources") or {}).items():
+            entry = totals.setdefault(source, {"income": 0.0, "deals": 0})
+            entry["income"] += values.get("income", 0)
+            entry["deals"] += values.get("count", 0)
+    ranked = sorted(totals.items(), key=lambda item: (-item[1]["income"], -item[1]["deals"]))
+    return [
+        {"source": source, "income": _round(values["income"], 0), "deals": int(values["deals"])}
+        for source, values in ranked[:limit]
+    ]
+
+
+def reflection_features(reflection_logs: Sequence[Dict[str, Any]], activity_logs: Sequence[Dict[str, Any]],
+                        limit: int = REFLECTION_SNIPPETS,
+                        max_chars: int = REFLECTION_SNIPPET_CHARS) -> Optional[Dict[str, Any]]:
+    """Mood counts plus the most recent redacted, truncated reflections from either source."""
+    entries = [
+        (str(log.get("loggedAt", "")), log.get("mood"), log.get("reflection"))
+        for log in list(reflection_logs) + list(activity_logs)
+        if log.get("reflection")
+    ]
+    if not entries:
+        return None
+    entries.sort(key=lambda entry: entry[0], reverse=True)
+
+    recent = []
+    for logged_at, mood, text in entries[:limit]:
+        text = " ".join(redact_pii(text).split())
+        if len(text) > max_chars:
+            text = text[:max_chars - 3].rstrip() + "..."
+        snippet = {"date": logged_at[:10], "text": text}
+        if mood:
+            snippet["mood"] = mood
+        recent.append(snippet)
+
+    features: Dict[str, Any] = {"recent": recent}
+    moods = Counter(log.get("mood") for log in reflection_logs if log.get("mood"))
+    if moods:
+        features["moods"] = dict(moods.most_common())
+    return features
+
+
+def build_coach_context(goal_settings: Dict[str, Any], activity_logs: Sequence[Dict[str, Any]],
+                        reflection_logs: Sequence[Dict[str, Any]], weekly_metrics: Sequence[Dict[str, Any]],
+                        rollups: Sequence[Dict[str, Any]], today: Optional[date] = None) -> Dict[str, Any]:
+    """The full compact context; sections without data are omitted."""
+    today = today or datetime.utcnow().date()
+    context: Dict[str, Any] = {"as_of": today.isoformat(), "goals": goal_pace(goal_settings, rollups, today)}
+
+    sections = {
+        "activity": activity_features(activity_logs, today),
+        "weekly_metrics": metrics_features(weekly_metrics),
+        "top_lead_sources": lead_source_features(rollups),
+        "reflections": reflection_features(reflection_logs, activity_logs)
+    }
+    context.update({name: value for name, value in sections.items() if value})
+    return context
+
+
+def context_json(context: Dict[str, Any]) -> str:
+    return json.dumps(context, separators=(",", ":"), default=str)
+
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str):
+    """tiktoken encoding for model, loaded once; None if it can't be loaded (e.g. offline)."""
+    if model not in _encodings:
+        try:
+            import tiktoken
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken encoding for {model} unavailable, estimating tokens: {e}")
+            _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Token count via tiktoken, or ~4 characters per token without an encoding.
+    The first call may download the encoding; call it off the event loop."""
+    encoding = _encoding(model)
+    return len(encoding.encode(text)) if encoding is not None else len(text) // 4
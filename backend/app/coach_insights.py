@@ -0,0 +1,215 @@
+"""
+AI coach insights for /api/ai-coach/generate.
+
+Responses are cached in ai_coach_cache for 24 hours under a key built from the user's
+data versions (app.data_versions), so a cached view costs two point reads. Generation
+goes through the AI response cache's single-flight, so a request arriving while a
+background pre-generation (app.coach_scheduler) is running waits for it instead of
+calling OpenAI again.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional
+
+from app.ai_cache import get_ai_cache
+from app.coach_context import ACTIVITY_WEEKS, build_coach_context, context_json, count_tokens
+from app.data_versions import GOALS, ACTIVITY, REFLECTION, PNL, get_versions, versions_key
+from app.llm_gateway import get_llm_gateway
+from app.pnl_rollups import get_rollups
+
+logger = logging.getLogger(__name__)
+
+# Bump the scope when the coach prompt changes. Weekly metrics are not written by the
+# app, so only the domains below key the cache; the 24h expiry bounds anything else.
+CACHE_SCOPE = "coach:v4"
+CACHE_DOMAINS = (GOALS, ACTIVITY, REFLECTION, PNL)
+CACHE_HOURS = 24
+
+SETUP_TEXT = "Welcome! I'm your personal real estate coach, ready to help you achieve your goals and maximize your productivity.\n\nTo get started, I need you to set up your goals in the Goal Settings tab. Once you've configured your annual GCI goal, monthly targets, and average commission per closing, I'll be able to analyze your performance and provide personalized coaching insights.\n\nI'll help you identify where to focus your energy, spot patterns in your activity, and create a strategic plan to reach your targets. Think of me as your personal mentor who's always watching your numbers and ready to guide you toward success.\n\nGo ahead and set up your goals, then come back here for your personalized coaching session!"
+
+NO_ACTIVITY_TEXT = "I can see you have your goals set up - that's a great start! Your annual GCI goal of ${:,} and monthly target of ${:,} show you're serious about your success.\n\nHowever, I don't have any activity data to analyze yet. To provide you with personalized coaching insights, I need you to start logging your daily activities in the Action Tracker.\n\nHere's what I recommend you track:\n• Outbound calls made - This tracks your lead generation effort\n• New conversations started - This measures your conversion funnel\n• Appointments scheduled - This shows your progress toward deals\n• Deals created and closed - This tracks your income progress\n\nOnce you start logging this data, I'll be able to analyze your patterns, identify what's working, spot areas for improvement, and give you specific recommendations to hit your goals. Think of me as your personal coach who's always watching your numbers and ready to guide you toward success!"
+
+SYSTEM_MESSAGE = """You are an experienced real estate sales coach and mentor. Write a comprehensive, thoughtful analysis of the user's current situation, goals, and performance. Think through their data like ChatGPT would - be conversational, insightful, and strategic.
+
+Analyze their goals, recent activity, deals, and performance data. Write your thoughts in a flowing, natural way that covers:
+- Current goal progress and gaps
+- Activity patterns and what's working/not working
+- Strategic recommendations for focus areas
+- Specific next steps and priorities
+- Encouragement and motivation
+
+Write in first person as their personal coach. Be direct but encouraging. Use natural paragraphs, not bullet points. Reference specific numbers from their data when relevant. Keep it conversational but professional - like you're their mentor giving them honest feedback and a strategic plan.
+
+The data is a statistical summary: per_week values are averages over completed weeks, trend_pct_vs_prior_4 compares the last 4 weeks with the 4 before, weekly_slope is the change per week, and goals.pace_delta is earned GCI minus a straight-line pace to the annual goal.
+
+All monetary values are provided in dollars. Format money with commas and dollar sign when mentioning them (e.g., $25,000 not $25,000.00).
+
+Write 3-4 substantial paragraphs. Be specific and actionable based on their actual data."""
+
+
+async def coaching_cache_key(db, user_id: str) -> str:
+    return versions_key(CACHE_SCOPE, await get_versions(db, user_id), CACHE_DOMAINS)
+
+
+async def get_cached_coaching(db, user_id: str, cache_key: str) -> Optional[Dict[str, Any]]:
+    cached_response = await db.ai_coach_cache.find_one({
+        "user_id": user_id,
+        "cache_key": cache_key,
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
+    if not cached_response:
+        return None
+
+    # Handle both old and new cache formats
+    response_data = cached_response["response_data"]
+    if "coaching_text" in response_data:
+        return {"coaching_text": response_data["coaching_text"]}
+    # Convert old format to new format
+    return {"coaching_text": response_data.get("summary", "Cached coaching data needs refresh. Please click retry.")}
+
+
+async def _store_coaching(db, user_id: str, cache_key: str, coaching_text: str):
+    now = datetime.now(timezone.utc)
+    # Upsert so concurrent misses for the same versions leave a single entry
+    await db.ai_coach_cache.update_one(
+        {"user_id": user_id, "cache_key": cache_key},
+        {
+            "$set": {
+                "response_data": {"coaching_text": coaching_text},
+                "generated_at": now.isoformat(),
+                # BSON date so the TTL index can expire it
+                "expires_at": now + timedelta(hours=CACHE_HOURS)
+            },
+            "$setOnInsert": {"id": str(uuid.uuid4())}
+        },
+        upsert=True
+    )
+
+
+async def _load_inputs(db, user_id: str) -> Dict[str, Any]:
+    """
+    The user's goals and recent logs. "guidance" holds the setup / no-activity text when
+    there is nothing to analyse yet; the logs are only loaded once goals are set.
+    """
+    # Get goal settings (new source of coaching data)
+    goal_settings = await db.goal_settings.find_one({
+        "userId": user_id
+    })
+
+    if not goal_settings or (not goal_settings.get("annualGciGoal") and not goal_settings.get("monthlyGciTarget")):
+        # Return setup response
+        return {"guidance": SETUP_TEXT}
+
+    # Raw activity for the last ACTIVITY_WEEKS weeks; summarised by app.coach_context
+    today = datetime.now(timezone.utc).date()
+    activity_since = today - timedelta(days=today.weekday(), weeks=ACTIVITY_WEEKS - 1)
+    activity_logs = await db.activity_logs.find(
+        {"userId": user_id, "loggedAt": {"$gte": activity_since.isoformat()}},
+        {"_id": 0, "loggedAt": 1, "activities": 1, "hours": 1, "reflection": 1}
+    ).sort("loggedAt", -1).to_list(length=1000)
+
+    # Get recent reflection logs (last 15 entries)
+    reflection_logs = await db.reflection_logs.find(
+        {"userId": user_id},
+        {"_id": 0, "loggedAt": 1, "reflection": 1, "mood": 1}
+    ).sort("loggedAt", -1).to_list(length=15)
+
+    # Get weekly metrics (last 12 weeks) - keep existing for backward compatibility
+    metrics_cursor = db.weekly_metrics.find({
+        "user_id": user_id
+    }).sort("week_of", -1).limit(12)
+
+    weekly_metrics = []
+    async for metric_data in metrics_cursor:
+        weekly_metrics.append(metric_data)
+
+    # Reverse to get oldest to newest
+    weekly_metrics = list(reversed(weekly_metrics))
+
+    # Check if we have any activity data to analyze
+    has_activity_data = bool(activity_logs or reflection_logs or weekly_metrics)
+
+    if not has_activity_data:
+        # Return data collection response
+        return {"guidance": NO_ACTIVITY_TEXT.format(
+            int(goal_settings.get("annualGciGoal", 0) or 0),
+            int(goal_settings.get("monthlyGciTarget", 0) or 0)
+        )}
+
+    return {
+        "guidance": None,
+        "goal_settings": goal_settings,
+        "activity_logs": activity_logs,
+        "reflection_logs": reflection_logs,
+        "weekly_metrics": weekly_metrics,
+        "today": today
+    }
+
+
+async def _generate(db, user_id: str, cache_key: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarise the user's data and ask the coach model; stores the response."""
+    today = inputs["today"]
+
+    # Compact statistical summary instead of the raw logs
+    first_month = (today.replace(day=1) - timedelta(days=335)).strftime("%Y-%m")
+    rollups = await get_rollups(db, user_id, first_month, today.strftime("%Y-%m"))
+    context = build_coach_context(inputs["goal_settings"], inputs["activity_logs"],
+                                  inputs["reflection_logs"], inputs["weekly_metrics"], rollups, today)
+
+    # Create user message with all their data
+    user_content = f"""Here's my current situation as a real estate agent. Please analyze this data and give me your honest coaching insights and strategic recommendations:
+
+{context_json(context)}
+
+Please analyze my activity patterns, reflection insights, and goal progress. Write your coaching thoughts and strategic plan for me. Be specific about what I should focus on to reach my goals."""
+
+    prompt_tokens = await asyncio.to_thread(count_tokens, SYSTEM_MESSAGE + user_content)
+
+    # Get response from OpenAI through the shared, pooled client
+    response = await get_llm_gateway().chat(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": user_content}
+        ],
+        temperature=0.7,
+        max_tokens=1000
+    )
+
+
+    llm_response = response.choices[0].message.content
+    usage = getattr(response, "usage", None)
+    logger.info(f"AI coach prompt - user: {user_id[:8]}..., estimated_prompt_tokens: {prompt_tokens}, "
+                f"prompt_tokens: {getattr(usage, 'prompt_tokens', None)}, "
+                f"completion_tokens: {getattr(usage, 'completion_tokens', None)}")
+
+    await _store_coaching(db, user_id, cache_key, llm_response)
+    return {"coaching_text": llm_response}
+
+
+async def generate_coaching(db, user_id: str) -> Dict[str, Any]:
+    """
+    Cached coaching for the user's current data, generating it on a miss.
+    Returns {"coaching_text": ...}. Setup / no-activity guidance is returned directly,
+    without going through (or being stored in) either cache.
+
+    Raises:
+        LLMBusyError: no LLM call slot freed up in time
+    """
+    cache_key = await coaching_cache_key(db, user_id)
+    cached = await get_cached_coaching(db, user_id, cache_key)
+    if cached:
+        return cached
+
+    inputs = await _load_inputs(db, user_id)
+    if inputs["guidance"]:
+        return {"coaching_text": inputs["guidance"]}
+
+    async def generate() -> str:
+        return json.dumps(await _generate(db, user_id, cache_key, inputs))
+
+    text, _ = await get_ai_cache().get_or_generate(f"legacy-coach:{user_id}:{cache_key}", generate)
+    return json.loads(text)
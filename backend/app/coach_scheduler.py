@@ -0,0 +1,206 @@
+"""
+Background pre-generation of AI coach insights.
+
+Data writes call notify(); after a quiet period (debounce) the registered generators run
+for that user, so the next coach request is a cache hit instead of a multi-second LLM
+call. A burst of writes produces one run, writes during a run queue exactly one more, and
+a semaphore caps how many users are generated at once. An optional nightly batch covers
+users who wrote data recently; one worker claims each day's batch through a lock document.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import get_config
+from app.data_versions import COLLECTION as VERSIONS_COLLECTION
+from app.scheduler_locks import claim_daily_lock
+
+logger = logging.getLogger(__name__)
+
+# generator(user_id, plan) -> anything; exceptions are logged and counted
+Generator = Callable[[str, Optional[str]], Awaitable[Any]]
+
+
+class CoachPregenScheduler:
+    """Per-user debounced, concurrency-capped runner for coach pre-generation."""
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        debounce_seconds: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        nightly_hour_utc: Optional[int] = None,
+        active_days: Optional[int] = None,
+        db=None
+    ):
+        config = get_config()
+        self.enabled = config.COACH_PREGEN_ENABLED if enabled is None else enabled
+        self.debounce_seconds = (config.COACH_PREGEN_DEBOUNCE_SECONDS
+                                 if debounce_seconds is None else debounce_seconds)
+        self.max_concurrency = max(1, max_concurrency or config.COACH_PREGEN_MAX_CONCURRENCY)
+        self.nightly_hour_utc = (config.COACH_PREGEN_NIGHTLY_HOUR_UTC
+                                 if nightly_hour_utc is None else nightly_hour_utc)
+        self.active_days = active_days or config.COACH_PREGEN_ACTIVE_DAYS
+        self._db = db
+
+        self._generators: Dict[str, Generator] = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._running: set = set()
+        self._dirty: Dict[str, Optional[str]] = {}
+        self._tasks: set = set()
+        self._nightly_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "notified": 0,
+            "debounced": 0,
+            "runs": 0,
+            "errors": 0,
+            "nightly_batches": 0
+        }
+
+    def register(self, name: str, generator: Generator):
+        """Add a generator run for every pre-generated user (e.g. one per coach endpoint)."""
+        self._generators[name] = generator
+
+    def notify(self, user_id: str, plan: Optional[str] = None):
+        """Schedule a pre-generation for user_id once their writes settle. Never raises."""
+        if not self.enabled or not self._generators:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self._stats["notified"] += 1
+        if user_id in self._running:
+            # Run again after the current one so it sees this write
+            self._dirty[user_id] = plan
+            return
+
+        previous = self._timers.pop(user_id, None)
+        if previous is not None:
+            previous.cancel()
+            self._stats["debounced"] += 1
+        self._timers[user_id] = loop.call_later(self.debounce_seconds, self._fire, user_id, plan)
+
+    def _fire(self, user_id: str, plan: Optional[str]):
+        self._timers.pop(user_id, None)
+        self._spawn(self.run_user(user_id, plan))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run_user(self, user_id: str, plan: Optional[str] = None):
+        """Run every registered generator for one user, holding a concurrency slot."""
+        if user_id in self._running:
+            self._dirty[user_id] = plan
+            return
+
+        self._running.add(user_id)
+        try:
+            async with self._semaphore:
+                for name, generator in list(self._generators.items()):
+                    try:
+                        await generator(user_id, plan)
+                        self._stats["runs"] += 1
+                    except Exception as e:
+                        self._stats["errors"] += 1
+                        logger.warning(f"Coach pre-generation '{name}' failed for user {user_id[:8]}...: {e}")
+        finally:
+            self._running.discard(user_id)
+            if user_id in self._dirty:
+                self.notify(user_id, self._dirty.pop(user_id))
+
+    async def run_batch(self, users: Iterable[Tuple[str, Optional[str]]]):
+        """Pre-generate for (user_id, plan) pairs; the semaphore bounds how many run at once."""
+        await asyncio.gather(*[self.run_user(user_id, plan) for user_id, plan in users])
+
+    async def active_users(self, since: datetime) -> List[Tuple[str, Optional[str]]]:
+        """(user_id, plan) for users whose data changed since `since`."""
+        db = self._get_db()
+        user_ids = [doc["_id"] async for doc in db[VERSIONS_COLLECTION].find(
+            {"updated_at": {"$gte": since}}, {"_id": 1}
+        )]
+        if not user_ids:
+            return []
+        return [(doc["id"], doc.get("plan")) async for doc in db.users.find(
+            {"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "plan": 1}
+        )]
+
+    async def run_nightly(self, now: Optional[datetime] = None) -> int:
+        """Pre-generate for recently active users, once per UTC day. Returns the user count."""
+        now = now or datetime.now(timezone.utc)
+        if not await claim_daily_lock(self._get_db(), f"coach_nightly:{now.date().isoformat()}", now):
+            return 0
+
+        users = await self.active_users(now - timedelta(days=self.active_days))
+        logger.info(f"Nightly coach pre-generation for {len(users)} active users")
+        await self.run_batch(users)
+        self._stats["nightly_batches"] += 1
+        return len(users)
+
+    def _seconds_until_nightly(self, now: datetime) -> float:
+        next_run = now.replace(hour=self.nightly_hour_utc, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    async def _nightly_loop(self):
+        while True:
+            await asyncio.sleep(self._seconds_until_nightly(datetime.now(timezone.utc)))
+            try:
+                await self.run_nightly()
+            except Exception as e:
+                logger.error(f"Nightly coach pre-generation error: {e}")
+
+    def _get_db(self):
+        if self._db is None:
+            from app.database import get_database
+            self._db = get_database()
+        return self._db
+
+    def start(self):
+        """Start the nightly batch task when enabled and an hour is configured."""
+        if not self.enabled or self.nightly_hour_utc is None:
+            return
+        if self._nightly_task is None or self._nightly_task.done():
+            self._nightly_task = asyncio.create_task(self._nightly_loop())
+
+    async def stop(self):
+        """Drop pending debounces and cancel in-flight runs; caches only lose a warm-up."""
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        self._dirty.clear()
+
+        tasks = list(self._tasks)
+        if self._nightly_task is not None:
+            tasks.append(self._nightly_task)
+            self._nightly_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._timers),
+            "running": len(self._running),
+            "max_concurrency": self.max_concurrency,
+            **self._stats
+        }
+
+
+# Global scheduler instance
+_scheduler_instance: Optional[CoachPregenScheduler] = None
+
+def get_coach_scheduler() -> CoachPregenScheduler:
+    """Get or create global coach pre-generation scheduler instance."""
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        _scheduler_instance = CoachPregenScheduler()
+    return _scheduler_instance
@@ -0,0 +1,59 @@
+"""
+Per-user data version counters.
+
+Every write to a user's goal settings, activity logs, reflections or P&L bumps the
+matching counter in user_data_versions (one document per user, keyed by user id). Caches
+of derived results - the AI coach response in particular - key on these counters instead
+of hashing the underlying data, so a lookup costs a primary-key read rather than fetching
+and serialising the whole context.
+
+Bumps happen after the write they describe. A reader racing a write can at worst cache a
+fresh result under the previous version, which the bump then retires.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "user_data_versions"
+
+GOALS = "goals"
+ACTIVITY = "activity"
+REFLECTION = "reflection"
+PNL = "pnl"
+
+DOMAINS = (GOALS, ACTIVITY, REFLECTION, PNL)
+
+
+async def bump_versions(db, user_id: str, *domains: str):
+    """Increment the counters for domains; never fails the write that triggered it."""
+    unknown = set(domains) - set(DOMAINS)
+    if unknown:
+        raise ValueError(f"Unknown data domains: {sorted(unknown)}")
+    try:
+        await db[COLLECTION].update_one(
+            {"_id": user_id},
+            {
+                "$inc": {domain: 1 for domain in domains},
+                "$set": {"updated_at": datetime.now(timezone.utc)}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to bump data versions {domains} for user {user_id}: {e}")
+
+
+async def get_versions(db, user_id: str) -> Dict[str, int]:
+    """Current counters; domains that were never written are 0."""
+    doc = await db[COLLECTION].find_one({"_id": user_id}, {domain: 1 for domain in DOMAINS}) or {}
+    return {domain: int(doc.get(domain, 0)) for domain in DOMAINS}
+
+
+def versions_key(scope: str, versions: Dict[str, int], domains: Iterable[str] = DOMAINS) -> str:
+    """Readable cache key, e.g. 'coach:v3:goals=2:activity=14:reflection=5:pnl=9'."""
+    return ":".join([scope] + [f"{domain}={versions.get(domain, 0)}" for domain in domains])
+
+
+async def delete_versions(db, user_id: str):
+    await db[COLLECTION].delete_one({"_id": user_id})
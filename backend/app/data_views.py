@@ -1,12 +1,11 @@
 from typing import Any, Dict, List
 from datetime import datetime, timedelta
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from app.database import get_database
+from app.pnl_rollups import get_rollups
 
-# Get database connection
+# Get database connection (shared app-scoped client)
 def get_db():
-    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-    return client[os.environ.get('DB_NAME', 'test_database')]
+    return get_database()
 
 async def fetch_goal_settings(user_id: str) -> Dict[str, Any]:
     """Fetch user's goal settings from goal_settings collection"""
@@ -98,45 +97,22 @@ async def fetch_reflection_log(user_id: str, limit: int = 5) -> List[Dict[str, A
     ]
 
 async def fetch_pnl_summary(user_id: str, year: int) -> Dict[str, Any]:
-    """Fetch P&L summary from deals and expenses"""
+    """Fetch yearly P&L summary from the monthly rollups"""
     db = get_db()
     
-    # Get deals for the year (checking both closing_date and date fields for compatibility)
-    deals_cursor = db.pnl_deals.find({
-        "user_id": user_id,  # Fixed: use user_id instead of userId
-        "$or": [
-            {"closing_date": {"$regex": f"^{year}-"}},
-            {"date": {"$regex": f"^{year}-"}}  # Fallback for older records
-        ]
-    })
-    
-    deals = await deals_cursor.to_list(length=1000)
-    
-    # Get expenses for the year  
-    expenses_cursor = db.pnl_expenses.find({
-        "user_id": user_id,  # Fixed: use user_id instead of userId
-        "date": {
-            "$regex": f"^{year}-"
-        }
-    })
-    
-    expenses = await expenses_cursor.to_list(length=1000)
+    months = await get_rollups(db, user_id, f"{year}-01", f"{year}-12")
     
-    # Calculate totals (use final_income field from deals)
-    total_income = sum(deal.get("final_income", deal.get("commission", 0)) for deal in deals)
-    total_expenses = sum(expense.get("amount", 0) for expense in expenses)
+    total_income = sum(m["income"] for m in months)
+    total_expenses = sum(m["expenses"] for m in months)
     profit = total_income - total_expenses
     margin_pct = (profit / total_income) if total_income > 0 else 0
     
-    # Count closed deals - P&L deals are inherently closed since they have closing_date and final_income
-    # All P&L deals with closing_date should be considered closed
-    closed_deals = [deal for deal in deals if deal.get("closing_date")]
-    
-    # Convert recent deals to JSON-serializable format (remove ObjectId fields)
-    recent_deals_clean = []
-    for deal in (deals[-3:] if deals else []):
-        clean_deal = {k: v for k, v in deal.items() if k != '_id'}  # Remove MongoDB _id field
-        recent_deals_clean.append(clean_deal)
+    # Most recent closings for context; served by the user_id + closing_date index
+    recent_cursor = db.pnl_deals.find(
+        {"user_id": user_id, "closing_date": {"$gte": f"{year}-01-01", "$lt": f"{year + 1}-01-01"}},
+        {"_id": 0}
+    ).sort("closing_date", -1).limit(3)
+    recent_deals_clean = list(reversed(await recent_cursor.to_list(length=3)))
     
     return {
         "year": year,
@@ -144,8 +120,8 @@ async def fetch_pnl_summary(user_id: str, year: int) -> Dict[str, Any]:
         "expenses": total_expenses, 
         "profit": profit,
         "margin_pct": round(margin_pct, 2),
-        "deals_count": len(deals),
-        "closed_deals_count": len(closed_deals),
-        "expenses_count": len(expenses),
+        "deals_count": sum(m["deals_count"] for m in months),
+        "closed_deals_count": sum(m["closed_deals_count"] for m in months),
+        "expenses_count": sum(m["expenses_count"] for m in months),
         "recent_deals": recent_deals_clean  # Include recent deals for context (JSON-safe)
-    }
\ No newline at end of file
+    }
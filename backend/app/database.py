@@ -0,0 +1,138 @@
+"""
+Application-scoped MongoDB client.
+server.py, the routers, auth and data views all share one Motor client (one connection
+pool per worker); pool activity is tracked for the readiness endpoint.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool counters fed by pymongo CMAP events.
+    Motor runs pymongo calls on executor threads, so checkout start/end for one operation
+    happen on the same thread and wait time is measured with a thread-local.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.pool_clears = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "wait_queue": self.waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "pool_clears": self.pool_clears
+            }
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        wait_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checked_out += 1
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+_pool_metrics = PoolMetrics()
+_client: Optional[AsyncIOMotorClient] = None
+
+def get_client() -> AsyncIOMotorClient:
+    """Get or create the shared Motor client."""
+    global _client
+    if _client is None:
+        config = get_config()
+        _client = AsyncIOMotorClient(
+            config.MONGO_URL,
+            maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            event_listeners=[_pool_metrics]
+        )
+        logger.info(f"MongoDB client created (pool {config.MONGO_MIN_POOL_SIZE}-{config.MONGO_MAX_POOL_SIZE})")
+    return _client
+
+def get_database():
+    """Get the application database from the shared client."""
+    return get_client()[get_config().DB_NAME]
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """Connection pool metrics for readiness reporting."""
+    config = get_config()
+    return {
+        "max_pool_size": config.MONGO_MAX_POOL_SIZE,
+        "min_pool_size": config.MONGO_MIN_POOL_SIZE,
+        **_pool_metrics.snapshot()
+    }
+
+def close_client():
+    """Close the shared client (app shutdown)."""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+        logger.info("MongoDB client closed")
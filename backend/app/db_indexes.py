@@ -0,0 +1,231 @@
+"""
+Declared MongoDB indexes for hot query paths.
+Indexes are created idempotently at startup; the CLI diffs declared vs actual indexes:
+
+    python -m app.db_indexes diff
+    python -m app.db_indexes apply
+"""
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Collection -> indexes. Names are explicit so re-running is a no-op and diffs are readable.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("subscription.stripe_subscription_id", ASCENDING)], name="stripe_subscription_id", sparse=True),
+        # Admin user listing: default sort plus keyset tie-breaker, and search_mode=text
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("email", TEXT), ("full_name", TEXT)], name="user_search_text"),
+    ],
+    "pnl_deals": [
+        # GET /pnl/deals and /pnl/summary: user_id + month, sorted by closing_date
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING), ("closing_date", ASCENDING)], name="user_month_closing_date"),
+        # Cap tracker and yearly summaries: user_id + closing_date range
+        IndexModel([("user_id", ASCENDING), ("closing_date", ASCENDING)], name="user_closing_date"),
+    ],
+    "pnl_expenses": [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING), ("date", ASCENDING)], name="user_month_date"),
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)], name="user_date"),
+    ],
+    # app.pnl_rollups: yearly views read a user's month range
+    "pnl_monthly_rollups": [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING)], name="user_month"),
+    ],
+    "activity_logs": [
+        IndexModel([("userId", ASCENDING), ("loggedAt", DESCENDING)], name="user_logged_at"),
+    ],
+    "reflection_logs": [
+        IndexModel([("userId", ASCENDING), ("loggedAt", DESCENDING)], name="user_logged_at"),
+    ],
+    # app.audit_logs: newest-first keyset pages, overall and per user / action
+    "audit_logs": [
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="user_timestamp"),
+        IndexModel([("action", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="action_timestamp"),
+    ],
+    "ai_coach_cache": [
+        IndexModel([("user_id", ASCENDING), ("cache_key", ASCENDING)], name="user_cache_key"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ],
+    "tracker_daily": [
+        IndexModel([("userId", ASCENDING), ("date", ASCENDING)], name="user_date"),
+    ],
+    "goal_settings": [
+        IndexModel([("userId", ASCENDING)], name="user"),
+    ],
+    "cap_configurations": [
+        IndexModel([("user_id", ASCENDING)], name="user"),
+    ],
+    "brand_profiles": [
+        IndexModel([("userId", ASCENDING)], name="user"),
+    ],
+    "webhook_events": [
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True),
+    ],
+    # TTL cleanup for app.mongodb_cache
+    "cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ],
+    # TTL cleanup for app.ai_cache
+    "ai_response_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ],
+    # app.coach_scheduler nightly batch: users with recent data writes
+    "user_data_versions": [
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    # app.brand_asset_cache: invalidated by storage key
+    "brand_asset_cache": [
+        IndexModel([("storage_key", ASCENDING)], name="storage_key"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ],
+    # app.scheduler_locks: daily job claims expire after two days
+    "scheduler_locks": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ],
+}
+
+# Build status reported on /api/ready
+_index_status: Dict[str, Any] = {"state": "pending", "errors": {}}
+_bootstrap_task: Optional[asyncio.Task] = None
+
+
+def _key_pattern(keys) -> List[List[Any]]:
+    """Normalise a key spec (list of tuples or SON) for comparison."""
+    items = list(keys.items() if hasattr(keys, "items") else keys)
+    if any(direction == "text" for _, direction in items):
+        # MongoDB reports every text index under the same internal key
+        return [["_fts", "text"], ["_ftsx", 1]]
+    return [[field, int(direction) if isinstance(direction, (int, float)) else direction]
+            for field, direction in items]
+
+
+def declared_indexes() -> Dict[str, List[Dict[str, Any]]]:
+    """Declared indexes as plain dicts."""
+    declared = {}
+    for collection, models in INDEXES.items():
+        declared[collection] = [
+            {
+                "name": model.document["name"],
+                "key": _key_pattern(model.document["key"]),
+                "unique": bool(model.document.get("unique", False))
+            }
+            for model in models
+        ]
+    return declared
+
+
+async def ensure_indexes(db) -> Dict[str, Any]:
+    """
+    Create all declared indexes. Safe to re-run: existing identical indexes are no-ops.
+    A failure on one index (e.g. duplicate emails blocking a unique index) is recorded
+    and does not stop the others.
+    """
+    global _index_status
+    _index_status = {
+        "state": "building",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "errors": {}
+    }
+    ok = 0
+
+    for collection, models in INDEXES.items():
+        for model in models:
+            name = model.document["name"]
+            try:
+                await db[collection].create_indexes([model])
+                ok += 1
+            except PyMongoError as e:
+                logger.error(f"Index build failed for {collection}.{name}: {e}")
+                _index_status["errors"][f"{collection}.{name}"] = str(e)[:200]
+
+    _index_status["state"] = "failed" if _index_status["errors"] else "complete"
+    _index_status["indexes_ok"] = ok
+    _index_status["finished_at"] = datetime.now(timezone.utc).isoformat()
+    logger.info(f"Index bootstrap {_index_status['state']}: {ok} indexes ok, "
+                f"{len(_index_status['errors'])} failed")
+    return _index_status
+
+
+def start_index_bootstrap(db) -> asyncio.Task:
+    """Run ensure_indexes in the background so large builds don't delay startup."""
+    global _bootstrap_task
+    _bootstrap_task = asyncio.create_task(ensure_indexes(db))
+    return _bootstrap_task
+
+
+def get_index_status() -> Dict[str, Any]:
+    """Current index bootstrap status."""
+    return dict(_index_status)
+
+
+async def diff_indexes(db) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """
+    Compare declared indexes against the database.
+    Returns {collection: {"missing": [...], "mismatched": [...], "extra": [...]}} for
+    collections that differ. Matching is by key pattern, so renamed indexes still count.
+    """
+    result = {}
+    for collection, declared in declared_indexes().items():
+        actual_info = await db[collection].index_information()
+        actual = {
+            name: {"name": name, "key": _key_pattern(info["key"]), "unique": bool(info.get("unique", False))}
+            for name, info in actual_info.items()
+            if name != "_id_"
+        }
+        actual_by_key = {json.dumps(idx["key"]): idx for idx in actual.values()}
+        declared_keys = {json.dumps(idx["key"]) for idx in declared}
+
+        missing, mismatched = [], []
+        for idx in declared:
+            existing = actual_by_key.get(json.dumps(idx["key"]))
+            if existing is None:
+                missing.append(idx)
+            elif existing["unique"] != idx["unique"]:
+                mismatched.append({"declared": idx, "actual": existing})
+        extra = [idx for key, idx in actual_by_key.items() if key not in declared_keys]
+
+        if missing or mismatched or extra:
+            result[collection] = {"missing": missing, "mismatched": mismatched, "extra": extra}
+    return result
+
+
+async def _run_cli(command: str) -> int:
+    from app.database import get_database, close_client
+
+    db = get_database()
+    try:
+        if command == "apply":
+            status = await ensure_indexes(db)
+            print(json.dumps(status, indent=2))
+            return 1 if status["errors"] else 0
+
+        diff = await diff_indexes(db)
+        if not diff:
+            print("Indexes match declaration")
+            return 0
+        print(json.dumps(diff, indent=2))
+        return 1
+    finally:
+        close_client()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "diff"
+    if command not in ("diff", "apply"):
+        print("Usage: python -m app.db_indexes [diff|apply]", file=sys.stderr)
+        sys.exit(2)
+    sys.exit(asyncio.run(_run_cli(command)))
@@ -4,10 +4,18 @@ Uses centralized configuration with validation.
 """
 
 from config import get_config, Config
+from app.database import get_database
 
 def get_settings() -> Config:
     """
     Get application settings/configuration.
     This replaces the old Settings model with the new centralized Config.
     """
-    return get_config()
\ No newline at end of file
+    return get_config()
+
+def get_db():
+    """
+    Get the application database.
+    Backed by the single app-scoped Motor client in app.database.
+    """
+    return get_database()
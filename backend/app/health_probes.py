@@ -0,0 +1,160 @@
+"""
+Background dependency probes for /health and /api/ready.
+
+Each dependency (MongoDB, the Mongo cache, S3, Stripe) is checked by its own loop on its
+own interval, with a timeout. Endpoints read the latest snapshot instead of probing, so a
+load balancer hitting them every few seconds costs no S3/Stripe calls and never blocks the
+event loop. Results carry the last check time, last success time and consecutive failures;
+a result older than a few intervals (e.g. the loop died) is reported as stale.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# A check returns extra fields for its result; {"status": ...} overrides "ok"
+# (e.g. "not_configured" or "warning"). Raising marks the dependency as "error".
+ProbeCheck = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+STALE_AFTER_INTERVALS = 3
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+
+@dataclass
+class Probe:
+    name: str
+    check: ProbeCheck
+    interval: float
+    timeout: float
+    status: str = "pending"
+    details: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    response_time_ms: Optional[float] = None
+    checked_at: Optional[float] = None
+    last_success: Optional[float] = None
+    consecutive_failures: int = 0
+
+    def stale(self, now: float) -> bool:
+        return self.checked_at is not None and now - self.checked_at > self.interval * STALE_AFTER_INTERVALS
+
+    def result(self, now: float) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"status": "stale" if self.stale(now) else self.status, **self.details}
+        if self.error:
+            result["error"] = self.error
+        if self.response_time_ms is not None:
+            result["response_time_ms"] = self.response_time_ms
+        result["checked_at"] = _iso(self.checked_at)
+        result["last_success"] = _iso(self.last_success)
+        if self.consecutive_failures:
+            result["consecutive_failures"] = self.consecutive_failures
+        return result
+
+
+class ProbeScheduler:
+    """Runs each registered probe on its own interval; snapshot() is a dict lookup."""
+
+    def __init__(self, interval_seconds: Optional[float] = None, timeout_seconds: Optional[float] = None):
+        config = get_config()
+        self.interval_seconds = interval_seconds or config.HEALTH_PROBE_INTERVAL_SECONDS
+        self.timeout_seconds = timeout_seconds or config.HEALTH_PROBE_TIMEOUT_SECONDS
+        self._probes: Dict[str, Probe] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stats = {"runs": 0, "failures": 0, "timeouts": 0}
+
+    def register(self, name: str, check: ProbeCheck, interval: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        self._probes[name] = Probe(
+            name=name,
+            check=check,
+            interval=interval or self.interval_seconds,
+            timeout=timeout or self.timeout_seconds
+        )
+
+    async def run(self, name: str) -> Dict[str, Any]:
+        """Run one probe now and record its result."""
+        probe = self._probes[name]
+        started = time.monotonic()
+        self._stats["runs"] += 1
+        try:
+            details = await asyncio.wait_for(probe.check(), timeout=probe.timeout) or {}
+            probe.status = details.pop("status", "ok")
+            probe.details, probe.error = details, None
+            probe.consecutive_failures = 0
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            self._fail(probe, f"timed out after {probe.timeout}s")
+        except Exception as e:
+            self._fail(probe, str(e)[:100])
+        probe.response_time_ms = round((time.monotonic() - started) * 1000, 2)
+        probe.checked_at = time.time()
+        if probe.status == "ok":
+            probe.last_success = probe.checked_at
+        return probe.result(probe.checked_at)
+
+    def _fail(self, probe: Probe, error: str):
+        self._stats["failures"] += 1
+        probe.status, probe.details, probe.error = "error", {}, error
+        probe.consecutive_failures += 1
+        if probe.consecutive_failures == 1:
+            logger.warning(f"Health probe {probe.name} failed: {error}")
+
+    async def run_all(self):
+        await asyncio.gather(*[self.run(name) for name in self._probes])
+
+    async def _loop(self, name: str):
+        probe = self._probes[name]
+        while True:
+            await asyncio.sleep(probe.interval)
+            try:
+                await self.run(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Health probe loop error ({name}): {e}")
+
+    async def start(self):
+        """Take a first reading of every dependency, then keep refreshing in the background."""
+        await self.run_all()
+        for name in self._probes:
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._loop(name))
+        logger.info(f"Health probes started: {', '.join(self._probes)}")
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def get(self, name: str) -> Dict[str, Any]:
+        probe = self._probes.get(name)
+        if probe is None:
+            return {"status": "not_configured"}
+        return probe.result(time.time())
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        return {name: probe.result(now) for name, probe in self._probes.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"probes": len(self._probes), "running": len(self._tasks), **self._stats}
+
+
+# Global scheduler instance
+_probe_scheduler_instance: Optional[ProbeScheduler] = None
+
+def get_probe_scheduler() -> ProbeScheduler:
+    """Get or create global health probe scheduler instance."""
+    global _probe_scheduler_instance
+    if _probe_scheduler_instance is None:
+        _probe_scheduler_instance = ProbeScheduler()
+    return _probe_scheduler_instance
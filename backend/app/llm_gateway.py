@@ -0,0 +1,177 @@
+"""
+App-scoped gateway for outbound LLM calls.
+
+One AsyncOpenAI client on a pooled httpx.AsyncClient is shared by every AI endpoint, so
+keep-alive connections and TLS sessions are reused instead of being rebuilt per request.
+A semaphore caps concurrent OpenAI calls per worker; callers that cannot get a slot within
+the queue timeout are rejected rather than piling up behind a slow upstream.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept for p50/p99 in stats()
+LATENCY_SAMPLES = 1000
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM call slot frees up within the queue timeout."""
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LLMGateway:
+    """
+    Pooled OpenAI client plus a concurrency limit for outbound calls.
+    The client is created on first use and closed on app shutdown.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        connect_timeout_seconds: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        queue_timeout_seconds: Optional[float] = None
+    ):
+        config = get_config()
+        self.api_key = api_key or config.OPENAI_API_KEY
+        self.base_url = base_url or config.OPENAI_BASE_URL
+        self.max_connections = max_connections or config.LLM_MAX_CONNECTIONS
+        self.max_keepalive_connections = max_keepalive_connections or config.LLM_MAX_KEEPALIVE_CONNECTIONS
+        self.timeout_seconds = timeout_seconds or config.LLM_TIMEOUT_SECONDS
+        self.connect_timeout_seconds = connect_timeout_seconds or config.LLM_CONNECT_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else config.LLM_MAX_RETRIES
+        self.max_concurrency = max(1, max_concurrency or config.LLM_MAX_CONCURRENCY)
+        self.queue_timeout_seconds = queue_timeout_seconds or config.LLM_QUEUE_TIMEOUT_SECONDS
+
+        self._client: Optional[AsyncOpenAI] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._inflight = 0
+        self._waiting = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._stats = {
+            "calls": 0,
+            "errors": 0,
+            "rejected": 0
+        }
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections
+                ),
+                timeout=httpx.Timeout(self.timeout_seconds, connect=self.connect_timeout_seconds)
+            )
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=self.max_retries,
+                http_client=self._http_client
+            )
+        return self._client
+
+    async def close(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._client = None
+        self._http_client = None
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of max_concurrency outbound call slots."""
+        self._waiting += 1
+        try:
+            # asyncio.timeout, not wait_for: on 3.11 wait_for can time out after acquire()
+            # has already succeeded, leaking the permit
+            async with asyncio.timeout(self.queue_timeout_seconds):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            self._stats["rejected"] += 1
+            raise LLMBusyError("Too many AI requests in progress")
+        finally:
+            self._waiting -= 1
+
+        self._inflight += 1
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self._inflight -= 1
+            self._semaphore.release()
+            self._stats["calls"] += 1
+            self._latencies.append(time.perf_counter() - started)
+
+    async def chat(self, **kwargs) -> Any:
+        """chat.completions.create through the pooled client.
+
+        Raises:
+            LLMBusyError: no call slot freed up within the queue timeout
+        """
+        async with self.slot():
+            return await self.client.chat.completions.create(**kwargs)
+
+    async def stream_chat(self, **kwargs) -> AsyncIterator[Any]:
+        """Streaming chat completion; the call slot is held until the stream ends."""
+        async with self.slot():
+            response = await self.client.chat.completions.create(stream=True, **kwargs)
+            async for chunk in response:
+                yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool settings, load and latency percentiles for health reporting."""
+        p50 = _percentile(self._latencies, 0.5)
+        p99 = _percentile(self._latencies, 0.99)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_connections": self.max_connections,
+            "inflight": self._inflight,
+            "waiting": self._waiting,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            **self._stats
+        }
+
+
+# Global gateway instance
+_gateway_instance: Optional[LLMGateway] = None
+
+def get_llm_gateway() -> LLMGateway:
+    """Get or create global LLM gateway instance."""
+    global _gateway_instance
+    if _gateway_instance is None:
+        _gateway_instance = LLMGateway()
+    return _gateway_instance
+
+
+async def close_llm_gateway():
+    global _gateway_instance
+    if _gateway_instance is not None:
+        await _gateway_instance.close()
+        _gateway_instance = None
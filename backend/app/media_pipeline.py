@@ -0,0 +1,299 @@
+"""
+Off-event-loop image processing for brand uploads.
+
+Decoding, resizing and encoding run in a bounded process pool so a large upload no
+longer stalls every other request on the worker. Each upload is decoded once: the
+normalised asset and all of its derivatives (PDF embed, web thumbnail, WebP) are built
+from that single decode in one pool call, together with their dimensions.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+HEADSHOT_SIZE = 600
+LOGO_HEIGHT = 200
+
+# PDF embed: what branded reports inline as base64
+PDF_MAX_DIMENSION = 800
+PDF_MAX_KB = {"headshot": 300}
+PDF_MAX_KB_DEFAULT = 200  # logos
+THUMBNAIL_SIZE = 160
+WEBP_QUALITY = 85
+
+DERIVATIVES = ("pdf", "thumb", "webp")
+
+
+class MediaError(Exception):
+    """Raised when an upload cannot be decoded or processed as an image."""
+
+
+class MediaBusyError(Exception):
+    """Raised when the processing queue is full or a job does not finish in time."""
+
+
+@dataclass
+class Rendition:
+    data: bytes
+    mime: str
+    ext: str
+    width: int
+    height: int
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+@dataclass
+class ProcessedImage:
+    primary: Rendition
+    derivatives: Dict[str, Rendition] = field(default_factory=dict)
+
+
+def _encode(image: Image.Image, fmt: str, **params) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format=fmt, **params)
+    return output.getvalue()
+
+
+def _rendition(image: Image.Image, fmt: str, mime: str, ext: str, **params) -> Rendition:
+    return Rendition(data=_encode(image, fmt, **params), mime=mime, ext=ext,
+                     width=image.width, height=image.height)
+
+
+def normalise_asset(image: Image.Image, asset_type: str) -> Image.Image:
+    """Headshots: 600x600 centre crop on white. Logos: keep transparency, height capped at 200px."""
+    if asset_type == "headshot":
+        # Headshots: convert to RGB (no transparency needed)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            if image.mode == 'RGBA':
+                # Create white background for transparency
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.split()[-1])
+                image = background
+            else:
+                image = image.convert('RGB')
+    elif image.mode in ('LA', 'P'):
+        # Logos: preserve transparency
+        image = image.convert('RGBA')
+
+    # Apply EXIF orientation; re-encoding drops the EXIF data itself
+    image = ImageOps.exif_transpose(image)
+
+    if asset_type == "headshot":
+        # Center crop to square if not already
+        width, height = image.size
+        if width != height:
+            size = min(width, height)
+            left = (width - size) // 2
+            top = (height - size) // 2
+            image = image.crop((left, top, left + size, top + size))
+        return image.resize((HEADSHOT_SIZE, HEADSHOT_SIZE), Image.Resampling.LANCZOS)
+
+    width, height = image.size
+    if height > LOGO_HEIGHT:
+        # Maintain aspect ratio, set height to 200px
+        new_width = int(LOGO_HEIGHT * (width / height))
+        image = image.resize((new_width, LOGO_HEIGHT), Image.Resampling.LANCZOS)
+    return image
+
+
+def pdf_embed(image: Image.Image, max_kb: int = PDF_MAX_KB_DEFAULT) -> Rendition:
+    """PNG when the image has transparency, otherwise JPEG; at most 800px, JPEGs re-encoded over max_kb."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        fmt, mime, ext = 'PNG', 'image/png', 'png'
+    else:
+        image = image.convert('RGB')
+        fmt, mime, ext = 'JPEG', 'image/jpeg', 'jpg'
+
+    if max(image.width, image.height) > PDF_MAX_DIMENSION:
+        image = image.copy()
+        image.thumbnail((PDF_MAX_DIMENSION, PDF_MAX_DIMENSION), Image.Resampling.LANCZOS)
+
+    if fmt == 'PNG':
+        return _rendition(image, fmt, mime, ext, optimize=True)
+    rendition = _rendition(image, fmt, mime, ext, quality=85, optimize=True)
+    if rendition.size > max_kb * 1024:
+        rendition = _rendition(image, fmt, mime, ext, quality=60, optimize=True)
+    return rendition
+
+
+def thumbnail(image: Image.Image) -> Rendition:
+    thumb = image.copy()
+    thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+    return _rendition(thumb, 'PNG', 'image/png', 'png', optimize=True)
+
+
+def webp(image: Image.Image) -> Rendition:
+    return _rendition(image, 'WEBP', 'image/webp', 'webp', quality=WEBP_QUALITY, method=4)
+
+
+def process_brand_image(image_data: bytes, asset_type: str) -> ProcessedImage:
+    """
+    Decode once and build the stored PNG plus every derivative. Runs in a pool worker.
+
+    Raises:
+        MediaError: the upload is not a decodable image
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as source:
+            image = normalise_asset(source, asset_type)
+            return ProcessedImage(
+                primary=_rendition(image, 'PNG', 'image/png', 'png', optimize=True),
+                derivatives={
+                    "pdf": pdf_embed(image, PDF_MAX_KB.get(asset_type, PDF_MAX_KB_DEFAULT)),
+                    "thumb": thumbnail(image),
+                    "webp": webp(image)
+                }
+            )
+    except Exception as e:
+        raise MediaError(str(e)) from None
+
+
+def _warm_up() -> bool:
+    return True
+
+
+class MediaPipeline:
+    """
+    Bounded pool for image work. At most max_workers jobs run at once and at most
+    max_queue wait; further uploads are rejected instead of piling up.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        use_processes: bool = True
+    ):
+        config = get_config()
+        self.max_workers = max(1, max_workers or config.MEDIA_WORKERS)
+        self.max_queue = config.MEDIA_MAX_QUEUE if max_queue is None else max_queue
+        self.timeout_seconds = timeout_seconds or config.MEDIA_TIMEOUT_SECONDS
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._stats = {"processed": 0, "failed": 0, "rejected": 0, "timeouts": 0, "pool_restarts": 0}
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                # spawn: forking a process that holds Motor/httpx threads is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="media")
+        return self._executor
+
+    async def start(self):
+        """Create the pool and start a worker so the first upload doesn't pay for spawning."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, _warm_up)
+        logger.info(f"Media pipeline started with {self.max_workers} workers")
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _discard(self, executor: Executor):
+        """Drop a broken pool so the next job gets a fresh one. A pool that already
+        replaced it (another job saw the same failure first) is left alone."""
+        if self._executor is not executor:
+            return
+        self._stats["pool_restarts"] += 1
+        logger.error("Media worker process died - restarting pool")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def _submit(self, image_data: bytes, asset_type: str) -> Tuple[Executor, Future]:
+        """Submit to the pool, replacing it once if a worker died since the last job."""
+        for _ in range(2):
+            executor = self.executor
+            try:
+                return executor, executor.submit(process_brand_image, image_data, asset_type)
+            except BrokenProcessPool:
+                self._discard(executor)
+        self._stats["failed"] += 1
+        raise MediaBusyError("Image processing is unavailable")
+
+    async def process(self, image_data: bytes, asset_type: str) -> ProcessedImage:
+        """
+        Normalise an uploaded brand image and build its derivatives off the event loop.
+
+        Raises:
+            MediaError: the upload is not a decodable image
+            MediaBusyError: queue full, or the job didn't finish within the timeout
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self._stats["rejected"] += 1
+            raise MediaBusyError("Image processing queue is full")
+
+        loop = asyncio.get_running_loop()
+        executor, future = self._submit(image_data, asset_type)
+        self._pending += 1
+        # The slot is freed when the work really finishes: a timed-out job keeps running
+        # in its worker and must keep counting against the queue bound until then
+        future.add_done_callback(lambda _: self._release_threadsafe(loop))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout_seconds)
+            self._stats["processed"] += 1
+            return result
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise MediaBusyError("Image processing timed out")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the pool for the next upload
+            self._stats["failed"] += 1
+            self._discard(executor)
+            raise MediaError("Image could not be processed")
+        except MediaError:
+            self._stats["failed"] += 1
+            raise
+
+    def _release(self):
+        self._pending -= 1
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        """Done-callbacks run on the executor's thread; hop back to the event loop."""
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Loop already closed (shutdown); nothing is waiting on the count any more
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "processes": self.use_processes,
+            "pending": self._pending,
+            "max_queue": self.max_queue,
+            **self._stats
+        }
+
+
+# Global pipeline instance
+_pipeline_instance: Optional[MediaPipeline] = None
+
+def get_media_pipeline() -> MediaPipeline:
+    """Get or create global media pipeline instance."""
+    global _pipeline_instance
+    if _pipeline_instance is None:
+        _pipeline_instance = MediaPipeline()
+    return _pipeline_instance
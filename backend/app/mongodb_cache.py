@@ -1,14 +1,16 @@
 """
 MongoDB-based caching and rate limiting system.
 Replaces Redis for Emergent deployment compatibility.
+All database calls go through Motor so cache and rate-limit checks never block the event loop.
 """
 import json
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, Any, Union
-import pymongo
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.database import get_client
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from config import get_config
 
 logger = logging.getLogger(__name__)
@@ -16,125 +18,130 @@ logger = logging.getLogger(__name__)
 class MongoDBCache:
     """
     MongoDB-based caching system that replaces Redis functionality.
-    Uses TTL indexes for automatic cache expiration.
+    Uses TTL indexes for automatic cache expiration (declared in app.db_indexes).
     """
-    
+
     def __init__(self):
         self.config = get_config()
-        self._client: Optional[MongoClient] = None
+        self._client: Optional[AsyncIOMotorClient] = None
         self._db = None
         self._cache_collection = None
         self._rate_limit_collection = None
+        self._connected = False
         self._connect()
-    
+
     def _connect(self):
-        """Initialize MongoDB connection and create collections."""
+        """Attach to the shared Motor client. Connections are opened lazily on first use."""
         try:
             if not self.config.MONGO_URL:
                 logger.error("MongoDB URL not configured")
                 return
-            
-            self._client = MongoClient(self.config.MONGO_URL)
+
+            self._client = get_client()
             self._db = self._client[self.config.DB_NAME]
-            
-            # Cache collection with TTL index
             self._cache_collection = self._db.cache
-            self._cache_collection.create_index(
-                "expires_at", 
-                expireAfterSeconds=0,
-                background=True
-            )
-            
-            # Rate limiting collection with TTL index
             self._rate_limit_collection = self._db.rate_limits
-            self._rate_limit_collection.create_index(
-                "expires_at", 
-                expireAfterSeconds=0,
-                background=True
-            )
-            
-            # Test connection
-            self._client.admin.command('ping')
+
+            # Assume reachable until a ping or operation says otherwise
+            self._connected = True
             logger.info("MongoDB cache system initialized successfully")
-            
+
         except Exception as e:
             logger.error(f"Failed to initialize MongoDB cache: {e}")
             self._client = None
-    
+
     def is_connected(self) -> bool:
-        """Check if MongoDB connection is active."""
+        """Last known connection state (updated by ping() and cache operations)."""
+        return self._client is not None and self._connected
+
+    async def ping(self) -> bool:
+        """Round-trip to MongoDB and update the connection state."""
+        if self._client is None:
+            return False
         try:
-            if self._client:
-                self._client.admin.command('ping')
-                return True
+            await self._client.admin.command('ping')
+            self._connected = True
         except Exception:
-            pass
-        return False
-    
+            self._connected = False
+        return self._connected
+
+    def _mark_error(self, e: Exception):
+        if isinstance(e, PyMongoError):
+            self._connected = False
+
     async def get(self, key: str) -> Optional[str]:
         """Get cached value by key."""
         if self._cache_collection is None:
             return None
-        
+
         try:
-            doc = self._cache_collection.find_one({"_id": key})
-            if doc and doc.get("expires_at", datetime.now(timezone.utc)) > datetime.now(timezone.utc):
+            doc = await self._cache_collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+            )
+            self._connected = True
+            if doc:
                 return doc.get("value")
         except Exception as e:
+            self._mark_error(e)
             logger.error(f"Cache get error for key {key}: {e}")
-        
+
         return None
-    
+
     async def set(self, key: str, value: str, ttl_seconds: int = 3600) -> bool:
         """Set cached value with TTL."""
         if self._cache_collection is None:
             return False
-        
+
         try:
-            expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
-            
-            self._cache_collection.replace_one(
+            now = datetime.now(timezone.utc)
+            expires_at = now + timedelta(seconds=ttl_seconds)
+
+            await self._cache_collection.replace_one(
                 {"_id": key},
                 {
                     "_id": key,
                     "value": value,
-                    "created_at": datetime.now(timezone.utc),
+                    "created_at": now,
                     "expires_at": expires_at
                 },
                 upsert=True
             )
+            self._connected = True
             return True
         except Exception as e:
+            self._mark_error(e)
             logger.error(f"Cache set error for key {key}: {e}")
             return False
-    
+
     async def delete(self, key: str) -> bool:
         """Delete cached value."""
         if self._cache_collection is None:
             return False
-        
+
         try:
-            result = self._cache_collection.delete_one({"_id": key})
+            result = await self._cache_collection.delete_one({"_id": key})
             return result.deleted_count > 0
         except Exception as e:
+            self._mark_error(e)
             logger.error(f"Cache delete error for key {key}: {e}")
             return False
-    
+
     async def exists(self, key: str) -> bool:
         """Check if key exists in cache."""
         if self._cache_collection is None:
             return False
-        
+
         try:
-            doc = self._cache_collection.find_one(
+            doc = await self._cache_collection.find_one(
                 {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
                 {"_id": 1}
             )
             return doc is not None
         except Exception as e:
+            self._mark_error(e)
             logger.error(f"Cache exists error for key {key}: {e}")
             return False
-    
+
     async def get_json(self, key: str) -> Optional[Dict]:
         """Get cached JSON value."""
         value = await self.get(key)
@@ -144,7 +151,7 @@ class MongoDBCache:
             except json.JSONDecodeError:
                 logger.error(f"Invalid JSON in cache for key {key}")
         return None
-    
+
     async def set_json(self, key: str, value: Dict, ttl_seconds: int = 3600) -> bool:
         """Set cached JSON value."""
         try:
@@ -153,64 +160,68 @@ class MongoDBCache:
         except Exception as e:
             logger.error(f"Cache set_json error for key {key}: {e}")
             return False
-    
+
     # Rate limiting methods
     async def rate_limit_check(self, key: str, limit: int, window_seconds: int) -> Dict[str, Any]:
         """
         Check and update rate limit for a key.
         Returns: {"allowed": bool, "remaining": int, "reset_time": datetime}
+
+        One counter document per key per fixed window, incremented with a single atomic
+        find_one_and_update; the TTL index on expires_at removes old windows.
         """
         if self._rate_limit_collection is None:
             # Fallback: allow request but log warning
             logger.warning("Rate limiting unavailable - MongoDB not connected")
             return {"allowed": True, "remaining": limit - 1, "reset_time": datetime.now(timezone.utc)}
-        
+
         try:
             now = datetime.now(timezone.utc)
-            window_start = now - timedelta(seconds=window_seconds)
-            reset_time = now + timedelta(seconds=window_seconds)
-            
-            # Clean up old entries and count current requests
-            self._rate_limit_collection.delete_many({
-                "key": key,
-                "timestamp": {"$lt": window_start}
-            })
-            
-            current_count = self._rate_limit_collection.count_documents({
-                "key": key,
-                "timestamp": {"$gte": window_start}
-            })
-            
-            if current_count >= limit:
-                return {
-                    "allowed": False,
-                    "remaining": 0,
-                    "reset_time": reset_time
-                }
-            
-            # Record this request
-            self._rate_limit_collection.insert_one({
-                "key": key,
-                "timestamp": now,
-                "expires_at": reset_time  # TTL cleanup
-            })
-            
+            bucket = int(now.timestamp()) // window_seconds
+            reset_time = datetime.fromtimestamp((bucket + 1) * window_seconds, tz=timezone.utc)
+
+            count = await self.increment_window(key, bucket, reset_time)
+            self._connected = True
+
             return {
-                "allowed": True,
-                "remaining": limit - current_count - 1,
+                "allowed": count <= limit,
+                "remaining": max(0, limit - count),
                 "reset_time": reset_time
             }
-            
+
         except Exception as e:
+            self._mark_error(e)
             logger.error(f"Rate limit check error for key {key}: {e}")
             # Fail open - allow the request
             return {"allowed": True, "remaining": limit - 1, "reset_time": datetime.now(timezone.utc)}
-    
+
+    async def increment_window(self, key: str, bucket: int, reset_time: datetime, amount: int = 1) -> int:
+        """Atomically add to a window counter and return the new total."""
+        update = {
+            "$inc": {"count": amount},
+            "$setOnInsert": {"key": key, "expires_at": reset_time}
+        }
+        try:
+            doc = await self._rate_limit_collection.find_one_and_update(
+                {"_id": f"{key}:{bucket}"},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two first-hits raced on the upsert; the document exists now
+            doc = await self._rate_limit_collection.find_one_and_update(
+                {"_id": f"{key}:{bucket}"},
+                update,
+                return_document=ReturnDocument.AFTER
+            )
+        return doc["count"] if doc else amount
+
     async def close(self):
-        """Close MongoDB connection."""
-        if self._client:
-            self._client.close()
-            logger.info("MongoDB cache connection closed")
+        """Detach from MongoDB. The shared client itself is closed by app.database."""
+        self._client = None
+        self._cache_collection = None
+        self._rate_limit_collection = None
 
 
 # Global cache instance
@@ -237,4 +248,4 @@ async def cache_delete(key: str) -> bool:
 
 async def rate_limit_check(key: str, limit: int, window_seconds: int) -> Dict[str, Any]:
     """Convenience function for rate limiting."""
-    return await get_cache().rate_limit_check(key, limit, window_seconds)
\ No newline at end of file
+    return await get_cache().rate_limit_check(key, limit, window_seconds)
@@ -0,0 +1,7 @@
+"""
+Shared pieces of cursor (keyset) pagination.
+"""
+
+
+class CursorError(ValueError):
+    """Malformed or mismatched pagination cursor."""
@@ -0,0 +1,205 @@
+"""
+Content-addressed cache for rendered report PDFs.
+Entries are keyed by a hash of the final HTML, the page options and the template version,
+so an identical report is only sent through Chromium once.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering pipeline changes in a way the HTML does not capture
+PDF_CACHE_VERSION = "1"
+
+
+def make_pdf_cache_key(html: str, page_options: Optional[Dict[str, Any]] = None, template_version: str = "") -> str:
+    """SHA-256 over the rendered HTML, page options and template version."""
+    digest = hashlib.sha256()
+    digest.update(PDF_CACHE_VERSION.encode())
+    digest.update(b"\0")
+    digest.update(template_version.encode())
+    digest.update(b"\0")
+    digest.update(json.dumps(page_options or {}, sort_keys=True, default=str).encode())
+    digest.update(b"\0")
+    digest.update(html.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def make_etag(key: str) -> str:
+    """Strong ETag for a cache key."""
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header (may be a list or *) against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class PDFCache:
+    """
+    Two-tier PDF cache: a byte-bounded in-memory LRU in front of a TTL'd disk directory.
+    Disk I/O runs in a worker thread so cache hits never block the event loop.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: Optional[int] = None,
+        disk_dir: Optional[str] = None,
+        ttl_seconds: Optional[int] = None
+    ):
+        config = get_config()
+        self.memory_bytes = memory_bytes if memory_bytes is not None else config.PDF_CACHE_MEMORY_MB * 1024 * 1024
+        self.ttl_seconds = ttl_seconds or config.PDF_CACHE_TTL_SECONDS
+        disk_dir = disk_dir if disk_dir is not None else config.PDF_CACHE_DIR
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._last_sweep = 0.0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+
+        if self.disk_dir:
+            try:
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                logger.warning(f"PDF disk cache disabled - cannot create {self.disk_dir}: {e}")
+                self.disk_dir = None
+
+    # Memory tier
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+        return data
+
+    def _memory_put(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self._stats["memory_evictions"] += 1
+
+    # Disk tier
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.pdf"
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                self._stats["disk_evictions"] += 1
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _disk_put(self, key: str, data: bytes):
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent readers never see a partial PDF
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self._sweep_expired()
+
+    def _sweep_expired(self):
+        """Remove expired files at most once per TTL/10."""
+        now = time.time()
+        if now - self._last_sweep < max(60, self.ttl_seconds / 10):
+            return
+        self._last_sweep = now
+        for path in self.disk_dir.glob("*/*.pdf"):
+            try:
+                if now - path.stat().st_mtime > self.ttl_seconds:
+                    path.unlink(missing_ok=True)
+                    self._stats["disk_evictions"] += 1
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Look up a PDF in memory, then on disk (promoting disk hits to memory)."""
+        data = self._memory_get(key)
+        if data is not None:
+            self._stats["memory_hits"] += 1
+            return data
+
+        if self.disk_dir:
+            try:
+                data = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                logger.error(f"PDF disk cache read error for {key[:12]}: {e}")
+                data = None
+            if data is not None:
+                self._stats["disk_hits"] += 1
+                self._memory_put(key, data)
+                return data
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, data: bytes):
+        """Store a PDF in both tiers."""
+        self._memory_put(key, data)
+        self._stats["stores"] += 1
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._disk_put, key, data)
+            except Exception as e:
+                logger.error(f"PDF disk cache write error for {key[:12]}: {e}")
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, bool]:
+        """Return (pdf_bytes, was_cached), calling render() on a miss."""
+        data = await self.get(key)
+        if data is not None:
+            return data, True
+        data = await render()
+        await self.set(key, data)
+        return data, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for health reporting."""
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "disk_enabled": self.disk_dir is not None
+        }
+
+
+# Global PDF cache instance
+_pdf_cache_instance: Optional[PDFCache] = None
+
+def get_pdf_cache() -> PDFCache:
+    """Get or create global PDF cache instance."""
+    global _pdf_cache_instance
+    if _pdf_cache_instance is None:
+        _pdf_cache_instance = PDFCache()
+    return _pdf_cache_instance
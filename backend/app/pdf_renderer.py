@@ -0,0 +1,292 @@
+"""
+Pooled headless Chromium renderer for PDF generation.
+One browser and a bounded set of warm pages are kept alive for the lifetime of the app
+instead of launching Chromium for every report download.
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Browser bundle installed on the Emergent image
+DEFAULT_BROWSERS_PATH = "/pw-browsers"
+DEFAULT_EXECUTABLE_PATH = "/pw-browsers/chromium_headless_shell-1187/chrome-linux/headless_shell"
+
+CHROMIUM_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-accelerated-2d-canvas',
+    '--no-first-run',
+    '--disable-gpu'
+]
+
+LETTER_PDF_OPTIONS = {
+    "format": "Letter",
+    "print_background": True,
+    "margin": {"top": "0.5in", "right": "0.5in", "bottom": "0.5in", "left": "0.5in"}
+}
+
+# Investor report: honour the template's @page size
+EXACT_PDF_OPTIONS = {
+    "print_background": True,
+    "prefer_css_page_size": True,
+    "margin": {"top": "0.5in", "right": "0.5in", "bottom": "0.5in", "left": "0.5in"},
+    "scale": 1,
+    "display_header_footer": False
+}
+
+
+class RendererBusyError(Exception):
+    """Raised when too many renders are already queued for a page."""
+
+
+class RendererUnavailableError(Exception):
+    """Raised when Chromium cannot be started."""
+
+
+@dataclass
+class _PageSlot:
+    """A pooled browser context/page pair. page is None until (re)created."""
+    context: Any = None
+    page: Any = None
+    generation: int = 0
+    renders: int = 0
+
+
+class PDFRenderer:
+    """
+    Bounded pool of warm Chromium pages.
+    Pages are recycled after a fixed number of renders or after any failure, and the
+    browser is relaunched if it disconnects. Callers beyond the queue limit are rejected.
+    """
+
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        max_renders_per_page: Optional[int] = None,
+        max_queue_depth: Optional[int] = None,
+        timeout_seconds: Optional[int] = None,
+        executable_path: Optional[str] = None
+    ):
+        config = get_config()
+        self.pool_size = max(1, pool_size or config.PDF_RENDER_POOL_SIZE)
+        self.max_renders_per_page = max(1, max_renders_per_page or config.PDF_RENDER_MAX_PER_PAGE)
+        self.max_queue_depth = max_queue_depth if max_queue_depth is not None else config.PDF_RENDER_MAX_QUEUE
+        self.timeout_seconds = timeout_seconds or config.PDF_RENDER_TIMEOUT_SECONDS
+        self.executable_path = executable_path or config.PDF_BROWSER_EXECUTABLE or self._detect_executable()
+
+        self._playwright = None
+        self._browser = None
+        self._generation = 0
+        self._slots: Optional[asyncio.Queue] = None
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+        self._stats = {
+            "renders": 0,
+            "failures": 0,
+            "rejected": 0,
+            "pages_recycled": 0,
+            "browser_restarts": 0
+        }
+
+    @staticmethod
+    def _detect_executable() -> Optional[str]:
+        """Use the bundled headless shell when present, otherwise Playwright's default."""
+        if os.path.isdir(DEFAULT_BROWSERS_PATH):
+            os.environ.setdefault('PLAYWRIGHT_BROWSERS_PATH', DEFAULT_BROWSERS_PATH)
+        if os.path.exists(DEFAULT_EXECUTABLE_PATH):
+            return DEFAULT_EXECUTABLE_PATH
+        return None
+
+    def _browser_alive(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _launch_browser(self):
+        """Launch (or relaunch) Chromium. Caller must hold self._lock."""
+        if self._playwright is None:
+            try:
+                from playwright.async_api import async_playwright
+            except ImportError as e:
+                raise RendererUnavailableError("Playwright is not installed") from e
+            self._playwright = await async_playwright().start()
+
+        if self._browser is not None:
+            self._stats["browser_restarts"] += 1
+            logger.warning("PDF renderer browser disconnected - relaunching Chromium")
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+
+        launch_kwargs = {"headless": True, "args": CHROMIUM_ARGS}
+        if self.executable_path:
+            launch_kwargs["executable_path"] = self.executable_path
+
+        try:
+            self._browser = await self._playwright.chromium.launch(**launch_kwargs)
+        except Exception as e:
+            self._browser = None
+            raise RendererUnavailableError(f"Failed to launch Chromium: {e}") from e
+
+        # Pages created against an older browser are replaced on next checkout
+        self._generation += 1
+
+    async def start(self):
+        """Launch Chromium and warm the page pool. Safe to call more than once."""
+        async with self._lock:
+            if not self._browser_alive():
+                await self._launch_browser()
+
+            if self._slots is None:
+                # Only publish the pool once every page is open; a partial pool would
+                # leave render() waiting on slots that never come back
+                slots: asyncio.Queue = asyncio.Queue()
+                try:
+                    for _ in range(self.pool_size):
+                        slots.put_nowait(await self._open_slot())
+                except Exception:
+                    while not slots.empty():
+                        await self._close_slot(slots.get_nowait())
+                    raise
+                self._slots = slots
+                logger.info(f"PDF renderer started with {self.pool_size} warm pages")
+
+    async def stop(self):
+        """Close all pages, the browser and the Playwright driver."""
+        async with self._lock:
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception as e:
+                    logger.warning(f"Error closing PDF renderer browser: {e}")
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception as e:
+                    logger.warning(f"Error stopping Playwright: {e}")
+            self._browser = None
+            self._playwright = None
+            self._slots = None
+            logger.info("PDF renderer stopped")
+
+    async def _open_slot(self) -> _PageSlot:
+        context = await self._browser.new_context()
+        page = await context.new_page()
+        return _PageSlot(context=context, page=page, generation=self._generation)
+
+    async def _ensure_slot(self, slot: _PageSlot) -> _PageSlot:
+        """Return a usable slot, relaunching the browser or page if needed."""
+        if slot.page is not None and slot.generation == self._generation and self._browser_alive():
+            return slot
+
+        async with self._lock:
+            if not self._browser_alive():
+                await self._launch_browser()
+            await self._close_slot(slot)
+            return await self._open_slot()
+
+    async def _close_slot(self, slot: _PageSlot):
+        if slot.context is not None:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+
+    async def _recycle(self, slot: _PageSlot) -> _PageSlot:
+        """Replace a slot's page. Never raises; a failed reopen is retried on next checkout."""
+        self._stats["pages_recycled"] += 1
+        await self._close_slot(slot)
+        try:
+            if self._browser_alive():
+                return await self._open_slot()
+        except Exception as e:
+            logger.warning(f"Failed to reopen PDF renderer page: {e}")
+        return _PageSlot()
+
+    async def _render_on_page(self, page, html: str, pdf_options: Dict[str, Any],
+                              emulate_screen: bool, wait_for_fonts: bool) -> bytes:
+        await page.emulate_media(media='screen' if emulate_screen else 'print')
+        await page.set_content(html, wait_until="networkidle", timeout=self.timeout_seconds * 1000)
+        if wait_for_fonts:
+            await page.evaluate('() => document.fonts && document.fonts.ready')
+            await page.wait_for_timeout(50)
+        return await page.pdf(**pdf_options)
+
+    async def render(
+        self,
+        html: str,
+        pdf_options: Optional[Dict[str, Any]] = None,
+        emulate_screen: bool = False,
+        wait_for_fonts: bool = False
+    ) -> bytes:
+        """
+        Render HTML to PDF bytes on a pooled page.
+
+        Raises:
+            RendererBusyError: queue limit reached or no page freed up within the timeout
+            RendererUnavailableError: Chromium could not be started
+        """
+        if self._waiting >= self.max_queue_depth:
+            self._stats["rejected"] += 1
+            raise RendererBusyError("PDF renderer queue is full")
+
+        if self._slots is None or not self._browser_alive():
+            await self.start()
+
+        self._waiting += 1
+        try:
+            slot = await asyncio.wait_for(self._slots.get(), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            raise RendererBusyError("Timed out waiting for a PDF renderer page")
+        finally:
+            self._waiting -= 1
+
+        healthy = False
+        try:
+            slot = await self._ensure_slot(slot)
+            pdf_bytes = await asyncio.wait_for(
+                self._render_on_page(slot.page, html, pdf_options or LETTER_PDF_OPTIONS,
+                                     emulate_screen, wait_for_fonts),
+                timeout=self.timeout_seconds
+            )
+            slot.renders += 1
+            healthy = True
+            self._stats["renders"] += 1
+            return pdf_bytes
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            if not healthy or slot.renders >= self.max_renders_per_page:
+                slot = await self._recycle(slot)
+            if self._slots is not None:
+                self._slots.put_nowait(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool state and counters for health reporting."""
+        return {
+            "running": self._browser_alive(),
+            "pool_size": self.pool_size,
+            "idle_pages": self._slots.qsize() if self._slots is not None else 0,
+            "waiting": self._waiting,
+            "max_queue_depth": self.max_queue_depth,
+            **self._stats
+        }
+
+
+# Global renderer instance
+_renderer_instance: Optional[PDFRenderer] = None
+
+def get_pdf_renderer() -> PDFRenderer:
+    """Get or create global PDF renderer instance."""
+    global _renderer_instance
+    if _renderer_instance is None:
+        _renderer_instance = PDFRenderer()
+    return _renderer_instance
@@ -0,0 +1,193 @@
+"""
+Streaming P&L export (CSV and XLSX).
+Deals and expenses are read through async cursors in batches and turned into rows as
+they arrive, so memory stays flat regardless of how many rows a user has.
+
+CSV is streamed to the client as it is produced. XLSX uses openpyxl's write-only
+workbook (rows are spooled to temp files rather than held in memory); the zip container
+can only be finalised at the end, so the workbook is saved to a temp file off the event
+loop and then streamed from disk.
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rows per cursor batch and per CSV chunk / worksheet append
+BATCH_SIZE = 1000
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK_SIZE = 64 * 1024
+
+COLUMNS = [
+    "Type", "Date", "Month", "Description", "Category", "Lead Source", "Sale Price",
+    "Commission %", "Split %", "Team/Brokerage %", "Cap Amount", "Income", "Expense", "Budget"
+]
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+_YEAR_RE = re.compile(r"^\d{4}$")
+
+# Spreadsheet apps evaluate a cell starting with one of these as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ExportError(ValueError):
+    """Invalid export parameters."""
+
+
+def normalize_format(format: str) -> str:
+    """'csv' or 'xlsx' ('excel' is accepted for the original API)."""
+    value = (format or "").lower()
+    if value in ("excel", "xlsx"):
+        return "xlsx"
+    if value == "csv":
+        return "csv"
+    raise ExportError("format must be csv or xlsx")
+
+
+def month_range(month: Optional[str], year: Optional[str]) -> Tuple[str, str]:
+    """Inclusive YYYY-MM range for the filters; defaults to the current year."""
+    if month:
+        if not _MONTH_RE.match(month):
+            raise ExportError("month must be YYYY-MM")
+        return month, month
+    year = year or str(datetime.now(timezone.utc).year)
+    if not _YEAR_RE.match(str(year)):
+        raise ExportError("year must be YYYY")
+    return f"{year}-01", f"{year}-12"
+
+
+def export_filename(start: str, end: str, category: Optional[str], fmt: str) -> str:
+    scope = start if start == end else start[:4]
+    if category:
+        scope += "-" + re.sub(r"[^A-Za-z0-9]+", "-", category).strip("-").lower()
+    return f"pnl-export-{scope}.{fmt}"
+
+
+def _text(value: Any) -> Any:
+    """User-entered text as an inert cell: a leading formula character is quoted with '."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def deal_row(deal: Dict[str, Any]) -> List[Any]:
+    return [
+        "Deal", deal.get("closing_date", ""), deal.get("month", ""), _text(deal.get("house_address", "")), "",
+        _text(deal.get("lead_source", "")), deal.get("amount_sold_for"), deal.get("commission_percent"),
+        deal.get("split_percent"), deal.get("team_brokerage_split_percent"), deal.get("cap_amount", 0),
+        deal.get("final_income", 0), None, None
+    ]
+
+
+def expense_row(expense: Dict[str, Any]) -> List[Any]:
+    return [
+        "Expense", expense.get("date", ""), expense.get("month", ""), _text(expense.get("description") or ""),
+        _text(expense.get("category", "")), "", None, None, None, None, None, None,
+        expense.get("amount", 0), expense.get("budget", 0)
+    ]
+
+
+async def export_rows(db, user_id: str, start: str, end: str,
+                      category: Optional[str] = None) -> AsyncIterator[List[Any]]:
+    """
+    Rows for the user's deals then expenses in [start, end] months.
+    A category restricts the export to expenses in that category.
+    Sorts follow the (user_id, month, date) indexes so MongoDB never sorts in memory.
+    """
+    months = {"$gte": start, "$lte": end}
+    if not category:
+        deals = db.pnl_deals.find(
+            {"user_id": user_id, "month": months}, {"_id": 0}
+        ).sort([("month", 1), ("closing_date", 1)]).batch_size(BATCH_SIZE)
+        async for deal in deals:
+            yield deal_row(deal)
+
+    expense_query = {"user_id": user_id, "month": months}
+    if category:
+        expense_query["category"] = category
+    expenses = db.pnl_expenses.find(
+        expense_query, {"_id": 0}
+    ).sort([("month", 1), ("date", 1)]).batch_size(BATCH_SIZE)
+    async for expense in expenses:
+        yield expense_row(expense)
+
+
+def _csv_value(value: Any) -> Any:
+    return "" if value is None else value
+
+
+async def csv_stream(rows: AsyncIterable[List[Any]]) -> AsyncIterator[bytes]:
+    """Encode rows as CSV, yielding one chunk per BATCH_SIZE rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens UTF-8 exports correctly
+    buffer.write("\ufeff")
+    writer.writerow(COLUMNS)
+    pending = 0
+    async for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+        pending += 1
+        if pending >= BATCH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _append_rows(worksheet, rows: List[List[Any]]):
+    for row in rows:
+        worksheet.append(row)
+
+
+async def xlsx_stream(rows: AsyncIterable[List[Any]]) -> AsyncIterator[bytes]:
+    """Build a write-only workbook off the event loop, then stream the saved file."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("P&L")
+    worksheet.append(COLUMNS)
+
+    batch: List[List[Any]] = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            await asyncio.to_thread(_append_rows, worksheet, batch)
+            batch = []
+    if batch:
+        await asyncio.to_thread(_append_rows, worksheet, batch)
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="pnl_export_")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(workbook.save, path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def stream_export(rows: AsyncIterable[List[Any]], fmt: str) -> AsyncIterator[bytes]:
+    return csv_stream(rows) if fmt == "csv" else xlsx_stream(rows)
+
+
+def media_type(fmt: str) -> str:
+    return CSV_MEDIA_TYPE if fmt == "csv" else XLSX_MEDIA_TYPE
@@ -0,0 +1,390 @@
+"""
+Materialized per-user monthly P&L rollups.
+One pnl_monthly_rollups document per user-month holds income, expenses, per-category
+spend, deal counts and lead-source totals. The P&L write endpoints keep it current with
+$inc deltas so summary views read O(months) documents instead of every transaction.
+
+A user's rollups are trusted once a full rebuild has finished for them, which is recorded
+in pnl_rollup_state. Users with transactions but no such marker (accounts that predate the
+rollups) are rebuilt in the background at startup (start_rollup_backfill). Rollups can be
+rebuilt from pnl_deals / pnl_expenses and checked for drift:
+
+    python -m app.pnl_rollups verify [--user USER_ID]
+    python -m app.pnl_rollups rebuild [--user USER_ID]
+"""
+import asyncio
+import json
+import logging
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DeleteMany, ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "pnl_monthly_rollups"
+# {_id: user_id, rollups_initialized: True} once a rebuild has completed for the user
+STATE_COLLECTION = "pnl_rollup_state"
+
+# Totals tracked at the top level of each rollup document
+TOTAL_FIELDS = ("income", "expenses", "deals_count", "closed_deals_count", "expenses_count")
+
+# Differences below this are float noise from repeated $inc
+TOLERANCE = 0.01
+
+_DEAL_FIELDS = {"user_id": 1, "month": 1, "closing_date": 1, "date": 1,
+                "final_income": 1, "commission": 1, "lead_source": 1}
+_EXPENSE_FIELDS = {"user_id": 1, "month": 1, "date": 1, "amount": 1, "category": 1}
+
+
+def rollup_id(user_id: str, month: str) -> str:
+    return f"{user_id}:{month}"
+
+
+def _encode_key(name: Optional[str], default: str) -> str:
+    """Category / lead source names become field names, so '.' and a leading '$' are escaped."""
+    name = (name or "").strip() or default
+    name = name.replace(".", "\uff0e")
+    if name.startswith("$"):
+        name = "\uff04" + name[1:]
+    return name
+
+
+def _decode_key(name: str) -> str:
+    name = name.replace("\uff0e", ".")
+    if name.startswith("\uff04"):
+        name = "$" + name[1:]
+    return name
+
+
+def deal_month(deal: Dict[str, Any]) -> Optional[str]:
+    """YYYY-MM a deal is counted in (older records may only carry `date`)."""
+    if deal.get("month"):
+        return deal["month"]
+    date = deal.get("closing_date") or deal.get("date")
+    return date[:7] if date else None
+
+
+def expense_month(expense: Dict[str, Any]) -> Optional[str]:
+    if expense.get("month"):
+        return expense["month"]
+    date = expense.get("date")
+    return date[:7] if date else None
+
+
+def deal_delta(deal: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    """$inc fields for adding (sign=1) or removing (sign=-1) a deal."""
+    income = float(deal.get("final_income", deal.get("commission", 0)) or 0)
+    source = _encode_key(deal.get("lead_source"), "Unknown")
+    delta = {
+        "income": sign * income,
+        "deals_count": sign,
+        f"lead_sources.{source}.income": sign * income,
+        f"lead_sources.{source}.count": sign,
+    }
+    if deal.get("closing_date"):
+        delta["closed_deals_count"] = sign
+    return delta
+
+
+def expense_delta(expense: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    """$inc fields for adding (sign=1) or removing (sign=-1) an expense."""
+    amount = float(expense.get("amount", 0) or 0)
+    category = _encode_key(expense.get("category"), "Uncategorized")
+    return {
+        "expenses": sign * amount,
+        "expenses_count": sign,
+        f"categories.{category}.amount": sign * amount,
+        f"categories.{category}.count": sign,
+    }
+
+
+def _merge(changes: Iterable[Tuple[Optional[str], Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """Combine deltas per month, dropping fields that cancel out."""
+    merged: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for month, inc in changes:
+        if not month:
+            continue
+        for field, value in inc.items():
+            merged[month][field] += value
+    return {
+        month: {field: value for field, value in inc.items() if value}
+        for month, inc in merged.items()
+    }
+
+
+def _apply_inc(doc: Dict[str, Any], inc: Dict[str, float]):
+    """Apply a dotted-path $inc to a plain dict (used when rebuilding in memory)."""
+    for path, value in inc.items():
+        target = doc
+        *parents, leaf = path.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = target.get(leaf, 0) + value
+
+
+def build_rollups(deals: Iterable[Dict[str, Any]], expenses: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Rollup documents (without _id/user_id) per month computed from raw transactions."""
+    rollups: Dict[str, Dict[str, Any]] = {}
+    changes = [(deal_month(d), deal_delta(d)) for d in deals]
+    changes += [(expense_month(e), expense_delta(e)) for e in expenses]
+    for month, inc in changes:
+        if not month:
+            continue
+        doc = rollups.setdefault(month, {"month": month, **{f: 0 for f in TOTAL_FIELDS},
+                                         "categories": {}, "lead_sources": {}})
+        _apply_inc(doc, inc)
+    return rollups
+
+
+async def apply_changes(db, user_id: str, changes: Iterable[Tuple[Optional[str], Dict[str, float]]]):
+    """
+    $inc the rollups for user_id, one upsert per affected month.
+    Failures are logged rather than raised: the transaction itself has already been
+    written, and any drift is repaired by `python -m app.pnl_rollups rebuild`.
+    """
+    merged = _merge(changes)
+    if not merged:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    operations = [
+        UpdateOne(
+            {"_id": rollup_id(user_id, month)},
+            {
+                "$inc": inc,
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"user_id": user_id, "month": month}
+            },
+            upsert=True
+        )
+        for month, inc in merged.items() if inc
+    ]
+    if not operations:
+        return
+    try:
+        await db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.error(f"P&L rollup update failed for user {user_id} months {sorted(merged)}: {e}")
+
+
+async def record_deals(db, user_id: str, deals: Iterable[Dict[str, Any]], sign: int = 1):
+    await apply_changes(db, user_id, [(deal_month(d), deal_delta(d, sign)) for d in deals])
+
+
+async def record_expenses(db, user_id: str, expenses: Iterable[Dict[str, Any]], sign: int = 1):
+    await apply_changes(db, user_id, [(expense_month(e), expense_delta(e, sign)) for e in expenses])
+
+
+async def record_deal_update(db, user_id: str, old: Dict[str, Any], new: Dict[str, Any]):
+    await apply_changes(db, user_id, [
+        (deal_month(old), deal_delta(old, -1)),
+        (deal_month(new), deal_delta(new, 1)),
+    ])
+
+
+async def record_expense_update(db, user_id: str, old: Dict[str, Any], new: Dict[str, Any]):
+    await apply_changes(db, user_id, [
+        (expense_month(old), expense_delta(old, -1)),
+        (expense_month(new), expense_delta(new, 1)),
+    ])
+
+
+def _present(doc: Optional[Dict[str, Any]], month: str) -> Dict[str, Any]:
+    """Decode a stored rollup; empty categories / lead sources are omitted."""
+    doc = doc or {}
+    result = {"month": month, **{f: doc.get(f, 0) for f in TOTAL_FIELDS}}
+    result["categories"] = {
+        _decode_key(name): values.get("amount", 0)
+        for name, values in (doc.get("categories") or {}).items()
+        if values.get("count", 0) > 0
+    }
+    result["lead_sources"] = {
+        _decode_key(name): {"count": values.get("count", 0), "income": values.get("income", 0)}
+        for name, values in (doc.get("lead_sources") or {}).items()
+        if values.get("count", 0) > 0
+    }
+    return result
+
+
+async def get_month_rollup(db, user_id: str, month: str) -> Dict[str, Any]:
+    """Rollup for one month (zeros if the user has no transactions that month)."""
+    doc = await db[ROLLUP_COLLECTION].find_one({"_id": rollup_id(user_id, month)})
+    return _present(doc, month)
+
+
+async def get_rollups(db, user_id: str, start_month: str, end_month: str) -> List[Dict[str, Any]]:
+    """Rollups for months in [start_month, end_month] that have data, oldest first."""
+    cursor = db[ROLLUP_COLLECTION].find({
+        "user_id": user_id,
+        "month": {"$gte": start_month, "$lte": end_month}
+    }).sort("month", 1)
+    return [_present(doc, doc["month"]) async for doc in cursor]
+
+
+async def _compute_user(db, user_id: str) -> Dict[str, Dict[str, Any]]:
+    deals = await db.pnl_deals.find({"user_id": user_id}, _DEAL_FIELDS).to_list(length=None)
+    expenses = await db.pnl_expenses.find({"user_id": user_id}, _EXPENSE_FIELDS).to_list(length=None)
+    return build_rollups(deals, expenses)
+
+
+async def rebuild_rollups(db, user_id: str) -> int:
+    """
+    Recompute a user's rollups from their transactions, replace the stored ones month by
+    month and mark the user initialized. A write landing on a month between its read and
+    its replace can still be overwritten; run verify afterwards if the user was active.
+    """
+    rollups = await _compute_user(db, user_id)
+    now = datetime.now(timezone.utc).isoformat()
+    operations = [
+        ReplaceOne(
+            {"_id": rollup_id(user_id, month)},
+            {"user_id": user_id, **doc, "updated_at": now},
+            upsert=True
+        )
+        for month, doc in rollups.items()
+    ]
+    # Months that no longer have any transactions
+    operations.append(DeleteMany({"user_id": user_id, "month": {"$nin": sorted(rollups)}}))
+    await db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+    await db[STATE_COLLECTION].update_one(
+        {"_id": user_id},
+        {"$set": {"rollups_initialized": True, "initialized_at": now}},
+        upsert=True
+    )
+    return len(rollups)
+
+
+async def delete_user_rollups(db, user_id: str):
+    """Remove a deleted user's rollups and their initialized marker."""
+    await db[ROLLUP_COLLECTION].delete_many({"user_id": user_id})
+    await db[STATE_COLLECTION].delete_one({"_id": user_id})
+
+
+def _diff(expected: Dict[str, Any], actual: Dict[str, Any]) -> Dict[str, Any]:
+    diffs = {}
+    for field in TOTAL_FIELDS:
+        if abs(expected.get(field, 0) - actual.get(field, 0)) > TOLERANCE:
+            diffs[field] = {"expected": expected.get(field, 0), "actual": actual.get(field, 0)}
+    for name in set(expected["categories"]) | set(actual["categories"]):
+        want, got = expected["categories"].get(name, 0), actual["categories"].get(name, 0)
+        if abs(want - got) > TOLERANCE:
+            diffs[f"categories.{name}"] = {"expected": want, "actual": got}
+    for name in set(expected["lead_sources"]) | set(actual["lead_sources"]):
+        want = expected["lead_sources"].get(name, {"count": 0, "income": 0})
+        got = actual["lead_sources"].get(name, {"count": 0, "income": 0})
+        if want["count"] != got["count"] or abs(want["income"] - got["income"]) > TOLERANCE:
+            diffs[f"lead_sources.{name}"] = {"expected": want, "actual": got}
+    return diffs
+
+
+async def verify_rollups(db, user_id: str) -> Dict[str, Dict[str, Any]]:
+    """{month: {field: {expected, actual}}} for every month whose stored rollup has drifted."""
+    expected = {month: _present(doc, month) for month, doc in (await _compute_user(db, user_id)).items()}
+    stored = {
+        doc["month"]: _present(doc, doc["month"])
+        async for doc in db[ROLLUP_COLLECTION].find({"user_id": user_id})
+    }
+    mismatches = {}
+    for month in set(expected) | set(stored):
+        diffs = _diff(expected.get(month) or _present(None, month), stored.get(month) or _present(None, month))
+        if diffs:
+            mismatches[month] = diffs
+    return mismatches
+
+
+async def _user_ids(db) -> List[str]:
+    ids = set(await db.pnl_deals.distinct("user_id"))
+    ids |= set(await db.pnl_expenses.distinct("user_id"))
+    ids |= set(await db[ROLLUP_COLLECTION].distinct("user_id"))
+    return sorted(i for i in ids if i)
+
+
+async def users_needing_backfill(db) -> List[str]:
+    """
+    Users with deals or expenses whose rollups were never rebuilt. Having rollup
+    documents is not enough: a legacy user's first write after the deploy creates one
+    holding only that write.
+    """
+    with_data = set(await db.pnl_deals.distinct("user_id"))
+    with_data |= set(await db.pnl_expenses.distinct("user_id"))
+    initialized = set(await db[STATE_COLLECTION].distinct("_id", {"rollups_initialized": True}))
+    return sorted(i for i in with_data - initialized if i)
+
+
+async def backfill_rollups(db) -> int:
+    """
+    Rebuild rollups for every user not yet initialized, so summaries don't read $0 or
+    partial totals for accounts created before rollups existed. Users that fail stay
+    unmarked and are retried on the next startup; once everyone is initialized this is
+    three distinct() calls. Returns the number of users rebuilt.
+    """
+    rebuilt = 0
+    for user_id in await users_needing_backfill(db):
+        try:
+            await rebuild_rollups(db, user_id)
+            rebuilt += 1
+        except Exception as e:
+            logger.error(f"P&L rollup backfill failed for user {user_id}: {e}")
+    if rebuilt:
+        logger.info(f"P&L rollup backfill rebuilt {rebuilt} users")
+    return rebuilt
+
+
+_backfill_task: Optional[asyncio.Task] = None
+
+
+async def _backfill(db):
+    try:
+        await backfill_rollups(db)
+    except Exception as e:
+        logger.error(f"P&L rollup backfill error: {e}")
+
+
+def start_rollup_backfill(db) -> asyncio.Task:
+    """Run backfill_rollups in the background so it doesn't delay startup."""
+    global _backfill_task
+    _backfill_task = asyncio.create_task(_backfill(db))
+    return _backfill_task
+
+
+async def stop_rollup_backfill():
+    global _backfill_task
+    if _backfill_task is not None:
+        _backfill_task.cancel()
+        await asyncio.gather(_backfill_task, return_exceptions=True)
+        _backfill_task = None
+
+
+async def _run_cli(command: str, user_id: Optional[str]) -> int:
+    from app.database import get_database, close_client
+
+    db = get_database()
+    try:
+        user_ids = [user_id] if user_id else await _user_ids(db)
+        drifted = 0
+        for uid in user_ids:
+            if command == "rebuild":
+                months = await rebuild_rollups(db, uid)
+                print(f"{uid}: rebuilt {months} months")
+                continue
+            mismatches = await verify_rollups(db, uid)
+            if mismatches:
+                drifted += 1
+                print(json.dumps({uid: mismatches}, indent=2, default=str))
+        if command == "verify":
+            print(f"{drifted} of {len(user_ids)} users have drifted rollups")
+        return 1 if drifted else 0
+    finally:
+        close_client()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    command = args[0] if args else "verify"
+    user = args[args.index("--user") + 1] if "--user" in args and args.index("--user") + 1 < len(args) else None
+    if command not in ("verify", "rebuild"):
+        print("Usage: python -m app.pnl_rollups [verify|rebuild] [--user USER_ID]", file=sys.stderr)
+        sys.exit(2)
+    sys.exit(asyncio.run(_run_cli(command, user)))
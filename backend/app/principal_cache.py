@@ -0,0 +1,97 @@
+"""
+Short-TTL cache of authenticated principals for the get_current_user* dependencies.
+
+After the JWT is verified, the user document lookup and User model construction are
+served from a bounded per-process LRU keyed by user id and a digest of the token. Writes
+to a user (admin edits, plan/status/password/2FA changes, Stripe webhooks) invalidate the
+user's entries explicitly; the TTL bounds staleness for writes made by other workers.
+"""
+import copy
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+
+class PrincipalCache:
+    """Bounded LRU of (user_id, token digest) -> (expires_at, user)."""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        config = get_config()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.PRINCIPAL_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or config.PRINCIPAL_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._by_user: Dict[str, Set[Tuple[str, str]]] = {}
+        # Bumped on invalidation so a lookup that started before it isn't stored after it
+        self._generations: Dict[str, int] = {}
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0, "evictions": 0}
+
+    def _drop(self, key: Tuple[str, str]):
+        if self._entries.pop(key, None) is None:
+            return
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def _put(self, key: Tuple[str, str], user: Any):
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, user)
+        self._by_user.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    async def get_or_load(self, user_id: str, token: str, load: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        The cached principal for this user and token, or load() on a miss. A copy is
+        returned so per-request changes never leak into the cache. Unknown users are not cached.
+        """
+        key = (user_id, token_digest(token))
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return copy.copy(entry[1])
+            self._drop(key)
+            self._stats["expired"] += 1
+
+        self._stats["misses"] += 1
+        generation = self._generations.get(user_id, 0)
+        user = await load()
+        if user is not None and self.ttl_seconds > 0 and self._generations.get(user_id, 0) == generation:
+            self._put(key, user)
+            return copy.copy(user)
+        return user
+
+    def invalidate(self, user_id: str):
+        """Drop every cached principal for a user after a write to their account."""
+        for key in list(self._by_user.get(user_id, ())):
+            self._drop(key)
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "ttl_seconds": self.ttl_seconds, **self._stats}
+
+
+# Global cache instance
+_principal_cache_instance: Optional[PrincipalCache] = None
+
+def get_principal_cache() -> PrincipalCache:
+    """Get or create global principal cache instance."""
+    global _principal_cache_instance
+    if _principal_cache_instance is None:
+        _principal_cache_instance = PrincipalCache()
+    return _principal_cache_instance
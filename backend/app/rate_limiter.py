@@ -0,0 +1,179 @@
+"""
+In-process sliding-window rate limiter with periodic MongoDB sync.
+Requests are counted in memory using a two-bucket approximation of a sliding window;
+aggregated counts are flushed to the rate_limits collection every few seconds so that
+multiple workers converge on roughly the same totals without a DB write per request.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Window:
+    """Counters for one key. current/flushed are this worker's; remote is other workers'."""
+    window_seconds: int
+    bucket: int
+    current: int = 0
+    flushed: int = 0
+    remote: int = 0
+    previous: int = 0
+
+
+class SlidingWindowLimiter:
+    """
+    Approximate sliding-window limiter held in a bounded LRU.
+
+    The estimate for a key is previous_bucket * (1 - elapsed_fraction) + current_bucket,
+    where current_bucket includes counts other workers reported at the last sync.
+    """
+
+    def __init__(self, max_keys: Optional[int] = None, sync_interval: Optional[float] = None, store=None):
+        config = get_config()
+        self.max_keys = max_keys or config.RATE_LIMIT_MAX_KEYS
+        self.sync_interval = sync_interval or config.RATE_LIMIT_SYNC_SECONDS
+        self._store = store
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self._pending: Dict[Tuple[str, int, int], int] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+        self._stats = {"checks": 0, "denied": 0, "evictions": 0, "syncs": 0, "sync_errors": 0}
+
+    def _get_window(self, key: str, window_seconds: int, now: float) -> _Window:
+        bucket = int(now // window_seconds)
+        window = self._windows.get(key)
+
+        if window is None or window.window_seconds != window_seconds:
+            window = _Window(window_seconds=window_seconds, bucket=bucket)
+            self._windows[key] = window
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+                self._stats["evictions"] += 1
+        elif window.bucket != bucket:
+            # Roll forward: the finished bucket becomes "previous", anything older is dropped
+            total = window.current + window.remote
+            window.previous = total if bucket == window.bucket + 1 else 0
+            window.bucket = bucket
+            window.current = window.flushed = window.remote = 0
+
+        self._windows.move_to_end(key)
+        return window
+
+    def hit(self, key: str, limit: int, window_seconds: int) -> Dict[str, Any]:
+        """
+        Count a request against key.
+        Returns the same contract as MongoDBCache.rate_limit_check:
+        {"allowed": bool, "remaining": int, "reset_time": datetime}
+        """
+        now = time.time()
+        window = self._get_window(key, window_seconds, now)
+        self._stats["checks"] += 1
+
+        elapsed = (now % window_seconds) / window_seconds
+        estimate = window.previous * (1 - elapsed) + window.current + window.remote
+
+        if estimate + 1 > limit:
+            self._stats["denied"] += 1
+            return {
+                "allowed": False,
+                "remaining": 0,
+                "reset_time": self._reset_time(window, limit, now)
+            }
+
+        # Only allowed requests count, so a client hammering while limited is not locked out forever
+        window.current += 1
+        pending_key = (key, window.bucket, window_seconds)
+        self._pending[pending_key] = self._pending.get(pending_key, 0) + 1
+
+        return {
+            "allowed": True,
+            "remaining": max(0, math.floor(limit - estimate - 1)),
+            "reset_time": self._reset_time(window, limit, now)
+        }
+
+    def _reset_time(self, window: _Window, limit: int, now: float) -> datetime:
+        """When the estimate will next allow a request."""
+        bucket_end = (window.bucket + 1) * window.window_seconds
+        in_bucket = window.current + window.remote
+        if in_bucket + 1 > limit or window.previous == 0:
+            reset = bucket_end
+        else:
+            # previous * (1 - f) + in_bucket + 1 <= limit  =>  f >= 1 - (limit - in_bucket - 1) / previous
+            fraction = max(0.0, 1 - (limit - in_bucket - 1) / window.previous)
+            reset = max(now, window.bucket * window.window_seconds + fraction * window.window_seconds)
+        return datetime.fromtimestamp(reset, tz=timezone.utc)
+
+    async def sync(self):
+        """Flush pending counts to MongoDB and pick up other workers' totals."""
+        if not self._pending:
+            return
+        store = self._store
+        if store is None:
+            from app.mongodb_cache import get_cache
+            store = self._store = get_cache()
+
+        pending, self._pending = self._pending, {}
+        for (key, bucket, window_seconds), amount in pending.items():
+            reset_time = datetime.fromtimestamp((bucket + 1) * window_seconds, tz=timezone.utc)
+            try:
+                total = await store.increment_window(key, bucket, reset_time, amount)
+            except Exception as e:
+                self._stats["sync_errors"] += 1
+                logger.error(f"Rate limit sync error for key {key}: {e}")
+                # Retry next time unless the window has already closed
+                if time.time() < reset_time.timestamp():
+                    retry_key = (key, bucket, window_seconds)
+                    self._pending[retry_key] = self._pending.get(retry_key, 0) + amount
+                continue
+
+            window = self._windows.get(key)
+            if window is not None and window.bucket == bucket:
+                window.flushed += amount
+                window.remote = max(0, total - window.flushed)
+        self._stats["syncs"] += 1
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Rate limit sync loop error: {e}")
+
+    def start(self):
+        """Start the periodic sync task."""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        """Stop syncing and flush whatever is left."""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+        await self.sync()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "keys": len(self._windows), "pending_keys": len(self._pending)}
+
+
+# Global limiter instance
+_limiter_instance: Optional[SlidingWindowLimiter] = None
+
+def get_rate_limiter() -> SlidingWindowLimiter:
+    """Get or create global rate limiter instance."""
+    global _limiter_instance
+    if _limiter_instance is None:
+        _limiter_instance = SlidingWindowLimiter()
+    return _limiter_instance
@@ -8,33 +8,25 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from app.deps import get_settings
 from app.auth import get_current_user_unified, require_plan_unified
-from app.ai import make_cache_key, get_cache, set_cache, check_rate_limit
+from app.ai import make_cache_key, check_rate_limit
+from app.ai_cache import get_ai_cache
+from app.coach_context import redact_pii
+from app.llm_gateway import get_llm_gateway
 from app.data_views import fetch_goal_settings, fetch_activity_log, fetch_reflection_log, fetch_pnl_summary
 from app.prompts import coach_system_prompt
 from app.security import enforce_body_limit
-from openai import AsyncOpenAI
 import asyncio
 import json
 import datetime
+import time
 import logging
-import re
+from typing import Optional
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-def redact_pii(text: str) -> str:
-    """Basic PII scrubbing for reflections"""
-    if not text:
-        return text
-    
-    # Replace email patterns
-    text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]', text)
-    # Replace phone patterns
-    text = re.sub(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', '[PHONE]', text)
-    # Replace SSN patterns
-    text = re.sub(r'\b\d{3}-\d{2}-\d{4}\b', '[SSN]', text)
-    
-    return text
+# Plans allowed by require_plan_unified("starter") on /generate
+COACH_PLANS = {"STARTER", "PRO"}
 
 def format_pnl_analysis(obj: dict) -> str:
     """
@@ -95,6 +87,212 @@ def format_pnl_analysis(obj: dict) -> str:
         logger.error(f"Error formatting P&L analysis: {e}")
         return obj.get("summary", "Analysis completed but formatting failed.")
 
+async def fetch_dashboard_inputs(user_id: str, year: int):
+    """Goals, 28 days of activity, the 2 latest reflections (PII redacted) and the P&L summary."""
+    goals, activity, reflections, pnl = await asyncio.gather(
+        fetch_goal_settings(user_id),
+        fetch_activity_log(user_id, 28),
+        fetch_reflection_log(user_id, 2),  # Limit to 2 most recent
+        fetch_pnl_summary(user_id, year)
+    )
+
+    # Redact PII from reflections
+    for reflection in reflections:
+        reflection['reflection'] = redact_pii(reflection['reflection'])
+    return goals, activity, reflections, pnl
+
+
+def dashboard_payload(goals, activity, reflections, pnl, plan: str) -> dict:
+    return {
+        "goals": goals,
+        "activity": activity,
+        "reflections": reflections,
+        "pnl": pnl,
+        "user_plan": plan
+    }
+
+
+def has_dashboard_data(goals, activity, reflections, pnl) -> bool:
+    return any([goals, activity.get('entries_count', 0) > 0, reflections, pnl.get('deals_count', 0) > 0])
+
+
+def build_messages(context: str, payload: dict) -> list:
+    # Use appropriate system prompt based on context
+    if context == "pnl_analysis":
+        from app.prompts import pnl_analysis_system_prompt
+        system_prompt = pnl_analysis_system_prompt()
+    elif context == "affordability_analysis":
+        from app.prompts import affordability_analysis_system_prompt
+        system_prompt = affordability_analysis_system_prompt()
+    elif context == "net_sheet_analysis":
+        from app.prompts import net_sheet_analysis_system_prompt
+        system_prompt = net_sheet_analysis_system_prompt()
+    else:
+        system_prompt = coach_system_prompt()
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": json.dumps(payload, indent=2)}
+    ]
+
+
+async def complete_coach(settings, context: str, messages: list, goals, activity, pnl) -> str:
+    """Call the coach model and shape its reply for the given context; returns the JSON body."""
+    response = await get_llm_gateway().chat(
+        model=settings.OPENAI_MODEL,
+        messages=messages,
+        temperature=settings.AI_COACH_TEMPERATURE,
+        max_tokens=settings.AI_COACH_MAX_TOKENS
+    )
+
+    text = response.choices[0].message.content or ""
+
+    # For P&L analysis and affordability analysis, format the response differently
+    if context == "pnl_analysis":
+        logger.info(f"P&L Analysis - Raw AI response: {text[:500]}...")  # Log first 500 chars
+
+        # Strip markdown code block syntax if present
+        clean_text = text.strip()
+        if clean_text.startswith("```json"):
+            # Remove the opening ```json
+            clean_text = clean_text[7:]
+        if clean_text.endswith("```"):
+            # Remove the closing ```
+            clean_text = clean_text[:-3]
+        clean_text = clean_text.strip()
+
+        logger.info(f"P&L Analysis - Cleaned text: {clean_text[:200]}...")
+
+        # Try to parse as JSON first
+        try:
+            obj = json.loads(clean_text)
+            logger.info(f"P&L Analysis - Parsed JSON keys: {list(obj.keys())}")
+            formatted_text = format_pnl_analysis(obj)
+            logger.info(f"P&L Analysis - Formatted text length: {len(formatted_text)}")
+            logger.info(f"P&L Analysis - Formatted text preview: {formatted_text[:200]}...")
+
+            # Extract and format the content for better display
+            formatted_response = {
+                "summary": obj.get("summary", "Analysis completed"),
+                "formatted_analysis": formatted_text,
+                "raw_data": obj  # Keep raw data for debugging
+            }
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"P&L Analysis - JSON parsing failed after cleaning: {e}")
+            logger.info(f"P&L Analysis - Treating as plain text: {clean_text[:200]}...")
+            # If JSON parsing fails, treat as plain text
+            formatted_response = {
+                "summary": clean_text.strip()[:300],
+                "formatted_analysis": clean_text.strip(),
+                "raw_data": None
+            }
+
+        return json.dumps(formatted_response)
+    elif context == "affordability_analysis" or context == "net_sheet_analysis":
+        analysis_type = "Affordability" if context == "affordability_analysis" else "Net Sheet"
+        logger.info(f"{analysis_type} Analysis - Raw AI response: {text[:500]}...")  # Log first 500 chars
+
+        # Strip markdown code block syntax if present
+        clean_text = text.strip()
+        if clean_text.startswith("```json"):
+            # Remove the opening ```json
+            clean_text = clean_text[7:]
+        if clean_text.endswith("```"):
+            # Remove the closing ```
+            clean_text = clean_text[:-3]
+        clean_text = clean_text.strip()
+
+        logger.info(f"{analysis_type} Analysis - Cleaned text: {clean_text[:200]}...")
+
+        # Try to parse as JSON first
+        try:
+            obj = json.loads(clean_text)
+            logger.info(f"{analysis_type} Analysis - Parsed JSON keys: {list(obj.keys())}")
+
+            # Validate required keys
+            required_keys = ['summary', 'stats', 'actions', 'risks', 'next_inputs']
+            if not all(key in obj for key in required_keys):
+                logger.warning(f"{analysis_type} Analysis - Missing required keys: {[k for k in required_keys if k not in obj]}")
+
+            # Return the parsed JSON directly
+            analysis_response = {
+                "summary": obj.get("summary", f"{analysis_type} analysis completed"),
+                "stats": obj.get("stats", {}),
+                "actions": obj.get("actions", []),
+                "risks": obj.get("risks", []),
+                "next_inputs": obj.get("next_inputs", [])
+            }
+
+            logger.info(f"{analysis_type} Analysis - Response summary: {analysis_response['summary'][:100]}...")
+
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"{analysis_type} Analysis - JSON parsing failed after cleaning: {e}")
+            logger.info(f"{analysis_type} Analysis - Treating as plain text: {clean_text[:200]}...")
+            # If JSON parsing fails, create structured response
+            analysis_response = {
+                "summary": clean_text.strip()[:300] if clean_text.strip() else f"{analysis_type} analysis completed",
+                "stats": {},
+                "actions": ["Review details", "Consider optimization opportunities"],
+                "risks": ["Incomplete assessment"],
+                "next_inputs": ["Additional data needed for comprehensive analysis"]
+            }
+
+        return json.dumps(analysis_response)
+    else:
+        # Standard AI Coach processing
+        try:
+            obj = json.loads(text)
+            # Validate required keys
+            required_keys = ['summary', 'stats', 'actions', 'risks', 'next_inputs']
+            if not all(key in obj for key in required_keys):
+                raise ValueError("Missing required keys")
+        except (json.JSONDecodeError, ValueError):
+            # Fallback to structured response
+            obj = {
+                "summary": text.strip()[:200],
+                "stats": {
+                    "goals": goals,
+                    "recent_activity": activity,
+                    "pnl_summary": pnl
+                },
+                "actions": [],
+                "risks": [],
+                "next_inputs": [
+                    "Log daily conversations and appointments", 
+                    "Update goal progress weekly",
+                    "Review P&L monthly"
+                ]
+            }
+
+        return json.dumps(obj)
+
+
+async def pregenerate_dashboard_coach(user_id: str, plan: str, ttl_seconds: Optional[float] = None) -> bool:
+    """
+    Compute the default dashboard coach response (context "general", current year) into the
+    AI response cache under the same key the endpoint uses. Returns False when the user
+    can't use the endpoint or has no data, in which case nothing is generated.
+    """
+    settings = get_settings()
+    if not settings.AI_COACH_ENABLED or plan not in COACH_PLANS:
+        return False
+
+    year = datetime.datetime.utcnow().year
+    goals, activity, reflections, pnl = await fetch_dashboard_inputs(user_id, year)
+    if not has_dashboard_data(goals, activity, reflections, pnl):
+        return False
+
+    payload = dashboard_payload(goals, activity, reflections, pnl, plan)
+    messages = build_messages("general", payload)
+
+    async def generate() -> str:
+        return await complete_coach(settings, "general", messages, goals, activity, pnl)
+
+    await get_ai_cache().get_or_generate(make_cache_key(user_id, payload, "general"), generate,
+                                         ttl_seconds=ttl_seconds)
+    return True
+
+
 @router.post("/generate")
 async def generate_coach(
     request: Request, 
@@ -138,16 +336,7 @@ async def generate_coach(
             goals, activity, reflections, pnl = [], {"entries_count": 0}, [], {"deals_count": 0}
         else:
             # Aggregate inputs for dashboard/P&L contexts
-            goals, activity, reflections, pnl = await asyncio.gather(
-                fetch_goal_settings(user.id),
-                fetch_activity_log(user.id, 28),
-                fetch_reflection_log(user.id, 2),  # Limit to 2 most recent
-                fetch_pnl_summary(user.id, year)
-            )
-            
-            # Redact PII from reflections
-            for reflection in reflections:
-                reflection['reflection'] = redact_pii(reflection['reflection'])
+            goals, activity, reflections, pnl = await fetch_dashboard_inputs(user.id, year)
         
         # Handle P&L Analysis Context
         if context == "pnl_analysis":
@@ -200,21 +389,11 @@ async def generate_coach(
             }
         else:
             # Standard dashboard AI Coach payload
-            payload = {
-                "goals": goals,
-                "activity": activity, 
-                "reflections": reflections,
-                "pnl": pnl,
-                "user_plan": user.plan
-            }
+            payload = dashboard_payload(goals, activity, reflections, pnl, user.plan)
         
-        # Check cache first (but use different cache keys for different contexts)
+        # Different contexts get different cache keys
         cache_key = make_cache_key(user.id, payload, context)
-        if not force:
-            cached = get_cache(cache_key, settings.AI_CACHE_TTL_SECONDS)
-            if cached:
-                logger.info(f"Cache hit for user {user.id[:8]}... context: {context}")
-                return JSONResponse(content=json.loads(cached))
+        cache = get_ai_cache()
         
         # If no data, return deterministic response
         if context == "pnl_analysis":
@@ -260,7 +439,7 @@ async def generate_coach(
                     ]
                 }
                 return JSONResponse(content=fallback_response)
-        elif not any([goals, activity.get('entries_count', 0) > 0, reflections, pnl.get('deals_count', 0) > 0]):
+        elif not has_dashboard_data(goals, activity, reflections, pnl):
             fallback_response = {
                 "summary": "Set up your goals and start logging activities to get personalized coaching insights.",
                 "stats": {},
@@ -274,26 +453,18 @@ async def generate_coach(
             }
             return JSONResponse(content=fallback_response)
         
-        # Call OpenAI
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        # Streaming requests reuse a finished or in-flight generation; non-stream lookups
+        # happen inside get_or_generate below
+        if stream and not force:
+            cached = await cache.join(cache_key) or await cache.get(cache_key)
+            if cached:
+                logger.info(f"Cache hit for user {user.id[:8]}... context: {context}")
+                return JSONResponse(content=json.loads(cached))
         
-        # Use appropriate system prompt based on context
-        if context == "pnl_analysis":
-            from app.prompts import pnl_analysis_system_prompt
-            system_prompt = pnl_analysis_system_prompt()
-        elif context == "affordability_analysis":
-            from app.prompts import affordability_analysis_system_prompt
-            system_prompt = affordability_analysis_system_prompt()
-        elif context == "net_sheet_analysis":
-            from app.prompts import net_sheet_analysis_system_prompt
-            system_prompt = net_sheet_analysis_system_prompt()
-        else:
-            system_prompt = coach_system_prompt()
+        # Call OpenAI through the shared, pooled client
+        gateway = get_llm_gateway()
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": json.dumps(payload, indent=2)}
-        ]
+        messages = build_messages(context, payload)
         
         # Log metadata (no raw content)
         logger.info(f"AI coach request - user: {user.id[:8]}..., model: {settings.OPENAI_MODEL}, "
@@ -303,24 +474,25 @@ async def generate_coach(
         if stream:
             async def token_generator():
                 try:
-                    response = await client.chat.completions.create(
+                    started = time.perf_counter()
+                    collected = ""
+                    async for chunk in gateway.stream_chat(
                         model=settings.OPENAI_MODEL,
                         messages=messages,
                         temperature=settings.AI_COACH_TEMPERATURE,
-                        max_tokens=settings.AI_COACH_MAX_TOKENS,
-                        stream=True
-                    )
-                    
-                    collected = ""
-                    async for chunk in response:
+                        max_tokens=settings.AI_COACH_MAX_TOKENS
+                    ):
                         delta = chunk.choices[0].delta.content or ""
                         collected += delta
                         yield f"data: {json.dumps({'delta': delta})}\n\n"
                     
+                    llm_seconds = time.perf_counter() - started
+                    cache.record_generation(llm_seconds)
+                    
                     # Try to parse final JSON and cache if valid
                     try:
                         final_obj = json.loads(collected)
-                        set_cache(cache_key, collected)
+                        await cache.set(cache_key, collected, llm_seconds)
                         yield f"data: {json.dumps({'done': True})}\n\n"
                     except json.JSONDecodeError:
                         # If not valid JSON, wrap in expected format
@@ -331,7 +503,7 @@ async def generate_coach(
                             "risks": [],
                             "next_inputs": ["Continue logging activities", "Review and update goals"]
                         }
-                        set_cache(cache_key, json.dumps(fallback))
+                        await cache.set(cache_key, json.dumps(fallback), llm_seconds)
                         yield f"data: {json.dumps({'fallback': fallback})}\n\n"
                         
                 except Exception as e:
@@ -345,140 +517,14 @@ async def generate_coach(
             )
         
         else:
-            # Non-streaming path
-            response = await client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=messages,
-                temperature=settings.AI_COACH_TEMPERATURE,
-                max_tokens=settings.AI_COACH_MAX_TOKENS
-            )
-            
-            text = response.choices[0].message.content or ""
-            
-            # For P&L analysis and affordability analysis, format the response differently
-            if context == "pnl_analysis":
-                logger.info(f"P&L Analysis - Raw AI response: {text[:500]}...")  # Log first 500 chars
-                
-                # Strip markdown code block syntax if present
-                clean_text = text.strip()
-                if clean_text.startswith("```json"):
-                    # Remove the opening ```json
-                    clean_text = clean_text[7:]
-                if clean_text.endswith("```"):
-                    # Remove the closing ```
-                    clean_text = clean_text[:-3]
-                clean_text = clean_text.strip()
-                
-                logger.info(f"P&L Analysis - Cleaned text: {clean_text[:200]}...")
-                
-                # Try to parse as JSON first
-                try:
-                    obj = json.loads(clean_text)
-                    logger.info(f"P&L Analysis - Parsed JSON keys: {list(obj.keys())}")
-                    formatted_text = format_pnl_analysis(obj)
-                    logger.info(f"P&L Analysis - Formatted text length: {len(formatted_text)}")
-                    logger.info(f"P&L Analysis - Formatted text preview: {formatted_text[:200]}...")
-                    
-                    # Extract and format the content for better display
-                    formatted_response = {
-                        "summary": obj.get("summary", "Analysis completed"),
-                        "formatted_analysis": formatted_text,
-                        "raw_data": obj  # Keep raw data for debugging
-                    }
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.error(f"P&L Analysis - JSON parsing failed after cleaning: {e}")
-                    logger.info(f"P&L Analysis - Treating as plain text: {clean_text[:200]}...")
-                    # If JSON parsing fails, treat as plain text
-                    formatted_response = {
-                        "summary": clean_text.strip()[:300],
-                        "formatted_analysis": clean_text.strip(),
-                        "raw_data": None
-                    }
-                
-                # Cache successful response
-                set_cache(cache_key, json.dumps(formatted_response))
-                return JSONResponse(content=formatted_response)
-            elif context == "affordability_analysis" or context == "net_sheet_analysis":
-                analysis_type = "Affordability" if context == "affordability_analysis" else "Net Sheet"
-                logger.info(f"{analysis_type} Analysis - Raw AI response: {text[:500]}...")  # Log first 500 chars
-                
-                # Strip markdown code block syntax if present
-                clean_text = text.strip()
-                if clean_text.startswith("```json"):
-                    # Remove the opening ```json
-                    clean_text = clean_text[7:]
-                if clean_text.endswith("```"):
-                    # Remove the closing ```
-                    clean_text = clean_text[:-3]
-                clean_text = clean_text.strip()
-                
-                logger.info(f"{analysis_type} Analysis - Cleaned text: {clean_text[:200]}...")
-                
-                # Try to parse as JSON first
-                try:
-                    obj = json.loads(clean_text)
-                    logger.info(f"{analysis_type} Analysis - Parsed JSON keys: {list(obj.keys())}")
-                    
-                    # Validate required keys
-                    required_keys = ['summary', 'stats', 'actions', 'risks', 'next_inputs']
-                    if not all(key in obj for key in required_keys):
-                        logger.warning(f"{analysis_type} Analysis - Missing required keys: {[k for k in required_keys if k not in obj]}")
-                    
-                    # Return the parsed JSON directly
-                    analysis_response = {
-                        "summary": obj.get("summary", f"{analysis_type} analysis completed"),
-                        "stats": obj.get("stats", {}),
-                        "actions": obj.get("actions", []),
-                        "risks": obj.get("risks", []),
-                        "next_inputs": obj.get("next_inputs", [])
-                    }
-                    
-                    logger.info(f"{analysis_type} Analysis - Response summary: {analysis_response['summary'][:100]}...")
-                    
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.error(f"{analysis_type} Analysis - JSON parsing failed after cleaning: {e}")
-                    logger.info(f"{analysis_type} Analysis - Treating as plain text: {clean_text[:200]}...")
-                    # If JSON parsing fails, create structured response
-                    analysis_response = {
-                        "summary": clean_text.strip()[:300] if clean_text.strip() else f"{analysis_type} analysis completed",
-                        "stats": {},
-                        "actions": ["Review details", "Consider optimization opportunities"],
-                        "risks": ["Incomplete assessment"],
-                        "next_inputs": ["Additional data needed for comprehensive analysis"]
-                    }
-                
-                # Cache successful response
-                set_cache(cache_key, json.dumps(analysis_response))
-                return JSONResponse(content=analysis_response)
-            else:
-                # Standard AI Coach processing
-                try:
-                    obj = json.loads(text)
-                    # Validate required keys
-                    required_keys = ['summary', 'stats', 'actions', 'risks', 'next_inputs']
-                    if not all(key in obj for key in required_keys):
-                        raise ValueError("Missing required keys")
-                except (json.JSONDecodeError, ValueError):
-                    # Fallback to structured response
-                    obj = {
-                        "summary": text.strip()[:200],
-                        "stats": {
-                            "goals": goals,
-                            "recent_activity": activity,
-                            "pnl_summary": pnl
-                        },
-                        "actions": [],
-                        "risks": [],
-                        "next_inputs": [
-                            "Log daily conversations and appointments", 
-                            "Update goal progress weekly",
-                            "Review P&L monthly"
-                        ]
-                    }
-                
-                # Cache successful response
-                set_cache(cache_key, json.dumps(obj))
-                return JSONResponse(content=obj)
+            # Non-streaming path: concurrent identical requests share one OpenAI call
+            async def generate() -> str:
+                return await complete_coach(settings, context, messages, goals, activity, pnl)
+
+            text, was_cached = await cache.get_or_generate(cache_key, generate, force=force)
+            if was_cached:
+                logger.info(f"Cache hit for user {user.id[:8]}... context: {context}")
+            return JSONResponse(content=json.loads(text))
             
     except Exception as e:
         logger.error(f"AI coach error for user {user.id[:8]}...: {e}")
@@ -4,10 +4,11 @@ Handles payment events, subscription updates, and billing failures.
 """
 
 from fastapi import APIRouter, Request, HTTPException, Depends
-from app.deps import get_settings
+from app.deps import get_settings, get_db
+from app.brand_bundle_cache import get_brand_bundle_cache
+from app.principal_cache import get_principal_cache
 import stripe
 import logging
-from pymongo import MongoClient
 from datetime import datetime, timezone
 from typing import Dict, Any
 import hashlib
@@ -15,23 +16,15 @@ import hashlib
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def get_database():
-    """Get MongoDB database connection."""
-    config = get_settings()
-    client = MongoClient(config.MONGO_URL)
-    return client[config.DB_NAME]
-
 def create_idempotency_key(event: Dict[str, Any]) -> str:
     """Create idempotency key for webhook event."""
     event_id = event.get('id', '')
     event_type = event.get('type', '')
     return hashlib.sha256(f"{event_id}:{event_type}".encode()).hexdigest()
 
-async def handle_checkout_completed(session: Dict[str, Any]):
+async def handle_checkout_completed(session: Dict[str, Any], db):
     """Handle successful checkout session completion."""
     try:
-        db = get_database()
-        
         # Extract session data
         customer_id = session.get('customer')
         subscription_id = session.get('subscription')
@@ -56,7 +49,7 @@ async def handle_checkout_completed(session: Dict[str, Any]):
             return False
         
         # Update user subscription in database
-        update_result = db.users.update_one(
+        update_result = await db.users.update_one(
             {"_id": client_reference_id},
             {
                 "$set": {
@@ -83,6 +76,10 @@ async def handle_checkout_completed(session: Dict[str, Any]):
             logger.warning(f"No user found with ID {client_reference_id}")
             return False
         
+        # Plan changed: drop this worker's cached principal and plan-filtered branding
+        get_principal_cache().invalidate(client_reference_id)
+        get_brand_bundle_cache().invalidate(client_reference_id)
+        
         logger.info(f"Successfully upgraded user {client_reference_id} to {plan_type}")
         return True
         
@@ -90,17 +87,15 @@ async def handle_checkout_completed(session: Dict[str, Any]):
         logger.error(f"Error handling checkout completion: {e}")
         return False
 
-async def handle_payment_succeeded(invoice: Dict[str, Any]):
+async def handle_payment_succeeded(invoice: Dict[str, Any], db):
     """Handle successful recurring payment."""
     try:
-        db = get_database()
-        
         subscription_id = invoice.get('subscription')
         if not subscription_id:
             return False
         
         # Find user by subscription ID
-        user = db.users.find_one({"subscription.stripe_subscription_id": subscription_id})
+        user = await db.users.find_one({"subscription.stripe_subscription_id": subscription_id})
         if not user:
             logger.error(f"No user found for subscription {subscription_id}")
             return False
@@ -109,7 +104,7 @@ async def handle_payment_succeeded(invoice: Dict[str, Any]):
         stripe_subscription = stripe.Subscription.retrieve(subscription_id)
         
         # Update subscription period
-        update_result = db.users.update_one(
+        update_result = await db.users.update_one(
             {"_id": user["_id"]},
             {
                 "$set": {
@@ -126,6 +121,7 @@ async def handle_payment_succeeded(invoice: Dict[str, Any]):
                 }
             }
         )
+        get_principal_cache().invalidate(user.get("id", user["_id"]))
         
         logger.info(f"Successfully renewed subscription for user {user['_id']}")
         return True
@@ -134,17 +130,15 @@ async def handle_payment_succeeded(invoice: Dict[str, Any]):
         logger.error(f"Error handling payment success: {e}")
         return False
 
-async def handle_payment_failed(invoice: Dict[str, Any]):
+async def handle_payment_failed(invoice: Dict[str, Any], db):
     """Handle failed payment."""
     try:
-        db = get_database()
-        
         subscription_id = invoice.get('subscription')
         if not subscription_id:
             return False
         
         # Find user by subscription ID
-        user = db.users.find_one({"subscription.stripe_subscription_id": subscription_id})
+        user = await db.users.find_one({"subscription.stripe_subscription_id": subscription_id})
         if not user:
             logger.error(f"No user found for subscription {subscription_id}")
             return False
@@ -169,7 +163,7 @@ async def handle_payment_failed(invoice: Dict[str, Any]):
                 logger.error(f"Failed to cancel Stripe subscription {subscription_id}: {e}")
         
         # Update user subscription status
-        update_result = db.users.update_one(
+        update_result = await db.users.update_one(
             {"_id": user["_id"]},
             {
                 "$set": {
@@ -179,6 +173,7 @@ async def handle_payment_failed(invoice: Dict[str, Any]):
                 }
             }
         )
+        get_principal_cache().invalidate(user.get("id", user["_id"]))
         
         logger.info(f"Updated user {user['_id']} subscription status to {status}")
         return True
@@ -188,7 +183,7 @@ async def handle_payment_failed(invoice: Dict[str, Any]):
         return False
 
 @router.post("/stripe/webhook")
-async def stripe_webhook(request: Request, settings=Depends(get_settings)):
+async def stripe_webhook(request: Request, settings=Depends(get_settings), db=Depends(get_db)):
     """
     Secure Stripe webhook with signature verification and idempotency.
     Handles subscription lifecycle events.
@@ -210,16 +205,15 @@ async def stripe_webhook(request: Request, settings=Depends(get_settings)):
         raise HTTPException(400, "Invalid signature")
     
     # Idempotency check
-    db = get_database()
     idempotency_key = create_idempotency_key(event)
     
-    existing_event = db.webhook_events.find_one({"idempotency_key": idempotency_key})
+    existing_event = await db.webhook_events.find_one({"idempotency_key": idempotency_key})
     if existing_event:
         logger.info(f"Webhook event {event.get('id')} already processed")
         return {"received": True, "status": "already_processed"}
     
     # Record event for idempotency
-    db.webhook_events.insert_one({
+    await db.webhook_events.insert_one({
         "idempotency_key": idempotency_key,
         "event_id": event.get('id'),
         "event_type": event.get('type'),
@@ -233,22 +227,22 @@ async def stripe_webhook(request: Request, settings=Depends(get_settings)):
     
     try:
         if event_type == 'checkout.session.completed':
-            success = await handle_checkout_completed(event['data']['object'])
+            success = await handle_checkout_completed(event['data']['object'], db)
         elif event_type == 'invoice.payment_succeeded':
-            success = await handle_payment_succeeded(event['data']['object'])
+            success = await handle_payment_succeeded(event['data']['object'], db)
         elif event_type == 'invoice.payment_failed':
-            success = await handle_payment_failed(event['data']['object'])
+            success = await handle_payment_failed(event['data']['object'], db)
         elif event_type in ['customer.subscription.updated', 'customer.subscription.deleted']:
             # Handle subscription updates/cancellations
             subscription = event['data']['object']
-            success = await handle_subscription_update(subscription)
+            success = await handle_subscription_update(subscription, db)
         else:
             logger.info(f"Unhandled webhook event type: {event_type}")
             success = True  # Don't fail for unhandled events
         
         # Update event status
         status = "completed" if success else "failed"
-        db.webhook_events.update_one(
+        await db.webhook_events.update_one(
             {"idempotency_key": idempotency_key},
             {"$set": {"status": status, "completed_at": datetime.now(timezone.utc)}}
         )
@@ -261,7 +255,7 @@ async def stripe_webhook(request: Request, settings=Depends(get_settings)):
         
     except Exception as e:
         # Mark event as failed
-        db.webhook_events.update_one(
+        await db.webhook_events.update_one(
             {"idempotency_key": idempotency_key},
             {
                 "$set": {
@@ -274,13 +268,12 @@ async def stripe_webhook(request: Request, settings=Depends(get_settings)):
         logger.error(f"Webhook processing failed: {e}")
         raise HTTPException(500, "Internal server error")
 
-async def handle_subscription_update(subscription: Dict[str, Any]):
+async def handle_subscription_update(subscription: Dict[str, Any], db):
     """Handle subscription updates and cancellations."""
     try:
-        db = get_database()
         subscription_id = subscription.get('id')
         
-        user = db.users.find_one({"subscription.stripe_subscription_id": subscription_id})
+        user = await db.users.find_one({"subscription.stripe_subscription_id": subscription_id})
         if not user:
             logger.error(f"No user found for subscription {subscription_id}")
             return False
@@ -312,10 +305,11 @@ async def handle_subscription_update(subscription: Dict[str, Any]):
                 subscription['current_period_end'], timezone.utc
             )
         
-        db.users.update_one(
+        await db.users.update_one(
             {"_id": user["_id"]},
             {"$set": update_data}
         )
+        get_principal_cache().invalidate(user.get("id", user["_id"]))
         
         logger.info(f"Updated subscription for user {user['_id']}: status={new_status}")
         return True
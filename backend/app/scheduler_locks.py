@@ -0,0 +1,25 @@
+"""
+Once-a-day job claims shared by every worker.
+A job inserts a lock document keyed by name and date; the unique _id means exactly one
+worker wins each day and the rest skip. Old locks are removed by the TTL index on
+expires_at (see db_indexes).
+"""
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+LOCKS_COLLECTION = "scheduler_locks"
+
+
+async def claim_daily_lock(db, lock_id: str, now: datetime) -> bool:
+    """True for exactly one caller per lock_id across workers; used for once-a-day jobs."""
+    try:
+        await db[LOCKS_COLLECTION].insert_one({
+            "_id": lock_id,
+            "claimed_at": now,
+            # TTL index removes old locks
+            "expires_at": now + timedelta(days=2)
+        })
+        return True
+    except DuplicateKeyError:
+        return False
@@ -1,6 +1,6 @@
 """
 Production-ready security middleware and utilities.
-Includes comprehensive security headers, MongoDB-based rate limiting, and CSRF protection.
+Includes comprehensive security headers, in-memory rate limiting synced to MongoDB, and CSRF protection.
 """
 
 from fastapi import Request, HTTPException, Response
@@ -13,6 +13,7 @@ import secrets
 from urllib.parse import urlparse
 from config import get_config
 from app.mongodb_cache import rate_limit_check
+from app.rate_limiter import get_rate_limiter
 import logging
 from datetime import datetime, timezone, timedelta
 from fastapi import status
@@ -82,7 +83,8 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """
-    MongoDB-based rate limiting middleware with graceful fallback.
+    Rate limiting middleware backed by the in-process sliding-window limiter.
+    Counts are synced to MongoDB in the background, not per request.
     """
     
     def __init__(self, app):
@@ -97,11 +99,12 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         # Get client identifier (IP + user agent for unauthenticated requests)
         client_ip = request.client.host if request.client else "unknown"
         user_agent = request.headers.get("user-agent", "unknown")[:100]  # Limit length
-        rate_limit_key = f"rate_limit:{client_ip}:{hash(user_agent)}"
+        # Stable digest (not hash()) so every worker derives the same key for syncing
+        ua_digest = hashlib.sha1(user_agent.encode()).hexdigest()[:12]
+        rate_limit_key = f"rate_limit:{client_ip}:{ua_digest}"
         
         try:
-            # Check rate limit using MongoDB
-            result = await rate_limit_check(
+            result = get_rate_limiter().hit(
                 rate_limit_key,
                 self.config.RATE_LIMIT_REQUESTS,
                 self.config.RATE_LIMIT_WINDOW
@@ -141,7 +144,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
 async def rate_limit_user(user_key: str, limit_per_min: int):
     """
     Per-user rate limiting function for API endpoints.
-    Uses MongoDB-based sliding window with fallback.
+    Uses the in-process sliding window limiter (synced to MongoDB periodically).
     """
     rate_limit_key = f"user_rate_limit:{user_key}"
     
@@ -149,7 +152,7 @@ async def rate_limit_user(user_key: str, limit_per_min: int):
     window_seconds = 60
     
     try:
-        result = await rate_limit_check(rate_limit_key, limit_per_min, window_seconds)
+        result = get_rate_limiter().hit(rate_limit_key, limit_per_min, window_seconds)
         
         if not result["allowed"]:
             now = datetime.now(timezone.utc)
@@ -164,6 +167,8 @@ async def rate_limit_user(user_key: str, limit_per_min: int):
                     "X-RateLimit-Reset": str(int(result["reset_time"].timestamp()))
                 }
             )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Rate limiting error for user {user_key}: {e}")
         # Fail open - allow the request but log the error
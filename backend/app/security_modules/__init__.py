@@ -1,6 +1,16 @@
 """
 Security module for I Need Numbers application
 """
-from .password import hash_password, verify_password, check_needs_rehash
+from .password import (
+    hash_password,
+    verify_password,
+    hash_password_async,
+    verify_password_async,
+    check_needs_rehash
+)
+from .worker_pool import AuthBusyError, get_auth_worker_pool
 
-__all__ = ['hash_password', 'verify_password', 'check_needs_rehash']
\ No newline at end of file
+__all__ = [
+    'hash_password', 'verify_password', 'hash_password_async', 'verify_password_async',
+    'check_needs_rehash', 'AuthBusyError', 'get_auth_worker_pool'
+]
\ No newline at end of file
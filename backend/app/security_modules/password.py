@@ -5,6 +5,8 @@ from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 import logging
 
+from .worker_pool import get_auth_worker_pool
+
 logger = logging.getLogger(__name__)
 
 # Initialize Argon2id hasher with secure parameters
@@ -93,6 +95,25 @@ def verify_password(password: str, hashed: str) -> bool:
         logger.error(f"Unknown password hash format: {hashed[:20]}...")
         return False
 
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password on the auth worker pool, keeping the event loop free
+    
+    Raises:
+        ValueError: If password is empty or None
+        AuthBusyError: If no auth worker is available in time
+    """
+    return await get_auth_worker_pool().run(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """
+    verify_password on the auth worker pool, keeping the event loop free
+    
+    Raises:
+        AuthBusyError: If no auth worker is available in time
+    """
+    return await get_auth_worker_pool().run(verify_password, password, hashed)
+
 def check_needs_rehash(hashed: str) -> bool:
     """
     Check if a hash needs to be rehashed with current parameters
@@ -0,0 +1,118 @@
+"""
+Bounded worker pool for CPU-bound auth work (Argon2/bcrypt hashing, TOTP QR rendering).
+
+An Argon2id hash with our parameters takes ~100ms+ of CPU and 64MB; run inline, a login
+burst stalls every request on the worker. Jobs run on a dedicated thread pool instead:
+argon2-cffi and bcrypt release the GIL while hashing, so threads give real parallelism
+without pickling passwords into other processes. At most max_workers jobs run at once
+(which also caps Argon2 memory), at most max_queue wait, and a job that can't get a
+worker within the queue timeout fails with AuthBusyError rather than piling up.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+class AuthBusyError(HTTPException):
+    """
+    Raised when the auth worker queue is full or a job waited too long for a worker.
+    A 503 with Retry-After, so it passes through the routes' `except HTTPException: raise`.
+    """
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+
+class AuthWorkerPool:
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout_seconds: Optional[float] = None
+    ):
+        config = get_config()
+        self.max_workers = max(1, max_workers or config.AUTH_WORKERS)
+        self.max_queue = config.AUTH_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds or config.AUTH_QUEUE_TIMEOUT_SECONDS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running = 0
+        self._waiting = 0
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0, "timeouts": 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="auth")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run fn(*args) on a worker thread.
+
+        Raises:
+            AuthBusyError: queue full, or no worker became free within the queue timeout
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        if self._waiting >= self.max_queue and self._slots.locked():
+            self._stats["rejected"] += 1
+            raise AuthBusyError("Authentication queue is full")
+
+        self._waiting += 1
+        try:
+            # asyncio.timeout, not wait_for: on 3.11 wait_for can time out after acquire()
+            # has already succeeded, leaking the permit
+            async with asyncio.timeout(self.queue_timeout_seconds):
+                await self._slots.acquire()
+        except TimeoutError:
+            self._stats["timeouts"] += 1
+            raise AuthBusyError("Timed out waiting for an authentication worker")
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+            self._stats["completed"] += 1
+            return result
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "running": self._running,
+            "waiting": self._waiting,
+            "max_queue": self.max_queue,
+            **self._stats
+        }
+
+
+# Global pool instance
+_auth_pool_instance: Optional[AuthWorkerPool] = None
+
+def get_auth_worker_pool() -> AuthWorkerPool:
+    """Get or create global auth worker pool instance."""
+    global _auth_pool_instance
+    if _auth_pool_instance is None:
+        _auth_pool_instance = AuthWorkerPool()
+    return _auth_pool_instance
@@ -0,0 +1,307 @@
+"""
+Async object storage for uploads and brand assets, selected by config.STORAGE_DRIVER.
+
+"s3" talks to S3 or any S3-compatible endpoint (S3_ENDPOINT_URL: MinIO, a moto server in
+tests) through one long-lived boto3 client with a pooled connection set. boto3 blocks, so
+calls run on a dedicated thread pool sized to that connection pool instead of the default
+executor; objects over the multipart threshold are uploaded as parallel parts.
+
+"local" stores files under STORAGE_LOCAL_DIR, reading and writing in worker threads. Files
+are served with FileResponse, which hands the path to the server (sendfile) when it supports
+the ASGI pathsend extension and streams it in chunks otherwise.
+"""
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import boto3
+from boto3.exceptions import Boto3Error
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+HEALTHCHECK_PREFIX = "healthcheck/"
+
+
+class StorageError(Exception):
+    """Raised when a storage operation fails; code carries the S3 error code when there is one."""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class ObjectNotFoundError(StorageError):
+    """Raised when the requested key does not exist."""
+
+
+@dataclass
+class StoredObject:
+    key: str
+    url: str
+    etag: str
+    size: int
+
+
+class S3Storage:
+    """S3 driver: pooled client, bounded executor, multipart uploads for large objects."""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        region: str,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        multipart_threshold: Optional[int] = None,
+        multipart_chunksize: Optional[int] = None
+    ):
+        config = get_config()
+        self.bucket = bucket
+        self.region = region
+        self.endpoint_url = endpoint_url.rstrip("/") if endpoint_url else None
+        self.max_connections = max_connections or config.S3_MAX_POOL_CONNECTIONS
+        self.multipart_threshold = multipart_threshold or config.S3_MULTIPART_THRESHOLD_MB * MB
+        self._credentials = {"aws_access_key_id": access_key_id, "aws_secret_access_key": secret_access_key}
+        self._transfer = TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=multipart_chunksize or config.S3_MULTIPART_CHUNK_MB * MB,
+            max_concurrency=min(10, self.max_connections),
+            use_threads=True
+        )
+        self._client = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {"puts": 0, "multipart_puts": 0, "gets": 0, "deletes": 0, "errors": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            # boto3 clients are thread-safe; one client shares its connection pool across calls
+            self._client = boto3.session.Session().client(
+                "s3",
+                region_name=self.region,
+                endpoint_url=self.endpoint_url,
+                config=BotoConfig(
+                    max_pool_connections=self.max_connections,
+                    retries={"max_attempts": 3, "mode": "standard"},
+                    tcp_keepalive=True
+                ),
+                **self._credentials
+            )
+        return self._client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            # No more threads than pooled connections, so calls never wait on the pool inside a thread
+            self._executor = ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="s3")
+        return self._executor
+
+    async def _call(self, method: str, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.executor, functools.partial(getattr(self.client, method), **kwargs)
+            )
+        except ClientError as e:
+            self._stats["errors"] += 1
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("NoSuchKey", "404", "NotFound"):
+                raise ObjectNotFoundError(f"{kwargs.get('Key')} not found", code) from None
+            raise StorageError(str(e), code) from None
+        except (BotoCoreError, Boto3Error) as e:
+            # Boto3Error: the managed transfer (upload_fileobj) raises S3UploadFailedError
+            self._stats["errors"] += 1
+            raise StorageError(str(e)) from None
+
+    def url_for(self, key: str) -> str:
+        if self.endpoint_url:
+            return f"{self.endpoint_url}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        prefix = self.url_for("")
+        return url[len(prefix):] if url and url.startswith(prefix) else None
+
+    async def put(self, key: str, data: bytes, content_type: str = "application/octet-stream",
+                  **extra_args) -> StoredObject:
+        """Store an object; extra_args are passed through as S3 PutObject parameters."""
+        args = {"ContentType": content_type, **extra_args}
+        if len(data) >= self.multipart_threshold:
+            await self._call("upload_fileobj", Fileobj=io.BytesIO(data), Bucket=self.bucket, Key=key,
+                             ExtraArgs=args, Config=self._transfer)
+            etag = (await self._call("head_object", Bucket=self.bucket, Key=key))["ETag"]
+            self._stats["multipart_puts"] += 1
+        else:
+            etag = (await self._call("put_object", Bucket=self.bucket, Key=key, Body=data, **args))["ETag"]
+        self._stats["puts"] += 1
+        return StoredObject(key=key, url=self.url_for(key), etag=etag.strip('"'), size=len(data))
+
+    async def get(self, key: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        response = await self._call("get_object", Bucket=self.bucket, Key=key)
+        self._stats["gets"] += 1
+        # Reading the body is blocking I/O too
+        return await loop.run_in_executor(self.executor, response["Body"].read)
+
+    async def delete(self, key: str):
+        await self._call("delete_object", Bucket=self.bucket, Key=key)
+        self._stats["deletes"] += 1
+
+    async def check(self) -> bool:
+        """Write and delete a small object to confirm credentials and bucket access."""
+        key = f"{HEALTHCHECK_PREFIX}{uuid.uuid4()}"
+        await self._call("put_object", Bucket=self.bucket, Key=key, Body=b"health-check",
+                         ContentType="text/plain")
+        await self._call("delete_object", Bucket=self.bucket, Key=key)
+        return True
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "driver": self.name,
+            "bucket": self.bucket,
+            "max_connections": self.max_connections,
+            "multipart_threshold_mb": self.multipart_threshold / MB,
+            **self._stats
+        }
+
+
+class LocalStorage:
+    """Local-disk driver for development: <root>/<key>, served from <url_prefix>/<key>."""
+
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None, url_prefix: str = "/api/uploads"):
+        self.root = Path(root or get_config().STORAGE_LOCAL_DIR).resolve()
+        self.url_prefix = url_prefix.rstrip("/")
+        self._stats = {"puts": 0, "gets": 0, "deletes": 0, "errors": 0}
+
+    def path_for(self, key: str) -> Path:
+        """Filesystem path for a key; keys may not escape the storage root."""
+        path = (self.root / key).resolve()
+        if self.root not in path.parents:
+            raise StorageError(f"Invalid storage key: {key}")
+        return path
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.url_prefix}/"
+        return url[len(prefix):] if url and url.startswith(prefix) else None
+
+    async def put(self, key: str, data: bytes, content_type: str = "application/octet-stream",
+                  **extra_args) -> StoredObject:
+        path = self.path_for(key)
+
+        def write():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so readers never see a partial file
+            tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as e:
+            self._stats["errors"] += 1
+            raise StorageError(str(e)) from None
+        self._stats["puts"] += 1
+        # Same value S3 reports for a single-part upload
+        return StoredObject(key=key, url=self.url_for(key), etag=hashlib.md5(data).hexdigest(), size=len(data))
+
+    async def get(self, key: str) -> bytes:
+        try:
+            data = await asyncio.to_thread(self.path_for(key).read_bytes)
+        except FileNotFoundError:
+            raise ObjectNotFoundError(f"{key} not found") from None
+        except OSError as e:
+            self._stats["errors"] += 1
+            raise StorageError(str(e)) from None
+        self._stats["gets"] += 1
+        return data
+
+    async def delete(self, key: str):
+        try:
+            await asyncio.to_thread(self.path_for(key).unlink, missing_ok=True)
+        except OSError as e:
+            self._stats["errors"] += 1
+            raise StorageError(str(e)) from None
+        self._stats["deletes"] += 1
+
+    async def check(self) -> bool:
+        key = f"{HEALTHCHECK_PREFIX}{uuid.uuid4()}"
+        await self.put(key, b"health-check", "text/plain")
+        await self.delete(key)
+        return True
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"driver": self.name, "root": str(self.root), **self._stats}
+
+
+def s3_configured(config=None) -> bool:
+    config = config or get_config()
+    return bool(config.S3_BUCKET and config.S3_ACCESS_KEY_ID and config.S3_SECRET_ACCESS_KEY and config.S3_REGION)
+
+
+def create_storage(config=None):
+    """Build the driver named by STORAGE_DRIVER; unconfigured S3 falls back to local disk outside production."""
+    config = config or get_config()
+    driver = (config.STORAGE_DRIVER or "s3").lower()
+
+    if driver == "s3":
+        if s3_configured(config):
+            return S3Storage(
+                bucket=config.S3_BUCKET,
+                region=config.S3_REGION,
+                access_key_id=config.S3_ACCESS_KEY_ID,
+                secret_access_key=config.S3_SECRET_ACCESS_KEY,
+                endpoint_url=config.S3_ENDPOINT_URL
+            )
+        if config.is_production():
+            raise StorageError("S3 configuration is required in production")
+        logger.info("S3 credentials not configured - using local storage fallback for file uploads")
+        return LocalStorage()
+
+    if driver == "local":
+        return LocalStorage()
+
+    raise StorageError(f"Unknown STORAGE_DRIVER: {config.STORAGE_DRIVER}")
+
+
+# Global storage instance
+_storage_instance = None
+
+def get_storage():
+    """Get or create global storage driver instance."""
+    global _storage_instance
+    if _storage_instance is None:
+        _storage_instance = create_storage()
+    return _storage_instance
@@ -0,0 +1,154 @@
+"""
+Pre-parsed Mustache templates for report rendering.
+
+Every file in backend/templates is read and parsed once (at startup, or on first use)
+and rendered through one shared pystache Renderer, so a preview or PDF request no longer
+reads the file from disk and re-parses it. Outside production a template is re-parsed
+when its file's mtime changes, so template edits show up without a restart.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pystache
+from pystache.parsed import ParsedTemplate
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+TEMPLATE_SUFFIXES = (".html",)
+
+# Report tool -> template file
+REPORT_TEMPLATES = {
+    "investor": "investor_report_comprehensive.html",
+    "affordability": "affordability_report.html",
+    "commission": "commission_split_report.html",
+    "seller-net": "seller_net_sheet_report.html",
+    "closing-date": "closing_date_report.html",
+}
+
+
+class TemplateNotFoundError(Exception):
+    """Raised when a template file does not exist in the templates directory."""
+
+
+@dataclass
+class CompiledTemplate:
+    name: str
+    path: Path
+    mtime_ns: int
+    size: int
+    parsed: ParsedTemplate
+    parse_seconds: float
+
+
+def make_renderer() -> pystache.Renderer:
+    # No HTML escaping (raw output for PDFs); missing tags render as empty
+    return pystache.Renderer(
+        escape=lambda u: u,
+        string_encoding=None,
+        missing_tags='ignore'
+    )
+
+
+class TemplateRegistry:
+    """Name -> parsed template, with optional mtime-based reload."""
+
+    def __init__(self, directory: Optional[Path] = None, auto_reload: Optional[bool] = None):
+        self.directory = Path(directory or TEMPLATES_DIR)
+        self.auto_reload = (not get_config().is_production()) if auto_reload is None else auto_reload
+        self.renderer = make_renderer()
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stats = {"renders": 0, "loads": 0, "reloads": 0}
+
+    def load(self) -> int:
+        """Parse every template in the directory; returns how many were loaded."""
+        with self._lock:
+            for path in sorted(self.directory.iterdir()):
+                if path.suffix in TEMPLATE_SUFFIXES and path.is_file():
+                    self._templates[path.name] = self._compile(path)
+            self._loaded = True
+        logger.info(f"Template registry loaded {len(self._templates)} templates from {self.directory}")
+        return len(self._templates)
+
+    def _compile(self, path: Path) -> CompiledTemplate:
+        stat = path.stat()
+        started = time.perf_counter()
+        parsed = pystache.parse(path.read_text(encoding='utf-8'))
+        self._stats["loads"] += 1
+        return CompiledTemplate(
+            name=path.name,
+            path=path,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            parsed=parsed,
+            parse_seconds=time.perf_counter() - started
+        )
+
+    def get(self, name: str) -> CompiledTemplate:
+        """
+        Parsed template by file name.
+
+        Raises:
+            TemplateNotFoundError: no such file in the templates directory
+        """
+        if not self._loaded:
+            self.load()
+
+        template = self._templates.get(name)
+        if template is not None and not self.auto_reload:
+            return template
+
+        # Names come from code, but never let one escape the templates directory
+        path = self.directory / os.path.basename(name)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            raise TemplateNotFoundError(name)
+
+        if template is None or stat.st_mtime_ns != template.mtime_ns or stat.st_size != template.size:
+            with self._lock:
+                template = self._templates.get(name)
+                if template is None or stat.st_mtime_ns != template.mtime_ns or stat.st_size != template.size:
+                    if template is not None:
+                        self._stats["reloads"] += 1
+                        logger.info(f"Template {name} changed on disk, reloading")
+                    template = self._templates[name] = self._compile(path)
+        return template
+
+    def render(self, name: str, data: Dict[str, Any]) -> str:
+        """
+        Render a template by file name.
+
+        Raises:
+            TemplateNotFoundError: no such file in the templates directory
+        """
+        template = self.get(name)
+        self._stats["renders"] += 1
+        return self.renderer.render(template.parsed, data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "templates": len(self._templates),
+            "auto_reload": self.auto_reload,
+            **self._stats
+        }
+
+
+# Global registry instance
+_registry_instance: Optional[TemplateRegistry] = None
+
+def get_template_registry() -> TemplateRegistry:
+    """Get or create global template registry instance."""
+    global _registry_instance
+    if _registry_instance is None:
+        _registry_instance = TemplateRegistry()
+    return _registry_instance
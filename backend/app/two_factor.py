@@ -9,6 +9,8 @@ import base64
 from typing import Tuple, List
 import secrets
 
+from app.security_modules.worker_pool import get_auth_worker_pool
+
 
 def generate_totp_secret() -> str:
     """Generate a new TOTP secret key"""
@@ -49,6 +51,14 @@ def generate_qr_code(email: str, secret: str, issuer: str = "I Need Numbers") ->
     return f"data:image/png;base64,{img_base64}"
 
 
+async def generate_qr_code_async(email: str, secret: str, issuer: str = "I Need Numbers") -> str:
+    """
+    Render the setup QR code on the auth worker pool instead of the event loop
+    Returns base64-encoded PNG image
+    """
+    return await get_auth_worker_pool().run(generate_qr_code, email, secret, issuer)
+
+
 def verify_totp_code(secret: str, code: str) -> bool:
     """
     Verify a TOTP code against the secret
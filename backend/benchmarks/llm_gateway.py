@@ -0,0 +1,120 @@
+"""
+Latency benchmark for outbound LLM calls against a local OpenAI stub.
+
+Starts a stub /v1/chat/completions server on localhost (fixed think time, no network)
+and sends N requests at a fixed concurrency, either the old way (a new AsyncOpenAI
+client per request) or through the shared app.llm_gateway pool, then reports p50/p99
+latency and throughput. The stub speaks plain HTTP, so the gateway's saving here is
+connection setup only; against api.openai.com the TLS handshake is saved as well.
+
+    cd backend && python -m benchmarks.llm_gateway --requests 500 --concurrency 20
+    cd backend && python -m benchmarks.llm_gateway --mode per-request
+    cd backend && python -m benchmarks.llm_gateway --serve --port 8765   # stub only, for OPENAI_BASE_URL
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+from fastapi import FastAPI
+
+COMPLETION_TEXT = '{"summary": "stub coaching", "stats": {}, "actions": [], "risks": [], "next_inputs": []}'
+
+
+def make_stub_app(delay_seconds: float) -> FastAPI:
+    stub = FastAPI()
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(body: dict):
+        await asyncio.sleep(delay_seconds)
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": COMPLETION_TEXT},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30}
+        }
+
+    return stub
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_thread(port: int, delay_seconds: float) -> uvicorn.Server:
+    """Serve the stub on its own thread and event loop so it doesn't share the client's loop."""
+    server = uvicorn.Server(uvicorn.Config(make_stub_app(delay_seconds), host="127.0.0.1", port=port,
+                                           log_level="warning", backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run(mode: str, base_url: str, requests: int, concurrency: int):
+    from openai import AsyncOpenAI
+    from app.llm_gateway import LLMGateway
+
+    gateway = LLMGateway(api_key="sk-bench", base_url=base_url, max_concurrency=concurrency)
+    messages = [{"role": "user", "content": "benchmark"}]
+    latencies = []
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def one_call():
+        async with limiter:
+            start = time.perf_counter()
+            if mode == "gateway":
+                await gateway.chat(model="stub", messages=messages, max_tokens=50)
+            else:
+                client = AsyncOpenAI(api_key="sk-bench", base_url=base_url)
+                try:
+                    await client.chat.completions.create(model="stub", messages=messages, max_tokens=50)
+                finally:
+                    await client.close()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one_call() for _ in range(requests)])
+    elapsed = time.perf_counter() - started
+    await gateway.close()
+
+    ordered = sorted(latencies)
+    print(f"mode: {mode}  requests: {requests}  concurrency: {concurrency}")
+    print(f"p50: {statistics.median(ordered):.1f} ms  p99: {ordered[int(0.99 * (len(ordered) - 1))]:.1f} ms  "
+          f"max: {ordered[-1]:.1f} ms")
+    print(f"throughput: {requests / elapsed:,.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay-ms", type=float, default=50, help="stub think time per completion")
+    parser.add_argument("--mode", choices=["gateway", "per-request", "both"], default="both")
+    parser.add_argument("--serve", action="store_true", help="only run the stub server")
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.serve:
+        uvicorn.run(make_stub_app(args.delay_ms / 1000), host="127.0.0.1", port=args.port or 8765)
+    else:
+        port = args.port or free_port()
+        start_stub_thread(port, args.delay_ms / 1000)
+        modes = ["per-request", "gateway"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            asyncio.run(run(mode, f"http://127.0.0.1:{port}/v1", args.requests, args.concurrency))
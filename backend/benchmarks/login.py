@@ -0,0 +1,81 @@
+"""
+Login throughput benchmark: inline vs pooled password verification.
+
+Simulates N concurrent logins, each verifying a password against a precomputed Argon2id
+hash. "inline" is the old path (verify_password called on the event loop); "pooled" runs
+it on the auth worker pool. A probe task measures event-loop lag meanwhile, which is what
+every other request on the worker experiences during a login burst.
+
+    cd backend && python -m benchmarks.login
+    cd backend && python -m benchmarks.login --concurrency 200 --workers 8
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.security_modules.password import hash_password, verify_password
+from app.security_modules.worker_pool import AuthBusyError, AuthWorkerPool
+
+PASSWORD = "correct horse battery staple"
+PROBE_INTERVAL = 0.005
+
+
+async def probe_loop_lag(stop: asyncio.Event, samples: list):
+    """Record how far past PROBE_INTERVAL each sleep actually took."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+async def run_logins(concurrency: int, hashed: str, pool: AuthWorkerPool = None):
+    async def login():
+        if pool is None:
+            return verify_password(PASSWORD, hashed)
+        try:
+            return await pool.run(verify_password, PASSWORD, hashed)
+        except AuthBusyError:
+            return None
+
+    stop = asyncio.Event()
+    lag = []
+    probe = asyncio.create_task(probe_loop_lag(stop, lag))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    results = await asyncio.gather(*[login() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    ok = sum(1 for result in results if result)
+    busy = sum(1 for result in results if result is None)
+    return ok / elapsed, busy, statistics.median(lag) if lag else 0.0, max(lag, default=0.0)
+
+
+async def run(levels, workers: int, max_queue: int, queue_timeout: float):
+    hashed = hash_password(PASSWORD)
+    print(f"{'mode':<8}{'logins':>8}{'logins/s':>10}{'503s':>6}{'lag p50':>10}{'lag max':>11}")
+    for concurrency in levels:
+        for mode in ("inline", "pooled"):
+            pool = AuthWorkerPool(workers, max_queue, queue_timeout) if mode == "pooled" else None
+            rate, busy, lag_p50, lag_max = await run_logins(concurrency, hashed, pool)
+            if pool is not None:
+                await pool.stop()
+            print(f"{mode:<8}{concurrency:>8}{rate:>10.1f}{busy:>6}{lag_p50:>8.1f}ms{lag_max:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, action="append", default=None,
+                        help="Concurrent logins (repeatable; default 50, 200 and 1000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--max-queue", type=int, default=1000)
+    parser.add_argument("--queue-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.concurrency or [50, 200, 1000], args.workers, args.max_queue, args.queue_timeout))
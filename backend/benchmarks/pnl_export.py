@@ -0,0 +1,71 @@
+"""
+Throughput / memory benchmark for the streaming P&L export.
+
+Feeds synthetic deal and expense documents through app.pnl_export exactly as the
+endpoint does (async cursor -> rows -> CSV or XLSX chunks) and reports wall time,
+output size and peak RSS. Output is discarded as it is produced, like a client download.
+
+    cd backend && python -m benchmarks.pnl_export --rows 100000 --format csv
+    cd backend && python -m benchmarks.pnl_export --rows 100000 --format xlsx
+"""
+import argparse
+import asyncio
+import resource
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.pnl_export import deal_row, expense_row, stream_export
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def synthetic_rows(count: int):
+    """Half deals, half expenses, shaped like the stored documents."""
+    for i in range(count):
+        month = f"2025-{i % 12 + 1:02d}"
+        if i % 2 == 0:
+            yield deal_row({
+                "closing_date": f"{month}-15", "month": month, "house_address": f"{i} Main Street",
+                "lead_source": "Referral", "amount_sold_for": 450000.0, "commission_percent": 3.0,
+                "split_percent": 70.0, "team_brokerage_split_percent": 10.0, "cap_amount": 250.0,
+                "final_income": 8250.0
+            })
+        else:
+            yield expense_row({
+                "date": f"{month}-03", "month": month, "description": f"Expense {i}",
+                "category": "Marketing", "amount": 125.5, "budget": 500.0
+            })
+        if i % 1000 == 0:
+            # Let the loop breathe the way a real cursor's network reads would
+            await asyncio.sleep(0)
+
+
+async def run(rows: int, fmt: str):
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    size = 0
+    chunks = 0
+    async for chunk in stream_export(synthetic_rows(rows), fmt):
+        size += len(chunk)
+        chunks += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"format: {fmt}  rows: {rows:,}")
+    print(f"time: {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+    print(f"output: {size / (1024 * 1024):.1f} MB in {chunks} chunks")
+    print(f"peak RSS: {peak_rss_mb():.1f} MB (baseline {baseline:.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.format))
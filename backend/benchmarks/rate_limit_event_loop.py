@@ -0,0 +1,104 @@
+"""
+Event-loop latency benchmark for MongoDB rate limiting.
+
+Runs N concurrent clients calling rate_limit_check while a probe task measures how late
+the event loop wakes it up. --legacy runs the old synchronous pymongo pattern
+(delete_many + count_documents + insert_one) for comparison.
+
+    cd backend && python -m benchmarks.rate_limit_event_loop --clients 500 --requests 20
+    cd backend && python -m benchmarks.rate_limit_event_loop --clients 500 --requests 20 --legacy
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import os
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import get_config
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe_loop_lag(stop: asyncio.Event, samples: list):
+    """Record how far past PROBE_INTERVAL each sleep actually took."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+def make_legacy_check():
+    from pymongo import MongoClient
+
+    config = get_config()
+    collection = MongoClient(config.MONGO_URL)[config.DB_NAME].rate_limits_bench
+
+    async def legacy_check(key: str, limit: int, window_seconds: int):
+        now = datetime.now(timezone.utc)
+        window_start = now - timedelta(seconds=window_seconds)
+        collection.delete_many({"key": key, "timestamp": {"$lt": window_start}})
+        count = collection.count_documents({"key": key, "timestamp": {"$gte": window_start}})
+        if count < limit:
+            collection.insert_one({"key": key, "timestamp": now, "expires_at": now + timedelta(seconds=window_seconds)})
+        return {"allowed": count < limit}
+
+    return legacy_check, collection
+
+
+async def run(clients: int, requests_per_client: int, legacy: bool):
+    if legacy:
+        check, bench_collection = make_legacy_check()
+    else:
+        from app.mongodb_cache import get_cache
+        check, bench_collection = get_cache().rate_limit_check, None
+
+    run_id = uuid.uuid4().hex[:8]
+    latencies = []
+
+    async def client(n: int):
+        key = f"bench:{run_id}:{n % 50}"
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            await check(key, 1000, 60)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    stop = asyncio.Event()
+    lag_samples = []
+    probe = asyncio.create_task(probe_loop_lag(stop, lag_samples))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client(n) for n in range(clients)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    if bench_collection is not None:
+        bench_collection.drop()
+
+    def pct(values, p):
+        return statistics.quantiles(values, n=100)[p - 1] if len(values) >= 2 else (values[0] if values else 0.0)
+
+    total = clients * requests_per_client
+    print(f"mode: {'legacy sync pymongo' if legacy else 'motor find_one_and_update'}")
+    print(f"clients: {clients}, checks: {total}, elapsed: {elapsed:.2f}s, throughput: {total / elapsed:.0f}/s")
+    print(f"check latency ms   p50={pct(latencies, 50):.2f} p99={pct(latencies, 99):.2f} max={max(latencies):.2f}")
+    print(f"event-loop lag ms  p50={pct(lag_samples, 50):.2f} p99={pct(lag_samples, 99):.2f} "
+          f"max={max(lag_samples, default=0):.2f} samples={len(lag_samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20, help="checks per client")
+    parser.add_argument("--legacy", action="store_true", help="benchmark the old synchronous implementation")
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.requests, args.legacy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cold vs warm render benchmark for the report templates.
+
+For each report tool, "cold" is the old path (read the file, build a pystache Renderer,
+parse and render the template string on every call) and "warm" renders the registry's
+pre-parsed template. Data comes from the template's own tags (every variable filled,
+every section rendered three times), so no database or request payload is needed.
+
+    cd backend && python -m benchmarks.templates --iterations 200
+    cd backend && python -m benchmarks.templates --tool investor
+"""
+import argparse
+import statistics
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.template_registry import REPORT_TEMPLATES, TemplateRegistry, make_renderer
+
+SECTION_ITEMS = 3
+
+
+def _put(context: dict, key: str, value):
+    *parents, leaf = key.split(".")
+    for part in parents:
+        context = context.setdefault(part, {})
+        if not isinstance(context, dict):
+            return
+    context.setdefault(leaf, value)
+
+
+def sample_context(parsed) -> dict:
+    """Fill every tag in a parsed template with a placeholder value."""
+    context = {}
+    for node in parsed._parse_tree:
+        key = getattr(node, "key", None)
+        if not key or key == ".":
+            continue
+        if hasattr(node, "parsed"):
+            _put(context, key, [sample_context(node.parsed) for _ in range(SECTION_ITEMS)])
+        elif not hasattr(node, "parsed_section"):
+            _put(context, key, "$123,456.78")
+    return context
+
+
+def time_renders(render, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        render()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def run(tools, iterations: int):
+    registry = TemplateRegistry(auto_reload=False)
+    registry.load()
+
+    print(f"{'tool':<14}{'template':<38}{'cold p50':>10}{'warm p50':>10}{'speedup':>9}")
+    for tool in tools:
+        name = REPORT_TEMPLATES[tool]
+        template = registry.get(name)
+        data = sample_context(template.parsed)
+
+        def cold():
+            return make_renderer().render(template.path.read_text(encoding='utf-8'), data)
+
+        def warm():
+            return registry.render(name, data)
+
+        assert cold() == warm()
+        cold_p50, _ = time_renders(cold, iterations)
+        warm_p50, _ = time_renders(warm, iterations)
+        print(f"{tool:<14}{name:<38}{cold_p50:>8.2f}ms{warm_p50:>8.2f}ms{cold_p50 / warm_p50:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--tool", choices=sorted(REPORT_TEMPLATES), default=None)
+    args = parser.parse_args()
+
+    run([args.tool] if args.tool else list(REPORT_TEMPLATES), args.iterations)
@@ -28,6 +28,10 @@ class Config(BaseSettings):
     # Database (REQUIRED)
     MONGO_URL: str = Field(..., description="MongoDB connection string")
     DB_NAME: str = Field(default="ineednumbers", description="Database name")
+    MONGO_MAX_POOL_SIZE: int = Field(default=50, description="Max MongoDB connections per worker")
+    MONGO_MIN_POOL_SIZE: int = Field(default=5, description="Warm MongoDB connections kept per worker")
+    MONGO_MAX_IDLE_TIME_MS: int = Field(default=60000, description="Close pooled connections idle longer than this")
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = Field(default=5000, description="Max wait for a pooled connection before erroring")
     
     # Security (REQUIRED in production)
     JWT_SECRET_KEY: str = Field(..., min_length=32, description="JWT signing secret (32+ chars)")
@@ -54,33 +58,90 @@ class Config(BaseSettings):
     # OpenAI (REQUIRED for AI features)
     OPENAI_API_KEY: str = Field(..., description="OpenAI API key")
     OPENAI_MODEL: Optional[str] = Field(default="gpt-4o-mini", description="OpenAI model (optional in dev)")
+    OPENAI_BASE_URL: Optional[str] = Field(default=None, description="OpenAI-compatible API base URL (e.g. a local stub for benchmarks)")
+    LLM_MAX_CONNECTIONS: int = Field(default=20, description="Max pooled HTTP connections to the LLM API per worker")
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=10, description="Idle keep-alive connections kept to the LLM API")
+    LLM_TIMEOUT_SECONDS: float = Field(default=60, description="LLM API read/write timeout")
+    LLM_CONNECT_TIMEOUT_SECONDS: float = Field(default=5, description="LLM API connect timeout")
+    LLM_MAX_RETRIES: int = Field(default=2, description="Retries for failed LLM API calls")
+    LLM_MAX_CONCURRENCY: int = Field(default=8, description="Max concurrent outbound LLM calls per worker")
+    LLM_QUEUE_TIMEOUT_SECONDS: float = Field(default=30, description="Max seconds to wait for an LLM call slot")
     AI_COACH_MAX_TOKENS: int = Field(default=800, description="Max AI tokens")
     AI_COACH_TEMPERATURE: float = Field(default=0.2, description="AI temperature")
     AI_COACH_RATE_LIMIT_PER_MIN: int = Field(default=10, description="AI rate limit per minute")
     AI_CACHE_TTL_SECONDS: int = Field(default=300, description="AI cache TTL")
+    AI_CACHE_MEMORY_MB: int = Field(default=16, description="In-process AI response cache size per worker")
     AI_COACH_ENABLED: bool = Field(default=False, description="Enable AI Coach")
+    COACH_PREGEN_ENABLED: bool = Field(default=False, description="Pre-generate AI coach insights in the background after data writes")
+    COACH_PREGEN_DEBOUNCE_SECONDS: float = Field(default=30, description="Quiet period after a user's last write before pre-generating")
+    COACH_PREGEN_MAX_CONCURRENCY: int = Field(default=2, description="Max concurrent background pre-generations per worker")
+    COACH_PREGEN_TTL_SECONDS: int = Field(default=86400, description="Cache lifetime of pre-generated dashboard coach responses")
+    COACH_PREGEN_NIGHTLY_HOUR_UTC: Optional[int] = Field(default=None, description="UTC hour for the nightly pre-generation batch (unset disables it)")
+    COACH_PREGEN_ACTIVE_DAYS: int = Field(default=7, description="Nightly batch covers users with data writes in this many days")
+    
+    # Health probes (/health and /api/ready serve the latest background result)
+    HEALTH_PROBE_INTERVAL_SECONDS: float = Field(default=10, description="Refresh interval for MongoDB and cache probes")
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = Field(default=5, description="Max seconds for one dependency probe")
+    HEALTH_PROBE_S3_INTERVAL_SECONDS: float = Field(default=60, description="Refresh interval for the S3 put/delete probe")
+    HEALTH_PROBE_STRIPE_INTERVAL_SECONDS: float = Field(default=300, description="Refresh interval for the Stripe account probe")
     
     # S3 Storage (REQUIRED in production, OPTIONAL in development)
-    STORAGE_DRIVER: str = Field(default="s3", description="Storage driver")
+    STORAGE_DRIVER: str = Field(default="s3", description="Storage driver: s3 (falls back to local in development when unconfigured) or local")
+    STORAGE_LOCAL_DIR: str = Field(default="/tmp/uploads", description="Root directory for the local storage driver")
     S3_REGION: str = Field(default="us-east-1", description="AWS S3 region")
     S3_BUCKET: Optional[str] = Field(default=None, description="S3 bucket name")
     S3_ACCESS_KEY_ID: Optional[str] = Field(default=None, description="AWS access key ID (optional in dev)")
     S3_SECRET_ACCESS_KEY: Optional[str] = Field(default=None, description="AWS secret access key (optional in dev)")
     S3_ENDPOINT_URL: Optional[str] = Field(default=None, description="Custom S3 endpoint")
+    S3_MAX_POOL_CONNECTIONS: int = Field(default=32, description="Pooled HTTP connections (and worker threads) for S3 calls")
+    S3_MULTIPART_THRESHOLD_MB: int = Field(default=8, description="Objects at least this large are uploaded in parallel parts")
+    S3_MULTIPART_CHUNK_MB: int = Field(default=8, description="Part size for multipart uploads (S3 minimum is 5MB)")
     
     # File Upload Limits
     ASSET_MAX_MB: int = Field(default=10, description="Max file size in MB")
     ALLOWED_MIME: str = Field(default="image/png,image/jpeg,image/svg+xml,image/webp", description="Allowed MIME types")
     MAX_JSON_BODY_KB: int = Field(default=512, description="Max JSON body size in KB")
-    
+
+    # PDF Rendering
+    PDF_BROWSER_EXECUTABLE: Optional[str] = Field(default=None, description="Chromium executable for PDF rendering (auto-detected if unset)")
+    PDF_RENDER_POOL_SIZE: int = Field(default=2, description="Number of warm Chromium pages kept for PDF rendering")
+    PDF_RENDER_MAX_PER_PAGE: int = Field(default=50, description="Renders before a pooled page is recycled")
+    PDF_RENDER_MAX_QUEUE: int = Field(default=20, description="Max PDF requests waiting for a page before returning 503")
+    PDF_RENDER_TIMEOUT_SECONDS: int = Field(default=60, description="Max seconds to wait for and perform a PDF render")
+    PDF_CACHE_ENABLED: bool = Field(default=True, description="Cache rendered report PDFs by content hash")
+    PDF_CACHE_MEMORY_MB: int = Field(default=64, description="In-memory PDF cache size in MB")
+    PDF_CACHE_DIR: Optional[str] = Field(default="/tmp/pdf_cache", description="On-disk PDF cache directory (unset to disable)")
+    PDF_CACHE_TTL_SECONDS: int = Field(default=86400, description="On-disk PDF cache TTL")
+    MEDIA_WORKERS: int = Field(default=2, description="Worker processes for brand image decoding/resizing")
+    MEDIA_MAX_QUEUE: int = Field(default=8, description="Max image jobs waiting for a worker before uploads get 503")
+    MEDIA_TIMEOUT_SECONDS: float = Field(default=30, description="Max seconds to wait for and process one image")
+    BRAND_ASSET_CACHE_MEMORY_MB: int = Field(default=8, description="In-process cache of base64 brand images for PDFs")
+    BRAND_ASSET_CACHE_TTL_DAYS: int = Field(default=30, description="Lifetime of cached brand images in MongoDB")
+    BRAND_BUNDLE_CACHE_MEMORY_MB: int = Field(default=16, description="Memory budget for resolved per-user brand bundles")
+
     # Security Settings
     COOKIE_SECURE: bool = Field(default=True, description="Use secure cookies")
     COOKIE_SAMESITE: str = Field(default="lax", description="SameSite cookie policy")
+    PRINCIPAL_CACHE_TTL_SECONDS: float = Field(default=15, description="How long a verified user lookup is reused per worker (0 disables)")
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = Field(default=10000, description="Max cached (user, token) principals per worker")
+    AUTH_WORKERS: int = Field(default=4, description="Threads for password hashing and QR rendering (each Argon2 hash uses 64MB)")
+    AUTH_MAX_QUEUE: int = Field(default=100, description="Max auth jobs waiting for a worker before requests get 503")
+    AUTH_QUEUE_TIMEOUT_SECONDS: float = Field(default=5, description="Max seconds an auth job waits for a worker")
+    AUDIT_QUEUE_MAX: int = Field(default=10000, description="Max audit events buffered per worker before the overflow policy applies")
+    AUDIT_BATCH_SIZE: int = Field(default=200, description="Audit events per insert_many batch")
+    AUDIT_FLUSH_SECONDS: float = Field(default=1, description="Max seconds an audit event waits before being written")
+    AUDIT_OVERFLOW_POLICY: str = Field(default="drop_oldest", description="When the audit queue is full: drop_oldest, drop_newest or block")
+    AUDIT_SYNC_ACTIONS: str = Field(default="password_reset_confirm,password_change,delete_account,admin_user_update,admin_user_delete,admin_plan_change", description="Comma-separated audit actions written synchronously, bypassing the queue")
+    AUDIT_RETENTION_DAYS: int = Field(default=0, description="Days to keep audit logs in MongoDB (0 keeps them forever)")
+    AUDIT_ARCHIVE_ENABLED: bool = Field(default=True, description="Archive expired audit logs to storage as gzipped NDJSON before deleting them")
+    AUDIT_RETENTION_BATCH_SIZE: int = Field(default=5000, description="Audit logs per archive file and delete batch")
     
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = Field(default=True, description="Enable rate limiting")
     RATE_LIMIT_REQUESTS: int = Field(default=100, description="Rate limit requests per window")
     RATE_LIMIT_WINDOW: int = Field(default=3600, description="Rate limit window in seconds")
+    RATE_LIMIT_MAX_KEYS: int = Field(default=10000, description="Max rate limit keys tracked in memory per worker")
+    RATE_LIMIT_SYNC_SECONDS: float = Field(default=5, description="Seconds between rate limit count syncs to MongoDB")
     
     # Logging
     LOG_FILE: Optional[str] = Field(default=None, description="Log file path")
@@ -124,6 +185,10 @@ class Config(BaseSettings):
         """Get CORS origins as a list."""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(',') if origin.strip()]
     
+    def get_audit_sync_actions(self) -> List[str]:
+        """Get synchronously written audit actions as a list."""
+        return [action.strip() for action in self.AUDIT_SYNC_ACTIONS.split(',') if action.strip()]
+    
     def validate_production_requirements(self):
         """Validate additional production requirements."""        
         # Development mode warnings for optional services
@@ -3,23 +3,30 @@ I Need Numbers - Production-Ready FastAPI Backend
 Real Estate Investment Analysis Platform
 """
 
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Cookie, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Cookie, Query, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Tuple, Union
 from datetime import datetime, timedelta, timezone, date
 import pytz
 from decimal import Decimal
 import math
 from calendar import monthrange
 from jose import JWTError, jwt
-from app.security_modules.password import hash_password, verify_password, check_needs_rehash
+from app.security_modules.password import (
+    hash_password,
+    verify_password,
+    hash_password_async,
+    verify_password_async,
+    check_needs_rehash
+)
+from app.security_modules.worker_pool import get_auth_worker_pool
 from app.two_factor import (
     generate_totp_secret,
-    generate_qr_code,
+    generate_qr_code_async,
     verify_totp_code,
     generate_backup_codes,
     hash_backup_codes,
@@ -36,17 +43,16 @@ import sys
 from enum import Enum
 import asyncio
 import tempfile
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 # WeasyPrint removed - using Playwright for PDF generation (Emergent compatibility)
 import io
 import os
 import re
 import base64
+from functools import lru_cache
 from typing import BinaryIO
 from fastapi import UploadFile, File, Form
-from PIL import Image, ImageOps
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
+from PIL import Image
 import subprocess
 
 # Add app directory to path for modules
@@ -64,6 +70,47 @@ from app.security import (
     create_secure_cookie_response
 )
 from app.security_modules.password import hash_password, verify_password, check_needs_rehash
+from app.database import get_client, get_database, get_pool_metrics, close_client
+from app.pdf_renderer import (
+    get_pdf_renderer,
+    RendererBusyError,
+    RendererUnavailableError,
+    EXACT_PDF_OPTIONS,
+    LETTER_PDF_OPTIONS
+)
+from app.pdf_cache import get_pdf_cache, make_pdf_cache_key, make_etag, etag_matches
+from app.media_pipeline import get_media_pipeline, MediaError, MediaBusyError
+from app.brand_asset_cache import get_brand_asset_cache
+from app.brand_bundle_cache import BundleEntry, bundle_version, get_brand_bundle_cache
+from app.storage import LocalStorage, StorageError, get_storage
+from app.health_probes import get_probe_scheduler
+from app.principal_cache import get_principal_cache
+from app.audit_sink import get_audit_sink
+from app.audit_logs import (
+    COUNT_MODES, build_audit_query, fetch_page, count_logs, serialize as serialize_audit_log,
+    stream_ndjson, get_audit_retention
+)
+from app.template_registry import REPORT_TEMPLATES, TemplateNotFoundError, get_template_registry
+from app.ai_cache import get_ai_cache
+from app.llm_gateway import get_llm_gateway, close_llm_gateway, LLMBusyError
+from app.db_indexes import start_index_bootstrap, get_index_status
+from app.rate_limiter import get_rate_limiter
+from app.pnl_rollups import (
+    record_deals, record_expenses, record_deal_update, record_expense_update, get_month_rollup,
+    delete_user_rollups, start_rollup_backfill, stop_rollup_backfill
+)
+from app.cap_ledger import apply_deal_change, rebuild_ledger, get_ledger_summary
+from app.coach_insights import generate_coaching
+from app.data_versions import GOALS, ACTIVITY, REFLECTION, PNL, bump_versions, delete_versions
+from app.coach_scheduler import get_coach_scheduler
+from app.admin_users import (
+    SEARCH_MODES, build_user_query, sort_spec, encode_cursor, decode_cursor,
+    build_page_pipeline, build_keyset_pipeline
+)
+from app.pagination import CursorError
+from app.pnl_export import (
+    ExportError, normalize_format, month_range, export_filename, export_rows, stream_export, media_type
+)
 
 # Initialize configuration - will fail if required secrets missing
 config = get_config()
@@ -89,8 +136,8 @@ except Exception as e:
 
 # MongoDB connection with production-ready error handling
 try:
-    client = AsyncIOMotorClient(config.MONGO_URL)
-    db = client[config.DB_NAME]
+    client = get_client()
+    db = get_database()
     logger.info(f"MongoDB connected: {config.DB_NAME}")
 except Exception as e:
     logger.error(f"Failed to connect to MongoDB: {e}")
@@ -183,20 +230,18 @@ async def health_check():
     Production health check endpoint.
     Returns application status, version, and service health.
     """
-    # Check MongoDB cache health
-    try:
-        cache_health = {"status": "healthy", "connected": True}
-        if 'cache' in globals():
-            cache_health = cache.health_check() if hasattr(cache, 'health_check') else {"status": "healthy", "connected": True}
-    except Exception as e:
-        cache_health = {"status": "unhealthy", "connected": False, "error": str(e)}
-    
-    # Check MongoDB connection
-    try:
-        await db.command("ping")
-        mongo_status = {"status": "healthy", "connected": True}
-    except Exception as e:
-        mongo_status = {"status": "unhealthy", "connected": False, "error": str(e)}
+    # MongoDB and cache status from the background probes (no round trip per request)
+    def service_health(probe: str) -> dict:
+        result = get_probe_scheduler().get(probe)
+        connected = result["status"] == "ok"
+        health = {"status": "healthy" if connected else "unhealthy", "connected": connected,
+                  "checked_at": result.get("checked_at")}
+        if "error" in result:
+            health["error"] = result["error"]
+        return health
+    
+    mongo_status = service_health("database")
+    cache_health = service_health("cache")
     
     return {
         "ok": True,
@@ -207,7 +252,22 @@ async def health_check():
             "mongodb": mongo_status,
             "cache": cache_health,
             "stripe": {"configured": bool(config.STRIPE_API_KEY)},
-            "s3": {"configured": bool(config.S3_BUCKET and config.S3_ACCESS_KEY_ID)}
+            "s3": {"configured": bool(config.S3_BUCKET and config.S3_ACCESS_KEY_ID)},
+            "storage": get_storage().stats(),
+            "pdf_renderer": get_pdf_renderer().stats(),
+            "pdf_cache": get_pdf_cache().stats(),
+            "media": get_media_pipeline().stats(),
+            "brand_asset_cache": get_brand_asset_cache().stats(),
+            "brand_bundle_cache": get_brand_bundle_cache().stats(),
+            "templates": get_template_registry().stats(),
+            "ai_cache": get_ai_cache().stats(),
+            "llm_gateway": get_llm_gateway().stats(),
+            "coach_pregen": get_coach_scheduler().stats(),
+            "health_probes": get_probe_scheduler().stats(),
+            "principal_cache": get_principal_cache().stats(),
+            "auth_workers": get_auth_worker_pool().stats(),
+            "audit_sink": get_audit_sink().stats(),
+            "audit_retention": get_audit_retention().stats()
         }
     }
 
@@ -221,37 +281,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize S3 client with production-ready error handling
-s3_client = None
-
-# Check if S3 credentials are properly configured
-s3_credentials_configured = (
-    hasattr(config, 'S3_ACCESS_KEY_ID') and config.S3_ACCESS_KEY_ID and
-    hasattr(config, 'S3_SECRET_ACCESS_KEY') and config.S3_SECRET_ACCESS_KEY and
-    hasattr(config, 'S3_BUCKET') and config.S3_BUCKET and
-    hasattr(config, 'S3_REGION') and config.S3_REGION
-)
-
-if s3_credentials_configured:
-    try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=config.S3_ACCESS_KEY_ID,
-            aws_secret_access_key=config.S3_SECRET_ACCESS_KEY,
-            region_name=config.S3_REGION
-        )
-        logger.info("S3 client initialized successfully")
-    except Exception as e:
-        if config.is_production():
-            logger.error(f"S3 client initialization failed in production: {e}")
-            sys.exit(1)
-        else:
-            logger.warning(f"S3 client initialization failed (dev mode): {e}")
-            s3_client = None
-else:
-    logger.info("S3 credentials not configured - using local storage fallback for file uploads")
+# Initialize object storage (S3, or local disk in development) with production-ready error handling
+try:
+    logger.info(f"Storage driver initialized: {get_storage().name}")
+except Exception as e:
+    logger.error(f"Storage initialization failed: {e}")
+    sys.exit(1)
 
 # PDF Branding Helper Functions
+@lru_cache(maxsize=1)
 def create_transparent_png_fallback() -> str:
     """Create a 1x1 transparent PNG as base64 fallback for missing assets."""
     try:
@@ -265,95 +303,6 @@ def create_transparent_png_fallback() -> str:
         logger.error(f"Failed to create transparent PNG fallback: {e}")
         return ""
 
-async def fetch_and_convert_s3_image(s3_url: str, max_size_kb: int = 500) -> str:
-    """
-    Fetch image from S3 private URL and convert to base64 for PDF embedding.
-    
-    Args:
-        s3_url: S3 URL in format 's3://bucket/key' or direct key
-        max_size_kb: Maximum image size in KB (for optimization)
-    
-    Returns:
-        Base64 encoded image string, or empty string on failure
-    """
-    if not s3_client or not s3_url:
-        return create_transparent_png_fallback()
-    
-    try:
-        # Extract S3 bucket and key from URL
-        if s3_url.startswith('s3://'):
-            # Format: s3://bucket/key
-            parts = s3_url[5:].split('/', 1)
-            if len(parts) != 2:
-                logger.warning(f"Invalid S3 URL format: {s3_url}")
-                return create_transparent_png_fallback()
-            bucket, key = parts
-        else:
-            # Assume it's just the key, use configured bucket
-            bucket = config.S3_BUCKET
-            key = s3_url
-        
-        # Fetch image from S3
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        image_data = response['Body'].read()
-        
-        # Open image with PIL for processing
-        with Image.open(io.BytesIO(image_data)) as img:
-            # Convert to RGB if necessary (for JPEG compatibility)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Keep transparency for PNG
-                img_format = 'PNG'
-            else:
-                img = img.convert('RGB')
-                img_format = 'JPEG'
-            
-            # Resize if too large (maintain aspect ratio)
-            max_dimension = 800  # Max width or height in pixels
-            if max(img.width, img.height) > max_dimension:
-                img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-            
-            # Optimize and convert to base64
-            buffer = io.BytesIO()
-            
-            if img_format == 'JPEG':
-                # Optimize JPEG quality
-                img.save(buffer, format=img_format, quality=85, optimize=True)
-            else:
-                # Optimize PNG
-                img.save(buffer, format=img_format, optimize=True)
-            
-            buffer.seek(0)
-            image_bytes = buffer.getvalue()
-            
-            # Check size limit
-            size_kb = len(image_bytes) / 1024
-            if size_kb > max_size_kb:
-                logger.warning(f"Image {key} is {size_kb:.1f}KB, exceeds {max_size_kb}KB limit")
-                # Try reducing quality or size further
-                if img_format == 'JPEG':
-                    buffer = io.BytesIO()
-                    img.save(buffer, format=img_format, quality=60, optimize=True)
-                    buffer.seek(0)
-                    image_bytes = buffer.getvalue()
-            
-            # Convert to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            logger.info(f"Successfully converted S3 image {key} to base64 ({len(image_bytes)/1024:.1f}KB)")
-            return base64_image
-            
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'NoSuchKey':
-            logger.warning(f"S3 key not found: {key}")
-        elif error_code == 'AccessDenied':
-            logger.warning(f"S3 access denied for key: {key}")
-        else:
-            logger.error(f"S3 error fetching {key}: {e}")
-        return create_transparent_png_fallback()
-        
-    except Exception as e:
-        logger.error(f"Failed to fetch and convert S3 image {s3_url}: {e}")
-        return create_transparent_png_fallback()
 
 # Enums
 class PlanType(str, Enum):
@@ -550,12 +499,25 @@ class SellerNetSheetCalculation(BaseModel):
     created_at: str
 
 # Brand Profile Models
+class BrandAssetVariant(BaseModel):
+    url: str = ""
+    key: str = ""
+    etag: str = ""
+    w: int = 0
+    h: int = 0
+    mime: str = ""
+    bytes: int = 0
+
 class BrandAsset(BaseModel):
     url: str = ""
+    key: str = ""
+    etag: str = ""
     w: int = 0
     h: int = 0
     mime: str = ""
     updatedAt: str = ""
+    # Derivatives built at upload time: pdf (report embed), thumb, webp
+    variants: Dict[str, BrandAssetVariant] = {}
 
 class BrandAgent(BaseModel):
     firstName: str = ""
@@ -782,14 +744,6 @@ class WeeklyMetrics(BaseModel):
 class AICoachResponse(BaseModel):
     coaching_text: str
 
-class AICoachCache(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    cache_key: str
-    response_data: Dict
-    generated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    expires_at: str
-
 # Helper Functions
 async def get_user_by_email(email: str) -> Optional[User]:
     user_data = await db.users.find_one({"email": email})
@@ -813,6 +767,15 @@ async def get_user_by_id(user_id: str) -> Optional[User]:
         return User(**user_data)
     return None
 
+async def get_user_for_token(user_id: str, token: str) -> Optional[User]:
+    """User for a verified token, reused for a few seconds from the principal cache"""
+    return await get_principal_cache().get_or_load(user_id, token, lambda: get_user_by_id(user_id))
+
+async def record_data_change(user: User, *domains: str):
+    """Bump the user's data versions and queue a background coach pre-generation."""
+    await bump_versions(db, user.id, *domains)
+    get_coach_scheduler().notify(user.id, user.plan)
+
 async def get_current_user(request: Request) -> Optional[User]:
     """Get current user from HttpOnly cookie"""
     token = request.cookies.get("access_token")
@@ -827,7 +790,7 @@ async def get_current_user(request: Request) -> Optional[User]:
     except JWTError:
         return None
     
-    user = await get_user_by_id(user_id)
+    user = await get_user_for_token(user_id, token)
     return user
 
 async def get_current_user_unified(request: Request, token: str = Depends(oauth2_scheme)) -> Optional[User]:
@@ -861,7 +824,7 @@ async def get_current_user_unified(request: Request, token: str = Depends(oauth2
     except JWTError:
         raise credentials_exception
     
-    user = await get_user_by_id(user_id)
+    user = await get_user_for_token(user_id, auth_token)
     if user is None:
         raise credentials_exception
     return user
@@ -892,7 +855,7 @@ async def get_current_user_form_upload(request: Request) -> Optional[User]:
     except JWTError:
         return None
     
-    user = await get_user_by_id(user_id)
+    user = await get_user_for_token(user_id, auth_token)
     return user
 
 async def get_current_user_optional(token: str = Depends(oauth2_scheme)) -> Optional[User]:
@@ -906,7 +869,7 @@ async def get_current_user_optional(token: str = Depends(oauth2_scheme)) -> Opti
         if user_id is None:
             return None
             
-        user = await get_user_by_id(user_id)
+        user = await get_user_for_token(user_id, token)
         return user
     except JWTError:
         return None
@@ -996,7 +959,10 @@ async def log_audit_event(
     details: Dict[str, Any],
     request: Request
 ):
-    """Log an audit event"""
+    """
+    Log an audit event. Events are batched by the audit sink and written off the request
+    path; security-critical actions (AUDIT_SYNC_ACTIONS) are written before returning.
+    """
     try:
         audit_log = {
             "id": str(uuid.uuid4()),
@@ -1006,10 +972,13 @@ async def log_audit_event(
             "details": details,
             "ip_address": request.client.host if request.client else "unknown",
             "user_agent": request.headers.get("user-agent", "unknown"),
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": datetime.now(timezone.utc)
         }
         
-        await db.audit_logs.insert_one(audit_log)
+        if action.value in config.get_audit_sync_actions():
+            await get_audit_sink().write_now(audit_log)
+        else:
+            await get_audit_sink().submit(audit_log)
         logger.info(f"Audit log created: {action.value} for user {user.email}")
     except Exception as e:
         logger.error(f"Failed to create audit log: {str(e)}")
@@ -1106,139 +1075,72 @@ def calculate_completion_score(profile: BrandProfile) -> float:
     
     return min(score, 100.0)
 
-def process_image_with_pillow(image_data: bytes, asset_type: str) -> bytes:
-    """Process image using Pillow based on asset type"""
-    try:
-        # Open image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convert to RGB if necessary (preserving transparency for logos)
-        if asset_type == "headshot":
-            # Headshots: convert to RGB (no transparency needed)
-            if image.mode in ('RGBA', 'LA', 'P'):
-                # Create white background for transparency
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'RGBA':
-                    background.paste(image, mask=image.split()[-1])
-                    image = background
-                else:
-                    image = image.convert('RGB')
-        else:
-            # Logos: preserve transparency
-            if image.mode in ('LA', 'P'):
-                image = image.convert('RGBA')
-        
-        # Remove EXIF data and apply orientation
-        image = ImageOps.exif_transpose(image)
-        
-        # Process based on asset type
-        if asset_type == "headshot":
-            # Headshot: crop/resize to 600×600 PNG, strip EXIF, sRGB
-            target_size = (600, 600)
-            # Center crop to square if not already
-            width, height = image.size
-            if width != height:
-                size = min(width, height)
-                left = (width - size) // 2
-                top = (height - size) // 2
-                image = image.crop((left, top, left + size, top + size))
-            
-            # Resize to target
-            image = image.resize(target_size, Image.Resampling.LANCZOS)
-            
-        else:
-            # Logos: keep transparency; normalize height ~200px
-            width, height = image.size
-            if height > 200:
-                # Maintain aspect ratio, set height to 200px
-                aspect_ratio = width / height
-                new_height = 200
-                new_width = int(new_height * aspect_ratio)
-                image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Save as PNG
-        output = io.BytesIO()
-        if asset_type == "headshot":
-            image.save(output, format='PNG', optimize=True)
-        else:
-            # Preserve transparency for logos
-            image.save(output, format='PNG', optimize=True)
-        
-        return output.getvalue()
-        
-    except Exception as e:
-        logger.error(f"Error processing {asset_type} image: {e}")
-        raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+async def save_brand_profile_update(user_id: str, update: dict) -> Optional[BrandProfile]:
+    """
+    Apply a brand profile update, refresh its completion score from the updated document and
+    drop the user's cached brand bundles. Returns None when the user has no profile.
+    """
+    profile_data = await db.brand_profiles.find_one_and_update(
+        {"userId": user_id},
+        {"$set": {**update, "updatedAt": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    get_brand_bundle_cache().invalidate(user_id)
+    if not profile_data:
+        return None
+    
+    profile = BrandProfile(**profile_data)
+    completion_score = calculate_completion_score(profile)
+    if completion_score != profile.completion:
+        await db.brand_profiles.update_one(
+            {"userId": user_id},
+            {"$set": {"completion": completion_score}}
+        )
+        profile.completion = completion_score
+    return profile
 
 async def upload_to_s3(file_data: bytes, key: str, content_type: str = "image/png") -> str:
     """Upload file to S3 without ACL (ACLs disabled on bucket)"""
-    if not s3_client:
+    storage = get_storage()
+    if storage.name != "s3":
         raise HTTPException(status_code=500, detail="File upload not configured")
     
     try:
-        # PutObject without ACL field (bucket has ACLs disabled)
-        s3_client.put_object(
-            Bucket=config.S3_BUCKET,
-            Key=key,
-            Body=file_data,
-            ContentType=content_type
-            # NO ACL field - bucket has "Object ownership = ACLs disabled"
-        )
+        # PutObject without ACL field (bucket has "Object ownership = ACLs disabled")
+        stored = await storage.put(key, file_data, content_type)
+        return stored.url
         
-        # Return S3 URL
-        url = f"https://{config.S3_BUCKET}.s3.{config.S3_REGION}.amazonaws.com/{key}"
-        return url
-        
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'AccessControlListNotSupported':
+    except StorageError as e:
+        if e.code == 'AccessControlListNotSupported':
             logger.error("ACL not supported - bucket has ACLs disabled")
             raise HTTPException(status_code=500, detail="Storage configuration error")
-        elif error_code == 'SignatureDoesNotMatch':
+        elif e.code == 'SignatureDoesNotMatch':
             logger.error("S3 signature mismatch - check credentials")
             raise HTTPException(status_code=500, detail="Storage authentication error")
         else:
             logger.error(f"S3 upload error: {e}")
             raise HTTPException(status_code=500, detail="File upload failed")
-    except Exception as e:
-        logger.error(f"Upload error: {e}")
-        raise HTTPException(status_code=500, detail="File upload failed")
 
 async def delete_from_s3(key: str) -> bool:
-    """Delete file from S3"""
-    if not s3_client:
-        return False
-    
+    """Delete file from storage"""
     try:
-        s3_client.delete_object(Bucket=config.S3_BUCKET, Key=key)
+        await get_storage().delete(key)
         return True
-    except Exception as e:
-        logger.error(f"S3 delete error: {e}")
+    except StorageError as e:
+        logger.error(f"Storage delete error: {e}")
         return False
 
 async def test_s3_connection() -> bool:
     """Test S3 connection with a health check"""
-    if not s3_client:
+    storage = get_storage()
+    if storage.name != "s3":
         return False
     
     try:
         # Try a small PutObject and DeleteObject
-        test_key = f"healthcheck/{uuid.uuid4()}"
-        test_data = b"health-check"
-        
-        # Upload test file
-        s3_client.put_object(
-            Bucket=config.S3_BUCKET,
-            Key=test_key,
-            Body=test_data,
-            ContentType='text/plain'
-        )
-        
-        # Delete test file
-        s3_client.delete_object(Bucket=config.S3_BUCKET, Key=test_key)
-        
-        return True
-    except Exception as e:
+        return await storage.check()
+    except StorageError as e:
         logger.error(f"S3 health check failed: {e}")
         return False
 
@@ -1271,10 +1173,8 @@ def ensure_branding_structure(branding_data: dict) -> dict:
     
     return branding_data
 
-def render_template(template_content: str, data: dict) -> str:
-    """Production-ready Mustache template rendering using pystache library"""
-    import pystache
-    
+def render_template(template_name: str, data: dict) -> str:
+    """Render a report template from the pre-parsed template registry"""
     # Ensure branding data has proper structure for pystache
     if "branding" in data:
         data["branding"] = ensure_branding_structure(data["branding"])
@@ -1284,18 +1184,13 @@ def render_template(template_content: str, data: dict) -> str:
         data["branding"] = ensure_branding_structure({})
         logger.info("Added empty branding structure to data")
     
-    # Create renderer with no HTML escaping (we want raw output for PDFs)
-    # Using string_encoding=None to handle missing keys gracefully
-    renderer = pystache.Renderer(
-        escape=lambda u: u,  # Disable HTML escaping
-        string_encoding=None,  # Return unicode directly
-        missing_tags='ignore'  # Ignore missing tags instead of raising errors
-    )
-    
     try:
-        rendered = renderer.render(template_content, data)
+        rendered = get_template_registry().render(template_name, data)
         logger.info(f"Template rendered successfully using pystache, output length: {len(rendered)}")
         return rendered
+    except TemplateNotFoundError:
+        logger.error(f"Report template not found: {template_name}")
+        raise HTTPException(status_code=500, detail="Report template not found")
     except Exception as e:
         logger.error(f"Pystache template rendering error: {str(e)}")
         # Log the data keys for debugging
@@ -1307,55 +1202,11 @@ def render_template(template_content: str, data: dict) -> str:
 async def prepare_affordability_report_data_generic(calculation_data: dict, property_data: dict, current_user=None) -> dict:
     """Prepare data for affordability report template"""
     
-    # Get branding information
+    # Get branding information (resolved once per profile version, shared with /brand/resolve)
     branding_data = {}
     if current_user:
         try:
-            profile = await get_brand_profile(current_user.id)
-            if profile:
-                # Process brand profile into branding data format
-                plan = current_user.plan.value
-                is_paid_user = plan in ["STARTER", "PRO"]
-                
-                # Prepare agent name
-                agent_name = f"{profile.agent.firstName} {profile.agent.lastName}".strip()
-                if not agent_name:
-                    agent_name = current_user.full_name or ""
-                
-                # Generate agent initials for PDF header
-                agent_initials = ""
-                if profile.agent.firstName and profile.agent.lastName:
-                    agent_initials = f"{profile.agent.firstName[0]}{profile.agent.lastName[0]}".upper()
-                elif agent_name:
-                    name_parts = agent_name.split()
-                    if len(name_parts) >= 2:
-                        agent_initials = f"{name_parts[0][0]}{name_parts[1][0]}".upper()
-                    elif len(name_parts) == 1:
-                        agent_initials = name_parts[0][0].upper()
-                
-                branding_data = {
-                    "agent": {
-                        "name": agent_name,
-                        "initials": agent_initials,
-                        "email": profile.agent.email or current_user.email,
-                        "phone": profile.agent.phone
-                    },
-                    "brokerage": {
-                        "name": profile.brokerage.name,
-                        "address": profile.brokerage.address
-                    },
-                    "colors": {
-                        "primary": profile.brand.primaryHex,
-                        "secondary": profile.brand.secondaryHex
-                    },
-                    "plan": plan,
-                    "show": {
-                        "headerBar": is_paid_user,
-                        "agentLogo": is_paid_user and bool(profile.assets.agentLogo.url),
-                        "brokerLogo": is_paid_user and bool(profile.assets.brokerLogo.url),
-                        "cta": plan == "PRO"
-                    }
-                }
+            branding_data = (await get_brand_bundle(current_user, "pdf", embed=False)).data()
         except Exception as e:
             logger.warning(f"Failed to get branding data: {e}")
             branding_data = {}
@@ -1441,7 +1292,9 @@ async def prepare_affordability_report_data_generic(calculation_data: dict, prop
         "title": "Home Affordability Analysis",
         "generatedAt": datetime.now().strftime("%B %d, %Y"),
         "address": property_data.get('address', ''),
-        "preparedBy": branding_data.get("agent", {}).get("name", "Real Estate Professional"),
+        "preparedBy": (branding_data.get("agent", {}).get("name")
+                       or (current_user.full_name if current_user else "")
+                       or "Real Estate Professional"),
         
         # Property Information
         "property": {
@@ -2249,13 +2102,6 @@ async def get_report_preview(tool: str, request: Request, current_user: Optional
         if not calculation_data or not property_data:
             raise HTTPException(status_code=400, detail="Calculation data and property data required")
         
-        # Load comprehensive template
-        template_path = Path(__file__).parent / "templates" / "investor_report_comprehensive.html"
-        if not template_path.exists():
-            raise HTTPException(status_code=500, detail="Report template not found")
-        
-        template_content = template_path.read_text(encoding='utf-8')
-        
         # Prepare data for template
         if tool == "investor":
             # Get branding data for PDF
@@ -2263,23 +2109,11 @@ async def get_report_preview(tool: str, request: Request, current_user: Optional
             
             report_data = prepare_investor_report_data(calculation_data, property_data, current_user)
         elif tool == "affordability":
-            # Load affordability template instead of investor template
-            template_path = Path(__file__).parent / "templates" / "affordability_report.html"
-            if not template_path.exists():
-                raise HTTPException(status_code=500, detail="Affordability template not found")
-            template_content = template_path.read_text(encoding='utf-8')
-            
             # Get branding data for affordability PDF
             branding_data = {}  # Branding disabled
             
             report_data = await prepare_affordability_report_data_generic(calculation_data, property_data, current_user)
         elif tool == "commission":
-            # Load commission split template
-            template_path = Path(__file__).parent / "templates" / "commission_split_report.html"
-            if not template_path.exists():
-                raise HTTPException(status_code=500, detail="Commission split template not found")
-            template_content = template_path.read_text(encoding='utf-8')
-            
             # Get branding data for commission split PDF
             branding_data = {}  # Branding disabled
             
@@ -2288,7 +2122,7 @@ async def get_report_preview(tool: str, request: Request, current_user: Optional
             raise HTTPException(status_code=404, detail="Tool not supported")
         
         # Render template
-        html_content = render_template(template_content, report_data)
+        html_content = render_template(REPORT_TEMPLATES[tool], report_data)
         
         return Response(content=html_content, media_type="text/html")
         
@@ -2312,13 +2146,6 @@ async def generate_pdf(tool: str, request: Request, current_user: Optional[User]
         if not calculation_data or not property_data:
             raise HTTPException(status_code=400, detail="Calculation data and property data required")
         
-        # Load comprehensive template
-        template_path = Path(__file__).parent / "templates" / "investor_report_comprehensive.html"
-        if not template_path.exists():
-            raise HTTPException(status_code=500, detail="Report template not found")
-        
-        template_content = template_path.read_text(encoding='utf-8')
-        
         # Prepare data for template
         if tool == "investor":
             # Get branding data for PDF
@@ -2326,23 +2153,11 @@ async def generate_pdf(tool: str, request: Request, current_user: Optional[User]
             
             report_data = prepare_investor_report_data(calculation_data, property_data, current_user)
         elif tool == "affordability":
-            # Load affordability template instead of investor template
-            template_path = Path(__file__).parent / "templates" / "affordability_report.html"
-            if not template_path.exists():
-                raise HTTPException(status_code=500, detail="Affordability template not found")
-            template_content = template_path.read_text(encoding='utf-8')
-            
             # Get branding data for affordability PDF
             branding_data = {}  # Branding disabled
             
             report_data = await prepare_affordability_report_data_generic(calculation_data, property_data, current_user)
         elif tool == "commission":
-            # Load commission split template
-            template_path = Path(__file__).parent / "templates" / "commission_split_report.html"
-            if not template_path.exists():
-                raise HTTPException(status_code=500, detail="Commission split template not found")
-            template_content = template_path.read_text(encoding='utf-8')
-            
             # Get branding data for commission split PDF
             branding_data = {}  # Branding disabled
             
@@ -2355,12 +2170,6 @@ async def generate_pdf(tool: str, request: Request, current_user: Optional[User]
             logger.info(f"Commission PDF - salePrice: {report_data.get('salePrice', 'MISSING')}")
             logger.info(f"Commission PDF - finalTakeHome: {report_data.get('finalTakeHome', 'MISSING')}")
         elif tool == "seller-net":
-            # Load seller net sheet template
-            template_path = Path(__file__).parent / "templates" / "seller_net_sheet_report.html"
-            if not template_path.exists():
-                raise HTTPException(status_code=500, detail="Seller net sheet template not found")
-            template_content = template_path.read_text(encoding='utf-8')
-            
             # Get branding data for seller net sheet PDF
             branding_data = {}  # Branding disabled
             
@@ -2372,12 +2181,6 @@ async def generate_pdf(tool: str, request: Request, current_user: Optional[User]
             report_data["brandPrimaryDark"] = primary_color + "dd" if primary_color else "#15803ddd"
             report_data["agentLogoUrl"] = branding_data.get("assets", {}).get("agentLogoUrl", "")
         elif tool == "closing-date":
-            # Load closing date timeline template
-            template_path = Path(__file__).parent / "templates" / "closing_date_report.html"
-            if not template_path.exists():
-                raise HTTPException(status_code=500, detail="Closing date template not found")
-            template_content = template_path.read_text(encoding='utf-8')
-            
             # Get branding data for closing date PDF
             branding_data = {}  # Branding disabled
             
@@ -2406,8 +2209,7 @@ async def generate_pdf(tool: str, request: Request, current_user: Optional[User]
         
         # Render template
         logger.info(f"Rendering template for tool: {tool}")
-        logger.info(f"Template content length: {len(template_content)}")
-        html_content = render_template(template_content, report_data)
+        html_content = render_template(REPORT_TEMPLATES[tool], report_data)
         logger.info(f"Rendered HTML length: {len(html_content)}")
         
         # Check if template variables are still present
@@ -2418,8 +2220,18 @@ async def generate_pdf(tool: str, request: Request, current_user: Optional[User]
         else:
             logger.info(f"Template rendering successful, no variables remaining")
         
-        # Generate PDF using WeasyPrint
-        pdf_buffer = await generate_pdf_with_weasyprint_from_html(html_content)
+        # Identical HTML + page options + template means an identical PDF
+        pdf_cache_key = make_pdf_cache_key(html_content, LETTER_PDF_OPTIONS, REPORT_TEMPLATES[tool])
+        etag = make_etag(pdf_cache_key)
+        
+        if config.PDF_CACHE_ENABLED:
+            pdf_buffer, cached = await get_pdf_cache().get_or_render(
+                pdf_cache_key,
+                lambda: generate_pdf_with_weasyprint_from_html(html_content)
+            )
+            logger.info(f"PDF cache {'hit' if cached else 'miss'} for tool: {tool}")
+        else:
+            pdf_buffer = await generate_pdf_with_weasyprint_from_html(html_content)
         
         # Generate filename based on tool type
         if tool == "affordability":
@@ -2452,7 +2264,8 @@ async def generate_pdf(tool: str, request: Request, current_user: Optional[User]
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename={filename}",
-                "Cache-Control": "no-cache"
+                "Cache-Control": "no-cache",
+                "ETag": etag
             }
         )
         
@@ -2476,13 +2289,6 @@ async def debug_report(tool: str, request: Request, current_user: Optional[User]
         if not calculation_data or not property_data:
             raise HTTPException(status_code=400, detail="Calculation data and property data required")
         
-        # Load comprehensive template
-        template_path = Path(__file__).parent / "templates" / "investor_report_comprehensive.html"
-        if not template_path.exists():
-            raise HTTPException(status_code=500, detail="Report template not found")
-        
-        template_content = template_path.read_text(encoding='utf-8')
-        
         # Prepare data for template
         if tool == "investor":
             # Get branding data for PDF
@@ -2490,12 +2296,6 @@ async def debug_report(tool: str, request: Request, current_user: Optional[User]
             
             report_data = prepare_investor_report_data(calculation_data, property_data, current_user)
         elif tool == "affordability":
-            # Load affordability template instead of investor template
-            template_path = Path(__file__).parent / "templates" / "affordability_report.html"
-            if not template_path.exists():
-                raise HTTPException(status_code=500, detail="Affordability template not found")
-            template_content = template_path.read_text(encoding='utf-8')
-            
             # Get branding data for affordability PDF
             branding_data = {}  # Branding disabled
             
@@ -2504,7 +2304,7 @@ async def debug_report(tool: str, request: Request, current_user: Optional[User]
             raise HTTPException(status_code=404, detail="Tool not supported")
         
         # Render template
-        html_content = render_template(template_content, report_data)
+        html_content = render_template(REPORT_TEMPLATES[tool], report_data)
         
         # Debug analysis
         debug_info = {
@@ -2541,8 +2341,8 @@ async def debug_report(tool: str, request: Request, current_user: Optional[User]
             "status": "debug_complete",
             "tool": tool,
             "debug_info": debug_info,
-            "template_path": str(template_path),
-            "template_exists": template_path.exists()
+            "template_path": str(get_template_registry().get(REPORT_TEMPLATES[tool]).path),
+            "template_exists": True
         }
         
     except HTTPException:
@@ -2551,51 +2351,28 @@ async def debug_report(tool: str, request: Request, current_user: Optional[User]
         logger.error(f"Error in debug route: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def generate_pdf_with_weasyprint_from_html(html_content: str) -> bytes:
+async def generate_pdf_with_weasyprint_from_html(html_content: str, **render_options) -> bytes:
     """
     Generate PDF from HTML using Playwright (maintains original HTML/CSS design)
     
-    Emergent platform requires pure-Python solutions.
-    Using Playwright with explicit browser path to render beautiful PDFs from HTML/CSS.
+    Renders on the shared warm Chromium pool (app.pdf_renderer) instead of launching
+    a browser per request. render_options are passed through to PDFRenderer.render.
     """
+    renderer = get_pdf_renderer()
     try:
-        from playwright.async_api import async_playwright
-        import os
-        
-        logger.info("Generating PDF using Playwright with HTML/CSS rendering")
+        logger.info("Generating PDF using pooled Playwright renderer")
+        pdf_bytes = await renderer.render(html_content, **render_options)
+        logger.info(f"PDF generated successfully using Playwright: {len(pdf_bytes)} bytes")
+        return pdf_bytes
         
-        # Set browser path to the installed location
-        os.environ['PLAYWRIGHT_BROWSERS_PATH'] = '/pw-browsers'
-        
-        async with async_playwright() as p:
-            # Launch browser with explicit executable path
-            browser = await p.chromium.launch(
-                headless=True,
-                executable_path='/pw-browsers/chromium_headless_shell-1187/chrome-linux/headless_shell'
-            )
-            page = await browser.new_page()
-            
-            # Set content and wait for everything to load
-            await page.set_content(html_content, wait_until="networkidle")
-            
-            # Generate PDF with print-friendly settings
-            pdf_bytes = await page.pdf(
-                format='Letter',
-                print_background=True,
-                margin={
-                    'top': '0.5in',
-                    'right': '0.5in',
-                    'bottom': '0.5in',
-                    'left': '0.5in'
-                }
-            )
-            
-            await browser.close()
-            
-            logger.info(f"PDF generated successfully using Playwright: {len(pdf_bytes)} bytes")
-            return pdf_bytes
-            
-    except ImportError as e:
+    except RendererBusyError as e:
+        logger.warning(f"PDF renderer busy: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="PDF generation is busy. Please try again in a few seconds.",
+            headers={"Retry-After": "5"}
+        )
+    except RendererUnavailableError as e:
         logger.error(f"Playwright not available: {e}")
         raise HTTPException(
             status_code=500,
@@ -2655,80 +2432,19 @@ async def generate_pdf_playwright(tool: str, request: Request, current_user: Opt
 async def generate_pdf_with_playwright_exact(tool: str, calculation_data: dict, property_data: dict, current_user = None) -> bytes:
     """Generate PDF using Playwright with exact specifications from requirements"""
     
-    # Import playwright here to avoid dependency issues if not needed
-    try:
-        from playwright.async_api import async_playwright
-    except ImportError:
-        logger.error("Playwright not available, falling back to WeasyPrint")
-        # Fallback to WeasyPrint
-        template_path = Path(__file__).parent / "templates" / "investor_report_comprehensive.html"
-        template_content = template_path.read_text(encoding='utf-8')
-        
-        if tool == "investor":
-            # Get branding data for PDF
-            branding_data = {}  # Branding disabled
-            
-            report_data = prepare_investor_report_data(calculation_data, property_data, current_user)
-        else:
-            raise HTTPException(status_code=404, detail="Tool not supported")
-        
-        html_content = render_template(template_content, report_data)
-        return await generate_pdf_with_weasyprint_from_html(html_content)
+    if tool != "investor":
+        raise HTTPException(status_code=404, detail="Tool not supported")
     
-    async with async_playwright() as p:
-        try:
-            # Launch browser
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox', 
-                    '--disable-dev-shm-usage',
-                    '--disable-accelerated-2d-canvas',
-                    '--no-first-run',
-                    '--disable-gpu'
-                ]
-            )
-            
-            page = await browser.new_page()
-            
-            # Load template and render
-            template_path = Path(__file__).parent / "templates" / "investor_report_comprehensive.html"
-            template_content = template_path.read_text(encoding='utf-8')
-            
-            if tool == "investor":
-                # Get branding data for PDF
-                branding_data = {}  # Branding disabled
-                
-                report_data = prepare_investor_report_data(calculation_data, property_data, current_user)
-            else:
-                raise HTTPException(status_code=404, detail="Tool not supported")
-            
-            html_content = render_template(template_content, report_data)
-            
-            # Set content and wait as specified
-            await page.set_content(html_content, wait_until='networkidle', timeout=60000)
-            await page.emulate_media(media='screen')
-            await page.evaluate('() => document.fonts && document.fonts.ready')
-            await page.wait_for_timeout(50)
-            
-            # Generate PDF with exact specifications
-            pdf_buffer = await page.pdf(
-                print_background=True,
-                prefer_css_page_size=True,
-                margin={'top': '0.5in', 'right': '0.5in', 'bottom': '0.5in', 'left': '0.5in'},
-                scale=1,
-                display_header_footer=False
-            )
-            
-            await browser.close()
-            return pdf_buffer
-            
-        except Exception as e:
-            logger.error(f"Playwright PDF generation error: {str(e)}")
-            if 'browser' in locals():
-                await browser.close()
-            raise e
+    report_data = prepare_investor_report_data(calculation_data, property_data, current_user)
+    html_content = render_template(REPORT_TEMPLATES[tool], report_data)
+    
+    # Screen media, settled fonts and CSS page size as specified
+    return await generate_pdf_with_weasyprint_from_html(
+        html_content,
+        pdf_options=EXACT_PDF_OPTIONS,
+        emulate_screen=True,
+        wait_for_fonts=True
+    )
 
 # PDF generation helper functions
 def convert_calculation_to_pdf_data_from_request(calculation_data: dict, property_data: dict, tool: str) -> dict:
@@ -3196,9 +2912,8 @@ async def generate_pdf_with_weasyprint_from_data(tool: str, calculation_data: di
         # Generate the HTML for the print page
         html_content = generate_print_html(pdf_data, plan, agent_profile)
         
-        # Generate PDF using WeasyPrint
-        html_obj = HTML(string=html_content)
-        pdf_buffer = html_obj.write_pdf()
+        # Generate PDF on the pooled renderer
+        pdf_buffer = await generate_pdf_with_weasyprint_from_html(html_content)
         
         return pdf_buffer
         
@@ -3238,7 +2953,7 @@ async def set_password(request: dict):
             raise HTTPException(status_code=404, detail="User not found. Please subscribe first.")
         
         # Update user password
-        hashed_password = get_password_hash(password)
+        hashed_password = await hash_password_async(password)
         await db.users.update_one(
             {"id": user.id},
             {
@@ -3248,6 +2963,7 @@ async def set_password(request: dict):
                 }
             }
         )
+        get_principal_cache().invalidate(user.id)
         
         return {"message": "Password set successfully"}
         
@@ -3258,8 +2974,24 @@ async def set_password(request: dict):
         logger.error(f"Error setting password: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def migrate_password_hash(user: User, password: str):
+    """Re-hash a legacy bcrypt password as Argon2id; runs after the login response is sent"""
+    try:
+        logger.info(f"Migrating password hash for user {user.email} from bcrypt to Argon2id")
+        new_hash = await hash_password_async(password)
+        # Matching the old hash too, so a password change in the meantime isn't overwritten
+        await db.users.update_one(
+            {"id": user.id, "hashed_password": user.hashed_password},
+            {"$set": {"hashed_password": new_hash, "updated_at": datetime.now(timezone.utc)}}
+        )
+        get_principal_cache().invalidate(user.id)
+        logger.info(f"Successfully migrated password hash for user {user.email}")
+    except Exception as e:
+        # Not fatal: the next login tries again
+        logger.error(f"Failed to migrate password hash for user {user.email}: {e}")
+
 @api_router.post("/auth/login")
-async def login(request: Request, response: Response, login_data: LoginRequest):
+async def login(request: Request, response: Response, login_data: LoginRequest, background_tasks: BackgroundTasks):
     user = await get_user_by_email(login_data.email)
     if not user:
         raise HTTPException(
@@ -3274,26 +3006,16 @@ async def login(request: Request, response: Response, login_data: LoginRequest):
             detail="Free accounts cannot log in. Please upgrade to Starter or Pro plan to access your account."
         )
     
-    if not verify_password(login_data.password, user.hashed_password):
+    if not await verify_password_async(login_data.password, user.hashed_password):
         await log_audit_event(user, AuditAction.LOGIN, {"success": False, "reason": "invalid_password"}, request)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
-    # Migrate bcrypt passwords to Argon2id on successful login
+    # Migrate bcrypt passwords to Argon2id on successful login, without delaying the response
     if user.hashed_password.startswith('$2b$') or user.hashed_password.startswith('$2a$') or user.hashed_password.startswith('$2y$'):
-        try:
-            logger.info(f"Migrating password hash for user {user.email} from bcrypt to Argon2id")
-            new_hash = hash_password(login_data.password)
-            await db.users.update_one(
-                {"_id": user.id}, 
-                {"$set": {"hashed_password": new_hash, "updated_at": datetime.now(timezone.utc)}}
-            )
-            logger.info(f"Successfully migrated password hash for user {user.email}")
-        except Exception as e:
-            logger.error(f"Failed to migrate password hash for user {user.email}: {e}")
-            # Don't fail login if migration fails
+        background_tasks.add_task(migrate_password_hash, user, login_data.password)
     
     access_token_expires = timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS if login_data.remember_me else 1)
     access_token = create_access_token(
@@ -3336,7 +3058,7 @@ async def generate_2fa_secret(current_user: User = Depends(require_auth)):
         secret = generate_totp_secret()
         
         # Generate QR code
-        qr_code_data = generate_qr_code(current_user.email, secret)
+        qr_code_data = await generate_qr_code_async(current_user.email, secret)
         
         # Store secret temporarily (will be saved when user verifies)
         # For now, we'll return it and the frontend will send it back for verification
@@ -3388,6 +3110,7 @@ async def verify_and_enable_2fa(
                 }
             }
         )
+        get_principal_cache().invalidate(current_user.id)
         
         if update_result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Failed to enable 2FA")
@@ -3425,7 +3148,7 @@ async def disable_2fa(
             raise HTTPException(status_code=404, detail="User not found")
         
         # Verify password
-        if not verify_password(password, user_data.get("password_hash", "")):
+        if not await verify_password_async(password, user_data.get("password_hash", "")):
             raise HTTPException(status_code=401, detail="Invalid password")
         
         # Disable 2FA
@@ -3442,6 +3165,7 @@ async def disable_2fa(
                 }
             }
         )
+        get_principal_cache().invalidate(current_user.id)
         
         if update_result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Failed to disable 2FA")
@@ -3584,7 +3308,7 @@ async def confirm_password_reset(reset_request: PasswordResetConfirm):
             )
         
         # Hash the new password
-        new_password_hash = hash_password(reset_request.new_password)
+        new_password_hash = await hash_password_async(reset_request.new_password)
         
         # Update password and clear reset token
         await db.users.update_one(
@@ -3601,6 +3325,7 @@ async def confirm_password_reset(reset_request: PasswordResetConfirm):
                 }
             }
         )
+        get_principal_cache().invalidate(user['id'])
         
         # Log the event
         await log_audit_event(
@@ -3653,7 +3378,7 @@ async def change_password(
             )
         
         # Verify current password
-        if not verify_password(current_password, current_user.hashed_password):
+        if not await verify_password_async(current_password, current_user.hashed_password):
             await log_audit_event(
                 current_user,
                 AuditAction.PASSWORD_CHANGE,
@@ -3666,7 +3391,7 @@ async def change_password(
             )
         
         # Hash new password
-        new_password_hash = hash_password(new_password)
+        new_password_hash = await hash_password_async(new_password)
         
         # Update password
         await db.users.update_one(
@@ -3679,6 +3404,7 @@ async def change_password(
                 }
             }
         )
+        get_principal_cache().invalidate(current_user.id)
         
         # Log successful password change
         await log_audit_event(
@@ -3712,8 +3438,13 @@ async def delete_account(request: Request, confirmation: dict, current_user: Use
     # Delete user's deals
     await db.deals.delete_many({"user_id": current_user.id})
     
+    # Coach cache entries and the data versions they are keyed by
+    await db.ai_coach_cache.delete_many({"user_id": current_user.id})
+    await delete_versions(db, current_user.id)
+    
     # Delete user
     await db.users.delete_one({"id": current_user.id})
+    get_principal_cache().invalidate(current_user.id)
     
     await log_audit_event(current_user, AuditAction.DELETE_ACCOUNT, {}, request)
     
@@ -3880,9 +3611,8 @@ async def generate_closing_date_pdf(
         # Generate timeline content for PDF
         timeline_html = generate_closing_date_timeline_html(request.inputs, request.timeline, is_branded, agent_profile)
         
-        # Create PDF using WeasyPrint
-        html_doc = HTML(string=timeline_html)
-        pdf_bytes = html_doc.write_pdf()
+        # Create PDF on the pooled renderer
+        pdf_bytes = await generate_pdf_with_weasyprint_from_html(timeline_html)
         
         # Return PDF as response
         return Response(
@@ -3893,6 +3623,8 @@ async def generate_closing_date_pdf(
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating closing date PDF: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -5039,7 +4771,7 @@ async def update_brand_profile_endpoint(
             raise HTTPException(status_code=500, detail="Failed to get brand profile")
         
         # Prepare update data
-        update_data = {"updatedAt": datetime.now(timezone.utc).isoformat()}
+        update_data = {}
         
         if profile_update.agent:
             update_data["agent"] = profile_update.agent.dict()
@@ -5057,24 +4789,10 @@ async def update_brand_profile_endpoint(
             update_data["planRules"] = profile_update.planRules.dict()
         
         # Update in database
-        result = await db.brand_profiles.update_one(
-            {"userId": current_user.id},
-            {"$set": update_data}
-        )
-        
-        if result.matched_count == 0:
+        updated_profile = await save_brand_profile_update(current_user.id, update_data)
+        if not updated_profile:
             raise HTTPException(status_code=404, detail="Brand profile not found")
         
-        # Get updated profile and recalculate completion
-        updated_profile = await get_brand_profile(current_user.id)
-        if updated_profile:
-            completion_score = calculate_completion_score(updated_profile)
-            await db.brand_profiles.update_one(
-                {"userId": current_user.id},
-                {"$set": {"completion": completion_score}}
-            )
-            updated_profile.completion = completion_score
-        
         return updated_profile
         
     except HTTPException:
@@ -5083,6 +4801,44 @@ async def update_brand_profile_endpoint(
         logger.error(f"Error updating brand profile: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def store_brand_file(key: str, data: bytes, content_type: str) -> Tuple[str, str]:
+    """Store one brand image (S3, or local disk in development); returns (url, etag)"""
+    try:
+        stored = await get_storage().put(key, data, content_type)
+    except StorageError as e:
+        logger.error(f"Brand asset upload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Storage upload failed: {str(e)}")
+    logger.info(f"Brand asset stored: {key}")
+    return stored.url, stored.etag
+
+async def read_brand_file(key: str) -> bytes:
+    """Fetch a stored brand image"""
+    return await get_storage().get(key)
+
+def brand_asset_key(asset: BrandAsset) -> Optional[str]:
+    """Storage key of an asset; assets uploaded before keys were stored only have a URL"""
+    return asset.key or get_storage().key_for_url(asset.url)
+
+async def embed_brand_asset(asset: BrandAsset, asset_type: str) -> str:
+    """Base64 PDF-embed image for a brand asset, from the brand asset cache when possible"""
+    variant = asset.variants.get("pdf")
+    if variant and variant.key:
+        storage_key, etag = variant.key, variant.etag
+        
+        async def load():
+            return await read_brand_file(storage_key), variant.mime
+    else:
+        # Uploaded before derivatives existed: build the embed from the stored original once
+        storage_key = brand_asset_key(asset)
+        etag = asset.etag or asset.updatedAt
+        
+        async def load():
+            processed = await get_media_pipeline().process(await read_brand_file(storage_key), asset_type)
+            return processed.derivatives["pdf"].data, processed.derivatives["pdf"].mime
+    
+    embedded = await get_brand_asset_cache().get_or_load(storage_key, etag, load)
+    return embedded.data
+
 @api_router.post("/brand/upload")
 async def upload_brand_asset(
     asset: str = Form(..., description="Asset type: headshot, agentLogo, or brokerLogo"),
@@ -5120,83 +4876,64 @@ async def upload_brand_asset(
                 detail=f"File too large. Maximum size is {config.ASSET_MAX_MB}MB"
             )
         
-        # Process image based on asset type
-        processed_data = process_image_with_pillow(file_data, asset)
+        # Decode once and build the stored PNG plus its derivatives in the media worker pool
+        try:
+            processed = await get_media_pipeline().process(file_data, asset)
+        except MediaError as e:
+            raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+        except MediaBusyError:
+            raise HTTPException(status_code=503, detail="Image processing is busy, please try again shortly")
         
-        # Generate S3 key with timestamp
+        # Generate S3 keys with timestamp; derivatives share the original's name plus a suffix
         timestamp = int(datetime.now().timestamp() * 1000)  # Use Date.now() equivalent
-        key = f"user/{current_user.id}/{asset}-{timestamp}.png"
+        base_name = f"{asset}-{timestamp}"
+        key = f"user/{current_user.id}/{base_name}.png"
+        variant_keys = {
+            name: f"user/{current_user.id}/{base_name}-{name}.{rendition.ext}"
+            for name, rendition in processed.derivatives.items()
+        }
         
-        # Upload to S3 or local storage based on configuration
-        if s3_client:
-            # Production: Upload to S3 directly
-            try:
-                s3_client.put_object(
-                    Bucket=config.S3_BUCKET,
-                    Key=key,
-                    Body=processed_data,
-                    ContentType="image/png"
-                )
-                # Return S3 URL
-                url = f"https://{config.S3_BUCKET}.s3.{config.S3_REGION}.amazonaws.com/{key}"
-                logger.info(f"Brand asset uploaded to S3: {key}")
-            except Exception as e:
-                logger.error(f"S3 upload failed: {e}")
-                raise HTTPException(status_code=500, detail=f"S3 upload failed: {str(e)}")
-        else:
-            # Development: Save locally and return placeholder URL
-            import os
-            
-            # Create local uploads directory
-            upload_dir = "/tmp/uploads/branding"
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Save file locally
-            local_filename = f"{current_user.id}-{asset}-{timestamp}.png"
-            local_path = os.path.join(upload_dir, local_filename)
-            
-            with open(local_path, "wb") as f:
-                f.write(processed_data)
-            
-            # Return a local URL for development
-            url = f"/api/uploads/branding/{local_filename}"
-            logger.info(f"Brand asset saved locally: {local_path}")
+        # Upload the original and every derivative concurrently
+        stored = await asyncio.gather(
+            store_brand_file(key, processed.primary.data, processed.primary.mime),
+            *[store_brand_file(variant_keys[name], rendition.data, rendition.mime)
+              for name, rendition in processed.derivatives.items()]
+        )
+        url, etag = stored[0]
+        width, height = processed.primary.width, processed.primary.height
         
-        # Get image dimensions
-        image = Image.open(io.BytesIO(processed_data))
-        width, height = image.size
+        # Pre-fill the PDF embed cache so branded reports never fetch the image back
+        pdf = processed.derivatives["pdf"]
+        pdf_etag = stored[1 + list(processed.derivatives).index("pdf")][1]
+        await get_brand_asset_cache().set(variant_keys["pdf"], pdf_etag, pdf.data, pdf.mime)
         
         # Update brand profile with new asset
         asset_data = {
             "url": url,
+            "key": key,
+            "etag": etag,
             "w": width,
             "h": height,
-            "mime": "image/png",
-            "updatedAt": datetime.now(timezone.utc).isoformat()
+            "mime": processed.primary.mime,
+            "updatedAt": datetime.now(timezone.utc).isoformat(),
+            "variants": {
+                name: {
+                    "url": variant_url,
+                    "key": variant_keys[name],
+                    "etag": variant_etag,
+                    "w": rendition.width,
+                    "h": rendition.height,
+                    "mime": rendition.mime,
+                    "bytes": rendition.size
+                }
+                for (name, rendition), (variant_url, variant_etag) in zip(processed.derivatives.items(), stored[1:])
+            }
         }
         
         # Update database
-        update_field = f"assets.{asset}"
-        result = await db.brand_profiles.update_one(
-            {"userId": current_user.id},
-            {"$set": {
-                update_field: asset_data,
-                "updatedAt": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        if result.matched_count == 0:
+        if not await save_brand_profile_update(current_user.id, {f"assets.{asset}": asset_data}):
             raise HTTPException(status_code=404, detail="Brand profile not found")
         
-        # Recalculate completion score
-        updated_profile = await get_brand_profile(current_user.id)
-        if updated_profile:
-            completion_score = calculate_completion_score(updated_profile)
-            await db.brand_profiles.update_one(
-                {"userId": current_user.id},
-                {"$set": {"completion": completion_score}}
-            )
-        
         return {
             "ok": True,
             "asset": asset,
@@ -5204,6 +4941,7 @@ async def upload_brand_asset(
             "url": url,
             "width": width,
             "height": height,
+            "variants": asset_data["variants"],
             "message": f"{asset} uploaded successfully"
         }
         
@@ -5213,27 +4951,35 @@ async def upload_brand_asset(
         logger.error(f"Error uploading brand asset: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/uploads/branding/{filename}")
-async def serve_branding_file(filename: str):
-    """Serve locally uploaded branding files (development only)"""
-    import os
+# Brand images only (user/<id>/..., and branding/ from before the storage driver);
+# generic uploads stay private
+SERVED_UPLOAD_PREFIXES = ("user/", "branding/")
+
+@api_router.get("/uploads/{key:path}")
+async def serve_branding_file(key: str):
+    """Serve brand images stored by the local storage driver (development only)"""
+    import mimetypes
     from fastapi.responses import FileResponse
     
-    if s3_client:
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
         raise HTTPException(status_code=404, detail="Local files not available in production")
     
-    file_path = f"/tmp/uploads/branding/{filename}"
+    if not key.startswith(SERVED_UPLOAD_PREFIXES):
+        raise HTTPException(status_code=404, detail="File not found")
     
-    if not os.path.exists(file_path):
+    try:
+        file_path = storage.path_for(key)
+    except StorageError:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Verify filename contains user ID for basic security
-    if not any(char.isdigit() for char in filename):
+    if not await asyncio.to_thread(file_path.is_file):
         raise HTTPException(status_code=404, detail="File not found")
     
+    # FileResponse hands the path to the server for sendfile when it supports ASGI pathsend
     return FileResponse(
         path=file_path,
-        media_type="image/png",
+        media_type=mimetypes.guess_type(file_path.name)[0] or "image/png",
         headers={"Cache-Control": "public, max-age=3600"}
     )
 
@@ -5253,39 +4999,21 @@ async def delete_brand_asset(
         if not profile:
             raise HTTPException(status_code=404, detail="Brand profile not found")
         
-        # Get asset URL for S3 deletion (optional - we could keep for audit)
+        # Delete the stored original and its derivatives from storage
         current_asset = getattr(profile.assets, type)
         if current_asset.url:
-            # Extract S3 key from URL and attempt deletion
             try:
-                key = current_asset.url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[1]
-                await delete_from_s3(key)
+                key = brand_asset_key(current_asset)
+                keys = ([key] if key else []) + [variant.key for variant in current_asset.variants.values() if variant.key]
+                await asyncio.gather(*[delete_from_s3(k) for k in keys])
+                await get_brand_asset_cache().invalidate(*keys)
             except Exception as e:
-                logger.warning(f"Failed to delete S3 asset: {e}")
+                logger.warning(f"Failed to delete stored asset: {e}")
         
         # Clear asset in database
-        empty_asset = BrandAsset()
-        update_field = f"assets.{type}"
-        result = await db.brand_profiles.update_one(
-            {"userId": current_user.id},
-            {"$set": {
-                update_field: empty_asset.dict(),
-                "updatedAt": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        if result.matched_count == 0:
+        if not await save_brand_profile_update(current_user.id, {f"assets.{type}": BrandAsset().dict()}):
             raise HTTPException(status_code=404, detail="Brand profile not found")
         
-        # Recalculate completion score
-        updated_profile = await get_brand_profile(current_user.id)
-        if updated_profile:
-            completion_score = calculate_completion_score(updated_profile)
-            await db.brand_profiles.update_one(
-                {"userId": current_user.id},
-                {"$set": {"completion": completion_score}}
-            )
-        
         return {"success": True, "message": f"{type} deleted successfully"}
         
     except HTTPException:
@@ -5343,6 +5071,8 @@ async def generate_test_pdf(
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating test PDF: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate test PDF: {str(e)}")
@@ -5558,8 +5288,152 @@ async def generate_test_pdf_html(data: dict, current_user) -> str:
     
     return html
 
+def generic_brand_bundle(plan: str = "FREE") -> dict:
+    """Unbranded bundle for anonymous and FREE users"""
+    return {
+        "agent": {"name": "", "initials": "", "email": "", "phone": ""},
+        "brokerage": {"name": "", "license": "", "address": ""},
+        "colors": {"primary": "#16a34a", "secondary": "#0ea5e9"},
+        "assets": {
+            "headshotPngBase64": "",
+            "agentLogoPngBase64": "",
+            "brokerLogoPngBase64": ""
+        },
+        "footer": {"compliance": "", "cta": ""},
+        "plan": plan,
+        "show": {
+            "headerBar": False,
+            "agentLogo": False,
+            "brokerLogo": False,
+            "cta": False
+        }
+    }
+
+async def build_brand_bundle(user: User, context: str = "pdf", embed: bool = True) -> Tuple[dict, bool]:
+    """
+    Resolve a user's plan-filtered branding, with assets embedded as base64 or as URLs.
+    The flag is False when an asset had to be replaced by the placeholder, so the
+    result should not be cached.
+    """
+    # Get user's brand profile
+    profile = await get_brand_profile(user.id)
+    if not profile:
+        profile = BrandProfile(
+            id=str(uuid.uuid4()),
+            userId=user.id,
+            updatedAt=datetime.now(timezone.utc).isoformat()
+        )
+    
+    # Apply plan-based rules for PDF branding
+    plan = user.plan.value
+    is_paid_user = plan in ["STARTER", "PRO"]  # Only STARTER and PRO get branding
+    show_logos = plan in ["STARTER", "PRO"]
+    show_cta = plan == "PRO"
+    
+    # FREE users get generic PDFs, STARTER/PRO get branded PDFs
+    if plan == "FREE":
+        return generic_brand_bundle(plan), True
+    
+    # Prepare agent name
+    agent_name = f"{profile.agent.firstName} {profile.agent.lastName}".strip()
+    if not agent_name:
+        agent_name = user.full_name or ""
+    
+    # Generate agent initials
+    agent_initials = ""
+    if profile.agent.firstName and profile.agent.lastName:
+        agent_initials = f"{profile.agent.firstName[0]}{profile.agent.lastName[0]}".upper()
+    elif agent_name:
+        # Fallback: use first letter of each word in full name
+        name_parts = agent_name.split()
+        if len(name_parts) >= 2:
+            agent_initials = f"{name_parts[0][0]}{name_parts[1][0]}".upper()
+        elif len(name_parts) == 1:
+            agent_initials = name_parts[0][0].upper()
+    
+    # Prepare response
+    response_data = {
+        "agent": {
+            "name": agent_name,
+            "initials": agent_initials,
+            "email": profile.agent.email or user.email,
+            "phone": profile.agent.phone
+        },
+        "brokerage": {
+            "name": profile.brokerage.name,
+            "license": profile.brokerage.licenseNumber,
+            "address": profile.brokerage.address
+        },
+        "colors": {
+            "primary": profile.brand.primaryHex,
+            "secondary": profile.brand.secondaryHex
+        },
+        "footer": {
+            "compliance": profile.footer.compliance,
+            "cta": profile.footer.cta.replace("{{agent.name}}", agent_name).replace("{{agent.email}}", profile.agent.email or user.email)
+        },
+        "plan": plan,
+        "show": {
+            "headerBar": is_paid_user,  # Only STARTER/PRO get branded header
+            "agentLogo": show_logos and bool(profile.assets.agentLogo.url),
+            "brokerLogo": show_logos and bool(profile.assets.brokerLogo.url),
+            "cta": show_cta and profile.planRules.proShowCta
+        }
+    }
+    cacheable = True
+    
+    # Add assets (as base64 if embed=true, otherwise URLs)
+    if embed and context == "pdf":
+        # Convert images to base64 for PDF embedding
+        assets = {}
+        
+        async def embed_asset(asset_type: str, show: bool = True) -> str:
+            nonlocal cacheable
+            asset = getattr(profile.assets, asset_type)
+            if not (asset.url and show):
+                return create_transparent_png_fallback()
+            try:
+                return await embed_brand_asset(asset, asset_type)
+            except Exception as e:
+                logger.warning(f"Failed to embed {asset_type}: {e}")
+                cacheable = False
+                return create_transparent_png_fallback()
+        
+        (assets["headshotPngBase64"],
+         assets["agentLogoPngBase64"],
+         assets["brokerLogoPngBase64"]) = await asyncio.gather(
+            embed_asset("headshot"),
+            embed_asset("agentLogo", show_logos),
+            embed_asset("brokerLogo", show_logos)
+        )
+        
+        response_data["assets"] = assets
+    else:
+        # Return URLs
+        response_data["assets"] = {
+            "headshotUrl": profile.assets.headshot.url if profile.assets.headshot.url else "",
+            "agentLogoUrl": profile.assets.agentLogo.url if profile.assets.agentLogo.url and show_logos else "",
+            "brokerLogoUrl": profile.assets.brokerLogo.url if profile.assets.brokerLogo.url and show_logos else ""
+        }
+    
+    return response_data, cacheable
+
+async def get_brand_bundle(user: User, context: str = "pdf", embed: bool = True) -> BundleEntry:
+    """
+    The user's resolved brand bundle from the per-user cache. Only the profile's updatedAt
+    is read on a hit; a profile write (on any worker) or a plan change yields a new version.
+    """
+    profile_version = await db.brand_profiles.find_one({"userId": user.id}, {"_id": 0, "updatedAt": 1})
+    version = bundle_version(
+        (profile_version or {}).get("updatedAt"), user.plan.value, user.full_name, user.email, context, embed
+    )
+    return await get_brand_bundle_cache().get_or_build(
+        user.id, f"{context}:{int(embed)}", version, lambda: build_brand_bundle(user, context, embed)
+    )
+
 @api_router.get("/brand/resolve")
 async def resolve_brand_data(
+    request: Request,
     context: str = "pdf",
     embed: bool = True,
     current_user: Optional[User] = Depends(get_current_user_optional)
@@ -5568,163 +5442,13 @@ async def resolve_brand_data(
     try:
         if not current_user:
             # Return default branding for anonymous users
-            return {
-                "agent": {"name": "", "initials": "", "email": "", "phone": ""},
-                "brokerage": {"name": "", "license": "", "address": ""},
-                "colors": {"primary": "#16a34a", "secondary": "#0ea5e9"},
-                "assets": {
-                    "headshotPngBase64": "",
-                    "agentLogoPngBase64": "",
-                    "brokerLogoPngBase64": ""
-                },
-                "footer": {"compliance": "", "cta": ""},
-                "plan": "FREE",
-                "show": {
-                    "headerBar": False,
-                    "agentLogo": False,
-                    "brokerLogo": False,
-                    "cta": False
-                }
-            }
-        
-        # Get user's brand profile
-        profile = await get_brand_profile(current_user.id)
-        if not profile:
-            profile = BrandProfile(
-                id=str(uuid.uuid4()),
-                userId=current_user.id,
-                updatedAt=datetime.now(timezone.utc).isoformat()
-            )
+            return generic_brand_bundle()
         
-        # Apply plan-based rules for PDF branding
-        plan = current_user.plan.value
-        is_paid_user = plan in ["STARTER", "PRO"]  # Only STARTER and PRO get branding
-        show_logos = plan in ["STARTER", "PRO"]
-        show_cta = plan == "PRO"
-        
-        # FREE users get generic PDFs, STARTER/PRO get branded PDFs
-        if plan == "FREE":
-            # Return generic branding for FREE users
-            return {
-                "agent": {"name": "", "initials": "", "email": "", "phone": ""},
-                "brokerage": {"name": "", "license": "", "address": ""},
-                "colors": {"primary": "#16a34a", "secondary": "#0ea5e9"},
-                "assets": {
-                    "headshotPngBase64": "",
-                    "agentLogoPngBase64": "",
-                    "brokerLogoPngBase64": ""
-                },
-                "footer": {"compliance": "", "cta": ""},
-                "plan": plan,
-                "show": {
-                    "headerBar": False,
-                    "agentLogo": False,
-                    "brokerLogo": False,
-                    "cta": False
-                }
-            }
-        
-        # Prepare agent name
-        agent_name = f"{profile.agent.firstName} {profile.agent.lastName}".strip()
-        if not agent_name:
-            agent_name = current_user.full_name or ""
-        
-        # Generate agent initials
-        agent_initials = ""
-        if profile.agent.firstName and profile.agent.lastName:
-            agent_initials = f"{profile.agent.firstName[0]}{profile.agent.lastName[0]}".upper()
-        elif agent_name:
-            # Fallback: use first letter of each word in full name
-            name_parts = agent_name.split()
-            if len(name_parts) >= 2:
-                agent_initials = f"{name_parts[0][0]}{name_parts[1][0]}".upper()
-            elif len(name_parts) == 1:
-                agent_initials = name_parts[0][0].upper()
-        
-        # Prepare response
-        response_data = {
-            "agent": {
-                "name": agent_name,
-                "initials": agent_initials,
-                "email": profile.agent.email or current_user.email,
-                "phone": profile.agent.phone
-            },
-            "brokerage": {
-                "name": profile.brokerage.name,
-                "license": profile.brokerage.licenseNumber,
-                "address": profile.brokerage.address
-            },
-            "colors": {
-                "primary": profile.brand.primaryHex,
-                "secondary": profile.brand.secondaryHex
-            },
-            "footer": {
-                "compliance": profile.footer.compliance,
-                "cta": profile.footer.cta.replace("{{agent.name}}", agent_name).replace("{{agent.email}}", profile.agent.email or current_user.email)
-            },
-            "plan": plan,
-            "show": {
-                "headerBar": is_paid_user,  # Only STARTER/PRO get branded header
-                "agentLogo": show_logos and bool(profile.assets.agentLogo.url),
-                "brokerLogo": show_logos and bool(profile.assets.brokerLogo.url),
-                "cta": show_cta and profile.planRules.proShowCta
-            }
-        }
-        
-        # Add assets (as base64 if embed=true, otherwise URLs)
-        if embed and context == "pdf":
-            # Convert images to base64 for PDF embedding
-            assets = {}
-            
-            # Process headshot
-            if profile.assets.headshot.url:
-                try:
-                    assets["headshotPngBase64"] = await fetch_and_convert_s3_image(
-                        profile.assets.headshot.url, 
-                        max_size_kb=300  # Smaller size for headshots
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to fetch headshot: {e}")
-                    assets["headshotPngBase64"] = create_transparent_png_fallback()
-            else:
-                assets["headshotPngBase64"] = create_transparent_png_fallback()
-            
-            # Process agent logo
-            if profile.assets.agentLogo.url and show_logos:
-                try:
-                    assets["agentLogoPngBase64"] = await fetch_and_convert_s3_image(
-                        profile.assets.agentLogo.url,
-                        max_size_kb=200  # Logos should be smaller
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to fetch agent logo: {e}")
-                    assets["agentLogoPngBase64"] = create_transparent_png_fallback()
-            else:
-                assets["agentLogoPngBase64"] = create_transparent_png_fallback()
-            
-            # Process broker logo
-            if profile.assets.brokerLogo.url and show_logos:
-                try:
-                    assets["brokerLogoPngBase64"] = await fetch_and_convert_s3_image(
-                        profile.assets.brokerLogo.url,
-                        max_size_kb=200  # Logos should be smaller
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to fetch broker logo: {e}")
-                    assets["brokerLogoPngBase64"] = create_transparent_png_fallback()
-            else:
-                assets["brokerLogoPngBase64"] = create_transparent_png_fallback()
-            
-            response_data["assets"] = assets
-        else:
-            # Return URLs
-            response_data["assets"] = {
-                "headshotUrl": profile.assets.headshot.url if profile.assets.headshot.url else "",
-                "agentLogoUrl": profile.assets.agentLogo.url if profile.assets.agentLogo.url and show_logos else "",
-                "brokerLogoUrl": profile.assets.brokerLogo.url if profile.assets.brokerLogo.url and show_logos else ""
-            }
-        
-        return response_data
+        bundle = await get_brand_bundle(current_user, context, embed)
+        headers = {"ETag": bundle.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), bundle.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=bundle.body, media_type="application/json", headers=headers)
         
     except HTTPException:
         raise
@@ -5736,7 +5460,7 @@ async def resolve_brand_data(
 async def storage_health_check():
     """Health check for S3 storage connectivity"""
     try:
-        if not s3_client:
+        if get_storage().name != "s3":
             # S3 not configured - running in development mode with local storage fallback
             return {
                 "ok": True, 
@@ -5813,49 +5537,11 @@ async def create_pnl_deal(
         gross_commission = amount_sold * commission_percent
         agent_gross_commission = gross_commission * split_percent
         
-        # Step 2: Calculate cap deduction using fixed percentage
+        # Step 2: Cap deduction is assigned by the cap ledger once the deal is stored,
+        # since it depends on every deal before this one in the cap period
         cap_amount = 0
         pre_cap_income = agent_gross_commission
         
-        # Get user's cap configuration to determine if cap applies
-        cap_config = await db.cap_configurations.find_one({
-            "user_id": current_user.id
-        })
-        
-        if cap_config:
-            # Check if we're within the cap period
-            closing_date_obj = datetime.fromisoformat(deal_data.closing_date)
-            cap_period_start = datetime.fromisoformat(cap_config["cap_period_start"])
-            cap_period_end = datetime.fromisoformat(cap_config["reset_date"])
-            
-            if cap_period_start <= closing_date_obj <= cap_period_end:
-                # Calculate current cap progress
-                total_cap = cap_config["annual_cap_amount"]
-                cap_percentage = cap_config["cap_percentage"] / 100  # Convert to decimal
-                current_cap_paid = cap_config.get("current_cap_paid", 0)
-                
-                # Find all previous deals in this cap period
-                deals_cursor = db.pnl_deals.find({
-                    "user_id": current_user.id,
-                    "closing_date": {
-                        "$gte": cap_period_start.isoformat(),
-                        "$lt": closing_date_obj.isoformat()  # Before this deal
-                    }
-                })
-                
-                # Sum up cap amounts from previous deals
-                async for previous_deal in deals_cursor:
-                    current_cap_paid += previous_deal.get("cap_amount", 0)
-                
-                # Check if cap is not yet complete
-                remaining_cap = max(0, total_cap - current_cap_paid)
-                
-                if remaining_cap > 0:
-                    # Apply fixed percentage to agent's commission
-                    calculated_cap = agent_gross_commission * cap_percentage
-                    # Don't exceed remaining cap obligation
-                    cap_amount = min(calculated_cap, remaining_cap)
-        
         # Step 3: Apply team/brokerage split to income after cap deduction
         income_after_cap = agent_gross_commission - cap_amount
         final_income = income_after_cap * (1 - team_brokerage_split_percent)
@@ -5883,6 +5569,13 @@ async def create_pnl_deal(
         # Save to database
         deal_dict = new_deal.dict()
         await db.pnl_deals.insert_one(deal_dict)
+        await record_deals(db, current_user.id, [deal_dict])
+        
+        changed = await apply_deal_change(db, current_user.id, new=deal_dict)
+        await record_data_change(current_user, PNL)
+        if new_deal.id in changed:
+            new_deal.cap_amount = changed[new_deal.id]["cap_amount"]
+            new_deal.final_income = changed[new_deal.id]["final_income"]
         
         return new_deal
     except Exception as e:
@@ -5914,6 +5607,11 @@ async def update_pnl_deal(
             elif field in ["house_address", "lead_source", "closing_date"]:
                 update_fields[field] = str(value)
         
+        # Keep the month bucket in step with the closing date
+        if "closing_date" in update_fields:
+            closing_date_obj = datetime.fromisoformat(update_fields["closing_date"])
+            update_fields["month"] = f"{closing_date_obj.year}-{closing_date_obj.month:02d}"
+        
         # Recalculate final income if any financial fields were updated
         if any(field in update_fields for field in ["amount_sold_for", "commission_percent", "split_percent", "team_brokerage_split_percent"]):
             amount_sold = update_fields.get("amount_sold_for", existing_deal["amount_sold_for"])
@@ -5921,7 +5619,7 @@ async def update_pnl_deal(
             split_percent = (update_fields.get("split_percent", existing_deal["split_percent"]) / 100) if update_fields.get("split_percent", existing_deal["split_percent"]) > 0 else 1.0
             team_brokerage_split_percent = (update_fields.get("team_brokerage_split_percent", existing_deal["team_brokerage_split_percent"])) / 100
             
-            # Recalculate with cap logic (simplified for updates - keep existing cap_amount)
+            # Recalculate with the existing cap_amount; the cap ledger corrects it below if needed
             gross_commission = amount_sold * commission_percent
             agent_gross_commission = gross_commission * split_percent
             cap_amount = existing_deal.get("cap_amount", 0)  # Keep existing cap amount
@@ -5946,6 +5644,11 @@ async def update_pnl_deal(
             "id": deal_id,
             "user_id": current_user.id
         })
+        await record_deal_update(db, current_user.id, existing_deal, updated_deal_data)
+        
+        changed = await apply_deal_change(db, current_user.id, old=existing_deal, new=updated_deal_data)
+        await record_data_change(current_user, PNL)
+        updated_deal_data.update(changed.get(deal_id, {}))
         
         return PnLDeal(**updated_deal_data)
         
@@ -5962,14 +5665,17 @@ async def delete_pnl_deal(
 ):
     """Delete a P&L deal entry"""
     try:
-        result = await db.pnl_deals.delete_one({
+        deal = await db.pnl_deals.find_one_and_delete({
             "id": deal_id,
             "user_id": current_user.id
         })
         
-        if result.deleted_count == 0:
+        if not deal:
             raise HTTPException(status_code=404, detail="Deal not found")
         
+        await record_deals(db, current_user.id, [deal], sign=-1)
+        await apply_deal_change(db, current_user.id, old=deal)
+        await record_data_change(current_user, PNL)
         return {"message": "Deal deleted successfully"}
     except HTTPException:
         raise
@@ -6043,6 +5749,7 @@ async def create_pnl_expense(
         # Save main expense to database
         expense_dict = new_expense.dict()
         await db.pnl_expenses.insert_one(expense_dict)
+        created_expenses = [expense_dict]
         
         # If recurring, create expenses for all remaining months in the year
         if expense_data.recurring:
@@ -6071,7 +5778,10 @@ async def create_pnl_expense(
                 # Save recurring instance
                 recurring_dict = recurring_expense.dict()
                 await db.pnl_expenses.insert_one(recurring_dict)
+                created_expenses.append(recurring_dict)
         
+        await record_expenses(db, current_user.id, created_expenses)
+        await record_data_change(current_user, PNL)
         return new_expense
     except Exception as e:
         logger.error(f"Error creating P&L expense: {e}")
@@ -6102,6 +5812,11 @@ async def update_pnl_expense(
             elif field in ["category", "description", "date"]:
                 update_fields[field] = str(value)
         
+        # Keep the month bucket in step with the expense date
+        if "date" in update_fields:
+            expense_date_obj = datetime.fromisoformat(update_fields["date"])
+            update_fields["month"] = f"{expense_date_obj.year}-{expense_date_obj.month:02d}"
+        
         # Update the expense
         update_fields["updated_at"] = datetime.now(timezone.utc).isoformat()
         
@@ -6115,6 +5830,8 @@ async def update_pnl_expense(
             "id": expense_id,
             "user_id": current_user.id
         })
+        await record_expense_update(db, current_user.id, existing_expense, updated_expense_data)
+        await record_data_change(current_user, PNL)
         
         return PnLExpense(**updated_expense_data)
         
@@ -6145,13 +5862,22 @@ async def delete_pnl_expense(
             "id": expense_id,
             "user_id": current_user.id
         })
+        if result.deleted_count:
+            await record_expenses(db, current_user.id, [expense], sign=-1)
+            await record_data_change(current_user, PNL)
         
         # If this was a recurring expense, delete all its recurring instances
         if expense.get("recurring", False):
-            await db.pnl_expenses.delete_many({
+            instance_filter = {
                 "original_expense_id": expense_id,
                 "user_id": current_user.id
-            })
+            }
+            instances = await db.pnl_expenses.find(
+                instance_filter, {"month": 1, "date": 1, "amount": 1, "category": 1}
+            ).to_list(length=None)
+            await db.pnl_expenses.delete_many(instance_filter)
+            await record_expenses(db, current_user.id, instances, sign=-1)
+            await record_data_change(current_user, PNL)
             return {"message": "Recurring expense and all instances deleted successfully"}
         
         # If this was a recurring instance, just delete this one
@@ -6321,40 +6047,27 @@ async def update_pnl_budget(
 @api_router.get("/pnl/summary")
 async def get_pnl_summary(
     month: str,
+    include_items: bool = Query(default=True, description="Include the month's deals and expenses"),
     current_user: User = Depends(require_auth)
 ) -> PnLSummary:
-    """Get P&L summary for a specific month"""
+    """Get P&L summary for a specific month (totals come from the monthly rollup)"""
     try:
-        # Get deals
-        deals_cursor = db.pnl_deals.find({
-            "user_id": current_user.id,
-            "month": month
-        }).sort("closing_date", 1)
+        rollup = await get_month_rollup(db, current_user.id, month)
         
         deals = []
-        total_income = 0
-        async for deal_data in deals_cursor:
-            deal = PnLDeal(**deal_data)
-            deals.append(deal)
-            total_income += deal.final_income
-        
-        # Get expenses
-        expenses_cursor = db.pnl_expenses.find({
-            "user_id": current_user.id,
-            "month": month
-        }).sort("date", 1)
-        
         expenses = []
-        total_expenses = 0
-        expense_by_category = {}
-        async for expense_data in expenses_cursor:
-            expense = PnLExpense(**expense_data)
-            expenses.append(expense)
-            total_expenses += expense.amount
+        if include_items:
+            deals_cursor = db.pnl_deals.find({
+                "user_id": current_user.id,
+                "month": month
+            }).sort("closing_date", 1)
+            deals = [PnLDeal(**deal_data) async for deal_data in deals_cursor]
             
-            if expense.category not in expense_by_category:
-                expense_by_category[expense.category] = 0
-            expense_by_category[expense.category] += expense.amount
+            expenses_cursor = db.pnl_expenses.find({
+                "user_id": current_user.id,
+                "month": month
+            }).sort("date", 1)
+            expenses = [PnLExpense(**expense_data) async for expense_data in expenses_cursor]
         
         # Get budgets
         budgets_cursor = db.pnl_budgets.find({
@@ -6368,7 +6081,7 @@ async def get_pnl_summary(
         
         # Calculate budget utilization
         budget_utilization = {}
-        for category, spent in expense_by_category.items():
+        for category, spent in rollup["categories"].items():
             budget = budgets.get(category, 0)
             budget_utilization[category] = {
                 "budget": budget,
@@ -6377,6 +6090,9 @@ async def get_pnl_summary(
                 "percent": (spent / budget * 100) if budget > 0 else 0
             }
         
+        total_income = rollup["income"]
+        total_expenses = rollup["expenses"]
+        
         # Calculate net income
         net_income = total_income - total_expenses
         
@@ -6397,10 +6113,11 @@ async def get_pnl_summary(
 async def export_pnl_data(
     month: Optional[str] = None,
     year: Optional[str] = None,
+    category: Optional[str] = None,
     format: str = "excel",
     current_user: User = Depends(require_auth)
 ):
-    """Export P&L data to Excel format"""
+    """Export P&L deals and expenses as XLSX (default) or CSV, streamed"""
     # Check if user is Pro (P&L is Pro-only feature)
     if current_user.plan not in ["PRO"]:
         raise HTTPException(
@@ -6409,14 +6126,22 @@ async def export_pnl_data(
         )
     
     try:
-        # This would implement Excel export functionality
-        # For now, return a placeholder response
-        return {
-            "message": "Export functionality coming soon",
-            "month": month,
-            "year": year,
-            "format": format
-        }
+        fmt = normalize_format(format)
+        start_month, end_month = month_range(month, year)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        rows = export_rows(db, current_user.id, start_month, end_month, category)
+        filename = export_filename(start_month, end_month, category, fmt)
+        return StreamingResponse(
+            stream_export(rows, fmt),
+            media_type=media_type(fmt),
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "Cache-Control": "no-store"
+            }
+        )
     except Exception as e:
         logger.error(f"Error exporting P&L data: {e}")
         raise HTTPException(status_code=500, detail="Failed to export P&L data")
@@ -6478,6 +6203,10 @@ async def create_or_update_cap_configuration(
                 {"$set": update_fields}
             )
             
+            # Period or amounts may have changed, so recompute the whole ledger
+            await rebuild_ledger(db, current_user.id)
+            await record_data_change(current_user, PNL)
+            
             # Return updated configuration
             updated_config = await db.cap_configurations.find_one({
                 "user_id": current_user.id
@@ -6497,6 +6226,8 @@ async def create_or_update_cap_configuration(
             
             config_dict = new_config.dict()
             await db.cap_configurations.insert_one(config_dict)
+            await rebuild_ledger(db, current_user.id, config_dict)
+            await record_data_change(current_user, PNL)
             
             return new_config
             
@@ -6512,34 +6243,14 @@ async def get_cap_progress(
 ) -> CapProgress:
     """Get current cap progress"""
     try:
-        # Get cap configuration
-        config = await db.cap_configurations.find_one({
-            "user_id": current_user.id
-        })
+        # Configuration and running totals come from one document
+        config = await get_ledger_summary(db, current_user.id)
         
         if not config:
             raise HTTPException(status_code=404, detail="Cap configuration not found")
         
-        # Calculate cap progress from deals within the cap period
-        cap_period_start = datetime.fromisoformat(config["cap_period_start"])
-        cap_period_end = datetime.fromisoformat(config["reset_date"])
-        
-        # Find all deals within the cap period
-        deals_cursor = db.pnl_deals.find({
-            "user_id": current_user.id,
-            "closing_date": {
-                "$gte": cap_period_start.isoformat(),
-                "$lte": cap_period_end.isoformat()
-            }
-        })
-        
-        total_cap_paid = config.get("current_cap_paid", 0)  # Manual adjustment
-        deals_contributing = 0
-        
-        async for deal in deals_cursor:
-            total_cap_paid += deal.get("cap_amount", 0)
-            if deal.get("cap_amount", 0) > 0:
-                deals_contributing += 1
+        total_cap_paid = config["ledger"]["total_paid"]  # Includes the manual adjustment
+        deals_contributing = config["ledger"]["deals_contributing"]
         
         total_cap = config["annual_cap_amount"]
         remaining = max(0, total_cap - total_cap_paid)
@@ -6670,205 +6381,11 @@ async def get_weekly_metrics(
 async def generate_ai_coach_response(
     current_user: User = Depends(require_auth)
 ) -> AICoachResponse:
-    """Generate AI coach response"""
-    import json
-    import hashlib
-    from dotenv import load_dotenv
-    
-    # Load environment variables
-    load_dotenv()
-    
+    """Generate AI coach response (served from cache when the user's data hasn't changed)"""
     try:
-        # Get goal settings (new source of coaching data)
-        goal_settings = await db.goal_settings.find_one({
-            "userId": current_user.id
-        })
-        
-        if not goal_settings or (not goal_settings.get("annualGciGoal") and not goal_settings.get("monthlyGciTarget")):
-            # Return setup response
-            return AICoachResponse(
-                coaching_text="Welcome! I'm your personal real estate coach, ready to help you achieve your goals and maximize your productivity.\n\nTo get started, I need you to set up your goals in the Goal Settings tab. Once you've configured your annual GCI goal, monthly targets, and average commission per closing, I'll be able to analyze your performance and provide personalized coaching insights.\n\nI'll help you identify where to focus your energy, spot patterns in your activity, and create a strategic plan to reach your targets. Think of me as your personal mentor who's always watching your numbers and ready to guide you toward success.\n\nGo ahead and set up your goals, then come back here for your personalized coaching session!"
-            )
-        
-        # Get recent activity logs (last 30 entries)
-        activity_logs_cursor = db.activity_logs.find({
-            "userId": current_user.id
-        }).sort("loggedAt", -1).limit(30)
-        
-        activity_logs = []
-        async for log_data in activity_logs_cursor:
-            activity_logs.append({
-                "loggedAt": log_data.get("loggedAt"),
-                "activities": log_data.get("activities", {}),
-                "hours": log_data.get("hours", {}),
-                "reflection": log_data.get("reflection")
-            })
-        
-        # Get recent reflection logs (last 15 entries)
-        reflection_logs_cursor = db.reflection_logs.find({
-            "userId": current_user.id
-        }).sort("loggedAt", -1).limit(15)
-        
-        reflection_logs = []
-        async for reflection_data in reflection_logs_cursor:
-            reflection_logs.append({
-                "loggedAt": reflection_data.get("loggedAt"),
-                "reflection": reflection_data.get("reflection"),
-                "mood": reflection_data.get("mood")
-            })
-        
-        # Get weekly metrics (last 12 weeks) - keep existing for backward compatibility
-        metrics_cursor = db.weekly_metrics.find({
-            "user_id": current_user.id
-        }).sort("week_of", -1).limit(12)
-        
-        weekly_metrics = []
-        async for metric_data in metrics_cursor:
-            weekly_metrics.append(metric_data)
-        
-        # Reverse to get oldest to newest
-        weekly_metrics = list(reversed(weekly_metrics))
-        
-        # Check if we have any activity data to analyze
-        has_activity_data = bool(activity_logs or reflection_logs or weekly_metrics)
-        
-        if not has_activity_data:
-            # Return data collection response
-            return AICoachResponse(
-                coaching_text="I can see you have your goals set up - that's a great start! Your annual GCI goal of ${:,} and monthly target of ${:,} show you're serious about your success.\n\nHowever, I don't have any activity data to analyze yet. To provide you with personalized coaching insights, I need you to start logging your daily activities in the Action Tracker.\n\nHere's what I recommend you track:\n• Outbound calls made - This tracks your lead generation effort\n• New conversations started - This measures your conversion funnel\n• Appointments scheduled - This shows your progress toward deals\n• Deals created and closed - This tracks your income progress\n\nOnce you start logging this data, I'll be able to analyze your patterns, identify what's working, spot areas for improvement, and give you specific recommendations to hit your goals. Think of me as your personal coach who's always watching your numbers and ready to guide you toward success!".format(
-                    int(goal_settings.get("annualGciGoal", 0) or 0),
-                    int(goal_settings.get("monthlyGciTarget", 0) or 0)
-                )
-            )
-        
-        # Generate cache key including all data sources
-        goal_settings_str = json.dumps(goal_settings, sort_keys=True, default=str)
-        activity_logs_str = json.dumps(activity_logs, sort_keys=True, default=str)
-        reflection_logs_str = json.dumps(reflection_logs, sort_keys=True, default=str)
-        metrics_str = json.dumps(weekly_metrics, sort_keys=True, default=str)
-        cache_key = hashlib.md5(f"{current_user.id}:{goal_settings_str}:{activity_logs_str}:{reflection_logs_str}:{metrics_str}:v2".encode()).hexdigest()
-        
-        # Check cache first
-        cached_response = await db.ai_coach_cache.find_one({
-            "user_id": current_user.id,
-            "cache_key": cache_key,
-            "expires_at": {"$gt": datetime.now(timezone.utc).isoformat()}
-        })
-        
-        if cached_response:
-            # Handle both old and new cache formats
-            response_data = cached_response["response_data"]
-            if "coaching_text" in response_data:
-                return AICoachResponse(**response_data)
-            else:
-                # Convert old format to new format
-                return AICoachResponse(coaching_text=response_data.get("summary", "Cached coaching data needs refresh. Please click retry."))
-        
-        # Prepare data for LLM
-        coaching_profile = {
-            "userId": current_user.id,
-            "market": "General",  # Default market since we're using goal_settings now
-            "commissionCapCents": 0,  # Will be pulled from separate cap tracker if needed
-            "capYearStart": None,
-            "goals": {
-                "annualGCI": goal_settings.get("annualGciGoal", 0) or 0,
-                "monthlyGCITarget": goal_settings.get("monthlyGciTarget", 0) or 0,
-                "avgGciPerClosing": goal_settings.get("avgGciPerClosing", 0) or 0,
-                "earnedGciToDate": goal_settings.get("earnedGciToDate", 0) or 0,
-                "workdaysThisMonth": goal_settings.get("workdays", 20)
-            },
-            "constraints": {
-                "goalType": goal_settings.get("goalType", "gci")
-            }
-        }
-        
-        weekly_metrics_formatted = []
-        for metric in weekly_metrics:
-            weekly_metrics_formatted.append({
-                "weekOf": metric.get("week_of"),
-                "dealsCreated": metric.get("deals_created", 0),
-                "dealsClosed": metric.get("deals_closed", 0),
-                "gciCents": metric.get("gci_cents", 0),
-                "capRemainingCents": metric.get("cap_remaining_cents", 0),
-                "callsMade": metric.get("calls_made", 0),
-                "newConversations": metric.get("new_conversations", 0),
-                "appointments": metric.get("appointments", 0),
-                "avgDaysToClose": metric.get("avg_days_to_close", 0),
-                "pipelineValueCents": metric.get("pipeline_value_cents", 0)
-            })
-        
-        # Initialize OpenAI client
-        openai_api_key = os.environ.get('OPENAI_API_KEY')
-        if not openai_api_key:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-        
-        from openai import AsyncOpenAI
-        
-        client = AsyncOpenAI(api_key=openai_api_key)
-        
-        system_message = """You are an experienced real estate sales coach and mentor. Write a comprehensive, thoughtful analysis of the user's current situation, goals, and performance. Think through their data like ChatGPT would - be conversational, insightful, and strategic.
-
-Analyze their goals, recent activity, deals, and performance data. Write your thoughts in a flowing, natural way that covers:
-- Current goal progress and gaps
-- Activity patterns and what's working/not working  
-- Strategic recommendations for focus areas
-- Specific next steps and priorities
-- Encouragement and motivation
-
-Write in first person as their personal coach. Be direct but encouraging. Use natural paragraphs, not bullet points. Reference specific numbers from their data when relevant. Keep it conversational but professional - like you're their mentor giving them honest feedback and a strategic plan.
-
-All monetary values are provided in dollars. Format money with commas and dollar sign when mentioning them (e.g., $25,000 not $25,000.00).
-
-Write 3-4 substantial paragraphs. Be specific and actionable based on their actual data."""
-        
-        # Create user message with all their data
-        user_content = f"""Here's my current situation as a real estate agent. Please analyze this data and give me your honest coaching insights and strategic recommendations:
-
-GOALS:
-{json.dumps(coaching_profile.get('goals', {}), indent=2)}
-
-RECENT ACTIVITY LOGS (Daily entries with specific activities and hours):
-{json.dumps(activity_logs, indent=2) if activity_logs else "No activity logs available"}
-
-RECENT REFLECTION LOGS (Daily thoughts and insights):
-{json.dumps(reflection_logs, indent=2) if reflection_logs else "No reflection logs available"}
-
-WEEKLY METRICS (Historical performance data):
-{json.dumps(weekly_metrics_formatted, indent=2) if weekly_metrics_formatted else "No weekly metrics available"}
-
-Please analyze my activity patterns, reflection insights, and goal progress. Write your coaching thoughts and strategic plan for me. Be specific about what I should focus on to reach my goals."""
-        
-        # Get response from OpenAI
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_content}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        
-        llm_response = response.choices[0].message.content
-        
-        # Create response object with the coaching text
-        coach_response = AICoachResponse(coaching_text=llm_response)
-        
-        # Cache the response (expires in 24 hours)
-        expires_at = (datetime.now(timezone.utc) + timedelta(hours=24)).isoformat()
-        cache_entry = AICoachCache(
-            user_id=current_user.id,
-            cache_key=cache_key,
-            response_data={"coaching_text": llm_response},
-            expires_at=expires_at
-        )
-        
-        await db.ai_coach_cache.insert_one(cache_entry.dict())
-        
-        return coach_response
-        
-    except HTTPException:
-        raise
+        return AICoachResponse(**await generate_coaching(db, current_user.id))
+    except LLMBusyError:
+        raise HTTPException(status_code=503, detail="AI coach is busy, please try again shortly")
     except Exception as e:
         logger.error(f"Error generating AI coach response: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate coaching insights")
@@ -6923,6 +6440,7 @@ async def update_goal_settings(
             {"$set": goal_dict},
             upsert=True
         )
+        await record_data_change(current_user, GOALS)
         
         # Log audit event
         await log_audit_event(
@@ -6974,6 +6492,7 @@ async def create_activity_log(
         
         # Insert log entry
         result = await db.activity_logs.insert_one(log_dict)
+        await record_data_change(current_user, ACTIVITY)
         
         logger.info(f"Activity log created for user: {current_user.id}")
         
@@ -7024,6 +6543,7 @@ async def update_activity_log(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Activity log not found")
+        await record_data_change(current_user, ACTIVITY)
         
         # Return updated log
         updated_log = await db.activity_logs.find_one({"id": log_id, "userId": current_user.id})
@@ -7053,6 +6573,7 @@ async def create_reflection_log(
         
         # Insert reflection entry
         result = await db.reflection_logs.insert_one(reflection_dict)
+        await record_data_change(current_user, REFLECTION)
         
         logger.info(f"Reflection log created for user: {current_user.id}")
         
@@ -7103,6 +6624,7 @@ async def update_reflection_log(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Reflection log not found")
+        await record_data_change(current_user, REFLECTION)
         
         # Return updated reflection
         updated_reflection = await db.reflection_logs.find_one({"id": log_id, "userId": current_user.id})
@@ -7132,81 +6654,34 @@ async def readiness_check():
     Comprehensive readiness check - verifies all dependencies.
     Use this for deployment validation and deep health monitoring.
     """
+    # Dependency checks come from the background probes; nothing is called per request
+    probes = get_probe_scheduler()
     checks = {}
     overall_ready = True
     
     # Database connectivity check
-    try:
-        if db is not None:
-            start_time = time.time()
-            # Try a simple operation with timeout
-            result = db.command("ping")
-            response_time = round((time.time() - start_time) * 1000, 2)
-            checks["database"] = {"status": "ok", "response_time_ms": response_time}
-        else:
-            checks["database"] = {"status": "error", "error": "Database not configured"}
-            overall_ready = False
-    except Exception as e:
-        checks["database"] = {"status": "error", "error": str(e)[:100]}
+    checks["database"] = {**probes.get("database"), "pool": get_pool_metrics()}
+    if checks["database"]["status"] != "ok":
         overall_ready = False
     
     # MongoDB cache connectivity check
-    try:
-        if 'cache' in globals() and cache and cache.is_connected():
-            start_time = time.time()
-            # Test cache connectivity using is_connected method
-            cache.is_connected()
-            response_time = round((time.time() - start_time) * 1000, 2)
-            checks["cache"] = {"status": "ok", "response_time_ms": response_time}
-        else:
-            checks["cache"] = {"status": "warning", "error": "MongoDB cache not available"}
-            # Cache is not required in development
-            if config.NODE_ENV == "production":
-                overall_ready = False
-    except Exception as e:
-        checks["cache"] = {"status": "error", "error": str(e)[:100]}
-        if config.NODE_ENV == "production":
-            overall_ready = False
+    checks["cache"] = probes.get("cache")
+    # Cache is not required in development
+    if checks["cache"]["status"] != "ok" and config.NODE_ENV == "production":
+        overall_ready = False
     
-    # S3 connectivity check (if configured)
-    try:
-        if config.S3_BUCKET and s3_client:
-            start_time = time.time()
-            # Test with a lightweight operation
-            test_key = f"healthcheck/{uuid.uuid4()}"
-            test_data = b"health-check"
-            
-            s3_client.put_object(
-                Bucket=config.S3_BUCKET,
-                Key=test_key,
-                Body=test_data,
-                ServerSideEncryption="AES256"
-            )
-            
-            # Clean up test object
-            s3_client.delete_object(Bucket=config.S3_BUCKET, Key=test_key)
-            
-            response_time = round((time.time() - start_time) * 1000, 2)
-            checks["s3"] = {"status": "ok", "response_time_ms": response_time}
-        else:
-            checks["s3"] = {"status": "not_configured"}
-    except Exception as e:
-        checks["s3"] = {"status": "error", "error": str(e)[:100]}
-        # S3 is optional, don't fail overall readiness
+    # S3 connectivity check (if configured) - S3 is optional, don't fail overall readiness
+    checks["s3"] = probes.get("s3")
     
-    # Stripe API connectivity check
-    try:
-        if config.STRIPE_API_KEY:
-            start_time = time.time()
-            # Test with a lightweight Stripe operation
-            stripe.Account.retrieve()
-            response_time = round((time.time() - start_time) * 1000, 2)
-            checks["stripe"] = {"status": "ok", "response_time_ms": response_time}
-        else:
-            checks["stripe"] = {"status": "not_configured"}
-    except Exception as e:
-        checks["stripe"] = {"status": "error", "error": str(e)[:100]}
-        # Stripe errors don't fail overall readiness (payment optional)
+    # Stripe API connectivity check - Stripe errors don't fail overall readiness (payment optional)
+    checks["stripe"] = probes.get("stripe")
+    
+    # Index bootstrap status (missing indexes degrade performance, not availability)
+    index_status = get_index_status()
+    checks["indexes"] = {
+        "status": {"complete": "ok", "failed": "warning"}.get(index_status["state"], index_status["state"]),
+        **index_status
+    }
     
     # OpenAI API connectivity check
     try:
@@ -7282,72 +6757,55 @@ async def admin_get_users(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     search: Optional[str] = Query(None),
+    search_mode: str = Query("contains", description="contains, prefix (indexed) or text (indexed)"),
     plan_filter: Optional[str] = Query(None),
     status_filter: Optional[str] = Query(None),
     sort_by: str = Query("created_at"),
     sort_order: str = Query("desc"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from next_cursor; replaces page"),
     current_user: User = Depends(require_master_admin)
 ):
     """Get all users with filtering and pagination (admin only)"""
+    if search_mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"search_mode must be one of {sorted(SEARCH_MODES)}")
+    
     try:
-        # Build query filters
-        query = {}
-        
-        if search:
-            query["$or"] = [
-                {"email": {"$regex": search, "$options": "i"}},
-                {"full_name": {"$regex": search, "$options": "i"}},
-                {"id": {"$regex": search, "$options": "i"}}
-            ]
-        
-        if plan_filter and plan_filter != "all":
-            query["plan"] = plan_filter
-            
-        if status_filter and status_filter != "all":
-            query["status"] = status_filter
-        
-        # Sort direction
-        sort_direction = -1 if sort_order == "desc" else 1
-        
-        # Get total count for pagination
-        total_users = await db.users.count_documents(query)
-        
-        # Calculate pagination
-        skip = (page - 1) * limit
-        total_pages = math.ceil(total_users / limit)
+        query = build_user_query(search, search_mode, plan_filter, status_filter)
+        sort_field, sort_direction = sort_spec(sort_by, sort_order)
+        
+        if cursor is not None:
+            # Keyset pagination: an empty cursor starts from the first row
+            after = decode_cursor(cursor, sort_field) if cursor else None
+            pipeline = build_keyset_pipeline(query, sort_field, sort_direction, after, limit)
+            docs = await db.users.aggregate(pipeline).to_list(length=limit + 1)
+            total_users = None
+        else:
+            pipeline = build_page_pipeline(query, sort_field, sort_direction, (page - 1) * limit, limit)
+            result = await db.users.aggregate(pipeline).to_list(length=1)
+            facet = result[0] if result else {"users": [], "total": []}
+            docs = facet["users"]
+            total_users = facet["total"][0]["count"] if facet["total"] else 0
         
-        # Get users with pagination and sorting
-        users_cursor = db.users.find(query).sort(sort_by, sort_direction).skip(skip).limit(limit)
+        has_more = len(docs) > limit if cursor is not None else page * limit < total_users
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field) if docs and has_more else None
         
         users = []
-        async for user_data in users_cursor:
+        for user_dict in docs:
             try:
-                # Convert datetime fields to strings for JSON serialization
-                user_dict = dict(user_data)
-                
                 # Ensure 'id' field exists - skip user if missing
-                if "id" not in user_dict or user_dict["id"] is None:
+                if user_dict.get("id") is None:
                     logger.warning(f"Skipping user {user_dict.get('email', 'UNKNOWN')} - missing 'id' field")
                     continue
                 
-                # Handle datetime fields
-                for field in ["created_at", "updated_at", "last_login"]:
-                    if field in user_dict and user_dict[field]:
+                # Convert datetime fields to strings for JSON serialization
+                for field in ["created_at", "last_login"]:
+                    if user_dict.get(field) and not isinstance(user_dict[field], str):
                         if isinstance(user_dict[field], datetime):
                             user_dict[field] = user_dict[field].isoformat()
-                        elif isinstance(user_dict[field], str):
-                            # Already a string, keep as is
-                            pass
                         else:
                             user_dict[field] = str(user_dict[field])
                 
-                # Get deals count for this user (with error handling)
-                try:
-                    deals_count = await db.pnl_deals.count_documents({"user_id": user_dict["id"]})
-                except Exception as deals_error:
-                    logger.warning(f"Could not fetch deals count for user {user_dict['id']}: {deals_error}")
-                    deals_count = 0
-                
                 admin_user = AdminUserResponse(
                     id=user_dict["id"],
                     email=user_dict["email"],
@@ -7357,23 +6815,26 @@ async def admin_get_users(
                     role=user_dict.get("role", "user"),
                     created_at=user_dict.get("created_at", ""),
                     last_login=user_dict.get("last_login"),
-                    deals_count=deals_count,
+                    deals_count=user_dict.get("deals_count", 0),
                     stripe_customer_id=user_dict.get("stripe_customer_id")
                 )
                 users.append(admin_user)
             except Exception as user_error:
-                logger.error(f"Error processing user {user_data.get('email', 'UNKNOWN')}: {user_error}")
+                logger.error(f"Error processing user {user_dict.get('email', 'UNKNOWN')}: {user_error}")
                 # Continue processing other users even if one fails
                 continue
         
         return {
             "users": users,
             "total": total_users,
-            "pages": total_pages,
-            "current_page": page,
-            "limit": limit
+            "pages": math.ceil(total_users / limit) if total_users is not None else None,
+            "current_page": page if cursor is None else None,
+            "limit": limit,
+            "next_cursor": next_cursor
         }
         
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching admin users: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch users")
@@ -7394,7 +6855,7 @@ async def admin_create_user(
             )
         
         # Hash the password
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await hash_password_async(user_data.password)
         
         # Create new user
         new_user = User(
@@ -7480,6 +6941,7 @@ async def admin_update_user(
                 {"id": user_id},
                 {"$set": update_fields}
             )
+            get_principal_cache().invalidate(user_id)
         
         # Get updated user
         updated_user = await db.users.find_one({"id": user_id})
@@ -7544,13 +7006,17 @@ async def admin_delete_user(
         # Delete user's related data
         await db.pnl_deals.delete_many({"user_id": user_id})
         await db.pnl_expenses.delete_many({"user_id": user_id})
+        await delete_user_rollups(db, user_id)
         await db.goal_settings.delete_many({"userId": user_id})
         await db.activity_logs.delete_many({"userId": user_id})
         await db.reflection_logs.delete_many({"userId": user_id})
         await db.brand_profiles.delete_many({"user_id": user_id})
+        await db.ai_coach_cache.delete_many({"user_id": user_id})
+        await delete_versions(db, user_id)
         
         # Delete the user
         result = await db.users.delete_one({"id": user_id})
+        get_principal_cache().invalidate(user_id)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -7593,7 +7059,7 @@ async def admin_reset_user_password(
             )
         
         # Hash the new password
-        password_hash = hash_password(new_password)
+        password_hash = await hash_password_async(new_password)
         
         # Update user password
         await db.users.update_one(
@@ -7606,6 +7072,7 @@ async def admin_reset_user_password(
                 }
             }
         )
+        get_principal_cache().invalidate(user_id)
         
         # Enhanced audit logging - who did it, when, and to whom
         await db.audit_logs.insert_one({
@@ -7614,7 +7081,7 @@ async def admin_reset_user_password(
             "action": "admin_password_reset",
             "admin_user_id": current_user.id,
             "admin_user_email": current_user.email,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": datetime.now(timezone.utc),
             "ip_address": request.client.host if request.client else None,
             "metadata": {
                 "target_user_email": target_user['email'],
@@ -7644,56 +7111,85 @@ async def admin_reset_user_password(
 
 
 
+async def audit_log_query(
+    action_filter: Optional[str],
+    user_id: Optional[str],
+    user_email: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> Dict[str, Any]:
+    """Audit filter; an email is resolved to its user id so the (user_id, timestamp) index serves it"""
+    if user_email and not user_id:
+        user_doc = await db.users.find_one({"email": user_email}, {"_id": 0, "id": 1})
+        if user_doc:
+            user_id = user_doc["id"]
+    return build_audit_query(action_filter, user_id, user_email, start, end)
+
 @api_router.get("/admin/audit-logs")
 async def get_audit_logs(
-    page: int = 1,
-    limit: int = 50,
-    action_filter: str = None,
-    user_email: str = None,
+    page: int = Query(1, ge=1, description="Offset page; prefer cursor for anything past the first pages"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from next_cursor; replaces page"),
+    action_filter: Optional[str] = Query(None),
+    user_email: Optional[str] = Query(None, description="Exact email"),
+    user_id: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None, description="Events at or after this time"),
+    end: Optional[datetime] = Query(None, description="Events before this time"),
+    count: str = Query("none", description="none, estimated or exact"),
     current_user: User = Depends(require_master_admin)
 ):
-    """Get audit logs (admin only)"""
+    """Get audit logs, newest first (admin only)"""
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of {sorted(COUNT_MODES)}")
+    
     try:
-        # Build query
-        query = {}
-        if action_filter:
-            query["action"] = action_filter
-        if user_email:
-            query["user_email"] = {"$regex": user_email, "$options": "i"}
-        
-        # Get total count
-        total = await db.audit_logs.count_documents(query)
-        
-        # Get logs with pagination
-        skip = (page - 1) * limit
-        logs_cursor = db.audit_logs.find(query).sort("timestamp", -1).skip(skip).limit(limit)
-        logs = []
-        
-        async for log in logs_cursor:
-            log_dict = dict(log)
-            
-            # Convert ObjectId to string if present
-            if "_id" in log_dict:
-                log_dict["_id"] = str(log_dict["_id"])
-            
-            # Convert datetime to ISO string
-            if "timestamp" in log_dict and log_dict["timestamp"]:
-                if isinstance(log_dict["timestamp"], datetime):
-                    log_dict["timestamp"] = log_dict["timestamp"].isoformat()
-            
-            logs.append(log_dict)
+        query = await audit_log_query(action_filter, user_id, user_email, start, end)
+        skip = 0 if cursor else (page - 1) * limit
+        docs, next_cursor = await fetch_page(db.audit_logs, query, limit, cursor, skip)
+        total, total_is_estimate = await count_logs(db.audit_logs, query, count)
         
         return {
-            "logs": logs,
+            "logs": [serialize_audit_log(doc) for doc in docs],
             "total": total,
-            "page": page,
-            "pages": (total + limit - 1) // limit
+            "total_is_estimate": total_is_estimate,
+            "page": page if cursor is None else None,
+            "pages": (total + limit - 1) // limit if total is not None else None,
+            "limit": limit,
+            "next_cursor": next_cursor
         }
         
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching audit logs: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch audit logs")
 
+@api_router.get("/admin/audit-logs/export")
+async def export_audit_logs(
+    action_filter: Optional[str] = Query(None),
+    user_email: Optional[str] = Query(None, description="Exact email"),
+    user_id: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None, description="Events at or after this time"),
+    end: Optional[datetime] = Query(None, description="Events before this time"),
+    current_user: User = Depends(require_master_admin)
+):
+    """Stream matching audit logs as NDJSON, oldest first (admin only)"""
+    try:
+        query = await audit_log_query(action_filter, user_id, user_email, start, end)
+        filename = f"audit-logs-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.ndjson"
+        logger.info(f"Audit log export by {current_user.email}: {query}")
+        return StreamingResponse(
+            stream_ndjson(db.audit_logs, query),
+            media_type="application/x-ndjson",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "Cache-Control": "no-store"
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error exporting audit logs: {e}")
+        raise HTTPException(status_code=500, detail="Failed to export audit logs")
+
 
 
         return {"message": "User deleted successfully", "deleted_user_id": user_id}
@@ -7740,6 +7236,7 @@ async def admin_change_user_status(
                 }
             }
         )
+        get_principal_cache().invalidate(user_id)
         
         logger.info(f"Admin {current_user.email} changed status of {target_user['email']} to {status}")
         
@@ -7754,9 +7251,147 @@ async def admin_change_user_status(
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    start_index_bootstrap(db)
+
+@app.on_event("startup")
+async def backfill_pnl_rollups():
+    # Accounts with transactions from before rollups existed would otherwise read $0
+    start_rollup_backfill(db)
+
+@app.on_event("startup")
+async def start_audit_sink():
+    get_audit_sink().start(db.audit_logs)
+
+@app.on_event("startup")
+async def start_audit_retention():
+    # Runs the legacy timestamp migration first; the task is cancelled on shutdown
+    get_audit_retention().start()
+
+@app.on_event("startup")
+async def start_media_pipeline():
+    # Spawn the image workers up front; if it fails the pool is created on first upload
+    try:
+        await get_media_pipeline().start()
+    except Exception as e:
+        logger.warning(f"Media pipeline not started at boot: {e}")
+
+@app.on_event("startup")
+async def start_health_probes():
+    probes = get_probe_scheduler()
+    
+    async def database_probe():
+        await db.command("ping")
+    
+    async def cache_probe():
+        mongo_cache = globals().get("cache")
+        if not (mongo_cache and await mongo_cache.ping()):
+            return {"status": "warning", "error": "MongoDB cache not available"}
+    
+    async def s3_probe():
+        if get_storage().name != "s3":
+            return {"status": "not_configured"}
+        # Small put + delete
+        await get_storage().check()
+    
+    async def stripe_probe():
+        if not config.STRIPE_API_KEY:
+            return {"status": "not_configured"}
+        # Lightweight Stripe operation; the SDK blocks
+        await asyncio.to_thread(stripe.Account.retrieve)
+    
+    probes.register("database", database_probe)
+    probes.register("cache", cache_probe)
+    probes.register("s3", s3_probe, interval=config.HEALTH_PROBE_S3_INTERVAL_SECONDS)
+    probes.register("stripe", stripe_probe, interval=config.HEALTH_PROBE_STRIPE_INTERVAL_SECONDS)
+    await probes.start()
+
+@app.on_event("startup")
+async def load_report_templates():
+    get_template_registry().load()
+
+@app.on_event("startup")
+async def start_rate_limit_sync():
+    get_rate_limiter().start()
+
+@app.on_event("startup")
+async def start_pdf_renderer():
+    # Warm Chromium up front; if it fails the renderer retries on first PDF request
+    try:
+        await get_pdf_renderer().start()
+    except Exception as e:
+        logger.warning(f"PDF renderer not started at boot: {e}")
+
+@app.on_event("startup")
+async def start_coach_pregen():
+    scheduler = get_coach_scheduler()
+
+    async def legacy_coach(user_id: str, plan: Optional[str]):
+        await generate_coaching(db, user_id)
+
+    scheduler.register("ai_coach", legacy_coach)
+    try:
+        from app.routes.ai_coach import pregenerate_dashboard_coach
+
+        async def dashboard_coach(user_id: str, plan: Optional[str]):
+            await pregenerate_dashboard_coach(user_id, plan, ttl_seconds=config.COACH_PREGEN_TTL_SECONDS)
+
+        scheduler.register("ai_coach_v2", dashboard_coach)
+    except ImportError as e:
+        logger.warning(f"AI Coach v2 pre-generation not available: {e}")
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_health_probes():
+    await get_probe_scheduler().stop()
+
+@app.on_event("shutdown")
+async def stop_coach_pregen():
+    await get_coach_scheduler().stop()
+
+@app.on_event("shutdown")
+async def stop_pnl_rollup_backfill():
+    await stop_rollup_backfill()
+
+@app.on_event("shutdown")
+async def stop_audit_retention():
+    await get_audit_retention().stop()
+
+@app.on_event("shutdown")
+async def stop_audit_sink():
+    # Drain queued audit events before the Motor client closes
+    await get_audit_sink().stop()
+
+@app.on_event("shutdown")
+async def stop_rate_limit_sync():
+    # Flush counts before the Motor client closes
+    await get_rate_limiter().stop()
+
+@app.on_event("shutdown")
+async def stop_pdf_renderer():
+    await get_pdf_renderer().stop()
+
+@app.on_event("shutdown")
+async def stop_media_pipeline():
+    await get_media_pipeline().stop()
+
+@app.on_event("shutdown")
+async def stop_auth_workers():
+    await get_auth_worker_pool().stop()
+
+@app.on_event("shutdown")
+async def stop_storage():
+    await get_storage().stop()
+
+@app.on_event("shutdown")
+async def stop_llm_gateway():
+    await close_llm_gateway()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    # Last, so other shutdown hooks can still flush to MongoDB
+    close_client()
 
 if __name__ == "__main__":
     import uvicorn
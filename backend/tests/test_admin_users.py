@@ -0,0 +1,139 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.admin_users import (
+    TYPE_ORDER, build_keyset_pipeline, build_page_pipeline, build_user_query,
+    decode_cursor, encode_cursor, keyset_match, sort_spec
+)
+from app.pagination import CursorError
+
+
+def test_cursor_round_trip_keeps_dates():
+    """Datetime sort values survive the cursor so keyset comparisons stay type-correct"""
+    created = datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor({"id": "u-1", "created_at": created}, "created_at")
+
+    value, user_id = decode_cursor(cursor, "created_at")
+    assert user_id == "u-1"
+    assert isinstance(value, datetime)
+    assert value.replace(tzinfo=timezone.utc) == created
+
+
+def test_cursor_rejected_for_other_sort_or_garbage():
+    cursor = encode_cursor({"id": "u-1", "email": "a@b.co"}, "email")
+    with pytest.raises(CursorError):
+        decode_cursor(cursor, "created_at")
+    with pytest.raises(CursorError):
+        decode_cursor("not-a-cursor", "created_at")
+
+
+def test_search_modes():
+    """prefix is anchored (index-usable); contains escapes user input"""
+    prefix = build_user_query("Ann", "prefix")
+    patterns = {clause[field]["$regex"] for clause in prefix["$or"] for field in clause}
+    assert patterns == {"^Ann", "^ann"}
+
+    contains = build_user_query("a.b", "contains", plan_filter="PRO", status_filter="all")
+    assert contains["$or"][0]["email"]["$regex"] == r"a\.b"
+    assert contains["plan"] == "PRO"
+    assert "status" not in contains
+
+    assert build_user_query("ann", "text")["$text"] == {"$search": "ann"}
+
+
+def test_page_pipeline_sorts_before_facet():
+    """Filter and sort run ahead of $facet so they can use the users indexes"""
+    field, direction = sort_spec("password_hash", "desc")
+    pipeline = build_page_pipeline({"plan": "PRO"}, field, direction, skip=40, limit=20)
+
+    assert field == "created_at"
+    assert [next(iter(stage)) for stage in pipeline] == ["$match", "$sort", "$facet"]
+    users = pipeline[2]["$facet"]["users"]
+    assert users[0] == {"$skip": 40}
+    assert users[1] == {"$limit": 20}
+    assert users[2]["$lookup"]["from"] == "pnl_deals"
+    assert "total" in pipeline[2]["$facet"]
+
+
+def test_keyset_pipeline_seeks_after_cursor():
+    pipeline = build_keyset_pipeline({"plan": "PRO"}, "created_at", -1, ("2025-03-01", "u-9"), limit=20)
+
+    match = pipeline[0]["$match"]
+    assert match["$and"][0] == {"plan": "PRO"}
+    assert match["$and"][1]["$or"][0] == {"created_at": {"$lt": "2025-03-01"}}
+    assert pipeline[1] == {"$sort": {"created_at": -1, "id": -1}}
+    assert pipeline[2] == {"$limit": 21}
+
+
+def _bson_key(value):
+    """(type rank, value) in MongoDB's cross-type sort order; missing sorts as null."""
+    if value is None:
+        return (0, 0)
+    for rank, (_, python_types) in enumerate(TYPE_ORDER):
+        if isinstance(value, bool) and bool not in python_types:
+            continue
+        if python_types and isinstance(value, python_types):
+            return (rank, value)
+    raise TypeError(value)
+
+
+def _matches(doc, clause):
+    """Just enough of MongoDB's matcher for keyset_match clauses (type-bracketed comparisons)."""
+    if "$or" in clause:
+        return any(_matches(doc, branch) for branch in clause["$or"])
+    for field, condition in clause.items():
+        value = doc.get(field)
+        if condition is None:
+            if value is not None:
+                return False
+        elif isinstance(condition, dict):
+            if value is None:
+                return False
+            for op, operand in condition.items():
+                if op == "$type":
+                    aliases = [alias for alias_list, _ in TYPE_ORDER for alias in alias_list]
+                    ranks = {rank for rank, (alias_list, _) in enumerate(TYPE_ORDER)
+                             if set(alias_list) & set(operand)}
+                    assert set(operand) <= set(aliases)
+                    if _bson_key(value)[0] not in ranks:
+                        return False
+                else:
+                    if _bson_key(value)[0] != _bson_key(operand)[0]:
+                        return False
+                    if not (value < operand if op == "$lt" else value > operand):
+                        return False
+        elif _bson_key(value)[0] != _bson_key(condition)[0] or value != condition:
+            return False
+    return True
+
+
+@pytest.mark.parametrize("sort_field", ["created_at", "status"])
+@pytest.mark.parametrize("direction", [-1, 1])
+def test_keyset_pages_cover_null_missing_and_mixed_type_rows(sort_field, direction):
+    """Every row is returned exactly once, including null/missing and legacy string values"""
+    values = [
+        datetime(2025, 3, 1), datetime(2025, 1, 1), datetime(2025, 1, 1),
+        "2024-06-01T00:00:00", "2024-01-01T00:00:00", "active", None, "MISSING", "MISSING"
+    ]
+    rows = []
+    for index, value in enumerate(values):
+        row = {"id": f"u-{index}"}
+        if value != "MISSING":
+            row[sort_field] = value
+        rows.append(row)
+    expected = sorted(rows, key=lambda row: (_bson_key(row.get(sort_field)), row["id"]),
+                      reverse=direction < 0)
+
+    seen, page = [], expected[:2]
+    while page:
+        seen.extend(page)
+        value, user_id = decode_cursor(encode_cursor(page[-1], sort_field), sort_field)
+        seek = keyset_match(sort_field, direction, value, user_id)
+        page = [row for row in expected if _matches(row, seek)][:2]
+
+    assert [row["id"] for row in seen] == [row["id"] for row in expected]
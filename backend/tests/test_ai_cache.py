@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+
+class FakeCollection:
+    """In-memory stand-in for the ai_response_cache collection (shared by several workers)."""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        if doc and doc["expires_at"] > query["expires_at"]["$gt"]:
+            return dict(doc)
+        return None
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = dict(doc)
+
+
+def _cache(collection=None, **kwargs):
+    from app.ai_cache import AIResponseCache, COLLECTION
+    return AIResponseCache(db={COLLECTION: collection or FakeCollection()}, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_generation():
+    """N identical concurrent requests make exactly one LLM call"""
+    cache = _cache(memory_bytes=1024, ttl_seconds=60)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return '{"summary": "coach"}'
+
+    results = await asyncio.gather(*[cache.get_or_generate("k", generate) for _ in range(10)])
+
+    assert len(calls) == 1
+    assert {text for text, _ in results} == {'{"summary": "coach"}'}
+    assert sum(1 for _, cached in results if not cached) == 1
+    stats = cache.stats()
+    assert stats["llm_calls"] == 1
+    assert stats["coalesced"] == 9
+    assert stats["hit_rate"] == 0.9
+    assert stats["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_is_not_cached():
+    cache = _cache(memory_bytes=1024, ttl_seconds=60)
+
+    async def fail():
+        raise RuntimeError("openai down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_generate("k", fail)
+    assert await cache.get("k") is None
+    assert cache.stats()["llm_errors"] == 1
+
+
+def test_memory_tier_bounded_by_bytes_and_ttl():
+    """Least recently used responses are evicted once the byte budget is exceeded"""
+    from app.ai_cache import CacheItem
+    import time
+
+    cache = _cache(memory_bytes=10, ttl_seconds=60)
+    now = time.time()
+    cache.memory_set("a", CacheItem("12345", now))
+    cache.memory_set("b", CacheItem("12345", now))
+    assert cache.memory_get("a") is not None  # a is now most recent
+    cache.memory_set("c", CacheItem("12345", now))
+
+    assert cache.memory_get("b") is None
+    assert cache.memory_get("a") is not None
+    assert cache.stats()["memory_evictions"] == 1
+
+    cache.memory_set("old", CacheItem("1", now - 120))
+    assert cache.memory_get("old") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_tier_serves_other_workers():
+    """A response generated on one worker is a hit on another"""
+    shared = FakeCollection()
+    worker_a = _cache(shared, memory_bytes=1024, ttl_seconds=60)
+    worker_b = _cache(shared, memory_bytes=1024, ttl_seconds=60)
+
+    async def generate():
+        await asyncio.sleep(0.01)
+        return '{"summary": "coach"}'
+
+    await worker_a.get_or_generate("k", generate)
+
+    async def must_not_run():
+        raise AssertionError("worker b should hit the shared tier")
+
+    text, cached = await worker_b.get_or_generate("k", must_not_run)
+    assert (text, cached) == ('{"summary": "coach"}', True)
+    stats = worker_b.stats()
+    assert stats["shared_hits"] == 1
+    assert stats["saved_llm_seconds"] > 0
@@ -2,7 +2,7 @@ import json
 import pytest
 import sys
 import os
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
@@ -90,6 +90,21 @@ def test_pii_redaction():
         result = redact_pii(input_text)
         assert result == expected
 
+@pytest.mark.asyncio
+async def test_setup_guidance_skips_the_ai_cache():
+    """Setup text is returned directly, never stored or counted as an LLM miss"""
+    from app.coach_insights import SETUP_TEXT, generate_coaching
+
+    db = MagicMock()
+    db.goal_settings.find_one = AsyncMock(return_value=None)
+
+    with patch('app.coach_insights.coaching_cache_key', AsyncMock(return_value="key")), \
+            patch('app.coach_insights.get_cached_coaching', AsyncMock(return_value=None)), \
+            patch('app.coach_insights.get_ai_cache') as ai_cache:
+        assert await generate_coaching(db, "test_user") == {"coaching_text": SETUP_TEXT}
+
+    ai_cache.return_value.get_or_generate.assert_not_called()
+
 # Integration test would require actual database
 # @pytest.mark.asyncio
 # async def test_coach_generate_endpoint():
@@ -0,0 +1,115 @@
+import asyncio
+import gzip
+import json
+import os
+import sys
+import pytest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.pagination import CursorError
+from app.audit_logs import (
+    AuditRetention, build_audit_query, decode_cursor, encode_cursor, ndjson_line, serialize
+)
+from app.storage import LocalStorage
+
+
+def test_cursor_round_trip_keeps_bson_types():
+    doc = {"_id": ObjectId(), "timestamp": datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc)}
+
+    timestamp, object_id = decode_cursor(encode_cursor(doc))
+
+    # Decoded as naive UTC, like the datetimes Motor returns
+    assert timestamp == datetime(2025, 3, 1, 12, 30) and object_id == doc["_id"]
+    with pytest.raises(CursorError):
+        decode_cursor("not-a-cursor")
+    # A page ending on a not-yet-migrated legacy row still yields a usable date cursor
+    legacy = decode_cursor(encode_cursor({"_id": ObjectId(), "timestamp": "2025-03-01T12:30:00"}))
+    assert legacy[0] == datetime(2025, 3, 1, 12, 30)
+    with pytest.raises(CursorError):
+        decode_cursor(encode_cursor({"_id": ObjectId(), "timestamp": "not a date"}))
+
+
+def test_query_uses_exact_indexed_fields():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    assert build_audit_query("login", "u1", "ann@example.com", start, None) == {
+        "action": "login",
+        "user_id": "u1",
+        "timestamp": {"$gte": start}
+    }
+    assert build_audit_query(user_email="ann@example.com") == {"user_email": "ann@example.com"}
+
+
+def test_naive_timestamps_serialize_as_utc():
+    doc = {"_id": ObjectId(), "action": "login", "timestamp": datetime(2025, 3, 1, 12, 30)}
+
+    assert serialize(doc)["timestamp"] == "2025-03-01T12:30:00+00:00"
+    assert serialize(doc)["_id"] == str(doc["_id"])
+    assert json.loads(ndjson_line(doc)) == serialize(doc)
+
+
+def make_db(batches):
+    audit_logs = MagicMock()
+    audit_logs.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(side_effect=batches)
+    audit_logs.delete_many = AsyncMock(side_effect=lambda query: SimpleNamespace(deleted_count=len(query["_id"]["$in"])))
+    locks = MagicMock()
+    locks.insert_one = AsyncMock(side_effect=[None, DuplicateKeyError("taken")])
+    return {"audit_logs": audit_logs, "scheduler_locks": locks}
+
+
+@pytest.mark.asyncio
+async def test_retention_archives_before_deleting_once_per_day(tmp_path):
+    old = [{"_id": ObjectId(), "action": "login", "timestamp": datetime(2024, 1, 2, 3, 4, 5)} for _ in range(3)]
+    db = make_db([old[:2], old[2:]])
+    storage = LocalStorage(root=str(tmp_path))
+    retention = AuditRetention(retention_days=90, archive=True, batch_size=2, db=db, storage=storage)
+    now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+    assert await retention.run(now) == 3
+    assert await retention.run(now) == 0  # another worker already claimed today
+
+    cutoff = db["audit_logs"].find.call_args.args[0]["timestamp"]["$lt"]
+    assert cutoff == datetime(2025, 3, 3, tzinfo=timezone.utc)
+    archives = sorted(tmp_path.rglob("*.ndjson.gz"))
+    assert len(archives) == 2
+    assert archives[0].relative_to(tmp_path).parts[:5] == ("archive", "audit_logs", "2024", "01", "02")
+    lines = gzip.decompress(archives[0].read_bytes()).splitlines()
+    assert {json.loads(line)["_id"] for line in lines} <= {str(doc["_id"]) for doc in old}
+    assert retention.stats()["archived"] == retention.stats()["deleted"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_archive_deletes_nothing():
+    db = make_db([[{"_id": ObjectId(), "timestamp": datetime(2024, 1, 1)}]])
+    storage = MagicMock()
+    storage.put = AsyncMock(side_effect=RuntimeError("bucket unavailable"))
+    retention = AuditRetention(retention_days=30, archive=True, batch_size=10, db=db, storage=storage)
+
+    with pytest.raises(RuntimeError):
+        await retention.run(datetime(2025, 6, 1, tzinfo=timezone.utc))
+    db["audit_logs"].delete_many.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_start_migrates_then_stop_cancels():
+    db = make_db([])
+    legacy = [{"_id": ObjectId(), "timestamp": "2025-03-01T12:30:00"}]
+    db["audit_logs"].find.return_value.limit.return_value.to_list = AsyncMock(side_effect=[legacy, []])
+    db["audit_logs"].bulk_write = AsyncMock()
+    retention = AuditRetention(retention_days=0, archive=False, db=db)
+
+    retention.start()  # migrates even with retention disabled
+    await asyncio.sleep(0.01)
+    await retention.stop()
+
+    update = db["audit_logs"].bulk_write.await_args.args[0][0]
+    assert update._doc == {"$set": {"timestamp": datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc)}}
+    assert retention._task is None
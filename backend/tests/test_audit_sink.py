@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from pymongo.errors import BulkWriteError
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.audit_sink import AuditSink
+
+
+def make_collection():
+    collection = MagicMock()
+    collection.insert_many = AsyncMock()
+    collection.insert_one = AsyncMock()
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_batch_size_and_interval():
+    collection = make_collection()
+    sink = AuditSink(max_queue=100, batch_size=3, flush_interval=0.05)
+    sink.start(collection)
+    try:
+        for i in range(3):
+            await sink.submit({"id": str(i)})
+        await asyncio.sleep(0.01)
+        assert collection.insert_many.await_count == 1  # size-triggered, before the interval
+
+        await sink.submit({"id": "3"})
+        await asyncio.sleep(0.1)
+    finally:
+        await sink.stop()
+
+    batches = [call.args[0] for call in collection.insert_many.await_args_list]
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert all(call.kwargs == {"ordered": False} for call in collection.insert_many.await_args_list)
+    collection.insert_one.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_queue():
+    collection = make_collection()
+    sink = AuditSink(max_queue=100, batch_size=2, flush_interval=60)
+    sink.start(collection)
+    for i in range(5):
+        await sink.submit({"id": str(i)})
+
+    await sink.stop()
+
+    written = [doc["id"] for call in collection.insert_many.await_args_list for doc in call.args[0]]
+    assert written == ["0", "1", "2", "3", "4"]
+    assert sink.stats()["pending"] == 0 and sink.stats()["written"] == 5
+
+
+@pytest.mark.asyncio
+async def test_overflow_policies_count_drops():
+    for policy, kept in [("drop_oldest", ["1", "2"]), ("drop_newest", ["0", "1"])]:
+        collection = make_collection()
+        sink = AuditSink(max_queue=2, batch_size=100, flush_interval=60, overflow_policy=policy)
+        sink.start(collection)
+        for i in range(3):
+            await sink.submit({"id": str(i)})
+        assert sink.stats()["dropped"] == 1
+        await sink.stop()
+        assert [doc["id"] for doc in collection.insert_many.await_args.args[0]] == kept
+
+    collection = make_collection()
+    sink = AuditSink(max_queue=2, batch_size=100, flush_interval=60, overflow_policy="block")
+    sink.start(collection)
+    for i in range(3):
+        await sink.submit({"id": str(i)})
+    await sink.stop()
+    assert sink.stats()["blocked"] == 1 and sink.stats()["dropped"] == 0
+    assert sink.stats()["written"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_retried_and_partial_failures_counted():
+    collection = make_collection()
+    collection.insert_many.side_effect = [
+        ConnectionError("primary stepped down"),
+        BulkWriteError({"writeErrors": [{"index": 0, "code": 11000}], "nInserted": 1}),
+    ]
+    sink = AuditSink(max_queue=10, batch_size=10, flush_interval=60)
+    sink.start(collection)
+    await sink.submit({"id": "0"})
+    await sink.submit({"id": "1"})
+
+    assert await sink.flush_batch() == 0
+    assert sink.stats()["pending"] == 2
+    assert await sink.flush_batch() == 1
+    await sink.stop()
+
+    stats = sink.stats()
+    assert stats["write_errors"] == 2 and stats["failed"] == 1 and stats["written"] == 1
+
+
+@pytest.mark.asyncio
+async def test_write_now_bypasses_queue():
+    collection = make_collection()
+    sink = AuditSink(max_queue=10, batch_size=10, flush_interval=60)
+    sink.start(collection)
+
+    await sink.write_now({"id": "critical"})
+
+    collection.insert_one.assert_awaited_once_with({"id": "critical"})
+    assert sink.stats()["pending"] == 0
+    await sink.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_during_slow_insert_loses_nothing():
+    collection = make_collection()
+    written = []
+
+    async def slow_insert(batch, ordered):
+        await asyncio.sleep(0.05)
+        written.extend(doc["id"] for doc in batch)
+
+    collection.insert_many.side_effect = slow_insert
+    sink = AuditSink(max_queue=100, batch_size=2, flush_interval=60)
+    sink.start(collection)
+    for i in range(3):
+        await sink.submit({"id": str(i)})
+    await asyncio.sleep(0.01)  # the flush loop is now inside insert_many for the first batch
+
+    await sink.stop()
+
+    assert written == ["0", "1", "2"]
+    assert sink.stats()["pending"] == 0 and sink.stats()["written"] == 3
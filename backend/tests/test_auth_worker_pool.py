@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.security_modules import hash_password_async, verify_password_async
+from app.security_modules.worker_pool import AuthBusyError, AuthWorkerPool
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_at_max_workers():
+    pool = AuthWorkerPool(max_workers=2, max_queue=10, queue_timeout_seconds=5)
+    lock = threading.Lock()
+    active = [0, 0]  # current, peak
+
+    def job():
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return True
+
+    try:
+        results = await asyncio.gather(*[pool.run(job) for _ in range(6)])
+    finally:
+        await pool.stop()
+
+    assert all(results)
+    assert active[1] == 2
+    assert pool.stats()["completed"] == 6
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_queue_timeout_raise_503():
+    pool = AuthWorkerPool(max_workers=1, max_queue=1, queue_timeout_seconds=0.05)
+    release = threading.Event()
+
+    try:
+        running = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.ensure_future(pool.run(lambda: None))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AuthBusyError) as rejected:
+            await pool.run(lambda: None)
+        with pytest.raises(AuthBusyError):
+            await waiting
+    finally:
+        release.set()
+        await running
+        await pool.stop()
+
+    assert rejected.value.status_code == 503
+    assert rejected.value.headers["Retry-After"] == "1"
+    stats = pool.stats()
+    assert stats["rejected"] == 1 and stats["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_hash_and_verify_round_trip():
+    hashed = await hash_password_async("s3cret-Passw0rd")
+
+    assert hashed.startswith("$argon2id$")
+    assert await verify_password_async("s3cret-Passw0rd", hashed)
+    assert not await verify_password_async("wrong", hashed)
@@ -0,0 +1,81 @@
+import asyncio
+import base64
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.brand_asset_cache import BrandAssetCache
+
+
+def _cache(found=None, memory_bytes=1024 * 1024):
+    db = MagicMock()
+    collection = db.__getitem__.return_value
+    collection.find_one = AsyncMock(return_value=found)
+    collection.replace_one = AsyncMock()
+    collection.delete_many = AsyncMock()
+    return BrandAssetCache(memory_bytes=memory_bytes, ttl_days=30, db=db), collection
+
+
+@pytest.mark.asyncio
+async def test_upload_fill_serves_without_loading():
+    cache, collection = _cache()
+    await cache.set("user/u1/headshot-1-pdf.jpg", "etag1", b"jpeg-bytes", "image/jpeg")
+    load = AsyncMock()
+
+    entry = await cache.get_or_load("user/u1/headshot-1-pdf.jpg", "etag1", load)
+
+    assert base64.b64decode(entry.data) == b"jpeg-bytes"
+    load.assert_not_awaited()
+    stored = collection.replace_one.await_args.args[1]
+    assert stored["storage_key"] == "user/u1/headshot-1-pdf.jpg" and stored["etag"] == "etag1"
+    assert cache.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_hit_and_etag_change():
+    cache, collection = _cache(found={"data": "c2hhcmVk", "mime": "image/png"})
+    load = AsyncMock(return_value=(b"fresh", "image/png"))
+
+    entry = await cache.get_or_load("k", "etag1", load)
+    assert entry.data == "c2hhcmVk"
+    load.assert_not_awaited()
+
+    collection.find_one.return_value = None
+    entry = await cache.get_or_load("k", "etag2", load)
+    assert base64.b64decode(entry.data) == b"fresh"
+    assert cache.stats()["shared_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    cache, _ = _cache()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"logo", "image/png"
+
+    entries = await asyncio.gather(*[cache.get_or_load("k", "e", load) for _ in range(5)])
+
+    assert calls == 1
+    assert len({entry.data for entry in entries}) == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_and_byte_bound():
+    cache, collection = _cache(memory_bytes=19)
+    await cache.set("a", "1", b"x" * 9, "image/png")  # 12 base64 bytes
+    await cache.set("b", "1", b"y" * 3, "image/png")  # 4
+    await cache.set("c", "1", b"z" * 3, "image/png")  # 4 -> a is evicted
+    assert cache.stats()["memory_entries"] == 2
+
+    await cache.invalidate("b")
+    assert cache.stats()["memory_entries"] == 1
+    collection.delete_many.assert_awaited_once_with({"storage_key": {"$in": ["b"]}})
+    assert await cache.get("b", "1") is None
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.brand_bundle_cache import BrandBundleCache, bundle_version
+
+
+@pytest.mark.asyncio
+async def test_hit_until_version_changes():
+    cache = BrandBundleCache(memory_bytes=1024 * 1024)
+    build = AsyncMock(return_value=({"plan": "PRO"}, True))
+    v1 = bundle_version("2026-01-01T00:00:00", "PRO", "pdf", True)
+
+    first = await cache.get_or_build("u1", "pdf:1", v1, build)
+    second = await cache.get_or_build("u1", "pdf:1", v1, build)
+
+    assert build.await_count == 1
+    assert first is second and second.data() == {"plan": "PRO"}
+    assert first.etag == f'"{v1}"'
+
+    # Plan change (or profile write on another worker) produces a new version
+    v2 = bundle_version("2026-01-01T00:00:00", "STARTER", "pdf", True)
+    assert v2 != v1
+    third = await cache.get_or_build("u1", "pdf:1", v2, build)
+    assert build.await_count == 2 and third.etag != first.etag
+    assert cache.stats()["stale"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_all_variants_for_user():
+    cache = BrandBundleCache(memory_bytes=1024 * 1024)
+    build = AsyncMock(return_value=({"a": 1}, True))
+    await cache.get_or_build("u1", "pdf:1", "v", build)
+    await cache.get_or_build("u1", "pdf:0", "v", build)
+    await cache.get_or_build("u2", "pdf:1", "v", build)
+
+    cache.invalidate("u1")
+
+    assert cache.stats()["entries"] == 1
+    await cache.get_or_build("u1", "pdf:1", "v", build)
+    assert build.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_placeholder_bundles_are_not_cached():
+    cache = BrandBundleCache(memory_bytes=1024 * 1024)
+    build = AsyncMock(return_value=({"assets": {}}, False))
+
+    await cache.get_or_build("u1", "pdf:1", "v", build)
+    await cache.get_or_build("u1", "pdf:1", "v", build)
+
+    assert build.await_count == 2
+    assert cache.stats()["uncacheable"] == 2 and cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_builds_share_one_and_bound_evicts():
+    cache = BrandBundleCache(memory_bytes=50)
+    calls = 0
+
+    async def build():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"name": "x" * 10}, True  # 22-byte body
+
+    await asyncio.gather(*[cache.get_or_build("u1", "pdf:1", "v", build) for _ in range(5)])
+    assert calls == 1
+
+    await cache.get_or_build("u2", "pdf:1", "v", build)
+    await cache.get_or_build("u3", "pdf:1", "v", build)  # 66 bytes -> u1 evicted
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
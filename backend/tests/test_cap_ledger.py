@@ -0,0 +1,178 @@
+import pytest
+import sys
+import os
+import copy
+from types import SimpleNamespace
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.cap_ledger import apply_deal_change, check_ledger, rebuild_ledger, run_ledger, get_ledger_summary
+
+USER_ID = "user-1"
+CONFIG = {
+    "user_id": USER_ID,
+    "annual_cap_amount": 10000.0,
+    "cap_percentage": 20.0,
+    "cap_period_start": "2025-01-01",
+    "reset_date": "2025-12-31",
+    "current_cap_paid": 1000.0,
+}
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None, False
+        doc = doc[part]
+    return doc, True
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        value, present = _get(doc, field)
+        if isinstance(cond, dict):
+            for op, operand in cond.items():
+                if op == "$exists" and present != operand:
+                    return False
+                if op == "$gte" and not (present and value >= operand):
+                    return False
+                if op == "$lt" and not (present and value < operand):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for the ledger: equality/range queries and $set."""
+
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query, projection=None):
+        return FakeCursor([copy.deepcopy(d) for d in self.docs if _matches(d, query)])
+
+    async def find_one(self, query, projection=None):
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc = copy.deepcopy(doc)
+                if projection and "ledger.entries" in projection and "ledger" in doc:
+                    doc["ledger"].pop("entries", None)
+                return doc
+        return None
+
+    async def insert_one(self, doc):
+        self.docs.append(copy.deepcopy(doc))
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(copy.deepcopy(update["$set"]))
+                return SimpleNamespace(matched_count=1)
+        return SimpleNamespace(matched_count=0)
+
+    async def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            await self.update_one(op._filter, op._doc)
+
+
+class FakeDB(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def db():
+    fake = FakeDB({name: FakeCollection() for name in ("pnl_deals", "cap_configurations", "pnl_monthly_rollups")})
+    fake.cap_configurations.docs.append(dict(CONFIG))
+    return fake
+
+
+def _deal(deal_id, closing_date, gross=20000.0, created_at="2025-01-01T00:00:00"):
+    return {
+        "id": deal_id, "user_id": USER_ID, "closing_date": closing_date, "month": closing_date[:7],
+        "created_at": created_at, "pre_cap_income": gross, "team_brokerage_split_percent": 0,
+        "cap_amount": 0, "final_income": gross, "lead_source": "Referral",
+    }
+
+
+async def _insert(db, deal):
+    await db.pnl_deals.insert_one(deal)
+    return await apply_deal_change(db, USER_ID, new=deal)
+
+
+def _stored(db, deal_id):
+    return next(d for d in db.pnl_deals.docs if d["id"] == deal_id)
+
+
+def test_run_ledger_stops_at_cap():
+    """Caps accrue at cap_percentage until the annual cap is reached"""
+    deals = [_deal(str(i), f"2025-0{i + 1}-01") for i in range(4)]
+    entries = run_ledger(deals, CONFIG, 1000.0)
+
+    assert [e["cap_amount"] for e in entries] == [4000.0, 4000.0, 1000.0, 0]
+    assert entries[-1]["running_total"] == 10000.0
+    assert entries[2]["final_income"] == 19000.0
+
+
+@pytest.mark.asyncio
+async def test_backdated_insert_recomputes_later_deals(db):
+    """Inserting an earlier deal shifts cap off the deals after it"""
+    await rebuild_ledger(db, USER_ID)
+    await _insert(db, _deal("may", "2025-05-01"))
+    await _insert(db, _deal("jun", "2025-06-01"))
+    assert _stored(db, "jun")["cap_amount"] == 4000.0
+
+    changed = await _insert(db, _deal("feb", "2025-02-01"))
+
+    assert changed["feb"]["cap_amount"] == 4000.0
+    assert _stored(db, "jun")["cap_amount"] == 1000.0
+    assert await check_ledger(db, USER_ID) == []
+
+
+@pytest.mark.asyncio
+async def test_update_and_delete_stay_consistent(db):
+    """Moving and deleting deals leaves the ledger equal to a full recompute"""
+    await rebuild_ledger(db, USER_ID)
+    for deal_id, closing in (("a", "2025-03-01"), ("b", "2025-04-01"), ("c", "2025-05-01")):
+        await _insert(db, _deal(deal_id, closing))
+
+    old = copy.deepcopy(_stored(db, "c"))
+    _stored(db, "c")["closing_date"] = "2025-02-01"
+    await apply_deal_change(db, USER_ID, old=old, new=copy.deepcopy(_stored(db, "c")))
+    assert await check_ledger(db, USER_ID) == []
+
+    deleted = db.pnl_deals.docs.pop(0)
+    await apply_deal_change(db, USER_ID, old=deleted)
+    assert await check_ledger(db, USER_ID) == []
+
+    summary = await get_ledger_summary(db, USER_ID)
+    assert summary["ledger"]["total_paid"] == 9000.0
+    assert "entries" not in summary["ledger"]
+
+
+@pytest.mark.asyncio
+async def test_check_ledger_detects_drift(db):
+    """A deal whose stored cap disagrees with the ledger is reported"""
+    await rebuild_ledger(db, USER_ID)
+    await _insert(db, _deal("a", "2025-03-01"))
+    _stored(db, "a")["cap_amount"] = 123.0
+
+    problems = await check_ledger(db, USER_ID)
+    assert any("stored cap_amount" in p for p in problems)
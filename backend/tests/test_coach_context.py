@@ -0,0 +1,88 @@
+import json
+import sys
+import os
+from datetime import date, timedelta
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.coach_context import (
+    ACTIVITY_KEYS, activity_features, build_coach_context, context_json, goal_pace, lead_source_features,
+    reflection_features, weekly_matrix
+)
+
+TODAY = date(2025, 6, 18)  # a Wednesday
+
+
+def _log(days_ago, conversations=10, appointments=2, hours=None, reflection=None):
+    return {
+        "loggedAt": f"{(TODAY - timedelta(days=days_ago)).isoformat()}T15:00:00+00:00",
+        "activities": {"conversations": conversations, "appointments": appointments},
+        "hours": hours or {"prospecting": 2.0},
+        "reflection": reflection
+    }
+
+
+def test_weekly_matrix_buckets_by_monday_week():
+    logs = [_log(0), _log(2), _log(3), _log(100)]  # Wed + Mon this week, Sun last week, too old
+    matrix = weekly_matrix(logs, "activities", ACTIVITY_KEYS, TODAY, weeks=4)
+
+    assert matrix.shape == (4, len(ACTIVITY_KEYS))
+    assert matrix[-1, 0] == 20  # this week
+    assert matrix[-2, 0] == 10  # last week
+    assert matrix[:2].sum() == 0
+
+
+def test_activity_rates_trend_and_conversion():
+    """Rates use completed weeks since the first log; activity is rising"""
+    logs = [_log(7 * week + 2, conversations=10 + (9 - week)) for week in range(1, 10)]
+    features = activity_features(logs, TODAY)
+
+    assert features["weeks_tracked"] == 9
+    assert features["per_week"]["conversations"] == 14.0
+    assert features["trend_pct_vs_prior_4"]["conversations"] > 0
+    assert features["weekly_slope"]["conversations"] == 1.0
+    assert features["conversion"]["appointments_per_conversations"] == round(18 / 126, 2)
+    assert features["hours_per_week"] == {"prospecting": 2.0}
+
+
+def test_goal_pace_prefers_pnl_income():
+    goals = {"annualGciGoal": 120000, "avgGciPerClosing": 10000, "earnedGciToDate": 1}
+    rollups = [{"month": "2025-05", "income": 30000, "closed_deals_count": 3},
+               {"month": "2024-12", "income": 99999}]
+    pace = goal_pace(goals, rollups, TODAY)
+
+    assert pace["earned_ytd"] == 30000 and pace["earned_source"] == "pnl"
+    assert pace["monthly_target"] == 10000
+    assert pace["pace_delta"] < 0
+    assert pace["closings_needed"] == 9
+    assert pace["needed_per_remaining_month"] == round(90000 / 7)
+
+
+def test_reflections_redacted_and_bounded():
+    reflections = [{"loggedAt": f"2025-06-{day:02d}", "reflection": f"Call 555-123-4567 day {day} " + "x" * 300,
+                    "mood": "good"} for day in range(1, 11)]
+    features = reflection_features(reflections, [])
+
+    assert len(features["recent"]) == 3
+    assert features["recent"][0]["date"] == "2025-06-10"
+    assert "[PHONE]" in features["recent"][0]["text"]
+    assert len(features["recent"][0]["text"]) <= 160
+    assert features["moods"] == {"good": 10}
+
+
+def test_top_lead_sources_across_months():
+    rollups = [{"lead_sources": {"Referral": {"income": 5000, "count": 1}, "Zillow": {"income": 9000, "count": 2}}},
+               {"lead_sources": {"Referral": {"income": 6000, "count": 1}}}]
+    assert lead_source_features(rollups, limit=1) == [{"source": "Referral", "income": 11000.0, "deals": 2}]
+
+
+def test_context_size_does_not_grow_with_history():
+    goals = {"annualGciGoal": 200000}
+    logs = [_log(d, reflection="ok") for d in range(80)]
+    short = context_json(build_coach_context(goals, logs, [], [], [], TODAY))
+    long = context_json(build_coach_context(goals, logs * 10, [], [], [], TODAY))
+
+    assert json.loads(long).keys() == json.loads(short).keys()
+    assert abs(len(long) - len(short)) < 50
+    assert len(long) < len(json.dumps(logs, indent=2)) / 10
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from pymongo.errors import DuplicateKeyError
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.coach_scheduler import CoachPregenScheduler
+
+
+def _scheduler(**kwargs):
+    kwargs.setdefault("enabled", True)
+    kwargs.setdefault("debounce_seconds", 0.02)
+    kwargs.setdefault("max_concurrency", 2)
+    return CoachPregenScheduler(**kwargs)
+
+
+@pytest.mark.asyncio
+async def test_burst_of_writes_runs_once():
+    scheduler = _scheduler()
+    generator = AsyncMock()
+    scheduler.register("coach", generator)
+
+    for _ in range(5):
+        scheduler.notify("user-1", "PRO")
+    await asyncio.sleep(0.1)
+
+    generator.assert_awaited_once_with("user-1", "PRO")
+    stats = scheduler.stats()
+    assert stats["debounced"] == 4
+    assert stats["runs"] == 1
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_write_during_run_queues_one_rerun():
+    scheduler = _scheduler()
+    release = asyncio.Event()
+    calls = []
+
+    async def generator(user_id, plan):
+        calls.append(user_id)
+        if len(calls) == 1:
+            await release.wait()
+
+    scheduler.register("coach", generator)
+    scheduler.notify("user-1")
+    await asyncio.sleep(0.05)
+    scheduler.notify("user-1")
+    scheduler.notify("user-1")
+    release.set()
+    await asyncio.sleep(0.1)
+
+    assert calls == ["user-1", "user-1"]
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_and_errors_are_contained():
+    scheduler = _scheduler(max_concurrency=2)
+    active = 0
+    peak = 0
+
+    async def generator(user_id, plan):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if user_id == "user-3":
+            raise RuntimeError("LLM down")
+
+    scheduler.register("coach", generator)
+    await scheduler.run_batch([(f"user-{i}", "PRO") for i in range(8)])
+
+    assert peak == 2
+    assert scheduler.stats()["runs"] == 7
+    assert scheduler.stats()["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_disabled_scheduler_ignores_writes():
+    scheduler = _scheduler(enabled=False)
+    generator = AsyncMock()
+    scheduler.register("coach", generator)
+
+    scheduler.notify("user-1", "PRO")
+    scheduler.start()
+    await asyncio.sleep(0.05)
+
+    generator.assert_not_awaited()
+    assert scheduler.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_nightly_batch_runs_once_per_day():
+    db = MagicMock()
+    locks = db.__getitem__.return_value
+    locks.insert_one = AsyncMock(side_effect=[None, DuplicateKeyError("taken")])
+    scheduler = _scheduler(db=db)
+    scheduler.active_users = AsyncMock(return_value=[("user-1", "PRO"), ("user-2", "FREE")])
+    generator = AsyncMock()
+    scheduler.register("coach", generator)
+
+    now = datetime(2025, 6, 18, 8, tzinfo=timezone.utc)
+    assert await scheduler.run_nightly(now) == 2
+    assert await scheduler.run_nightly(now) == 0
+
+    assert generator.await_count == 2
+    assert locks.insert_one.await_args_list[0].args[0]["_id"] == "coach_nightly:2025-06-18"
@@ -0,0 +1,56 @@
+import pytest
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.data_versions import (
+    ACTIVITY, GOALS, PNL, REFLECTION, COLLECTION, bump_versions, get_versions, versions_key
+)
+
+
+def _db(doc=None):
+    collection = MagicMock()
+    collection.update_one = AsyncMock()
+    collection.find_one = AsyncMock(return_value=doc)
+    return {COLLECTION: collection}, collection
+
+
+@pytest.mark.asyncio
+async def test_bump_increments_only_named_domains():
+    db, collection = _db()
+    await bump_versions(db, "u-1", ACTIVITY, REFLECTION)
+
+    query, update = collection.update_one.call_args.args
+    assert query == {"_id": "u-1"}
+    assert update["$inc"] == {ACTIVITY: 1, REFLECTION: 1}
+    assert collection.update_one.call_args.kwargs["upsert"] is True
+
+    with pytest.raises(ValueError):
+        await bump_versions(db, "u-1", "weekly_metrics")
+
+
+@pytest.mark.asyncio
+async def test_bump_failure_does_not_raise():
+    """A failed bump is logged; the write that triggered it already succeeded"""
+    db, collection = _db()
+    collection.update_one.side_effect = RuntimeError("mongo down")
+    await bump_versions(db, "u-1", PNL)
+
+
+@pytest.mark.asyncio
+async def test_key_changes_only_with_keyed_domains():
+    db, _ = _db({"_id": "u-1", GOALS: 2, ACTIVITY: 14})
+    versions = await get_versions(db, "u-1")
+    assert versions == {GOALS: 2, ACTIVITY: 14, REFLECTION: 0, PNL: 0}
+
+    domains = (GOALS, ACTIVITY, REFLECTION)
+    key = versions_key("coach:v3", versions, domains)
+    assert key == "coach:v3:goals=2:activity=14:reflection=0"
+    assert versions_key("coach:v3", {**versions, PNL: 5}, domains) == key
+    assert versions_key("coach:v3", {**versions, ACTIVITY: 15}, domains) != key
+
+    db, _ = _db(None)
+    assert await get_versions(db, "new-user") == {GOALS: 0, ACTIVITY: 0, REFLECTION: 0, PNL: 0}
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+import pytest
+from datetime import datetime
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from app.db_indexes import INDEXES, declared_indexes
+
+USER_ID = "index_test_user"
+
+# (collection, filter, sort) for each endpoint query the indexes exist to serve
+HOT_QUERIES = [
+    ("pnl_deals", {"user_id": USER_ID, "month": "2025-03"}, [("closing_date", ASCENDING)]),
+    ("pnl_deals", {"user_id": USER_ID, "closing_date": {"$gte": "2025-01-01", "$lt": "2025-06-01"}}, None),
+    ("pnl_deals", {"user_id": USER_ID, "$or": [{"closing_date": {"$regex": "^2025-"}}, {"date": {"$regex": "^2025-"}}]}, None),
+    ("pnl_expenses", {"user_id": USER_ID, "month": "2025-03"}, [("date", ASCENDING)]),
+    ("pnl_expenses", {"user_id": USER_ID, "date": {"$regex": "^2025-"}}, None),
+    ("pnl_monthly_rollups", {"user_id": USER_ID, "month": {"$gte": "2025-01", "$lte": "2025-12"}}, [("month", ASCENDING)]),
+    ("activity_logs", {"userId": USER_ID}, [("loggedAt", DESCENDING)]),
+    ("activity_logs", {"userId": USER_ID, "loggedAt": {"$gte": "2025-01-01", "$lte": "2025-02-01"}}, [("loggedAt", DESCENDING)]),
+    ("reflection_logs", {"userId": USER_ID}, [("loggedAt", DESCENDING)]),
+    ("users", {"email": "someone@example.com"}, None),
+    ("users", {"id": USER_ID}, None),
+    # Admin listing: search_mode=prefix and a keyset page on the default sort
+    ("users", {"$or": [{"email": {"$regex": "^ann"}}, {"id": {"$regex": "^ann"}}]}, None),
+    ("users", {"$or": [{"created_at": {"$lt": "2025-03-01"}}, {"created_at": "2025-03-01", "id": {"$lt": USER_ID}}]},
+     [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("users", {"$text": {"$search": "ann"}}, None),
+    ("audit_logs", {}, [("timestamp", DESCENDING)]),
+    # Admin audit log: keyset pages per user and per action
+    ("audit_logs", {"user_id": USER_ID, "timestamp": {"$lt": datetime(2025, 3, 1)}}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("audit_logs", {"action": "login"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("ai_coach_cache", {"user_id": USER_ID, "cache_key": "abc", "expires_at": {"$gt": "2025-01-01"}}, None),
+    ("tracker_daily", {"userId": USER_ID, "date": "2025-03-01"}, None),
+]
+
+
+@pytest.fixture(scope="module")
+def index_db():
+    """Throwaway database with the declared indexes applied. Skips without MongoDB."""
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    client = MongoClient(mongo_url, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB not available")
+
+    db_name = f"{os.environ.get('DB_NAME', 'ineednumbers')}_index_test"
+    client.drop_database(db_name)
+    db = client[db_name]
+    for collection, models in INDEXES.items():
+        db[collection].create_indexes(models)
+
+    yield db
+
+    client.drop_database(db_name)
+    client.close()
+
+
+def _winning_stages(plan: dict) -> str:
+    return json.dumps(plan["queryPlanner"]["winningPlan"])
+
+
+@pytest.mark.parametrize("collection,query,sort", HOT_QUERIES)
+def test_hot_queries_use_index(index_db, collection, query, sort):
+    """Each hot endpoint query must be served by an index scan, not a COLLSCAN"""
+    cursor = index_db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    stages = _winning_stages(cursor.explain())
+
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages
+
+
+def test_declared_unique_indexes():
+    """Users must be unique by email and id"""
+    users = {idx["name"]: idx for idx in declared_indexes()["users"]}
+    assert users["email_unique"]["unique"]
+    assert users["id_unique"]["unique"]
+    assert users["email_unique"]["key"] == [["email", 1]]
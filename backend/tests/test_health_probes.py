@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+import time
+import pytest
+from unittest.mock import AsyncMock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.health_probes import ProbeScheduler
+
+
+@pytest.mark.asyncio
+async def test_results_are_cached_between_runs():
+    scheduler = ProbeScheduler(interval_seconds=60, timeout_seconds=1)
+    check = AsyncMock(return_value={"pool": 3})
+    scheduler.register("database", check)
+
+    await scheduler.start()
+    try:
+        for _ in range(100):
+            result = scheduler.get("database")
+    finally:
+        await scheduler.stop()
+
+    assert check.await_count == 1
+    assert result["status"] == "ok" and result["pool"] == 3
+    assert result["last_success"] == result["checked_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_failures_and_timeouts_keep_last_success():
+    scheduler = ProbeScheduler(interval_seconds=60, timeout_seconds=0.05)
+    outcomes = [None, RuntimeError("connection refused")]
+
+    async def check():
+        outcome = outcomes.pop(0) if outcomes else "hang"
+        if outcome == "hang":
+            await asyncio.sleep(1)
+        if isinstance(outcome, Exception):
+            raise outcome
+
+    scheduler.register("s3", check)
+    ok = await scheduler.run("s3")
+    failed = await scheduler.run("s3")
+    timed_out = await scheduler.run("s3")
+
+    assert ok["status"] == "ok"
+    assert failed["status"] == "error" and failed["error"] == "connection refused"
+    assert timed_out["status"] == "error" and "timed out" in timed_out["error"]
+    assert timed_out["last_success"] == ok["last_success"]
+    assert timed_out["consecutive_failures"] == 2
+    assert scheduler.stats()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_status_override_pending_and_stale():
+    scheduler = ProbeScheduler(interval_seconds=10, timeout_seconds=1)
+    scheduler.register("stripe", AsyncMock(return_value={"status": "not_configured"}))
+
+    assert scheduler.get("stripe")["status"] == "pending"
+    assert scheduler.get("unknown")["status"] == "not_configured"
+
+    await scheduler.run("stripe")
+    assert scheduler.get("stripe")["status"] == "not_configured"
+
+    scheduler._probes["stripe"].checked_at = time.time() - 31
+    assert scheduler.get("stripe")["status"] == "stale"
+
+
+@pytest.mark.asyncio
+async def test_background_loop_refreshes_on_interval():
+    scheduler = ProbeScheduler(interval_seconds=0.02, timeout_seconds=1)
+    check = AsyncMock(return_value=None)
+    scheduler.register("cache", check)
+
+    await scheduler.start()
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+
+    assert check.await_count >= 3
+    assert scheduler.stats()["running"] == 0
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+
+def _gateway(create, **kwargs):
+    from app.llm_gateway import LLMGateway
+
+    gateway = LLMGateway(api_key="sk-test", **kwargs)
+    gateway._client = MagicMock()
+    gateway._client.chat.completions.create = create
+    return gateway
+
+
+def test_client_is_built_once():
+    """Every call shares one pooled client instead of constructing its own"""
+    from app.llm_gateway import LLMGateway
+
+    gateway = LLMGateway(api_key="sk-test", max_connections=5, max_keepalive_connections=2)
+    client = gateway.client
+    assert gateway.client is client
+    assert client.max_retries == gateway.max_retries
+    asyncio.run(gateway.close())
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    active = 0
+    peak = 0
+
+    async def create(**kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return "ok"
+
+    gateway = _gateway(create, max_concurrency=3)
+    results = await asyncio.gather(*[gateway.chat(model="m", messages=[]) for _ in range(10)])
+
+    assert results == ["ok"] * 10
+    assert peak == 3
+    stats = gateway.stats()
+    assert stats["calls"] == 10
+    assert stats["inflight"] == 0
+    assert stats["latency_p50_ms"] is not None
+
+
+@pytest.mark.asyncio
+async def test_busy_when_no_slot_frees_up():
+    from app.llm_gateway import LLMBusyError
+
+    release = asyncio.Event()
+
+    async def create(**kwargs):
+        await release.wait()
+        return "ok"
+
+    gateway = _gateway(create, max_concurrency=1, queue_timeout_seconds=0.05)
+    first = asyncio.create_task(gateway.chat(model="m", messages=[]))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMBusyError):
+        await gateway.chat(model="m", messages=[])
+    release.set()
+    assert await first == "ok"
+    assert gateway.stats()["rejected"] == 1
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import os
+import sys
+import time
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import media_pipeline
+from app.media_pipeline import MediaBusyError, MediaError, MediaPipeline, process_brand_image
+
+
+def _png(size, mode="RGBA", color=(200, 30, 30, 128)):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color[:len(mode)] if mode != "P" else 1).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _open(rendition):
+    return Image.open(io.BytesIO(rendition.data))
+
+
+def test_headshot_is_square_rgb_with_all_derivatives():
+    result = process_brand_image(_png((1200, 900)), "headshot")
+
+    assert (result.primary.width, result.primary.height) == (600, 600)
+    assert _open(result.primary).mode == "RGB"
+    assert set(result.derivatives) == {"pdf", "thumb", "webp"}
+
+    pdf = result.derivatives["pdf"]
+    assert pdf.mime == "image/jpeg" and _open(pdf).format == "JPEG"
+    assert (result.derivatives["thumb"].width, result.derivatives["thumb"].height) == (160, 160)
+    assert _open(result.derivatives["webp"]).format == "WEBP"
+
+
+def test_logo_keeps_transparency_and_aspect_ratio():
+    result = process_brand_image(_png((1000, 400)), "agentLogo")
+
+    assert (result.primary.width, result.primary.height) == (500, 200)
+    assert _open(result.primary).mode == "RGBA"
+    assert result.derivatives["pdf"].mime == "image/png"
+    assert result.derivatives["thumb"].width == 160
+    assert _open(result.derivatives["webp"]).mode == "RGBA"
+
+
+def test_invalid_image():
+    with pytest.raises(MediaError):
+        process_brand_image(b"not an image", "headshot")
+
+
+@pytest.mark.asyncio
+async def test_process_pool_round_trip():
+    pipeline = MediaPipeline(max_workers=1, max_queue=2)
+    try:
+        result = await pipeline.process(_png((300, 300)), "brokerLogo")
+        assert (result.primary.width, result.primary.height) == (200, 200)
+        with pytest.raises(MediaError):
+            await pipeline.process(b"garbage", "brokerLogo")
+    finally:
+        await pipeline.stop()
+
+    stats = pipeline.stats()
+    assert stats["processed"] == 1 and stats["failed"] == 1 and stats["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full():
+    pipeline = MediaPipeline(max_workers=1, max_queue=1, use_processes=False)
+    image = _png((2000, 2000))
+    results = await asyncio.gather(*[pipeline.process(image, "headshot") for _ in range(4)],
+                                   return_exceptions=True)
+    await pipeline.stop()
+
+    assert sum(isinstance(r, MediaBusyError) for r in results) == 2
+    assert pipeline.stats()["rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_timed_out_job_holds_its_slot_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(media_pipeline, "process_brand_image", lambda data, asset_type: time.sleep(0.2))
+    pipeline = MediaPipeline(max_workers=1, max_queue=0, timeout_seconds=0.05, use_processes=False)
+    try:
+        with pytest.raises(MediaBusyError):
+            await pipeline.process(b"slow", "headshot")
+        # The worker is still busy with the runaway job, so there is no room
+        assert pipeline.stats()["pending"] == 1
+        with pytest.raises(MediaBusyError, match="queue is full"):
+            await pipeline.process(b"next", "headshot")
+
+        await asyncio.sleep(0.3)
+        assert pipeline.stats()["pending"] == 0
+    finally:
+        await pipeline.stop()
+    assert pipeline.stats()["timeouts"] == 1
+
+
+class BrokenPool:
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, *args):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.mark.asyncio
+async def test_pool_broken_between_jobs_is_replaced_on_submit():
+    pipeline = MediaPipeline(max_workers=1, max_queue=1, use_processes=False)
+    broken = BrokenPool()
+    pipeline._executor = broken
+    try:
+        result = await pipeline.process(_png((300, 300)), "brokerLogo")
+        assert (result.primary.width, result.primary.height) == (200, 200)
+        assert broken.shut_down and pipeline.stats()["pool_restarts"] == 1
+
+        # A late failure report for the old pool must not tear down its replacement
+        replacement = pipeline._executor
+        pipeline._discard(broken)
+        assert pipeline._executor is replacement
+    finally:
+        await pipeline.stop()
+    assert pipeline.stats()["pool_restarts"] == 1 and pipeline.stats()["pending"] == 0
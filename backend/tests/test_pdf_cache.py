@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+
+def test_cache_key_and_etag():
+    """Key must change with HTML, page options or template version"""
+    from app.pdf_cache import make_pdf_cache_key, make_etag, etag_matches
+
+    base = make_pdf_cache_key("<p>a</p>", {"format": "Letter"}, "investor.html")
+    assert base == make_pdf_cache_key("<p>a</p>", {"format": "Letter"}, "investor.html")
+    assert base != make_pdf_cache_key("<p>b</p>", {"format": "Letter"}, "investor.html")
+    assert base != make_pdf_cache_key("<p>a</p>", {"format": "A4"}, "investor.html")
+    assert base != make_pdf_cache_key("<p>a</p>", {"format": "Letter"}, "affordability.html")
+
+    etag = make_etag(base)
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_is_size_bounded(tmp_path):
+    """Least recently used PDFs are evicted once the byte budget is exceeded"""
+    from app.pdf_cache import PDFCache
+
+    cache = PDFCache(memory_bytes=10, disk_dir="")
+    await cache.set("a", b"12345")
+    await cache.set("b", b"12345")
+    assert await cache.get("a") == b"12345"  # a is now most recent
+    await cache.set("c", b"12345")
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"12345"
+    assert cache.stats()["memory_evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_hit_and_ttl(tmp_path):
+    """Disk entries survive a memory miss and expire after the TTL"""
+    from app.pdf_cache import PDFCache
+
+    cache = PDFCache(memory_bytes=0, disk_dir=str(tmp_path), ttl_seconds=60)
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return b"%PDF-1"
+
+    data, cached = await cache.get_or_render("ab" * 32, render)
+    assert (data, cached) == (b"%PDF-1", False)
+    data, cached = await cache.get_or_render("ab" * 32, render)
+    assert (data, cached) == (b"%PDF-1", True)
+    assert len(renders) == 1
+    assert cache.stats()["disk_hits"] == 1
+
+    path = cache._disk_path("ab" * 32)
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert await cache.get("ab" * 32) is None
+    assert cache.stats()["disk_evictions"] == 1
@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+
+class FakePage:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    async def emulate_media(self, media=None):
+        pass
+
+    async def set_content(self, html, wait_until=None, timeout=None):
+        if self.fail:
+            raise RuntimeError("Target crashed")
+        await asyncio.sleep(0.01)
+
+    async def evaluate(self, script):
+        pass
+
+    async def wait_for_timeout(self, ms):
+        pass
+
+    async def pdf(self, **options):
+        return b"%PDF-fake"
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def new_page(self):
+        self.browser.pages_opened += 1
+        return FakePage(fail=self.browser.fail_next)
+
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.pages_opened = 0
+        self.fail_next = False
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self):
+        return FakeContext(self)
+
+    async def close(self):
+        pass
+
+
+def make_renderer(**kwargs):
+    from app.pdf_renderer import PDFRenderer
+    renderer = PDFRenderer(executable_path="/bin/true", **kwargs)
+    renderer._browser = FakeBrowser()
+    renderer._playwright = object()
+    return renderer
+
+
+@pytest.mark.asyncio
+async def test_pages_are_reused_then_recycled():
+    """Pages should be reused until the per-page render budget is spent"""
+    renderer = make_renderer(pool_size=1, max_renders_per_page=2)
+    await renderer.start()
+    assert renderer._browser.pages_opened == 1
+
+    for _ in range(2):
+        assert await renderer.render("<p>hi</p>") == b"%PDF-fake"
+
+    stats = renderer.stats()
+    assert stats["renders"] == 2
+    assert stats["pages_recycled"] == 1
+    assert renderer._browser.pages_opened == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_render_recycles_page():
+    """A crashed page must be replaced, not returned to the pool"""
+    renderer = make_renderer(pool_size=1, max_renders_per_page=50)
+    renderer._browser.fail_next = True
+    await renderer.start()
+    renderer._browser.fail_next = False
+
+    with pytest.raises(RuntimeError):
+        await renderer.render("<p>boom</p>")
+
+    assert await renderer.render("<p>ok</p>") == b"%PDF-fake"
+    assert renderer.stats()["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_backpressure():
+    """Requests beyond the queue limit are rejected immediately"""
+    from app.pdf_renderer import RendererBusyError
+
+    renderer = make_renderer(pool_size=1, max_queue_depth=1)
+    await renderer.start()
+
+    results = await asyncio.gather(
+        *[renderer.render("<p>x</p>") for _ in range(5)],
+        return_exceptions=True
+    )
+
+    rejected = [r for r in results if isinstance(r, RendererBusyError)]
+    rendered = [r for r in results if r == b"%PDF-fake"]
+    assert rejected and rendered
+    assert len(rejected) + len(rendered) == 5
+    assert renderer.stats()["rejected"] == len(rejected)
+
+
+@pytest.mark.asyncio
+async def test_failed_warmup_leaves_pool_unset_for_retry():
+    """A page that fails to open must not leave a partial pool behind"""
+    renderer = make_renderer(pool_size=2)
+    browser = renderer._browser
+    closed = []
+    opened = 0
+
+    async def flaky_new_context():
+        nonlocal opened
+        opened += 1
+        if opened == 2:
+            raise RuntimeError("Target closed")
+        context = FakeContext(browser)
+
+        async def close():
+            closed.append(context)
+
+        context.close = close
+        return context
+
+    browser.new_context = flaky_new_context
+    with pytest.raises(RuntimeError):
+        await renderer.start()
+
+    assert renderer._slots is None
+    assert len(closed) == 1  # the page opened before the failure is released
+
+    assert await renderer.render("<p>retry</p>") == b"%PDF-fake"
+    assert renderer._slots is not None
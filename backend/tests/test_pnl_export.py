@@ -0,0 +1,86 @@
+import pytest
+import sys
+import os
+import csv
+import io
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.pnl_export import (
+    COLUMNS, ExportError, csv_stream, xlsx_stream, deal_row, expense_row, month_range, normalize_format
+)
+
+DEAL = {"closing_date": "2025-03-10", "month": "2025-03", "house_address": "1 Main St", "lead_source": "Referral",
+        "amount_sold_for": 400000.0, "commission_percent": 3.0, "split_percent": 70.0,
+        "team_brokerage_split_percent": 0, "cap_amount": 500.0, "final_income": 7900.0}
+EXPENSE = {"date": "2025-03-02", "month": "2025-03", "description": "Flyers", "category": "Marketing",
+           "amount": 120.0, "budget": 300.0}
+
+
+async def _rows(count):
+    for i in range(count):
+        yield deal_row(DEAL) if i % 2 == 0 else expense_row(EXPENSE)
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_filters_validated():
+    """Month wins over year, and malformed values are rejected"""
+    assert month_range("2025-03", "2024") == ("2025-03", "2025-03")
+    assert month_range(None, "2024") == ("2024-01", "2024-12")
+    assert normalize_format("excel") == "xlsx"
+    with pytest.raises(ExportError):
+        month_range("2025-13", None)
+    with pytest.raises(ExportError):
+        normalize_format("pdf")
+
+
+@pytest.mark.asyncio
+async def test_csv_streams_in_chunks():
+    """CSV is produced incrementally, one chunk per batch of rows"""
+    chunks = await _collect(csv_stream(_rows(2500)))
+
+    assert len(chunks) == 3
+    text = b"".join(chunks).decode("utf-8-sig")
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == COLUMNS
+    assert len(rows) == 2501
+    assert rows[1][0] == "Deal" and rows[1][11] == "7900.0"
+    assert rows[2][4] == "Marketing" and rows[2][12] == "120.0"
+
+
+@pytest.mark.asyncio
+async def test_xlsx_round_trip():
+    """The write-only workbook opens with every row"""
+    from openpyxl import load_workbook
+
+    data = b"".join(await _collect(xlsx_stream(_rows(10))))
+    sheet = load_workbook(io.BytesIO(data), read_only=True)["P&L"]
+    rows = list(sheet.iter_rows(values_only=True))
+
+    assert list(rows[0]) == COLUMNS
+    assert len(rows) == 11
+    assert rows[1][11] == 7900.0
+
+
+@pytest.mark.asyncio
+async def test_user_text_cannot_become_a_formula():
+    """Text starting with a formula character is quoted in both formats"""
+    from openpyxl import load_workbook
+
+    async def rows():
+        yield deal_row({**DEAL, "house_address": "=HYPERLINK(\"http://evil\")", "lead_source": "@SUM(A1)"})
+        yield expense_row({**EXPENSE, "description": "+1+2", "category": "-Fees"})
+        yield expense_row({**EXPENSE, "description": "\tTabbed", "category": "Plain"})
+
+    csv_rows = list(csv.reader(io.StringIO(b"".join(await _collect(csv_stream(rows()))).decode("utf-8-sig"))))
+    assert csv_rows[1][3] == "'=HYPERLINK(\"http://evil\")" and csv_rows[1][5] == "'@SUM(A1)"
+    assert csv_rows[2][3:5] == ["'+1+2", "'-Fees"]
+    assert csv_rows[3][3:5] == ["'\tTabbed", "Plain"]
+
+    sheet = load_workbook(io.BytesIO(b"".join(await _collect(xlsx_stream(rows())))))["P&L"]
+    assert sheet["D2"].data_type == "s" and sheet["D2"].value == "'=HYPERLINK(\"http://evil\")"
+    assert sheet["D3"].value == "'+1+2" and sheet["E3"].value == "'-Fees"
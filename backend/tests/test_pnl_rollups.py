@@ -0,0 +1,168 @@
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from pymongo import ReplaceOne
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import server
+from app.pnl_rollups import (
+    build_rollups, deal_delta, expense_delta, apply_changes, backfill_rollups, rebuild_rollups,
+    _apply_inc, _present, _merge
+)
+
+DEALS = [
+    {"month": "2025-03", "closing_date": "2025-03-10", "final_income": 9000.0, "lead_source": "Referral"},
+    {"month": "2025-03", "closing_date": "2025-03-20", "final_income": 6000.0, "lead_source": "Zillow.com"},
+    {"month": "2025-04", "closing_date": "2025-04-02", "final_income": 3000.0, "lead_source": ""},
+]
+EXPENSES = [
+    {"month": "2025-03", "date": "2025-03-01", "amount": 250.0, "category": "Marketing"},
+    {"month": "2025-03", "date": "2025-03-05", "amount": 100.0, "category": "Marketing"},
+    {"month": "2025-04", "date": "2025-04-05", "amount": 80.0, "category": "$Fees"},
+]
+
+
+def test_build_rollups_totals():
+    """Per-month totals, category spend and lead sources are aggregated"""
+    rollups = build_rollups(DEALS, EXPENSES)
+    march = _present(rollups["2025-03"], "2025-03")
+
+    assert march["income"] == 15000.0
+    assert march["expenses"] == 350.0
+    assert march["deals_count"] == 2
+    assert march["closed_deals_count"] == 2
+    assert march["expenses_count"] == 2
+    assert march["categories"] == {"Marketing": 350.0}
+    assert march["lead_sources"]["Zillow.com"] == {"count": 1, "income": 6000.0}
+
+    april = _present(rollups["2025-04"], "2025-04")
+    assert april["categories"] == {"$Fees": 80.0}
+    assert april["lead_sources"]["Unknown"]["count"] == 1
+
+
+def test_field_names_are_escaped():
+    """Dots and leading dollars never reach a MongoDB field path"""
+    paths = list(deal_delta(DEALS[1])) + list(expense_delta(EXPENSES[2]))
+    for path in paths:
+        assert all(part and not part.startswith("$") for part in path.split("."))
+        assert path.count(".") <= 2
+
+
+def test_removal_cancels_addition():
+    """Deleting what was added leaves an empty rollup"""
+    doc = {}
+    for deal in DEALS[:2]:
+        _apply_inc(doc, deal_delta(deal))
+    for deal in DEALS[:2]:
+        _apply_inc(doc, deal_delta(deal, -1))
+
+    present = _present(doc, "2025-03")
+    assert present["income"] == 0
+    assert present["deals_count"] == 0
+    assert present["lead_sources"] == {}
+
+
+def test_merge_moves_between_months():
+    """An update that changes month decrements the old month and increments the new"""
+    old = DEALS[0]
+    new = {**old, "month": "2025-05", "closing_date": "2025-05-01"}
+    merged = _merge([("2025-03", deal_delta(old, -1)), ("2025-05", deal_delta(new))])
+
+    assert merged["2025-03"]["income"] == -9000.0
+    assert merged["2025-05"]["deals_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_apply_changes_single_bulk_write():
+    """One upsert per affected month, sent in one bulk_write"""
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock()
+    db = {"pnl_monthly_rollups": collection}
+
+    await apply_changes(db, "user-1", [
+        ("2025-03", expense_delta(EXPENSES[0])),
+        ("2025-03", expense_delta(EXPENSES[1])),
+        ("2025-04", expense_delta(EXPENSES[2])),
+    ])
+
+    operations = collection.bulk_write.call_args.args[0]
+    assert len(operations) == 2
+    assert operations[0]._filter == {"_id": "user-1:2025-03"}
+    assert operations[0]._doc["$inc"]["expenses"] == 350.0
+
+
+class FakeCollection:
+    def __init__(self, distinct=None):
+        self.distinct = AsyncMock(return_value=distinct or [])
+        self.find = MagicMock()
+        self.find.return_value.to_list = AsyncMock(return_value=[])
+        for method in ("find_one", "bulk_write", "update_one", "delete_one", "delete_many"):
+            setattr(self, method, AsyncMock())
+
+
+class FakeDb(dict):
+    """db.name and db["name"] both return the same FakeCollection."""
+
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.mark.asyncio
+async def test_backfill_rebuilds_every_user_not_yet_initialized():
+    """Having rollup documents is not enough; only a finished rebuild marks a user done"""
+    db = FakeDb({
+        "pnl_deals": FakeCollection(["initialized", "partial-rollups", None]),
+        "pnl_expenses": FakeCollection(["legacy"]),
+        # partial-rollups has a rollup from one post-deploy write, but no marker
+        "pnl_monthly_rollups": FakeCollection(["initialized", "partial-rollups"]),
+        "pnl_rollup_state": FakeCollection(["initialized"]),
+    })
+
+    with patch("app.pnl_rollups.rebuild_rollups", AsyncMock(side_effect=[RuntimeError("down"), 3])) as rebuild:
+        assert await backfill_rollups(db) == 1
+
+    # The failed user stays unmarked, so the next startup retries it
+    assert [call.args[1] for call in rebuild.await_args_list] == ["legacy", "partial-rollups"]
+    db["pnl_rollup_state"].distinct.assert_awaited_with("_id", {"rollups_initialized": True})
+
+
+@pytest.mark.asyncio
+async def test_rebuild_replaces_months_in_place_then_marks_user():
+    db = FakeDb()
+    db.pnl_deals.find.return_value.to_list = AsyncMock(return_value=DEALS)
+    db.pnl_expenses.find.return_value.to_list = AsyncMock(return_value=EXPENSES)
+
+    assert await rebuild_rollups(db, "user-1") == 2
+
+    operations = db.pnl_monthly_rollups.bulk_write.await_args.args[0]
+    replaced = {op._filter["_id"]: op._doc for op in operations if isinstance(op, ReplaceOne)}
+    assert set(replaced) == {"user-1:2025-03", "user-1:2025-04"}
+    assert replaced["user-1:2025-03"]["income"] == 15000.0
+    assert operations[-1]._filter == {"user_id": "user-1", "month": {"$nin": ["2025-03", "2025-04"]}}
+    db.pnl_monthly_rollups.delete_many.assert_not_awaited()
+    marker = db.pnl_rollup_state.update_one.await_args
+    assert marker.args[0] == {"_id": "user-1"} and marker.args[1]["$set"]["rollups_initialized"] is True
+
+
+@pytest.mark.asyncio
+async def test_admin_delete_user_removes_rollups():
+    """Otherwise verify reports drift for the deleted user forever"""
+    db = FakeDb()
+    db.users.find_one = AsyncMock(return_value={"id": "user-1", "email": "ann@example.com", "role": "free"})
+    db.users.delete_one = AsyncMock(return_value=SimpleNamespace(deleted_count=1))
+    admin = SimpleNamespace(id="admin-1", email="admin@example.com")
+
+    with patch.object(server, "db", db):
+        await server.admin_delete_user("user-1", current_user=admin)
+
+    db.pnl_monthly_rollups.delete_many.assert_awaited_once_with({"user_id": "user-1"})
+    db.pnl_rollup_state.delete_one.assert_awaited_once_with({"_id": "user-1"})
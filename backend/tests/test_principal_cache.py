@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from pydantic import BaseModel
+
+from app.principal_cache import PrincipalCache
+
+
+class FakeUser(BaseModel):
+    id: str
+    plan: str = "FREE"
+
+
+@pytest.mark.asyncio
+async def test_repeat_requests_share_one_lookup():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+    load = AsyncMock(return_value=FakeUser(id="u1"))
+
+    users = [await cache.get_or_load("u1", "token-a", load) for _ in range(30)]
+
+    assert load.await_count == 1
+    assert all(user.id == "u1" for user in users)
+    # Each request gets its own copy
+    users[0].plan = "PRO"
+    assert (await cache.get_or_load("u1", "token-a", load)).plan == "FREE"
+
+    # A different token for the same user is a separate entry
+    await cache.get_or_load("u1", "token-b", load)
+    assert load.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_ttl_and_unknown_users():
+    cache = PrincipalCache(ttl_seconds=0.05, max_entries=10)
+    load = AsyncMock(return_value=FakeUser(id="u1", plan="PRO"))
+
+    await cache.get_or_load("u1", "t", load)
+    cache.invalidate("u1")
+    await cache.get_or_load("u1", "t", load)
+    assert load.await_count == 2
+
+    await asyncio.sleep(0.06)
+    await cache.get_or_load("u1", "t", load)
+    assert load.await_count == 3 and cache.stats()["expired"] == 1
+
+    missing = AsyncMock(return_value=None)
+    assert await cache.get_or_load("ghost", "t", missing) is None
+    assert await cache.get_or_load("ghost", "t", missing) is None
+    assert missing.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_lookup_racing_an_invalidation_is_not_stored():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+
+    async def slow_load():
+        await asyncio.sleep(0.01)
+        return FakeUser(id="u1", plan="FREE")
+
+    lookup = asyncio.create_task(cache.get_or_load("u1", "t", slow_load))
+    await asyncio.sleep(0)
+    cache.invalidate("u1")  # e.g. a plan upgrade lands mid-lookup
+    await lookup
+
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_bounded_size():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    for user_id in ("u1", "u2", "u3"):
+        await cache.get_or_load(user_id, "t", AsyncMock(return_value=FakeUser(id=user_id)))
+
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
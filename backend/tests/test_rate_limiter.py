@@ -0,0 +1,79 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+
+class FakeStore:
+    """Stands in for MongoDBCache.increment_window with a shared dict."""
+
+    def __init__(self):
+        self.counts = {}
+
+    async def increment_window(self, key, bucket, reset_time, amount=1):
+        self.counts[(key, bucket)] = self.counts.get((key, bucket), 0) + amount
+        return self.counts[(key, bucket)]
+
+
+def test_limit_enforced_in_memory():
+    """Requests beyond the limit are denied without touching the store"""
+    from app.rate_limiter import SlidingWindowLimiter
+
+    limiter = SlidingWindowLimiter(max_keys=100, sync_interval=5, store=FakeStore())
+    with patch("app.rate_limiter.time.time", return_value=1_000_000.0):
+        results = [limiter.hit("k", 3, 60) for _ in range(5)]
+
+    assert [r["allowed"] for r in results] == [True, True, True, False, False]
+    assert results[0]["remaining"] == 2
+    assert results[3]["remaining"] == 0
+    assert results[3]["reset_time"].timestamp() > 1_000_000.0
+
+
+def test_previous_window_is_weighted():
+    """Half way into the next window, half of the previous window still counts"""
+    from app.rate_limiter import SlidingWindowLimiter
+
+    limiter = SlidingWindowLimiter(max_keys=100, sync_interval=5, store=FakeStore())
+    start = 60 * 1000
+    with patch("app.rate_limiter.time.time", return_value=float(start)):
+        for _ in range(10):
+            limiter.hit("k", 10, 60)
+    with patch("app.rate_limiter.time.time", return_value=float(start + 90)):
+        allowed = sum(limiter.hit("k", 10, 60)["allowed"] for _ in range(10))
+
+    assert allowed == 5
+
+
+def test_lru_is_bounded():
+    """Least recently used keys are evicted past max_keys"""
+    from app.rate_limiter import SlidingWindowLimiter
+
+    limiter = SlidingWindowLimiter(max_keys=2, sync_interval=5, store=FakeStore())
+    for key in ("a", "b", "c"):
+        limiter.hit(key, 10, 60)
+
+    assert limiter.stats()["keys"] == 2
+    assert limiter.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sync_shares_counts_between_workers():
+    """After a sync each worker sees the other's requests"""
+    from app.rate_limiter import SlidingWindowLimiter
+
+    store = FakeStore()
+    worker_a = SlidingWindowLimiter(max_keys=100, sync_interval=5, store=store)
+    worker_b = SlidingWindowLimiter(max_keys=100, sync_interval=5, store=store)
+
+    with patch("app.rate_limiter.time.time", return_value=60_000.0):
+        for _ in range(3):
+            worker_a.hit("k", 5, 60)
+        worker_b.hit("k", 5, 60)
+        await worker_a.sync()
+        await worker_b.sync()
+
+        assert worker_b.hit("k", 5, 60)["allowed"]
+        assert not worker_b.hit("k", 5, 60)["allowed"]
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock
+
+from boto3.exceptions import S3UploadFailedError
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.storage import LocalStorage, ObjectNotFoundError, S3Storage, StorageError
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    """A local S3-compatible server (moto) for end-to-end driver tests."""
+    server_module = pytest.importorskip("moto.server")
+    server = server_module.ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3(s3_endpoint):
+    storage = S3Storage(
+        bucket="test-bucket",
+        region="us-east-1",
+        access_key_id="test",
+        secret_access_key="test",
+        endpoint_url=s3_endpoint,
+        max_connections=4,
+        multipart_threshold=5 * 1024 * 1024,
+        multipart_chunksize=5 * 1024 * 1024
+    )
+    storage.client.create_bucket(Bucket="test-bucket")
+    yield storage
+    asyncio.run(storage.stop())
+
+
+@pytest.mark.asyncio
+async def test_local_round_trip(tmp_path):
+    storage = LocalStorage(root=str(tmp_path))
+
+    stored = await storage.put("user/u1/headshot-1.png", b"png-bytes", "image/png")
+
+    assert stored.url == "/api/uploads/user/u1/headshot-1.png"
+    assert storage.key_for_url(stored.url) == "user/u1/headshot-1.png"
+    assert await storage.get("user/u1/headshot-1.png") == b"png-bytes"
+    assert await storage.check()
+
+    await storage.delete("user/u1/headshot-1.png")
+    with pytest.raises(ObjectNotFoundError):
+        await storage.get("user/u1/headshot-1.png")
+    assert list(tmp_path.rglob("*.png")) == []
+
+
+@pytest.mark.asyncio
+async def test_local_rejects_keys_outside_root(tmp_path):
+    storage = LocalStorage(root=str(tmp_path / "uploads"))
+    with pytest.raises(StorageError):
+        await storage.put("../escape.txt", b"x")
+
+
+@pytest.mark.asyncio
+async def test_s3_round_trip(s3, s3_endpoint):
+    stored = await s3.put("user/u1/logo.png", b"logo", "image/png")
+
+    assert stored.url == f"{s3_endpoint}/test-bucket/user/u1/logo.png"
+    assert s3.key_for_url(stored.url) == "user/u1/logo.png"
+    assert stored.etag and await s3.get("user/u1/logo.png") == b"logo"
+    assert await s3.check()
+
+    await s3.delete("user/u1/logo.png")
+    with pytest.raises(ObjectNotFoundError):
+        await s3.get("user/u1/logo.png")
+
+
+@pytest.mark.asyncio
+async def test_s3_large_objects_use_multipart(s3):
+    data = os.urandom(11 * 1024 * 1024)
+
+    stored = await s3.put("assets/large.pdf", data, "application/pdf")
+
+    assert stored.etag.endswith("-3")  # S3 multipart ETags carry the part count
+    assert await s3.get("assets/large.pdf") == data
+    head = await s3._call("head_object", Bucket="test-bucket", Key="assets/large.pdf")
+    assert head["ContentType"] == "application/pdf"
+    assert s3.stats()["multipart_puts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_s3_failed_multipart_upload_raises_storage_error():
+    """upload_fileobj raises boto3's own S3UploadFailedError, not a botocore error"""
+    storage = S3Storage(bucket="test-bucket", region="us-east-1", max_connections=2, multipart_threshold=4)
+    storage._client = MagicMock()
+    storage._client.upload_fileobj.side_effect = S3UploadFailedError("Failed to upload: connection reset")
+    try:
+        with pytest.raises(StorageError):
+            await storage.put("assets/large.pdf", b"0123456789", "application/pdf")
+    finally:
+        await storage.stop()
+    assert storage.stats()["errors"] == 1
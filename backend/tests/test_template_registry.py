@@ -0,0 +1,53 @@
+import os
+import sys
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.template_registry import REPORT_TEMPLATES, TemplateNotFoundError, TemplateRegistry
+
+
+def _write(path, text, mtime_ns):
+    path.write_text(text, encoding='utf-8')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_loads_and_renders_without_escaping(tmp_path):
+    _write(tmp_path / "report.html", "<p>{{name}}</p>{{#rows}}<i>{{v}}</i>{{/rows}}{{missing}}", 1_000_000_000)
+    (tmp_path / "notes.txt").write_text("ignored")
+    registry = TemplateRegistry(directory=tmp_path, auto_reload=False)
+
+    assert registry.load() == 1
+    html = registry.render("report.html", {"name": "<b>Ann</b>", "rows": [{"v": 1}, {"v": 2}]})
+    assert html == "<p><b>Ann</b></p><i>1</i><i>2</i>"
+    assert registry.stats()["loads"] == 1
+
+
+def test_reloads_changed_file_only_when_enabled(tmp_path):
+    path = tmp_path / "report.html"
+    _write(path, "v1 {{x}}", 1_000_000_000)
+    dev = TemplateRegistry(directory=tmp_path, auto_reload=True)
+    prod = TemplateRegistry(directory=tmp_path, auto_reload=False)
+    assert dev.render("report.html", {"x": 1}) == prod.render("report.html", {"x": 1}) == "v1 1"
+
+    _write(path, "v2 {{x}}", 2_000_000_000)
+    assert dev.render("report.html", {"x": 1}) == "v2 1"
+    assert prod.render("report.html", {"x": 1}) == "v1 1"
+    assert dev.stats()["reloads"] == 1
+
+    dev.render("report.html", {"x": 1})
+    assert dev.stats()["loads"] == 2
+
+
+def test_missing_template(tmp_path):
+    registry = TemplateRegistry(directory=tmp_path, auto_reload=True)
+    with pytest.raises(TemplateNotFoundError):
+        registry.get("../server.py")
+
+
+def test_every_report_tool_has_a_template():
+    registry = TemplateRegistry(auto_reload=False)
+    registry.load()
+    for name in REPORT_TEMPLATES.values():
+        assert registry.get(name).parsed is not None